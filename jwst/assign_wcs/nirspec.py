@@ -4,7 +4,11 @@ Tools to create the WCS pipeline NIRSPEC modes.
 Calls create_pipeline() which redirects based on EXP_TYPE.
 
 """
+import copy
 import logging
+import weakref
+from collections import OrderedDict, namedtuple
+
 import numpy as np
 
 from astropy.modeling import models
@@ -13,6 +17,8 @@ from astropy import units as u
 from astropy import coordinates as coord
 from astropy.io import fits
 from gwcs import coordinate_frames as cf
+from gwcs.wcs import WCS
+from gwcs.wcstools import grid_from_bounding_box
 
 from ..transforms.models import (Rotation3DToGWA, DirCos2Unitless, Slit2Msa,
                                  AngleFromGratingEquation, WavelengthFromGratingEquation,
@@ -35,7 +41,33 @@ log.setLevel(logging.DEBUG)
 
 
 __all__ = ["create_pipeline", "imaging", "ifu", "slits_wcs", "get_open_slits", "nrs_wcs_set_input",
-           "nrs_ifu_wcs", "get_spectral_order_wrange"]
+           "nrs_ifu_wcs", "nrs_slit_maps", "get_spectral_order_wrange"]
+
+
+# Bounding boxes of the slits, for each (multi-slit) WCS object.
+_bounding_boxes = weakref.WeakKeyDictionary()
+
+
+SlitMap = namedtuple('SlitMap', ['xstart', 'ystart', 'bounding_box', 'mask',
+                                 'slit', 'world'])
+SlitMap.__doc__ = """
+Coordinates of the detector pixels of one slit, slice or shutter.
+
+The maps cover the pixels of the bounding box of the slit, as returned by
+`~gwcs.wcstools.grid_from_bounding_box`.  Pixels are not masked by the
+bounding box; ``mask`` is True for the pixels inside it.
+
+xstart, ystart : int
+    Detector pixel of the first element of the maps.
+bounding_box : tuple
+    Bounding box of the slit WCS.
+mask : `~numpy.ndarray`
+    Pixels inside the bounding box.
+slit : tuple of `~numpy.ndarray`
+    ``x_slit``, ``y_slit`` and wavelength (in meters) in ``slit_frame``.
+world : tuple of `~numpy.ndarray`
+    The output coordinates of the WCS, e.g. ra, dec and wavelength.
+"""
 
 
 def create_pipeline(input_model, reference_files):
@@ -1394,38 +1426,157 @@ def nrs_wcs_set_input(input_model, slit_name, wavelength_range=None):
     wcsobj : `~gwcs.wcs.WCS`
         WCS object for this slit.
     """
-    import copy # TODO: Add a copy method to gwcs.WCS
     wcsobj = input_model.meta.wcs
     if wavelength_range is None:
         _, wrange = spectral_order_wrange_from_model(input_model)
     else:
         wrange = wavelength_range
-    slit_wcs = copy.deepcopy(wcsobj)
-    slit_wcs.set_transform('sca', 'gwa', wcsobj.pipeline[1][1][1:])
-    # get the open slits from the model
-    # Need them to get the slit ymin,ymax
-    g2s = wcsobj.pipeline[2][1]
-    open_slits = g2s.slits
-
-    slit_wcs.set_transform('gwa', 'slit_frame', g2s.get_model(slit_name))
-    if input_model.meta.exposure.type.lower() == 'nrs_ifu':
-        slit_wcs.set_transform('slit_frame', 'slicer',
-                           wcsobj.pipeline[3][1].get_model(slit_name) & Identity(1))
-    else:
-        slit_wcs.set_transform('slit_frame', 'msa_frame',
-                           wcsobj.pipeline[3][1].get_model(slit_name) & Identity(1))
-    slit2detector = slit_wcs.get_transform('slit_frame', 'detector')
-
-    if input_model.meta.exposure.type.lower() != 'nrs_ifu':
-        slit = [s for s in open_slits if s.name == slit_name][0]
-        bb = compute_bounding_box(slit2detector, wrange,
-                                  slit_ymin=slit.ymin, slit_ymax=slit.ymax)
-    else:
-        bb = compute_bounding_box(slit2detector, wrange)
-    slit_wcs.bounding_box = bb
+    is_ifu = input_model.meta.exposure.type.lower() == 'nrs_ifu'
+    slit_wcs = _slit_wcs(wcsobj, slit_name)
+    slit_wcs.bounding_box = _slit_bounding_box(wcsobj, slit_name, wrange, is_ifu)
     return slit_wcs
 
 
+def _slit_transforms(wcsobj, slit_name):
+    """
+    The transforms of the WCS pipeline of one slit.
+
+    Only the transforms for this slit are taken from the multi-slit models
+    (``gwa2slit`` and ``slit2msa`` or ``slit2slicer``), so that the cost
+    does not depend on the number of open slits.
+    """
+    pipeline = wcsobj.pipeline
+    transforms = [pipeline[0][1],
+                  pipeline[1][1][1:],
+                  pipeline[2][1].get_model(slit_name),
+                  pipeline[3][1].get_model(slit_name) & Identity(1)]
+    transforms.extend(step[1] for step in pipeline[4:])
+    return transforms
+
+
+def _slit_wcs(wcsobj, slit_name):
+    """ A WCS object for one slit, without a bounding box."""
+    frames = [step[0] for step in wcsobj.pipeline]
+    transforms = _slit_transforms(wcsobj, slit_name)
+    return WCS(copy.deepcopy(list(zip(frames, transforms))))
+
+
+def _slit_bounding_box(wcsobj, slit_name, wrange, is_ifu):
+    """
+    The bounding box of one slit.
+
+    The bounding boxes are cached for each WCS object.
+    """
+    boxes = _bounding_boxes.setdefault(wcsobj, {})
+    key = (slit_name, tuple(wrange))
+    if key not in boxes:
+        det2slit = _slit_transforms(wcsobj, slit_name)[:3]
+        slit2detector = (det2slit[0] | det2slit[1] | det2slit[2]).inverse
+        if is_ifu:
+            boxes[key] = compute_bounding_box(slit2detector, wrange)
+        else:
+            g2s = wcsobj.pipeline[2][1]
+            slit = g2s.slits[g2s.slit_ids.index(slit_name)]
+            boxes[key] = compute_bounding_box(slit2detector, wrange,
+                                              slit_ymin=slit.ymin,
+                                              slit_ymax=slit.ymax)
+    return boxes[key]
+
+
+def nrs_slit_maps(input_model, slit_names=None, wavelength_range=None):
+    """
+    Evaluate the WCS of several slits, slices or shutters at once.
+
+    The part of the WCS shared by all slits (from the detector to the GWA,
+    and from the MSA to the sky) is evaluated once for the pixels of all
+    slits; only the transforms specific to a slit are evaluated separately.
+
+    Parameters
+    ----------
+    input_model : `~jwst.datamodels.DataModel`
+        The data model. Must have been through the assign_wcs step.
+    slit_names : list
+        Names of the slits (or slices).  The default is all open slits.
+    wavelength_range : list
+        Wavelength range for the combination of filter and grating.
+
+    Returns
+    -------
+    slit_maps : dict
+        A `SlitMap` for each slit, {slit_name: SlitMap}, in the order of
+        ``slit_names``.
+    """
+    wcsobj = input_model.meta.wcs
+    if wavelength_range is None:
+        _, wrange = spectral_order_wrange_from_model(input_model)
+    else:
+        wrange = wavelength_range
+    is_ifu = input_model.meta.exposure.type.lower() == 'nrs_ifu'
+    if slit_names is None:
+        slit_names = wcsobj.pipeline[2][1].slit_ids
+    slit_names = list(slit_names)
+
+    log.debug("Evaluating the WCS of {0} slits".format(len(slit_names)))
+    new_maps = _evaluate_slit_maps(wcsobj, slit_names, wrange, is_ifu)
+    return OrderedDict(zip(slit_names, new_maps))
+
+
+def _evaluate_slit_maps(wcsobj, slit_names, wrange, is_ifu):
+    """
+    Evaluate the WCS on the bounding box pixels of several slits.
+
+    Returns
+    -------
+    slit_maps : list
+        A `SlitMap` for each slit.
+    """
+    pipeline = wcsobj.pipeline
+    det2gwa = pipeline[0][1] | pipeline[1][1][1:]
+    msa2world = [step[1] for step in pipeline[4:] if step[1] is not None]
+
+    boxes = []
+    grids = []
+    for name in slit_names:
+        bb = _slit_bounding_box(wcsobj, name, wrange, is_ifu)
+        boxes.append(bb)
+        grids.append(grid_from_bounding_box(bb))
+
+    # detector to GWA, for the pixels of all slits
+    x = np.concatenate([grid[0].ravel() for grid in grids])
+    y = np.concatenate([grid[1].ravel() for grid in grids])
+    split = np.cumsum([grid[0].size for grid in grids])[:-1]
+    angles = [np.split(a, split) for a in det2gwa(x, y)]
+
+    # GWA to slit frame and MSA, slit by slit
+    slit_coords = []
+    msa_coords = []
+    for k, name in enumerate(slit_names):
+        gwa2slit = pipeline[2][1].get_model(name)
+        slit2msa = pipeline[3][1].get_model(name) & Identity(1)
+        coords = gwa2slit(*[a[k] for a in angles])
+        slit_coords.append(coords)
+        msa_coords.append(slit2msa(*coords))
+
+    # MSA to world, for the pixels of all slits
+    world = [np.concatenate(c) for c in zip(*msa_coords)]
+    for transform in msa2world:
+        world = transform(*world)
+    world = [np.split(w, split) for w in world]
+
+    slit_maps = []
+    for k, (bb, grid) in enumerate(zip(boxes, grids)):
+        xgrid, ygrid = grid
+        mask = ((xgrid >= bb[0][0]) & (xgrid <= bb[0][1]) &
+                (ygrid >= bb[1][0]) & (ygrid <= bb[1][1]))
+        slit = tuple(np.asarray(c).reshape(xgrid.shape) for c in slit_coords[k])
+        wcoords = tuple(w[k].reshape(xgrid.shape) for w in world)
+        for a in (mask,) + slit + wcoords:
+            a.setflags(write=False)
+        slit_maps.append(SlitMap(int(xgrid[0, 0]), int(ygrid[0, 0]), bb,
+                                 mask, slit, wcoords))
+    return slit_maps
+
+
 def validate_open_slits(input_model, open_slits, reference_files):
     """
     Remove slits which do not project on the detector from the list of open slits.
@@ -8,6 +8,7 @@ from astropy.io import fits
 from astropy.modeling import models as astmodels
 from astropy import wcs as astwcs
 from gwcs import wcs
+from gwcs import wcstools
 from ... import datamodels
 from ...transforms.models import Slit
 from .. import nirspec
@@ -231,6 +232,29 @@ def test_nirspec_fs_esa():
     ref.close()
 
 
+def test_nrs_slit_maps():
+    """
+    Test the evaluation of the WCS of all slits at once against the WCS
+    of each slit.
+    """
+    im = datamodels.ImageModel(create_nirspec_fs_file(grating="G140M", filter="F100LP"))
+    refs = create_reference_files(im)
+    im.meta.wcs = wcs.WCS(nirspec.create_pipeline(im, refs))
+
+    slit_maps = nirspec.nrs_slit_maps(im)
+    assert list(slit_maps) == im.meta.wcs.get_transform('gwa', 'slit_frame').slit_ids
+    for name, slit_map in slit_maps.items():
+        slit_wcs = nirspec.nrs_wcs_set_input(im, name)
+        assert slit_map.bounding_box == slit_wcs.bounding_box
+        x, y = wcstools.grid_from_bounding_box(slit_wcs.bounding_box)
+        assert (slit_map.xstart, slit_map.ystart) == (x[0, 0], y[0, 0])
+        for coord, expected in zip(slit_map.world, slit_wcs(x, y)):
+            assert_allclose(np.where(slit_map.mask, coord, np.nan), expected)
+        det2slit = slit_wcs.get_transform('detector', 'slit_frame')
+        for coord, expected in zip(slit_map.slit, det2slit(x, y)):
+            assert_allclose(coord, expected)
+
+
 def test_correct_tilt():
     """
     Example provided by Catarina.
@@ -5,6 +5,9 @@ Utility function for assign_wcs.
 import warnings
 import logging
 import functools
+import hashlib
+import io
+import asdf
 import numpy as np
 
 from astropy.utils.misc import isiterable
@@ -851,3 +854,22 @@ def velocity_correction(velosys):
     model.inverse = astmodels.Identity(1) / astmodels.Const1D(correction, name="inv_vel_correciton")
 
     return model
+
+
+def wcs_hash(wcsobj):
+    """
+    Hash of a WCS object, used to cache quantities derived from it.
+
+    Parameters
+    ----------
+    wcsobj : `~gwcs.wcs.WCS`
+        The WCS object.
+
+    Returns
+    -------
+    key : str
+        SHA1 digest of the ASDF serialization of the WCS.
+    """
+    buff = io.BytesIO()
+    asdf.AsdfFile({'wcs': wcsobj}).write_to(buff)
+    return hashlib.sha1(buff.getvalue()).hexdigest()
@@ -1,8 +1,13 @@
 import logging
 
 from .association import (
+    Association,
     make_timestamp
 )
+from .lib.constraint import (
+    AttrConstraint,
+    Constraint
+)
 from .lib.process_list import (
     ProcessList,
     ProcessQueueSorted
@@ -43,6 +48,7 @@ def generate(pool, rules, version_id=None):
     documentation for a full description.
     """
     associations = []
+    index = AssociationIndex()
     if type(version_id) is bool:
         version_id = make_timestamp()
     process_queue = ProcessQueueSorted([
@@ -58,10 +64,14 @@ def generate(pool, rules, version_id=None):
             existing_asns, new_asns, to_process = generate_from_item(
                 item,
                 version_id,
-                associations,
+                index.candidates(item),
                 rules,
                 process_list
             )
+            for asn in existing_asns:
+                index.update(asn)
+            for asn in new_asns:
+                index.add(asn)
             associations.extend(new_asns)
 
             # If working on a process list EXISTING
@@ -201,3 +211,161 @@ def match_item(item, associations):
         if matches:
             item_associations.append(asn)
     return item_associations, process_list
+
+
+class AssociationIndex:
+    """Index of associations by the values their constraints require
+
+    Most associations can only accept items that have specific values,
+    such as the program, observation, or exposure type of the
+    association. Adding an item to each existing association to find out
+    is the most expensive part of the generation. The index groups
+    associations that require the same attributes by their required
+    values, so that only associations the item may match are checked.
+
+    Associations that cannot be indexed, because their constraints are
+    not literal values or may trigger reprocessing on failure, are
+    always candidates.
+
+    Notes
+    -----
+    The constraints of an association change when an item is added
+    to it. Use `update` after an association has matched an item.
+    """
+    def __init__(self):
+        self._order = {}
+        self._always = {}
+        self._buckets = {}
+        self._constraints = {}
+        self._keys = {}
+
+    def add(self, asn):
+        """Add an association to the index
+
+        Parameters
+        ----------
+        asn : Association
+            The association to add.
+        """
+        asn_id = id(asn)
+        self._order.setdefault(asn_id, len(self._order))
+        constraints = index_constraints(asn)
+        if not constraints:
+            self._always[asn_id] = asn
+            return
+
+        signature = tuple(
+            (tuple(constraint.sources), tuple(constraint.invalid_values))
+            for constraint in constraints
+        )
+        values = tuple(
+            constraint.index_value()
+            for constraint in constraints
+        )
+        self._constraints.setdefault(signature, constraints)
+        bucket = self._buckets.setdefault(signature, {})
+        bucket.setdefault(values, {})[asn_id] = asn
+        self._keys[asn_id] = (signature, values)
+
+    def update(self, asn):
+        """Re-index an association whose constraints have changed
+
+        Parameters
+        ----------
+        asn : Association
+            The association to update.
+        """
+        asn_id = id(asn)
+        if self._always.pop(asn_id, None) is None:
+            signature, values = self._keys.pop(asn_id)
+            bucket = self._buckets[signature]
+            del bucket[values][asn_id]
+            if not bucket[values]:
+                del bucket[values]
+        self.add(asn)
+
+    def candidates(self, item):
+        """Associations that the item may be added to
+
+        Parameters
+        ----------
+        item : dict
+            The item to match.
+
+        Returns
+        -------
+        associations : [Association[,...]]
+            The associations, in the order they were added to the index.
+        """
+        candidates = list(self._always.values())
+        for signature, bucket in self._buckets.items():
+            try:
+                values = tuple(
+                    constraint.item_value(item)
+                    for constraint in self._constraints[signature]
+                )
+            except KeyError:
+                # A required attribute is missing: no match possible.
+                continue
+            if None in values:
+                for asns in bucket.values():
+                    candidates.extend(asns.values())
+            else:
+                candidates.extend(bucket.get(values, {}).values())
+
+        candidates.sort(key=lambda asn: self._order[id(asn)])
+        return candidates
+
+
+def index_constraints(asn):
+    """Constraints of an association that can be indexed
+
+    A constraint can be indexed if its failure means that the item
+    cannot be added to the association, without any reprocessing.
+
+    Parameters
+    ----------
+    asn : Association
+        The association to examine.
+
+    Returns
+    -------
+    constraints : [AttrConstraint[,...]]
+        The constraints that can be indexed. Empty if the association
+        cannot be indexed at all.
+    """
+    asn_type = type(asn)
+    if asn_type.add is not Association.add or \
+       asn_type.check_and_set_constraints is not \
+       Association.check_and_set_constraints:
+        return []
+    try:
+        asn.constraints['force_match']
+    except (KeyError, TypeError):
+        pass
+    else:
+        return []
+
+    return [
+        constraint
+        for constraint in _required(asn.constraints)
+        if type(constraint).check_and_set is AttrConstraint.check_and_set
+        and constraint.index_value() is not None
+    ]
+
+
+def _required(constraint):
+    """Simple constraints that must all be satisfied, without reprocessing"""
+    if not isinstance(constraint, Constraint) or \
+       type(constraint).check_and_set is not Constraint.check_and_set or \
+       constraint.reduce is not Constraint.all or \
+       constraint.reprocess_on_fail:
+        return []
+
+    required = []
+    for component in constraint.constraints:
+        if isinstance(component, Constraint):
+            required.extend(_required(component))
+        elif isinstance(component, AttrConstraint):
+            required.append(component)
+    return required
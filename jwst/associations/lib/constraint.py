@@ -24,6 +24,10 @@ __all__ = [
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Values that regular expressions with IGNORECASE compare
+# as simple lower-cased strings: printable ASCII.
+_PLAIN_VALUE = re.compile('[ -~]*')
+
 
 class SimpleConstraintABC(abc.ABC):
     """Simple Constraint ABC
@@ -363,7 +367,7 @@ class AttrConstraint(SimpleConstraintABC):
         if invalid_values is None:
             self.invalid_values = []
         if onlyif is None:
-            self.onlyif = lambda item: True
+            self.onlyif = always_true
 
         # Haven't actually matched anything yet.
         self.found_values = set()
@@ -459,6 +463,49 @@ class AttrConstraint(SimpleConstraintABC):
         self.matched = True
         return self.matched, reprocess
 
+    def index_value(self):
+        """Value an item must have to satisfy the constraint
+
+        Returns
+        -------
+        value : str or None
+            The lower-cased value that `sources` must have in an item
+            for the constraint to be satisfied, if the constraint
+            requires a single, literal value and fails without
+            reprocessing otherwise. Else None.
+        """
+        if self.evaluate or not self.required or self.force_undefined:
+            return None
+        if self.onlyif is not always_true:
+            return None
+        return literal_value(self.value)
+
+    def item_value(self, item):
+        """Value of an item to compare with `index_value`
+
+        Parameters
+        ----------
+        item : dict
+            The item to retrieve the value from.
+
+        Returns
+        -------
+        value : str or None
+            The lower-cased value of the item, or None if it cannot
+            be compared as a plain string.
+
+        Raises
+        ------
+        KeyError
+            The item has no valid value for any of the sources.
+        """
+        source, value = getattr_from_list(
+            item, self.sources, invalid_values=self.invalid_values
+        )
+        if isinstance(value, str) and _PLAIN_VALUE.fullmatch(value):
+            return value.lower()
+        return None
+
 
 class Constraint:
     """Constraint that is made up of SimpleConstraint
@@ -724,6 +771,34 @@ class Constraint:
 # ---------
 # Utilities
 # ---------
+def always_true(item):
+    """Default `onlyif` condition: check every item"""
+    return True
+
+
+def literal_value(condition):
+    """Value matched by a condition that is a literal string
+
+    Parameters
+    ----------
+    condition : object
+        A condition, as used by `meets_conditions`.
+
+    Returns
+    -------
+    value : str or None
+        The lower-cased string matched by `condition`, if `condition`
+        is an escaped plain string, such as the values set by
+        `AttrConstraint` once it has matched. Else None.
+    """
+    if not isinstance(condition, str):
+        return None
+    value = re.sub(r'\\(.)', r'\1', condition, flags=re.DOTALL)
+    if re.escape(value) != condition or not _PLAIN_VALUE.fullmatch(value):
+        return None
+    return value.lower()
+
+
 def meets_conditions(value, conditions):
     """Check whether value meets any of the provided conditions
 
@@ -1,5 +1,7 @@
 """Main entry for the association generator"""
+from copy import deepcopy
 import os
+import re
 import sys
 import argparse
 import logging
@@ -8,15 +10,19 @@ import numpy as np
 
 from jwst.associations import (
     __version__,
+    AssociationError,
+    AssociationNotValidError,
     AssociationPool,
     AssociationRegistry,
     generate,
 )
+from jwst.associations.association import make_timestamp
 from jwst.associations.lib.dms_base import DMSAttrConstraint
 from jwst.associations.lib.constraint import (
     ConstraintTrue,
 )
 from jwst.associations.lib.log_config import (log_config, DMS_config)
+from jwst.lib.parallel_utils import map_ordered
 
 __all__ = ['Main']
 
@@ -27,6 +33,9 @@ logger = log_config(name=__package__)
 DISCOVER_RULESET = 'discover'
 CANDIDATE_RULESET = 'candidate'
 
+# Association names ending with the sequence number
+_SEQUENCE_NAME = re.compile(r'^(?P<prefix>.*_)(?P<sequence>\d+)(?P<suffix>_asn)$')
+
 
 class Main():
     """
@@ -54,7 +63,10 @@ class Main():
         The rules used for association creation.
 
     associations : [`Association`, ...]
-        The list of generated associations.
+        The list of generated associations. With ``--partition-by`` and
+        ``--nproc`` greater than 1, these are `SerializedAssociation`
+        instances, which only hold the name, description, items and
+        serialization of each association.
 
     orphaned : `AssociationPool`
         The pool of exposures that do not belong
@@ -179,6 +191,23 @@ class Main():
             '--no-merge', action='store_true',
             help='Do not merge Level2 associations into one'
         )
+        parser.add_argument(
+            '--partition-by', dest='partition_by',
+            nargs='?', const='program', default=None,
+            help=(
+                'Generate associations separately for each value of'
+                ' the specified pool column. If specified without a'
+                ' column, "program" is used.'
+                ' Default: no partitioning.'
+            )
+        )
+        parser.add_argument(
+            '--nproc', type=int, default=1,
+            help=(
+                'Number of processes to generate the partitions with.'
+                ' Only used with --partition-by. Default: %(default)s'
+            )
+        )
 
         parsed = parser.parse_args(args=args)
 
@@ -245,31 +274,22 @@ class Main():
             )
 
         logger.info('Generating associations.')
-        self.associations = generate(
-            self.pool, self.rules, version_id=parsed.version_id
+        generate_kwargs = dict(
+            version_id=parsed.version_id,
+            discover=parsed.discover,
+            all_candidates=parsed.all_candidates,
+            merge=not parsed.no_merge,
         )
-
-        if parsed.discover:
-            logger.debug(
-                '# asns found before discover filtering={}'.format(
-                    len(self.associations)
-                )
+        if parsed.partition_by is None:
+            self.associations = generate_from_pool(
+                self.pool, self.rules, **generate_kwargs
             )
-            self.associations = filter_discovered_only(
-                self.associations,
-                DISCOVER_RULESET,
-                CANDIDATE_RULESET,
-                keep_candidates=parsed.all_candidates,
+        else:
+            self.associations = generate_partitioned(
+                self.pool, self.rules, parsed.partition_by,
+                nproc=parsed.nproc, format=parsed.format,
+                **generate_kwargs
             )
-            self.rules.Utility.resequence(self.associations)
-
-        # Do a grand merging. This is done particularly for
-        # Level2 associations.
-        if not parsed.no_merge:
-            try:
-                self.associations = self.rules.Utility.merge_asns(self.associations)
-            except AttributeError:
-                pass
 
         logger.info(self.__str__())
 
@@ -332,9 +352,338 @@ class Main():
             )
 
 
+class SerializedAssociation():
+    """An association generated in another process
+
+    Associations cannot be sent between processes. The partitions of
+    `generate_partitioned` generated in parallel send their associations
+    back serialized, along with what `Main` needs to report and save them.
+
+    Parameters
+    ----------
+    asn : Association
+        The association to serialize.
+
+    rows : [int[,...]]
+        The indexes in the whole pool of the rows of the partition
+        the association was generated from.
+
+    format : str
+        The format to serialize the association to.
+
+    Attributes
+    ----------
+    asn_name : str
+        The name of the association.
+
+    from_items : [item[,...]]
+        The items of the whole pool that contributed to the association.
+        Set by `generate_partitioned`.
+
+    rows : [int[,...]]
+        The indexes in the whole pool of the items that contributed to
+        the association.
+    """
+    def __init__(self, asn, rows, format='json'):
+        self.asn_name = asn.asn_name
+        self.format = format
+        self.description = str(asn)
+        self.from_items = []
+        try:
+            self.rows = [int(rows[item.index]) for item in asn.from_items]
+        except AttributeError:
+            self.rows = []
+        self.error = None
+        try:
+            self.fname, self.serialized = asn.dump(format=format)
+        except AssociationNotValidError as exception:
+            self.fname, self.serialized = (self.asn_name, None)
+            self.error = exception
+
+    def resequence(self, sequence):
+        """Change the sequence number in the name of the association
+
+        Parameters
+        ----------
+        sequence : int
+            The new sequence number.
+        """
+        match = _SEQUENCE_NAME.match(self.asn_name)
+        name = '{}{:03d}{}'.format(
+            match.group('prefix'), sequence, match.group('suffix')
+        )
+        self.description = self.description.replace(self.asn_name, name)
+        if self.fname == self.asn_name:
+            self.fname = name
+        self.asn_name = name
+
+    def dump(self, format='json'):
+        """Serialization of the association
+
+        Parameters
+        ----------
+        format : str
+            The format to use. Only the format the association
+            was serialized to is available.
+
+        Returns
+        -------
+        (name, serialized):
+            The suggested base name for the file and the serialization.
+
+        Raises
+        ------
+        AssociationError
+            The association was not serialized to `format`.
+
+        AssociationNotValidError
+            The association did not validate.
+        """
+        if format != self.format:
+            raise AssociationError(
+                'Association {} is only available in format {}'.format(
+                    self.asn_name, self.format
+                )
+            )
+        if self.error is not None:
+            raise self.error
+        return self.fname, self.serialized
+
+    def __str__(self):
+        return self.description
+
+
 # #########
 # Utilities
 # #########
+def generate_from_pool(
+        pool,
+        rules,
+        version_id=None,
+        discover=False,
+        all_candidates=False,
+        merge=True,
+):
+    """Generate, filter and merge associations
+
+    Parameters
+    ----------
+    pool : AssociationPool
+        The pool to generate from.
+
+    rules : AssociationRegistry
+        The association rules.
+
+    version_id : None, True, or str
+        The string to use to tag associations and products.
+        See `generate`.
+
+    discover : bool
+        The rules include the discover ruleset. Only discovered
+        associations that are not candidate associations are kept.
+
+    all_candidates : bool
+        With `discover`, also keep the candidate associations.
+
+    merge : bool
+        Merge Level2 associations.
+
+    Returns
+    -------
+    associations : [Association[,...]]
+        The associations.
+    """
+    associations = generate(pool, rules, version_id=version_id)
+
+    if discover:
+        logger.debug(
+            '# asns found before discover filtering={}'.format(
+                len(associations)
+            )
+        )
+        associations = filter_discovered_only(
+            associations,
+            DISCOVER_RULESET,
+            CANDIDATE_RULESET,
+            keep_candidates=all_candidates,
+        )
+        rules.Utility.resequence(associations)
+
+    # Do a grand merging. This is done particularly for
+    # Level2 associations.
+    if merge:
+        try:
+            associations = rules.Utility.merge_asns(associations)
+        except AttributeError:
+            pass
+
+    return associations
+
+
+def generate_partitioned(
+        pool,
+        rules,
+        partition_by,
+        nproc=1,
+        format='json',
+        version_id=None,
+        **kwargs
+):
+    """Generate associations separately for each value of a pool column
+
+    The pool is split on the values of `partition_by`, such as the
+    program, and the associations of each partition are generated
+    independently with `generate_from_pool`, possibly in parallel.
+    No association can contain items of different partitions.
+
+    Parameters
+    ----------
+    pool : AssociationPool
+        The pool to generate from.
+
+    rules : AssociationRegistry
+        The association rules.
+
+    partition_by : str
+        The pool column to partition on.
+
+    nproc : int
+        Number of processes to use.
+
+    format : str
+        The format to serialize the associations to.
+
+    version_id : None, True, or str
+        The string to use to tag associations and products.
+        If True, a single timestamp is used for all partitions.
+
+    kwargs : dict
+        Other arguments for `generate_from_pool`.
+
+    Returns
+    -------
+    associations : [Association[,...]] or [SerializedAssociation[,...]]
+        The associations of all partitions. The partitions are in
+        the order of their first item in the pool. If `nproc` is greater
+        than 1, the associations are generated in other processes and
+        returned as `SerializedAssociation` instances.
+
+    Raises
+    ------
+    AssociationError
+        Associations of different partitions have the same name.
+
+    Notes
+    -----
+    Each partition is generated from the association sequence numbers
+    that the rules have when this function is called. The sequence
+    numbers of the names of each partition are then carried on from
+    the largest ones of the earlier partitions with the same name
+    prefix, so the names are unique and do not depend on `nproc`.
+    """
+    if type(version_id) is bool:
+        version_id = make_timestamp()
+
+    values, first, inverse, counts = np.unique(
+        pool[partition_by],
+        return_index=True, return_inverse=True, return_counts=True
+    )
+    groups = np.split(
+        np.argsort(inverse, kind='mergesort'), np.cumsum(counts)[:-1]
+    )
+    partitions = [groups[index] for index in np.argsort(first)]
+    logger.info('Generating {} partitions on {}.'.format(
+        len(partitions), partition_by
+    ))
+    sequences = sequence_state(rules)
+
+    def generate_partition(rows):
+        set_sequence_state(sequences)
+        associations = generate_from_pool(
+            pool[rows], rules, version_id=version_id, **kwargs
+        )
+        if nproc == 1:
+            return associations
+        return [
+            SerializedAssociation(asn, rows, format=format)
+            for asn in associations
+        ]
+
+    results = map_ordered(generate_partition, partitions, nproc)
+
+    # Merge the partitions, numbering the associations of each partition
+    # after those of the earlier partitions, and refer their items to the
+    # whole pool.
+    associations = []
+    names = set()
+    last_sequences = {}
+    for rows, result in zip(partitions, results):
+        partition_sequences = {}
+        for asn in result:
+            match = _SEQUENCE_NAME.match(asn.asn_name)
+            if match:
+                key = (match.group('prefix'), match.group('suffix'))
+                sequence = int(match.group('sequence')) + \
+                    last_sequences.get(key, 0)
+                partition_sequences[key] = max(
+                    sequence, partition_sequences.get(key, 0)
+                )
+                if isinstance(asn, SerializedAssociation):
+                    asn.resequence(sequence)
+                else:
+                    asn.sequence = sequence
+            if asn.asn_name in names:
+                raise AssociationError(
+                    'Association {} is generated by different'
+                    ' partitions.'.format(asn.asn_name)
+                )
+            names.add(asn.asn_name)
+            if isinstance(asn, SerializedAssociation):
+                asn.from_items = [pool[row] for row in asn.rows]
+            elif hasattr(asn, 'from_items'):
+                asn.from_items = [
+                    pool[int(rows[item.index])] for item in asn.from_items
+                ]
+            associations.append(asn)
+        last_sequences.update(partition_sequences)
+
+    return associations
+
+
+def sequence_state(rules):
+    """Copy the association sequence counters of the rules
+
+    Parameters
+    ----------
+    rules : AssociationRegistry
+        The association rules.
+
+    Returns
+    -------
+    state : dict
+        The counters, keyed by rule class and attribute name.
+    """
+    state = {}
+    for rule in rules.values():
+        for cls in rule.__mro__:
+            for attr in ('_sequence', '_sequences'):
+                if attr in vars(cls):
+                    state[(cls, attr)] = deepcopy(vars(cls)[attr])
+    return state
+
+
+def set_sequence_state(state):
+    """Reset the association sequence counters
+
+    Parameters
+    ----------
+    state : dict
+        The counters, as returned by `sequence_state`.
+    """
+    for (cls, attr), counter in state.items():
+        setattr(cls, attr, deepcopy(counter))
+
+
 def constrain_on_candidates(candidates):
     """Create a constraint based on a list of candidates
 
@@ -1,6 +1,12 @@
 """
 Association Pools
 """
+from collections import OrderedDict
+import os
+import re
+
+import numpy as np
+
 from astropy.io.ascii import convert_numpy
 
 from astropy.table import Table
@@ -10,6 +16,9 @@ __all__ = ['AssociationPool']
 DEFAULT_DELIMITER = '|'
 DEFAULT_FORMAT = 'ascii'
 
+# Comment lines, as recognized by the astropy ASCII readers.
+_COMMENT = re.compile(r'\s*#')
+
 
 class AssociationPool(Table):
     """Association Pool
@@ -46,8 +55,39 @@ class AssociationPool(Table):
         -------
         AssociationPool
             The ``AssociationPool`` representation of the file.
+
+        Notes
+        -----
+        Files with a simple single-character delimiter and no quoted
+        values are parsed directly. Other files are read with the astropy
+        ASCII readers.
         """
-        table = super(AssociationPool, cls).read(
+        parsed = None
+        if not kwargs and format == DEFAULT_FORMAT and \
+           isinstance(filename, str) and os.path.isfile(filename):
+            with open(filename, 'rb') as pool_file:
+                parsed = _parse_pool(pool_file.read(), delimiter)
+        if parsed is None:
+            parsed = cls._read_table(filename, delimiter, format, **kwargs)
+        names, columns, comments = parsed
+
+        table = cls(columns, names=names, copy=False)
+        if comments:
+            table.meta['comments'] = list(comments)
+        table.meta['pool_file'] = filename
+        return table
+
+    @classmethod
+    def _read_table(cls, filename, delimiter, format, **kwargs):
+        """Read a pool with the astropy ASCII readers
+
+        Returns
+        -------
+        names, columns, comments : [str[,...]], [ndarray[,...]], [str[,...]]
+            The lower-cased column names, the string columns, and the
+            comment lines.
+        """
+        table = Table.read(
             filename, delimiter=delimiter,
             format=format,
             converters=_ConvertToStr(), **kwargs
@@ -56,15 +96,12 @@ class AssociationPool(Table):
         # If anything has been masked, just fill
         table = table.filled('null')
 
-        # Lowercase the column names
-        # Note: Cannot do in-place because modifying the
-        #       list while iterating.
-        columns = [column for name, column in table.columns.items()]
-        for c in columns:
-            c.name = c.name.lower()
-
-        table.meta['pool_file'] = filename
-        return table
+        names = [name.lower() for name in table.colnames]
+        columns = [
+            np.array(table[name], dtype=str)
+            for name in table.colnames
+        ]
+        return names, columns, table.meta.get('comments', [])
 
     def write(self, *args, **kwargs):
         """Write the pool to a file.
@@ -115,3 +152,68 @@ class _ConvertToStr(dict):
 
     def get(self, k, default=None):
         return self.__getitem__(k)
+
+
+def _parse_pool(contents, delimiter):
+    """Parse a delimited pool file
+
+    Values are stripped of surrounding whitespace and lower-cased.
+    Empty values are replaced by 'null'. Each distinct value is
+    converted only once.
+
+    Parameters
+    ----------
+    contents : bytes
+        The contents of the pool file.
+
+    delimiter : str
+        Character used to delineate columns.
+
+    Returns
+    -------
+    names, columns, comments : [str[,...]], [ndarray[,...]], [str[,...]]
+        The lower-cased column names, the string columns, and the
+        comment lines. None if the file cannot be parsed directly,
+        such as when values are quoted.
+    """
+    if len(delimiter) != 1 or delimiter.isspace() or b'"' in contents:
+        return None
+    try:
+        text = contents.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+    lines = []
+    comments = []
+    for line in text.splitlines():
+        if _COMMENT.match(line):
+            comments.append(_COMMENT.sub('', line, count=1).strip())
+        elif line.strip():
+            lines.append(line.strip())
+    if len(lines) < 2:
+        return None
+
+    names = [name.strip(' \t') for name in lines[0].split(delimiter)]
+    if '' in names or len(set(names)) != len(names):
+        return None
+    ncolumns = len(names)
+    if any(line.count(delimiter) != ncolumns - 1 for line in lines[1:]):
+        return None
+
+    # Split all rows at once; column `i` is every `ncolumns`th value.
+    values = delimiter.join(lines[1:]).split(delimiter)
+    names = [name.lower() for name in names]
+    columns = []
+    for index in range(ncolumns):
+        column = values[index::ncolumns]
+        uniques = list(OrderedDict.fromkeys(column))
+        codes = {value: code for code, value in enumerate(uniques)}
+        strings = np.array(
+            [value.strip(' \t').lower() or 'null' for value in uniques],
+            dtype=str
+        )
+        columns.append(
+            strings[np.array([codes[value] for value in column], dtype=int)]
+        )
+    return names, columns, comments
+
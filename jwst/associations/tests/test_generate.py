@@ -1,13 +1,21 @@
 """Test basic generate operations"""
+import pytest
+from astropy.table import vstack
 
 from .helpers import t_path
 
 from .. import (
+    Association,
     AssociationPool,
     AssociationRegistry,
     generate,
     load_asn
 )
+from ..generate import AssociationIndex
+from ..lib.constraint import (
+    AttrConstraint,
+    Constraint,
+)
 
 
 def test_simple():
@@ -32,3 +40,121 @@ def test_unserialize():
     with open(asn_file, 'r') as asn_fp:
         asn = load_asn(asn_fp)
     assert isinstance(asn, dict)
+
+
+class ProgramAsn(Association):
+    """Association of items of a single program"""
+
+    def __init__(self, version_id=None, **kwargs):
+        self.constraints = Constraint([
+            AttrConstraint(sources=['program'], force_unique=True),
+            AttrConstraint(
+                sources=['exp_type'],
+                value='nrc_image|nrc_coron',
+                force_unique=False,
+            ),
+        ], **kwargs)
+        super(ProgramAsn, self).__init__(version_id=version_id)
+        self.data['members'] = []
+
+    def _add(self, item):
+        self.data['members'].append(item)
+
+    def is_item_member(self, item):
+        return item in self.data['members']
+
+
+def test_index_candidates():
+    """Only associations the item may match are candidates"""
+    items = [
+        {'program': '00001', 'exp_type': 'nrc_image'},
+        {'program': '00002', 'exp_type': 'NRC_CORON'},
+        {'program': '00001', 'exp_type': 'nrc_coron'},
+    ]
+    index = AssociationIndex()
+    asns = []
+    for item in items[:2]:
+        asn, _ = ProgramAsn.create(item)
+        index.add(asn)
+        asns.append(asn)
+    unindexed, _ = ProgramAsn.create(items[0])
+    unindexed.constraints.reprocess_on_fail = True
+    index.add(unindexed)
+
+    assert index.candidates(items[2]) == [asns[0], unindexed]
+    assert index.candidates({'program': '00002'}) == [asns[1], unindexed]
+    assert index.candidates({'program': 'P1'}) == [unindexed]
+    assert index.candidates({'exp_type': 'nrc_image'}) == [unindexed]
+
+    # Values that are not plain strings are compared by the constraints
+    assert index.candidates({'program': '0000[12]'}) == [unindexed]
+    assert index.candidates({'program': 1}) == asns + [unindexed]
+
+    # Matching can change the constraints of an association.
+    asns[0].add(items[2])
+    index.update(asns[0])
+    assert index.candidates(items[2]) == [asns[0], unindexed]
+
+
+@pytest.mark.parametrize(
+    'pool_path',
+    [
+        'data/pool_013_coron_nircam.csv',
+        'data/pool_024_nirspec_fss_nods.csv',
+    ]
+)
+def test_index_generate(pool_path, monkeypatch):
+    """Indexing does not change the generated associations"""
+    pool = AssociationPool.read(t_path(pool_path))
+    rules = AssociationRegistry()
+    asns = generate(pool, rules)
+
+    def all_candidates(self, item):
+        candidates = list(self._always.values())
+        for bucket in self._buckets.values():
+            for indexed in bucket.values():
+                candidates.extend(indexed.values())
+        return sorted(candidates, key=lambda asn: self._order[id(asn)])
+
+    monkeypatch.setattr(AssociationIndex, 'candidates', all_candidates)
+    expected = generate(pool, rules)
+
+    assert [asn.asn_name for asn in asns] == \
+        [asn.asn_name for asn in expected]
+    for asn, expected_asn in zip(asns, expected):
+        assert asn['products'] == expected_asn['products']
+
+
+def test_index_scaling(monkeypatch):
+    """Candidates per item do not grow with the number of programs"""
+    base = AssociationPool.read(t_path('data/pool_007_spec_miri.csv'))
+    rules = AssociationRegistry()
+    candidates = AssociationIndex.candidates
+
+    def count_candidates(nprograms):
+        copies = []
+        for program in range(nprograms):
+            pool = base.copy()
+            pool['program'] = '{:05d}'.format(10000 + program)
+            pool['filename'] = [
+                'p{}_{}'.format(program, filename)
+                for filename in pool['filename']
+            ]
+            copies.append(pool)
+        pool = AssociationPool(vstack(copies))
+
+        counts = []
+
+        def counted_candidates(self, item):
+            result = candidates(self, item)
+            counts.append(len(result))
+            return result
+
+        monkeypatch.setattr(
+            AssociationIndex, 'candidates', counted_candidates
+        )
+        asns = generate(pool, rules)
+        return len(asns), sum(counts)
+
+    n_asns, n_checks = count_candidates(1)
+    assert count_candidates(3) == (3 * n_asns, 3 * n_checks)
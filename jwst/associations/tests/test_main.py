@@ -1,7 +1,11 @@
 """test_associations: Test of general Association functionality."""
 import pytest
 
-from ..main import Main
+from astropy.table import vstack
+
+from .helpers import t_path
+from .. import Association, AssociationPool
+from ..main import Main, SerializedAssociation
 
 
 def test_toomanyoptions(full_pool_rules):
@@ -50,3 +54,73 @@ def test_discovered(full_pool_rules):
     candidates = Main([pool_fname, '--dry-run', '--all-candidates'])
     discovered = Main([pool_fname, '--dry-run', '--discover'])
     assert len(full.associations) == len(candidates.associations) + len(discovered.associations)
+
+
+def test_partitioned():
+    """Partitions are generated as separate pools"""
+    pool = AssociationPool.read(t_path('data/pool_013_coron_nircam.csv'))
+    single = Main(['--dry-run'], pool=pool)
+    other = pool.copy()
+    other['program'] = '99999'
+    pool = vstack([pool, other])
+
+    partitioned = [
+        Main(
+            ['--dry-run', '--partition-by', '--nproc', str(nproc)],
+            pool=pool
+        )
+        for nproc in (1, 2)
+    ]
+
+    names = [asn.asn_name for asn in partitioned[0].associations]
+    assert names == [asn.asn_name for asn in partitioned[1].associations]
+    assert names[:len(single.associations)] == \
+        [asn.asn_name for asn in single.associations]
+    assert names[len(single.associations):] == [
+        asn.asn_name.replace('jw10005', 'jw99999')
+        for asn in single.associations
+    ]
+    assert len(partitioned[0].orphaned) == 2 * len(single.orphaned)
+    for asn in partitioned[0].associations:
+        assert len(set(item['program'] for item in asn.from_items)) == 1
+        fname, serialized = asn.dump()
+        assert fname == asn.asn_name
+
+
+def test_partitioned_names():
+    """Partitions of a program are numbered after the earlier partitions"""
+    pool = AssociationPool.read(t_path('data/pool_013_coron_nircam.csv'))
+    single = Main(['--dry-run'], pool=pool)
+    pool['partition'] = 'a'
+    other = pool.copy()
+    other['partition'] = 'b'
+    pool = vstack([pool, other])
+
+    partitioned = [
+        Main(
+            ['--dry-run', '--partition-by', 'partition',
+             '--nproc', str(nproc)],
+            pool=pool
+        )
+        for nproc in (1, 2)
+    ]
+
+    # the associations generated in other processes are serialized
+    assert all(isinstance(asn, Association)
+               for asn in partitioned[0].associations)
+    assert all(isinstance(asn, SerializedAssociation)
+               for asn in partitioned[1].associations)
+
+    names = [asn.asn_name for asn in partitioned[0].associations]
+    assert names == [asn.asn_name for asn in partitioned[1].associations]
+    nsingle = len(single.associations)
+    assert names[:nsingle] == [asn.asn_name for asn in single.associations]
+    assert names[nsingle:] == [
+        'jw10005-a3001_coron3_{:03d}_asn'.format(nsingle + sequence)
+        for sequence in range(1, nsingle + 1)
+    ]
+    for asn in partitioned[0].associations:
+        assert len(set(item['partition'] for item in asn.from_items)) == 1
+        fname, serialized = asn.dump()
+        assert fname == asn.asn_name
+        assert str(asn).startswith(asn.asn_name)
@@ -15,3 +15,28 @@ def test_pool(tmpdir):
     roundtrip = AssociationPool.read(tmp_pool)
     assert len(pool) == len(roundtrip)
     assert set(pool.colnames) == set(roundtrip.colnames)
+
+
+def test_pool_parse():
+    """Parse the pool directly as the astropy readers would"""
+    pool = AssociationPool.read(POOL_FILE)
+    names, columns, comments = AssociationPool._read_table(
+        POOL_FILE, '|', 'ascii'
+    )
+    assert pool.colnames == names
+    for name, column in zip(names, columns):
+        assert list(pool[name]) == list(column)
+    assert pool.meta.get('comments', []) == list(comments)
+
+
+def test_pool_quoted(tmpdir):
+    """Quoted values are read by the astropy readers"""
+    pool_path = str(tmpdir.join('quoted_pool.csv'))
+    with open(pool_path, 'w') as pool_file:
+        pool_file.write('# A quoted pool\nFILENAME|Exp_Type\n')
+        pool_file.write('"a|b.fits"|NRC_IMAGE\nc.fits|\n')
+
+    pool = AssociationPool.read(pool_path)
+    assert pool.colnames == ['filename', 'exp_type']
+    assert list(pool['filename']) == ['a|b.fits', 'c.fits']
+    assert list(pool['exp_type']) == ['nrc_image', 'null']
@@ -4,12 +4,11 @@ import time
 import numpy as np
 import logging
 
-from jwst.transforms.models import _toindex
 from .. import datamodels
-from ..assign_wcs import nirspec
 from gwcs import wcstools
 from . import instrument_defaults
 from . import coord
+from . import detector_map
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
@@ -17,7 +16,7 @@ log.setLevel(logging.DEBUG)
 
 class CubeBlot():
 
-    def __init__(self, median_model, input_models):
+    def __init__(self, median_model, input_models, coord_cache_dir=None):
         """Class Blot holds the main varibles for blotting sky cube to detector
 
 
@@ -35,6 +34,10 @@ class CubeBlot():
            sky.
         input_models: data model
            The input models used to create the median sky image.
+        coord_cache_dir: str
+           Directory holding saved detector coordinate maps (see
+           detector_map.DetectorMaps). If None, the maps are only cached in
+           memory.
 
         Returns
         -------
@@ -87,6 +90,7 @@ class CubeBlot():
 # initialize blotted images to be original input images
 
         self.input_models = input_models
+        self.detector_maps = detector_map.DetectorMaps(coord_cache_dir)
 
 # *******************************************************************************
 
@@ -160,56 +164,20 @@ class CubeBlot():
 
                 # get the detector values for this model
                 xstart, xend = instrument_info.GetMIRISliceEndPts(this_par1)
-                ydet, xdet = np.mgrid[:1024, :1032]
 
                 # mask out the side channel we aren not working on
                 pixel_mask = np.full(model.shape, False, dtype=bool)
                 pixel_mask[:, xstart:xend] = True
-                ra_det, dec_det, lam_det = model.meta.wcs(xdet, ydet)
+                ra_det, dec_det, lam_det = self.detector_maps(
+                    model, 'world')
 
             elif self.instrument == 'NIRSPEC':
                 blot.meta.filename = filename[:indx] + '_blot.fits'
-                # initialize the ra,dec, and wavelength arrays
-                # we will loop over slices and fill in values
-                # the flag_det will be set when a slice pixel is filled in
-                #   at the end we will use this flag to pull out valid data
-                ra_det = np.zeros((2048, 2048))
-                dec_det = np.zeros((2048, 2048))
-                lam_det = np.zeros((2048, 2048))
-                flag_det = np.zeros((2048, 2048))
-
-                # for NIRSPEC each file has 30 slices
-                # wcs information access seperately for each slice
-
-                nslices = 30
-                log.info('Looping over 30 slices on NIRSPEC detector, this takes a little while')
-                for ii in range(nslices):
-                    slice_wcs = nirspec.nrs_wcs_set_input(model, ii)
-                    x, y = wcstools.grid_from_bounding_box(slice_wcs.bounding_box)
-                    ra, dec, lam = slice_wcs(x, y)
-
-                    # the slices are curved on detector so a rectangular region
-                    # returns NaNs
-                    valid = ~np.isnan(lam)
-                    ra = ra[valid]
-                    dec = dec[valid]
-                    lam = lam[valid]
-                    x = x[valid]
-                    y = y[valid]
-
-                    xind = _toindex(x)
-                    yind = _toindex(y)
-                    xind = np.ndarray.flatten(xind)
-                    yind = np.ndarray.flatten(yind)
-                    ra = np.ndarray.flatten(ra)
-                    dec = np.ndarray.flatten(dec)
-                    lam = np.ndarray.flatten(lam)
-                    ra_det[yind, xind] = ra
-                    dec_det[yind, xind] = dec
-                    lam_det[yind, xind] = lam
-                    flag_det[yind, xind] = 1
-
-# Done looping over slices
+                # the ra,dec, and wavelength of the pixels of all the slices
+                # (NaN for pixels not in a slice)
+                ra_det, dec_det, lam_det = self.detector_maps(
+                    model, 'world')
+
             log.info('Blotting back %s', model.meta.filename)
 
             if self.instrument == 'MIRI':
@@ -217,7 +185,7 @@ class CubeBlot():
                 good_data1 = valid3 & pixel_mask
                 good_data = np.where(good_data1)
             elif self.instrument == 'NIRSPEC':
-                good_data = np.where(flag_det == 1)
+                good_data = np.where(~np.isnan(lam_det))
 
             y, x = good_data
             ra_blot = ra_det[good_data]
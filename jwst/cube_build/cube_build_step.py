@@ -5,6 +5,7 @@ from .. import datamodels
 from . import cube_build
 from . import ifu_cube
 from . import data_types
+from . import detector_map
 from ..assign_wcs.util import update_s_region_keyword
 
 
@@ -54,6 +55,9 @@ class CubeBuildStep (Step):
          output_type = option('band','channel','grating','multi',default='band') # Type IFUcube to create. Options=band,channel,grating,multi
          search_output_file = boolean(default=false)
          output_use_model = boolean(default=true) # Use filenames in the output models
+         nproc = integer(min=1, default=1) # processes used to map input files to the cube
+         coord_cache_dir = string(default=None) # directory to save the detector coordinate maps to
+         weight_matrix = boolean(default=false) # map the input files with sparse weight matrices, msm weighting only
        """
 
     reference_file_types = ['cubepar', 'resol']
@@ -254,7 +258,10 @@ class CubeBuildStep (Step):
             'ydebug': self.ydebug,
             'zdebug': self.zdebug,
             'debug_pixel': self.debug_pixel,
-            'spaxel_debug': self.spaxel_debug}
+            'spaxel_debug': self.spaxel_debug,
+            'nproc': self.nproc,
+            'detector_maps': detector_map.DetectorMaps(self.coord_cache_dir),
+            'weight_matrix': self.weight_matrix}
 # ________________________________________________________________________________
 # create an instance of class CubeData
 
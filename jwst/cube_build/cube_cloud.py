@@ -1,11 +1,17 @@
 """ Map the detector pixels to the cube coordinate system
 """
-import numpy as np
+import hashlib
 import logging
 
+import numpy as np
+from scipy import sparse
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
+# maximum total size of the cached weight matrices, in bytes
+MAX_MATRIX_CACHE_SIZE = 2 * 1024**3
+
 
 def match_det2cube_msm(naxis1, naxis2, naxis3,
                        cdelt1, cdelt2,
@@ -25,6 +31,9 @@ def match_det2cube_msm(naxis1, naxis2, naxis3,
     For each spaxel the coord1,coord1 and wave point cloud members are weighed
     according to modified shepard method of inverse weighting based on the
     distance between the point cloud member and the spaxel center.
+    Only the spaxels in the box bounding the ROI of each point cloud member
+    are tested (see `_roi_matches`) and point cloud members are processed
+    in vectorized batches.
 
     Parameters
     ----------
@@ -77,80 +86,365 @@ def match_det2cube_msm(naxis1, naxis2, naxis3,
     from the detector pixels that fall within the roi if the spaxel center.
     """
 
+    for ipt, icube_index, weight_distance in _msm_weights(
+            naxis1, naxis2, cdelt1, cdelt2, zcdelt3, xcenters, ycenters, zcoord,
+            coord1, coord2, wave, rois_pixel, roiw_pixel, weight_pixel,
+            softrad_pixel):
+        weighted_flux = weight_distance * flux[ipt]
+        _accumulate_spaxels(icube_index, weighted_flux, weight_distance,
+                            spaxel_flux, spaxel_weight, spaxel_iflux)
+# _______________________________________________________________________
+
+
+def _msm_weights(naxis1, naxis2, cdelt1, cdelt2, zcdelt3,
+                 xcenters, ycenters, zcoord,
+                 coord1, coord2, wave,
+                 rois_pixel, roiw_pixel, weight_pixel, softrad_pixel):
+    """ Find the MSM weights of the point cloud members for the spaxels
+
+    See match_det2cube_msm for a description of the parameters.
+
+    Returns
+    -------
+    A generator yielding, for each batch of point cloud members, the
+    arrays ipt, icube_index and weight_distance of the index of the point
+    cloud member, of the spaxel (in the flattened cube) and of the weight
+    for every (point cloud member, spaxel) pair within the ROI.
+    """
     nplane = naxis1 * naxis2
 
-# now loop over the pixel values for this region and find the spaxels that fall
-# withing the region of interest.
-    nn = coord1.size
-# Left this commented code in to check when we get new cube par reference files
-# The roi size was too small at long wavelength that may pixels did not match
-# to a spaxel.
-#    ilow = 0
-#    ihigh = 0
-#    imatch  = 0
-#    print('looping over n points mapping to cloud',nn)
-# ________________________________________________________________________________
-    for ipt in range(0, nn - 1):
-        # xcenters, ycenters is a flattened 1-D array of the 2 X 2 xy plane
-        # cube coordinates.
-        # find the spaxels that fall withing ROI of point cloud defined  by
-        # coord1,coord2,wave
+# the last point of the point cloud is not mapped to the cube (as in the
+# original point-by-point implementation of this routine)
+    nn = coord1.size - 1
+
+# find the spaxels that fall within the ROI of the point cloud members
+# defined by coord1, coord2, wave in batches of point cloud members
+# and find the weights of each batch.
+    for ipt, ixy, iz in _roi_matches(naxis1, naxis2,
+                                     xcenters, ycenters, zcoord,
+                                     coord1[:nn], coord2[:nn], wave[:nn],
+                                     rois_pixel[:nn], roiw_pixel[:nn]):
+        d1 = (coord1[ipt] - xcenters[ixy]) / cdelt1
+        d2 = (coord2[ipt] - ycenters[ixy]) / cdelt2
+        d3 = (wave[ipt] - zcoord[iz]) / zcdelt3[iz]
+
+        dxy = (d1 * d1) + (d2 * d2)
+        wdistance = dxy + d3 * d3
+
+        weight_distance = np.power(np.sqrt(wdistance), weight_pixel[ipt])
         lower_limit = softrad_pixel[ipt]
-        xdistance = (xcenters - coord1[ipt])
-        ydistance = (ycenters - coord2[ipt])
-        radius = np.sqrt(xdistance * xdistance + ydistance * ydistance)
-        indexr = np.where(radius <= rois_pixel[ipt])
-        indexz = np.where(abs(zcoord - wave[ipt]) <= roiw_pixel[ipt])
-
-        # on the wavelength boundaries the point cloud may not be in the IFUCube
-        # the edge cases are skipped and not included in final IFUcube.
-        # Left commented code for checking later for NIRSPEC the spectral size
-        # in the reference file may be too small
-#        if len(indexz[0]) == 0:
-#            if wave[ipt] < zcoord[0]:
-#               ilow = ilow + 1
-#            elif wave[ipt] > zcoord[-1]:
-#               ihigh = ihigh + 1
-#            else:
-#                imatch = imatch + 1
-#                print(' no z match found ',wave[ipt],roiw_pixel[ipt])
-#                print(zcoord[naxis3-11:naxis3])
-#                diff = abs(zcoord[naxis3-11:naxis3] - wave[ipt])
-#                print(diff)
-#                exit()
-        if len(indexz[0]) > 0:
-            d1 = np.array(coord1[ipt] - xcenters[indexr]) / cdelt1
-            d2 = np.array(coord2[ipt] - ycenters[indexr]) / cdelt2
-            d3 = np.array(wave[ipt] - zcoord[indexz]) / zcdelt3[indexz]
-
-            dxy = (d1 * d1) + (d2 * d2)
-
-        # shape of dxy is #indexr or number of overlaps in spatial plane
-        # shape of d3 is #indexz or number of overlaps in spectral plane
-        # shape of dxy_matrix & d3_matrix  (#indexr, #indexz)
-        # rows = number of overlaps in spatial plane
-        # cols = number of overlaps in spectral plane
-            dxy_matrix = np.tile(dxy[np.newaxis].T, [1, d3.shape[0]])
-            d3_matrix = np.tile(d3 * d3, [dxy_matrix.shape[0], 1])
-
-            wdistance = dxy_matrix + d3_matrix
-            weight_distance = np.power(np.sqrt(wdistance), weight_pixel[ipt])
-            weight_distance[weight_distance < lower_limit] = lower_limit
-            weight_distance = 1.0 / weight_distance
-            weight_distance = weight_distance.flatten('F')
-            weighted_flux = weight_distance * flux[ipt]
-
-            icube_index = [iz * nplane + ir for iz in indexz[0] for ir in indexr[0]]
-            spaxel_flux[icube_index] = spaxel_flux[icube_index] + weighted_flux
-            spaxel_weight[icube_index] = spaxel_weight[icube_index] + weight_distance
-            spaxel_iflux[icube_index] = spaxel_iflux[icube_index] + 1
-
-#    print('Number of pixels not in ifu cube too low wavelength', ilow)
-#    print('Number of pixels not in ifu cube too high wavelength', ihigh)
-#    print('Number of pixels not in ifu cube not match', imatch)
+        weight_distance = np.where(weight_distance < lower_limit,
+                                   lower_limit, weight_distance)
+        weight_distance = 1.0 / weight_distance
+
+        icube_index = iz * nplane + ixy
+        yield ipt, icube_index, weight_distance
 # _______________________________________________________________________
 
 
+def msm_weight_matrix(naxis1, naxis2, naxis3,
+                      cdelt1, cdelt2,
+                      zcdelt3,
+                      xcenters, ycenters, zcoord,
+                      coord1, coord2, wave,
+                      rois_pixel, roiw_pixel, weight_pixel, softrad_pixel,
+                      cache=None):
+    """ Sparse matrix of the MSM weights of the point cloud for the spaxels
+
+    Mapping the point cloud to the cube with the msm weighting is linear in
+    the point cloud fluxes: the weights only depend on the coordinates of
+    the point cloud members and on the cube. The weights are stored in a
+    CSR matrix with one row per spaxel (of the flattened cube) and one
+    column per point cloud member. If a cache is given the matrices are
+    stored in it, keyed by a hash of all the parameters, so mapping the same
+    point cloud again with different fluxes (e.g. after background
+    subtraction) only requires sparse matrix-vector products (see
+    apply_weight_matrix).
+
+    See match_det2cube_msm for a description of the other parameters.
+
+    Parameters
+    ----------
+    cache : collections.OrderedDict, optional
+       matrices computed before, owned by the caller. The least recently
+       used matrices are dropped when their total size exceeds
+       MAX_MATRIX_CACHE_SIZE.
+
+    Returns
+    -------
+    matrix : scipy.sparse.csr_matrix
+       weights of shape (naxis1 * naxis2 * naxis3, coord1.size)
+    """
+    if cache is None:
+        return _build_weight_matrix(naxis1, naxis2, naxis3, cdelt1, cdelt2,
+                                    zcdelt3, xcenters, ycenters, zcoord,
+                                    coord1, coord2, wave, rois_pixel,
+                                    roiw_pixel, weight_pixel, softrad_pixel)
+
+    hasher = hashlib.sha1(repr((naxis1, naxis2, naxis3,
+                                cdelt1, cdelt2)).encode())
+    for a in (zcdelt3, xcenters, ycenters, zcoord, coord1, coord2, wave,
+              rois_pixel, roiw_pixel, weight_pixel, softrad_pixel):
+        a = np.ascontiguousarray(a, dtype=float)
+        hasher.update(repr(a.shape).encode())
+        hasher.update(a.data)
+    key = hasher.hexdigest()
+
+    matrix = cache.get(key)
+    if matrix is not None:
+        cache.move_to_end(key)
+        return matrix
+
+    matrix = _build_weight_matrix(naxis1, naxis2, naxis3, cdelt1, cdelt2,
+                                  zcdelt3, xcenters, ycenters, zcoord,
+                                  coord1, coord2, wave, rois_pixel,
+                                  roiw_pixel, weight_pixel, softrad_pixel)
+    cache[key] = matrix
+    size = sum(_matrix_nbytes(m) for m in cache.values())
+    while len(cache) > 1 and size > MAX_MATRIX_CACHE_SIZE:
+        key, m = cache.popitem(last=False)
+        size -= _matrix_nbytes(m)
+    return matrix
+
+
+def _build_weight_matrix(naxis1, naxis2, naxis3, cdelt1, cdelt2, zcdelt3,
+                         xcenters, ycenters, zcoord, coord1, coord2, wave,
+                         rois_pixel, roiw_pixel, weight_pixel, softrad_pixel):
+    """ Compute the CSR matrix of the MSM weights (see msm_weight_matrix) """
+    rows = []
+    columns = []
+    weights = []
+    for ipt, icube_index, weight_distance in _msm_weights(
+            naxis1, naxis2, cdelt1, cdelt2, zcdelt3, xcenters, ycenters, zcoord,
+            coord1, coord2, wave, rois_pixel, roiw_pixel, weight_pixel,
+            softrad_pixel):
+        rows.append(icube_index)
+        columns.append(ipt)
+        weights.append(weight_distance)
+
+    shape = (naxis1 * naxis2 * naxis3, coord1.size)
+    if rows:
+        matrix = sparse.csr_matrix((np.concatenate(weights),
+                                    (np.concatenate(rows),
+                                     np.concatenate(columns))),
+                                   shape=shape)
+    else:
+        matrix = sparse.csr_matrix(shape)
+    return matrix
+
+
+def _matrix_nbytes(matrix):
+    """ Memory used by a CSR matrix """
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+def apply_weight_matrix(matrix, flux,
+                        spaxel_flux, spaxel_weight, spaxel_iflux):
+    """ Add the point cloud fluxes to the spaxels using a weight matrix
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.csr_matrix
+       weights of the point cloud members for the spaxels (see
+       msm_weight_matrix)
+    flux : numpy.ndarray
+       array of detector fluxes associated with each point cloud member
+    spaxel_flux : numpy.ndarray
+       contains the weighted summed detector fluxes
+    spaxel_weight : numpy.ndarray
+       contains the summed weights assocated with the detector fluxes
+    spaxel_iflux : numpy.ndarray
+       number of detector pixels contributing to the spaxel
+    """
+    spaxel_flux += matrix.dot(flux)
+    spaxel_weight += np.asarray(matrix.sum(axis=1)).ravel()
+    spaxel_iflux += np.diff(matrix.indptr)
+# _______________________________________________________________________
+
+
+def _roi_range(centers, coord, roi):
+    """ Find the range of indices of (sorted) spaxel centers that may fall
+    within the ROI of each point cloud member.
+
+    Parameters
+    ----------
+    centers : numpy.ndarray
+       sorted 1-D array of spaxel center locations along one cube axis
+    coord : numpy.ndarray
+       coordinates of the point cloud members along the same axis
+    roi : numpy.ndarray
+       region of influence size of the point cloud members
+
+    Returns
+    -------
+    lower and upper (exclusive) indices of the spaxel centers. Ranges are
+    padded by one spaxel on each side to account for round-off and must be
+    filtered by the exact ROI criterion.
+    """
+    lower = np.searchsorted(centers, coord - roi, side='left') - 1
+    upper = np.searchsorted(centers, coord + roi, side='right') + 1
+    lower = np.clip(lower, 0, centers.size)
+    upper = np.clip(upper, 0, centers.size)
+    return lower, np.maximum(upper, lower)
+
+
+def wavelength_slab(zcoord, wave, roiw_pixel):
+    """ Find the wavelength planes of the cube the point cloud is mapped to
+
+    Parameters
+    ----------
+    zcoord : numpy.ndarray
+        spaxel center locations in 3rd dimensions
+    wave : numpy.ndarray
+       contains the spectral coordinate  for the mapped detector pixel
+    roiw_pixel : numpy.ndarray
+       region of influence size in spectral dimension
+
+    Returns
+    -------
+    first and last (exclusive) wavelength plane that may fall within the ROI
+    of any point cloud member. Mapping the point cloud to this slab of the
+    cube gives the same result as mapping it to the full cube.
+    """
+    if wave.size == 0:
+        return 0, 0
+    lower, upper = _roi_range(zcoord, wave, roiw_pixel)
+    return int(lower.min()), int(upper.max())
+
+
+def _roi_matches(naxis1, naxis2, xcenters, ycenters, zcoord,
+                 coord1, coord2, wave, rois_pixel, roiw_pixel,
+                 max_candidates=4000000):
+    """ Match point cloud members to the spaxels that fall in their ROI
+
+    The spaxel centers form a regular grid in the spatial plane and are
+    sorted along the wavelength axis. This grid is used as a spatial index:
+    for each point cloud member only the spaxels in the box (and range of
+    wavelength planes) bounding its ROI are tested, instead of all spaxels.
+    Point cloud members are processed in batches whose size is chosen so
+    that the number of tested spaxels in a batch does not exceed
+    ``max_candidates``.
+
+    Parameters
+    ----------
+    naxis1 : int
+       size of the ifucube in 1st axis
+    naxis2 : int
+       size of the ifucube in 2nd axis
+    xcenters : numpy.ndarray
+       spaxel center locations 1st dimensions.
+    ycenters : numpy.ndarray
+       spaxel center locations 2nd dimensions.
+    zcoord : numpy.ndarray
+        spaxel center locations in 3rd dimensions
+    coord1 : numpy.ndarray
+       contains the spatial coordinate for 1st dimension for the mapped
+       detector pixel
+    coord2 : numpy.ndarray
+       contains the spatial coordinate for 2nd dimension for the mapped
+       detector pixel
+    wave : numpy.ndarray
+       contains the spectral coordinate  for the mapped detector pixel
+    rois_pixel : numpy.ndarray
+       region of influence size in spatial dimension
+    roiw_pixel : numpy.ndarray
+       region of influence size in spectral dimension
+    max_candidates : int
+       maximum number of spaxels tested in one batch
+
+    Returns
+    -------
+    A generator yielding, for each batch of point cloud members, the
+    arrays ipt, ixy and iz of the index of the point cloud member, of the
+    spaxel in the spatial plane and of the wavelength plane for every
+    (point cloud member, spaxel) pair within the ROI.
+    """
+    # 1-D spaxel center locations along each axis of the cube
+    xcoord = xcenters[:naxis1]
+    ycoord = ycenters[::naxis1][:naxis2]
+
+    xlower, xupper = _roi_range(xcoord, coord1, rois_pixel)
+    ylower, yupper = _roi_range(ycoord, coord2, rois_pixel)
+    zlower, zupper = _roi_range(zcoord, wave, roiw_pixel)
+
+    nn = coord1.size
+    if nn == 0:
+        return
+
+    nx = max(int((xupper - xlower).max()), 1)
+    ny = max(int((yupper - ylower).max()), 1)
+    nz = max(int((zupper - zlower).max()), 1)
+    xoffset = np.arange(nx)
+    yoffset = np.arange(ny)
+    zoffset = np.arange(nz)
+
+    batch = max(max_candidates // (nx * ny * nz), 1)
+    for istart in range(0, nn, batch):
+        ibatch = np.arange(istart, min(istart + batch, nn))
+
+        # spaxels in the box bounding the spatial ROI
+        ix = xlower[ibatch, np.newaxis] + xoffset
+        iy = ylower[ibatch, np.newaxis] + yoffset
+        ixy = iy[:, :, np.newaxis] * naxis1 + ix[:, np.newaxis, :]
+        ixy = ixy.reshape((ibatch.size, -1))
+        in_box = ((ix < xupper[ibatch, np.newaxis])[:, np.newaxis, :] &
+                  (iy < yupper[ibatch, np.newaxis])[:, :, np.newaxis])
+        in_box = in_box.reshape((ibatch.size, -1))
+        ixy[~in_box] = 0
+
+        xdistance = (xcenters[ixy] - coord1[ibatch, np.newaxis])
+        ydistance = (ycenters[ixy] - coord2[ibatch, np.newaxis])
+        radius = np.sqrt(xdistance * xdistance + ydistance * ydistance)
+        in_roi_xy = in_box & (radius <= rois_pixel[ibatch, np.newaxis])
+
+        # wavelength planes bounding the spectral ROI
+        iz = zlower[ibatch, np.newaxis] + zoffset
+        in_box = iz < zupper[ibatch, np.newaxis]
+        iz[~in_box] = 0
+        in_roi_z = in_box & (abs(zcoord[iz] - wave[ibatch, np.newaxis]) <=
+                             roiw_pixel[ibatch, np.newaxis])
+
+        # all (spectral, spatial) pairs within the ROI
+        jpt, jz, jxy = np.nonzero(in_roi_z[:, :, np.newaxis] &
+                                  in_roi_xy[:, np.newaxis, :])
+        yield ibatch[jpt], ixy[jpt, jxy], iz[jpt, jz]
+
+
+def _accumulate_spaxels(icube_index, weighted_flux, weight_distance,
+                        spaxel_flux, spaxel_weight, spaxel_iflux):
+    """ Add weighted fluxes, weights and counts to the cube spaxels
+
+    Parameters
+    ----------
+    icube_index : numpy.ndarray
+       index of the spaxel (in the flattened cube) each value is added to.
+       The same spaxel may occur multiple times.
+    weighted_flux : numpy.ndarray
+       weighted fluxes added to spaxel_flux
+    weight_distance : numpy.ndarray
+       weights added to spaxel_weight
+    spaxel_flux : numpy.ndarray
+       contains the weighted summed detector fluxes
+    spaxel_weight : numpy.ndarray
+       contains the summed weights assocated with the detector fluxes
+    spaxel_iflux : numpy.ndarray
+       number of detector pixels contributing to the spaxel
+    """
+    if icube_index.size == 0:
+        return
+
+    # only accumulate over the range of spaxels touched by this batch
+    imin = icube_index.min()
+    index = icube_index - imin
+    n = index.max() + 1
+    cube_slice = slice(imin, imin + n)
+    spaxel_flux[cube_slice] += np.bincount(index, weights=weighted_flux,
+                                           minlength=n)
+    spaxel_weight[cube_slice] += np.bincount(index, weights=weight_distance,
+                                             minlength=n)
+    spaxel_iflux[cube_slice] += np.bincount(index, minlength=n)
+
+
 def match_det2cube_miripsf(alpha_resol, beta_resol, wave_resol,
                            naxis1, naxis2, naxis3,
                            xcenters, ycenters, zcoord,
@@ -236,63 +530,44 @@ def match_det2cube_miripsf(alpha_resol, beta_resol, wave_resol,
     """
 
     nplane = naxis1 * naxis2
-# now loop over the pixel values for this region and find the spaxels that fall
-# withing the region of interest.
-    nn = coord1.size
-#    print('looping over n points mapping to cloud',nn)
-# ______________________________________________________________________________
-    for ipt in range(0, nn - 1):
+
+# the last point of the point cloud is not mapped to the cube (as in the
+# original point-by-point implementation of this routine)
+    nn = coord1.size - 1
+
+# find the spaxels that fall within the ROI of the point cloud members
+# defined by coord1, coord2, wave in batches of point cloud members.
+# The distances are determined in the alpha-beta coordinate system.
+    for ipt, ixy, iz in _roi_matches(naxis1, naxis2,
+                                     xcenters, ycenters, zcoord,
+                                     coord1[:nn], coord2[:nn], wave[:nn],
+                                     rois_pixel[:nn], roiw_pixel[:nn]):
+        weights = FindNormalizationWeights(wave[ipt],
+                                           wave_resol,
+                                           alpha_resol,
+                                           beta_resol)
+
+        cube_index = iz * nplane + ixy
+
+        alpha_distance = alpha_det[ipt] - spaxel_alpha[cube_index]
+        beta_distance = beta_det[ipt] - spaxel_beta[cube_index]
+        wave_distance = abs(wave[ipt] - spaxel_wave[cube_index])
+
+        xn = alpha_distance / weights[0]
+        yn = beta_distance / weights[1]
+        wn = wave_distance / weights[2]
+
+        wdistance = (xn * xn + yn * yn + wn * wn)
+        weight_distance = np.power(np.sqrt(wdistance), weight_pixel[ipt])
+
         lower_limit = softrad_pixel[ipt]
-# ______________________________________________________________________________
-        # xcenters, ycenters is a flattened 1-D array of the 2 X 2 xy plane
-        # cube coordinates.
-        # find the spaxels that fall withing ROI of point cloud defined  by
-        # coord1,coord2,wave
-
-        xdistance = (xcenters - coord1[ipt])
-        ydistance = (ycenters - coord2[ipt])
-        radius = np.sqrt(xdistance * xdistance + ydistance * ydistance)
+        weight_distance = np.where(weight_distance < lower_limit,
+                                   lower_limit, weight_distance)
+        weight_distance = 1.0 / weight_distance
 
-        indexr = np.where(radius <= rois_pixel[ipt])
-        indexz = np.where(abs(zcoord - wave[ipt]) <= roiw_pixel[ipt])
-
-# ______________________________________________________________________________
-# loop over the points in the ROI
-        for iz, zz in enumerate(indexz[0]):
-            istart = zz * nplane
-            for ir, rr in enumerate(indexr[0]):
-# ______________________________________________________________________________
-# ______________________________________________________________________________
-# if weight is miripsf -distances determined in alpha-beta coordinate system
-
-                weights = FindNormalizationWeights(wave[ipt],
-                                                   wave_resol,
-                                                   alpha_resol,
-                                                   beta_resol)
-
-                cube_index = istart + rr
-
-                alpha_distance = alpha_det[ipt] - spaxel_alpha[cube_index]
-                beta_distance = beta_det[ipt] - spaxel_beta[cube_index]
-                wave_distance = abs(wave[ipt] - spaxel_wave[cube_index])
-
-                xn = alpha_distance / weights[0]
-                yn = beta_distance / weights[1]
-                wn = wave_distance / weights[2]
-
-                # only included the spatial dimensions
-                wdistance = (xn * xn + yn * yn + wn * wn)
-                weight_distance = np.power(np.sqrt(wdistance), weight_pixel[ipt])
-# ________________________________________________________________________________
-# We have found the weight_distance based on instrument type
-
-                if weight_distance < lower_limit:
-                    weight_distance = lower_limit
-                weight_distance = 1.0 / weight_distance
-
-                spaxel_flux[cube_index] = spaxel_flux[cube_index] + weight_distance * flux[ipt]
-                spaxel_weight[cube_index] = spaxel_weight[cube_index] + weight_distance
-                spaxel_iflux[cube_index] = spaxel_iflux[cube_index] + 1
+        _accumulate_spaxels(cube_index, weight_distance * flux[ipt],
+                            weight_distance,
+                            spaxel_flux, spaxel_weight, spaxel_iflux)
 # _______________________________________________________________________
 
 
@@ -309,6 +584,8 @@ def FindNormalizationWeights(wavelength,
 
     Parameters
     ----------
+    wavelength : float or numpy.ndarray
+      wavelength(s) of the point cloud member(s)
     wave_resol : numpy.ndarray
       wavelength resolution array
     alpha_resol : numpy.ndarray
@@ -318,22 +595,17 @@ def FindNormalizationWeights(wavelength,
 
     Returns
     -------
-    normalized weighting for 3 dimension
+    normalized weighting for 3 dimension (for each wavelength)
     """
-    alpha_weight = 1.0
-    beta_weight = 1.0
-    lambda_weight = 1.0
-
     # alpha psf weighting
     alpha_wave_cutoff = alpha_resol[0]
     alpha_a_short = alpha_resol[1]
     alpha_b_short = alpha_resol[2]
     alpha_a_long = alpha_resol[3]
     alpha_b_long = alpha_resol[4]
-    if wavelength < alpha_wave_cutoff:
-        alpha_weight = alpha_a_short + alpha_b_short * wavelength
-    else:
-        alpha_weight = alpha_a_long + alpha_b_long * wavelength
+    alpha_weight = np.where(wavelength < alpha_wave_cutoff,
+                            alpha_a_short + alpha_b_short * wavelength,
+                            alpha_a_long + alpha_b_long * wavelength)
 
     # beta psf weighting
     beta_wave_cutoff = beta_resol[0]
@@ -341,10 +613,9 @@ def FindNormalizationWeights(wavelength,
     beta_b_short = beta_resol[2]
     beta_a_long = beta_resol[3]
     beta_b_long = beta_resol[4]
-    if wavelength < beta_wave_cutoff:
-        beta_weight = beta_a_short + beta_b_short * wavelength
-    else:
-        beta_weight = beta_a_long + beta_b_long * wavelength
+    beta_weight = np.where(wavelength < beta_wave_cutoff,
+                           beta_a_short + beta_b_short * wavelength,
+                           beta_a_long + beta_b_long * wavelength)
 
     # wavelength weighting
     wavecenter = wave_resol[0]
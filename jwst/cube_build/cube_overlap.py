@@ -2,8 +2,8 @@
 the interoplation method = area
 """
 import numpy as np
-import math
 from ..datamodels import dqflags
+from .cube_cloud import _accumulate_spaxels
 
 
 def find_area_poly(nvertices, xpixel, ypixel):
@@ -366,12 +366,131 @@ def SH_FindOverlap(xcenter, ycenter, xlength, ylength, xp_corner, yp_corner):
 # _____________________________________________________________________________
 
 
+def sh_find_overlap_batch(xcenter, ycenter, xlength, ylength,
+                          xp_corner, yp_corner):
+    """ Find overlap between arrays of pixels and spaxels
+
+    Vectorized version of SH_FindOverlap: the Sutherland-Hodgman polygon
+    clipping algorithm is applied simultaneously to N (detector pixel,
+    spaxel) pairs. Clipped polygons are stored as rows of 2-D arrays of
+    vertices together with the number of vertices of each polygon.
+
+    Parameters
+    ---------
+    xcenter : numpy.ndarray
+      center grid points in x dimension for cube (along slice- alpha), shape (N,)
+    ycenter : numpy.ndarray
+      center grid points in y dimension for cube (lambda), shape (N,)
+    xlength : float
+      width of spaxel in x dimesion (along slice- alpha)
+    ylength : float
+      width of spaxel in y dimesion (lambda)
+    xp_corner : numpy.ndarray
+      alpha pixel corner values, shape (N, 4)
+    yp_Corner : numpy.ndarray
+      lambda pixel corner values, shape (N, 4)
+
+    Returns
+    -------
+    AreaOverlap : numpy.ndarray
+       area of overlap of each pixel with its spaxel, shape (N,)
+    """
+    npair = xcenter.size
+    rows = np.arange(npair)
+
+    top = ycenter + 0.5 * ylength
+    bottom = ycenter - 0.5 * ylength
+    left = xcenter - 0.5 * xlength
+    right = xcenter + 0.5 * xlength
+
+    # closed polygons (5 corners)
+    xPixel = np.concatenate([xp_corner, xp_corner[:, :1]], axis=1)
+    yPixel = np.concatenate([yp_corner, yp_corner[:, :1]], axis=1)
+    nvertices = np.full(npair, 4)
+
+    for edge in range(0, 4):  # 0:left, 1: right, 2: bottom, 3: top
+        if edge == 0:
+            inside = xPixel > left[:, np.newaxis]
+        elif edge == 1:
+            inside = xPixel < right[:, np.newaxis]
+        elif edge == 2:
+            inside = yPixel > bottom[:, np.newaxis]
+        else:
+            inside = yPixel < top[:, np.newaxis]
+
+        # the clipped polygons are written to flattened arrays; a vertex
+        # written at the current position of a row without incrementing its
+        # number of vertices is overwritten by the next vertex (or by the
+        # closing vertex), which avoids masking the pairs for every vertex.
+        ncol = 2 * xPixel.shape[1] + 1
+        xnew = np.zeros(npair * ncol)
+        ynew = np.zeros_like(xnew)
+        nvertices2 = np.zeros(npair, dtype=int)
+        start = rows * ncol
+
+        for j in range(0, xPixel.shape[1] - 1):
+            active = j < nvertices
+            x1 = xPixel[:, j]
+            y1 = yPixel[:, j]
+            x2 = xPixel[:, j + 1]
+            y2 = yPixel[:, j + 1]
+            stat1 = inside[:, j]
+            stat2 = inside[:, j + 1]
+
+            # intersection of the pixel edge with the spaxel edge
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dx = x2 - x1
+                m = np.where(dx != 0, (y2 - y1) / np.where(dx != 0, dx, 1), 0)
+                if edge < 2:
+                    x = left if edge == 0 else right
+                    y = y1 + m * (x - x1)
+                else:
+                    y = bottom if edge == 2 else top
+                    x = np.where(dx != 0, x1 + (1.0 / m) * (y - y1), x1)
+
+            # condition 1 (entering) and 3 (leaving): add intersection
+            pos = start + nvertices2
+            xnew[pos] = x
+            ynew[pos] = y
+            nvertices2 += active & (stat1 != stat2)
+
+            # condition 1 (entering) and 2 (inside): add second point
+            pos = start + nvertices2
+            xnew[pos] = x2
+            ynew[pos] = y2
+            nvertices2 += active & stat2
+
+        # close the clipped polygons
+        pos = start + nvertices2
+        xnew[pos] = xnew[start]
+        ynew[pos] = ynew[start]
+        nvertices2 += 1
+
+        if (nvertices2 > 9).any():
+            raise Error2DPolygon(" Failure in finding the clipped polygon, nvertices2 > 9 ")
+
+        nvertices = nvertices2 - 1
+        nkeep = nvertices2.max() if npair else 1
+        xPixel = xnew.reshape(npair, ncol)[:, :nkeep]
+        yPixel = ynew.reshape(npair, ncol)[:, :nkeep]
+
+    # area of the clipped polygons (vertices past the last closing vertex
+    # do not contribute)
+    valid = np.arange(xPixel.shape[1] - 1) < nvertices[:, np.newaxis]
+    xPixel = xPixel - xPixel[:, :1]
+    yPixel = yPixel - yPixel[:, :1]
+    area = (xPixel[:, :-1] * yPixel[:, 1:] - xPixel[:, 1:] * yPixel[:, :-1])
+    return abs(0.5 * np.where(valid, area, 0.0).sum(axis=1))
+# _____________________________________________________________________________
+
+
 def match_det2cube(x, y, sliceno, start_slice, input_model, transform,
                    spaxel_flux,
                    spaxel_weight,
                    spaxel_iflux,
                    xcoord, zcoord,
-                   crval1, crval3, cdelt1, cdelt3, naxis1, naxis2):
+                   crval1, crval3, cdelt1, cdelt3, naxis1, naxis2,
+                   max_pairs=1000000):
     """ Match detector pixels to output plane in alpha-beta coordinate system
 
     This routine assumes a 1-1 mapping in beta - slice no.
@@ -381,6 +500,8 @@ def match_det2cube(x, y, sliceno, start_slice, input_model, transform,
     lambda. In the alpha,lambda plane find the % area of the detector pixel
     which it overlaps with in the cube. For each spaxel record the detector
     pixels that overlap with it - store flux,  % overlap, beta_distance.
+    The overlaps of all (pixel, spaxel) pairs are found in vectorized batches
+    of at most max_pairs pairs with sh_find_overlap_batch.
 
     Parameters
     ----------
@@ -396,14 +517,13 @@ def match_det2cube(x, y, sliceno, start_slice, input_model, transform,
       wcs transform to transform x,y to alpha,beta, lambda
     spaxel : list
       list of spaxels holding information on each cube pixel.
+    max_pairs : int
+      maximum number of (pixel, spaxel) pairs clipped in one batch
 
     Returns
     -------
     spaxel filled in with needed information on overlapping detector pixels
     """
-    nxc = len(xcoord)
-    nzc = len(zcoord)
-
     sliceno_use = sliceno - start_slice + 1
     # 1-1 mapping in beta
     yy = sliceno_use - 1
@@ -431,81 +551,111 @@ def match_det2cube(x, y, sliceno, start_slice, input_model, transform,
     xx_left = x
     xx_right = x + 1
 
-    alpha, beta, lam = transform(x, y)
     alpha1, beta1, lam1 = transform(xx_left, yy_bot)
     alpha2, beta2, lam2 = transform(xx_right, yy_bot)
     alpha3, beta3, lam3 = transform(xx_right, yy_top)
     alpha4, beta4, lam4 = transform(xx_left, yy_top)
 
-    nn = len(x)
-    # Loop over all pixels in slice
-    for ipixel in range(0, nn - 1):
-
-        # detector pixel -> 4 corners
-        # In alpha,wave space
-        # in beta space: beta center + width
+    match_pixels_to_spaxels(yy, pixel_flux,
+                            np.column_stack([alpha1, alpha2, alpha3, alpha4]),
+                            np.column_stack([lam1, lam2, lam3, lam4]),
+                            spaxel_flux, spaxel_weight, spaxel_iflux,
+                            xcoord, zcoord, crval1, crval3, cdelt1, cdelt3,
+                            naxis1, naxis2, max_pairs=max_pairs)
+# ________________________________________________________________________________
 
-        alpha_corner = []
-        wave_corner = []
 
-        alpha_corner.append(alpha1[ipixel])
-        alpha_corner.append(alpha2[ipixel])
-        alpha_corner.append(alpha3[ipixel])
-        alpha_corner.append(alpha4[ipixel])
+def match_pixels_to_spaxels(yy, pixel_flux, alpha_corner, wave_corner,
+                            spaxel_flux, spaxel_weight, spaxel_iflux,
+                            xcoord, zcoord, crval1, crval3, cdelt1, cdelt3,
+                            naxis1, naxis2, max_pairs=1000000):
+    """ Add the area-weighted fluxes of pixels to the overlapping spaxels
 
-        wave_corner.append(lam1[ipixel])
-        wave_corner.append(lam2[ipixel])
-        wave_corner.append(lam3[ipixel])
-        wave_corner.append(lam4[ipixel])
+    Parameters
+    ----------
+    yy : int
+      index of the cube plane (slice) along beta
+    pixel_flux : numpy.ndarray
+      flux of the detector pixels
+    alpha_corner : numpy.ndarray
+      alpha values of the 4 pixel corners, shape (npixels, 4)
+    wave_corner : numpy.ndarray
+      wavelength values of the 4 pixel corners, shape (npixels, 4)
+    spaxel_flux : numpy.ndarray
+       contains the weighted summed detector fluxes
+    spaxel_weight : numpy.ndarray
+       contains the summed weights assocated with the detector fluxes
+    spaxel_iflux : numpy.ndarray
+       number of detector pixels overlapping the spaxel
+    max_pairs : int
+      maximum number of (pixel, spaxel) pairs clipped in one batch
 
-# ________________________________________________________________________________
-# Now it does not matter the WCS method used
-        alpha_min = min(alpha_corner)
-        alpha_max = max(alpha_corner)
-        wave_min = min(wave_corner)
-        wave_max = max(wave_corner)
-
-        Area = find_area_quad(alpha_min, wave_min, alpha_corner, wave_corner)
-
-        # estimate the where the pixel overlaps in the cube
-        # find the min and max values in the cube xcoord,ycoord and zcoord
-
-        MinA = (alpha_min - crval1) / cdelt1
-        MaxA = (alpha_max - crval1) / cdelt1
-        ix1 = max(0, int(math.trunc(MinA)))
-        ix2 = int(math.ceil(MaxA))
-        if ix2 >= nxc:
-            ix2 = nxc - 1
-
-        MinW = (wave_min - crval3) / cdelt3
-        MaxW = (wave_max - crval3) / cdelt3
-        iz1 = int(math.trunc(MinW))
-        iz2 = int(math.ceil(MaxW))
-        if iz2 >= nzc:
-            iz2 = nzc - 1
-
-        # loop over possible overlapping cube pixels
-        # noverlap = 0
-        nplane = naxis1 * naxis2
-
-        for zz in range(iz1, iz2 + 1):
-            zcenter = zcoord[zz]
-            istart = zz * nplane
-
-            for xx in range(ix1, ix2 + 1):
-                cube_index = istart + yy * naxis1 + xx  # yy = slice # -1
-                xcenter = xcoord[xx]
-                AreaOverlap = SH_FindOverlap(xcenter, zcenter,
-                                             cdelt1, cdelt3,
-                                             alpha_corner, wave_corner)
-
-                if AreaOverlap > 0.0:
-                    AreaRatio = AreaOverlap / Area
-                    spaxel_flux[cube_index] = spaxel_flux[cube_index] + \
-                        (AreaRatio * pixel_flux[ipixel])
-                    spaxel_weight[cube_index] = spaxel_weight[cube_index] + \
-                        AreaRatio
-                    spaxel_iflux[cube_index] = spaxel_iflux[cube_index] + 1
+    Returns
+    -------
+    spaxel_flux, spaxel_weight and spaxel_iflux updated with the pixels
+    """
+    nxc = len(xcoord)
+    nzc = len(zcoord)
+    nplane = naxis1 * naxis2
+
+    # the last pixel is not mapped to the cube (as in the original
+    # pixel-by-pixel implementation of this routine)
+    nn = max(pixel_flux.size - 1, 0)
+    alpha_corner = alpha_corner[:nn]
+    wave_corner = wave_corner[:nn]
+
+    alpha_min = alpha_corner.min(axis=1)
+    alpha_max = alpha_corner.max(axis=1)
+    wave_min = wave_corner.min(axis=1)
+    wave_max = wave_corner.max(axis=1)
+
+    xc = alpha_corner - alpha_min[:, np.newaxis]
+    yc = wave_corner - wave_min[:, np.newaxis]
+    Area = abs(0.5 * (xc * np.roll(yc, -1, axis=1) -
+                      np.roll(xc, -1, axis=1) * yc).sum(axis=1))
+
+    # estimate the where the pixel overlaps in the cube
+    # find the min and max values in the cube xcoord,ycoord and zcoord
+    ix1 = np.maximum(np.trunc((alpha_min - crval1) / cdelt1), 0).astype(int)
+    ix2 = np.minimum(np.ceil((alpha_max - crval1) / cdelt1), nxc - 1).astype(int)
+    iz1 = np.maximum(np.trunc((wave_min - crval3) / cdelt3), 0).astype(int)
+    iz2 = np.minimum(np.ceil((wave_max - crval3) / cdelt3), nzc - 1).astype(int)
+
+    nx = np.maximum(ix2 - ix1 + 1, 0)
+    nz = np.maximum(iz2 - iz1 + 1, 0)
+    npairs = nx * nz
+
+    # split pixels into batches of at most max_pairs (pixel, spaxel) pairs
+    cum_pairs = np.cumsum(npairs)
+    ipixel = 0
+    while ipixel < nn:
+        offset = cum_pairs[ipixel] - npairs[ipixel]
+        iend = max(np.searchsorted(cum_pairs, offset + max_pairs, side='right'),
+                   ipixel + 1)
+        pix = np.arange(ipixel, iend)
+        ipixel = iend
+
+        # (pixel, spaxel) pairs: loop over wavelength then alpha
+        ipair = np.repeat(pix, npairs[pix])
+        if ipair.size == 0:
+            continue
+        k = np.arange(ipair.size) - np.repeat(cum_pairs[pix] - npairs[pix] - offset,
+                                               npairs[pix])
+        xx = ix1[ipair] + k % nx[ipair]
+        zz = iz1[ipair] + k // nx[ipair]
+
+        AreaOverlap = sh_find_overlap_batch(xcoord[xx], zcoord[zz],
+                                            cdelt1, cdelt3,
+                                            alpha_corner[ipair],
+                                            wave_corner[ipair])
+
+        overlap = AreaOverlap > 0.0
+        ipair = ipair[overlap]
+        AreaRatio = AreaOverlap[overlap] / Area[ipair]
+        cube_index = zz[overlap] * nplane + yy * naxis1 + xx[overlap]  # yy = slice # -1
+        _accumulate_spaxels(cube_index, AreaRatio * pixel_flux[ipair],
+                            AreaRatio, spaxel_flux, spaxel_weight,
+                            spaxel_iflux)
 # ________________________________________________________________________________
 
 
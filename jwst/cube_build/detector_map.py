@@ -0,0 +1,169 @@
+""" Cache of the coordinates of the IFU detector pixels
+
+Mapping every detector pixel of an IFU exposure to the sky (or to the
+alpha-beta plane of MIRI) requires evaluating the full WCS, slice by slice for
+NIRSpec. For a given WCS this mapping does not change, so the maps are cached
+and reused whenever cubes are built (or blotted) again from the same exposure
+during a step run. The maps can also be saved to disk, next to the calibrated
+files, so later runs can reuse them.
+"""
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from ..assign_wcs import nirspec
+from ..assign_wcs.util import wcs_hash
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+__all__ = ['DetectorMaps']
+
+# maximum total size of the maps held in memory, in bytes
+MAX_CACHE_SIZE = 2 * 1024**3
+
+
+class DetectorMaps():
+    """ Detector coordinate maps of the input models of a step run
+
+    The maps are held in memory, keyed by the identity of the WCS object of
+    the model, for as long as this object is alive. The least recently used
+    maps are dropped when their total size exceeds MAX_CACHE_SIZE.
+
+    Parameters
+    ----------
+    cache_dir : str
+       if not None, directory the maps are saved to (and read from if they
+       were saved for the same WCS). It is created if it does not exist.
+    """
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self._cache = OrderedDict()
+# ______________________________________________________________________________
+
+    def __call__(self, model, frame='world'):
+        """ Coordinates of all the pixels of an IFU detector
+
+        Parameters
+        ----------
+        model : IFUImageModel
+           input data model with an assigned WCS
+        frame : str
+           'world' for ra, dec and wavelength or 'alpha_beta' (MIRI only) for
+           alpha, beta and wavelength
+
+        Returns
+        -------
+        coord1, coord2, wave : numpy.ndarray
+           read-only maps with the shape of the detector. Pixels which are not
+           mapped have a NaN wavelength.
+        """
+        wcsobj = model.meta.wcs
+        key = (id(wcsobj), frame)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] is wcsobj:
+            self._cache.move_to_end(key)
+            return cached[1]
+
+        # the hash of the WCS is only needed to validate saved maps
+        filename = None
+        maps = None
+        if self.cache_dir is not None:
+            whash = wcs_hash(wcsobj)
+            filename = _map_filename(model, frame, whash, self.cache_dir)
+            maps = _read_map(filename, whash)
+
+        if maps is None:
+            maps = _evaluate_map(model, frame)
+            if filename is not None:
+                np.savez(filename, wcs_hash=whash, coord1=maps[0],
+                         coord2=maps[1], wave=maps[2])
+                log.debug('Saved detector map %s', filename)
+
+        for m in maps:
+            m.setflags(write=False)
+        # keep a reference to the WCS so that its id is not reused
+        self._cache[key] = (wcsobj, maps)
+        self._resize()
+        return maps
+# ______________________________________________________________________________
+
+    def clear(self):
+        """ Remove all the detector maps held in memory
+        """
+        self._cache.clear()
+# ______________________________________________________________________________
+
+    def _resize(self):
+        """ Remove the least recently used maps over MAX_CACHE_SIZE """
+        size = sum(m.nbytes for _, maps in self._cache.values()
+                   for m in maps)
+        while len(self._cache) > 1 and size > MAX_CACHE_SIZE:
+            key, (_, maps) = self._cache.popitem(last=False)
+            size -= sum(m.nbytes for m in maps)
+# ______________________________________________________________________________
+
+
+def _map_filename(model, frame, key, cache_dir):
+    """ Name of the file holding the detector map of the model """
+    filename = model.meta.filename
+    if filename:
+        base = os.path.splitext(os.path.basename(filename))[0]
+    else:
+        base = key
+    return os.path.join(cache_dir, '{}_{}_detmap.npz'.format(base, frame))
+# ______________________________________________________________________________
+
+
+def _read_map(filename, key):
+    """ Read a saved detector map, if it was made with the same WCS """
+    if not os.path.exists(filename):
+        return None
+    with np.load(filename) as saved:
+        if str(saved['wcs_hash']) != key:
+            log.debug('Detector map %s is out of date', filename)
+            return None
+        log.debug('Read detector map %s', filename)
+        return saved['coord1'], saved['coord2'], saved['wave']
+# ______________________________________________________________________________
+
+
+def _evaluate_map(model, frame):
+    """ Evaluate the WCS of the model for all the detector pixels """
+    instrument = model.meta.instrument.name.upper()
+    if instrument == 'MIRI':
+        y, x = np.mgrid[:model.data.shape[0], :model.data.shape[1]]
+        if frame == 'world':
+            return model.meta.wcs(x, y)
+        det2ab_transform = model.meta.wcs.get_transform('detector',
+                                                        'alpha_beta')
+        return det2ab_transform(x, y)
+
+    if frame != 'world':
+        raise ValueError('Frame {} not supported for {}'.format(frame,
+                                                               instrument))
+
+    # for NIRSPEC each file has 30 slices, evaluated together
+    ra_det = np.full((2048, 2048), np.nan)
+    dec_det = np.full((2048, 2048), np.nan)
+    lam_det = np.full((2048, 2048), np.nan)
+    nslices = 30
+    log.info("Mapping each NIRSpec slice to sky; this takes a while for NIRSpec data")
+    slice_maps = nirspec.nrs_slit_maps(model, range(nslices))
+    for slice_map in slice_maps.values():
+        ra, dec, lam = slice_map.world
+        # the slices are curved on detector so a rectangular region
+        # returns NaNs
+        valid = slice_map.mask & ~np.isnan(lam)
+        ny, nx = lam.shape
+        box = np.s_[slice_map.ystart:slice_map.ystart + ny,
+                    slice_map.xstart:slice_map.xstart + nx]
+        ra_det[box][valid] = ra[valid]
+        dec_det[box][valid] = dec[valid]
+        lam_det[box][valid] = lam[valid]
+    return ra_det, dec_det, lam_det
@@ -5,24 +5,23 @@ import time
 import numpy as np
 import logging
 import math
+from collections import OrderedDict
 from ..model_blender import blendmeta
 from .. import datamodels
 from ..assign_wcs import pointing
-from jwst.transforms.models import _toindex
+from ..lib import parallel_utils
 from astropy.stats import circmean
 from astropy import units as u
-from gwcs import wcstools
-from ..assign_wcs import nirspec
 from ..datamodels import dqflags
 from . import cube_build_wcs_util
 from . import cube_overlap
 from . import cube_cloud
 from . import coord
+from . import detector_map
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
-
 class IFUCubeData():
 
     def __init__(self,
@@ -74,6 +73,13 @@ class IFUCubeData():
         self.zdebug = pars_cube.get('zdebug')
         self.debug_pixel = pars_cube.get('debug_pixel')
         self.spaxel_debug = pars_cube.get('spaxel_debug')
+        self.nproc = pars_cube.get('nproc', 1)
+        self.detector_maps = pars_cube.get('detector_maps')
+        if self.detector_maps is None:
+            self.detector_maps = detector_map.DetectorMaps(
+                pars_cube.get('coord_cache_dir'))
+        self.weight_matrix = pars_cube.get('weight_matrix', False)
+        self.weight_matrices = OrderedDict()
 
         self.num_bands = 0
         self.output_name = ''
@@ -472,6 +478,9 @@ class IFUCubeData():
         the ifucube in created in the detector plane. The weighting function is based on
         the overlap of between the detector pixel and spaxel. This method is simplified
         to determine the overlap in the alpha-wavelength plane.
+        When nproc > 1 the files are mapped with cube_cloud:match_det2_cube_msm in
+        parallel (see map_files_parallel). When weight_matrix is set the files are
+        mapped with cached sparse weight matrices (see map_point_cloud_msm).
         4. find_spaxel_flux: find the final flux assoicated with each spaxel
         5. setup_ifucube
         6. output_ifucube
@@ -498,21 +507,13 @@ class IFUCubeData():
 # ra,dec, wave is independent of input_model
 # v2,v3, alpha,beta depends on the input_model
         if self.weighting == 'miripsf':
-            spaxel_ra = np.zeros(total_num)
-            spaxel_dec = np.zeros(total_num)
-            spaxel_wave = np.zeros(total_num)
-
-            nxy = self.xcenters.size
+            # ra,dec of the spaxel centers are the same in every wavelength plane
+            ra, dec = coord.std2radec(self.crval1, self.crval2,
+                                      self.xcenters, self.ycenters)
             nz = self.zcoord.size
-            for iz in range(nz):
-                istart = iz * nxy
-                for ixy in range(nxy):
-                    ii = istart + ixy
-                    spaxel_ra[ii], spaxel_dec[ii] = coord.std2radec(self.crval1,
-                                                                    self.crval2,
-                                                                    self.xcenters[ixy],
-                                                                    self.ycenters[ixy])
-                    spaxel_wave[ii] = self.zcoord[iz]
+            spaxel_ra = np.tile(ra, nz)
+            spaxel_dec = np.tile(dec, nz)
+            spaxel_wave = np.repeat(self.zcoord, self.xcenters.size)
 # ______________________________________________________________________________
 
         subtract_background = True
@@ -523,6 +524,7 @@ class IFUCubeData():
         # and map the detector pixels to the cube spaxel
 
         number_bands = len(self.list_par1)
+        parallel_tasks = []
         t0 = time.time()
         for i in range(number_bands):
             this_par1 = self.list_par1[i]
@@ -535,7 +537,11 @@ class IFUCubeData():
                 self.this_cube_filenames.append(ifile)
                 log.debug("Working on Band defined by: %s %s ", this_par1, this_par2)
 # --------------------------------------------------------------------------------
-                if self.interpolation == 'pointcloud':
+                if (self.interpolation == 'pointcloud' and self.weighting == 'msm' and
+                        self.nproc > 1 and not self.weight_matrix):
+                    parallel_tasks.append((this_par1, this_par2, k))
+
+                elif self.interpolation == 'pointcloud':
                     t0 = time.time()
                     pixelresult = self.map_detector_to_outputframe(this_par1,
                                                                    this_par2,
@@ -548,30 +554,9 @@ class IFUCubeData():
                     log.info("Time to transform pixels to output frame = %.1f.s" % (t1 - t0,))
                     if self.weighting == 'msm':
                         t0 = time.time()
-#                        if self.new_code:
-#                            print('calling new cube_cloud')
-#                            cube_cloud_quick.match_det2cube_msm(self.naxis1,self.naxis2,self.naxis3,
-#                                                              self.cdelt1,self.cdelt2,self.cdelt3,
-#                                                              self.rois,self.roiw,self.weight_power,
-#                                                              self.xcoord,self.ycoord,self.zcoord,
-#                                                              self.spaxel_flux,
-#                                                              self.spaxel_weight,
-#                                                              self.spaxel_iflux,
-#                                                              flux,
-#                                                              coord1,coord2,wave)
-#                        else:
-#                            print('calling old cube_cloud')
-                        cube_cloud.match_det2cube_msm(self.naxis1, self.naxis2, self.naxis3,
-                                                      self.cdelt1, self.cdelt2,
-                                                      self.cdelt3_normal,
-                                                      self.xcenters, self.ycenters, self.zcoord,
-                                                      self.spaxel_flux,
-                                                      self.spaxel_weight,
-                                                      self.spaxel_iflux,
-                                                      flux,
-                                                      coord1, coord2, wave,
-                                                      rois_pixel, roiw_pixel, weight_pixel,
-                                                      softrad_pixel)
+                        self.map_point_cloud_msm(flux, coord1, coord2, wave,
+                                                 rois_pixel, roiw_pixel, weight_pixel,
+                                                 softrad_pixel)
 
                         t1 = time.time()
                         log.info("Time to match file to ifucube = %.1f.s" % (t1 - t0,))
@@ -642,6 +627,12 @@ class IFUCubeData():
                         t1 = time.time()
 
                         log.info("Time to Map All slices on Detector to Cube = %.1f.s" % (t1 - t0,))
+
+        if parallel_tasks:
+            t0 = time.time()
+            self.map_files_parallel(parallel_tasks, subtract_background)
+            t1 = time.time()
+            log.info("Time to map files to ifucube = %.1f.s" % (t1 - t0,))
 # _______________________________________________________________________
 # Mapped all data to cube or Point Cloud
 # now determine Cube Spaxel flux
@@ -659,6 +650,135 @@ class IFUCubeData():
         return ifucube_model
 # ********************************************************************************
 
+    def map_point_cloud_msm(self, flux, coord1, coord2, wave,
+                            rois_pixel, roiw_pixel, weight_pixel, softrad_pixel):
+        """ Map the point cloud of one file to the cube with msm weighting
+
+        If weight_matrix is set, the weights of the point cloud members for
+        the spaxels are stored in a sparse matrix (cached on this cube for
+        later builds from the same point cloud, see
+        cube_cloud.msm_weight_matrix) and the
+        fluxes are mapped with sparse matrix-vector products. Otherwise
+        the weights are computed and accumulated directly with
+        cube_cloud.match_det2cube_msm.
+
+        Parameters
+        ----------
+        flux : numpy.ndarray
+           flux of the point cloud members
+        coord1, coord2, wave : numpy.ndarray
+           coordinates of the point cloud members in the output frame
+        rois_pixel, roiw_pixel, weight_pixel, softrad_pixel : numpy.ndarray
+           msm weighting parameters of the point cloud members
+        """
+        if self.weight_matrix:
+            matrix = cube_cloud.msm_weight_matrix(self.naxis1, self.naxis2, self.naxis3,
+                                                  self.cdelt1, self.cdelt2,
+                                                  self.cdelt3_normal,
+                                                  self.xcenters, self.ycenters, self.zcoord,
+                                                  coord1, coord2, wave,
+                                                  rois_pixel, roiw_pixel, weight_pixel,
+                                                  softrad_pixel,
+                                                  cache=self.weight_matrices)
+            cube_cloud.apply_weight_matrix(matrix, flux,
+                                           self.spaxel_flux,
+                                           self.spaxel_weight,
+                                           self.spaxel_iflux)
+        else:
+            cube_cloud.match_det2cube_msm(self.naxis1, self.naxis2, self.naxis3,
+                                          self.cdelt1, self.cdelt2,
+                                          self.cdelt3_normal,
+                                          self.xcenters, self.ycenters, self.zcoord,
+                                          self.spaxel_flux,
+                                          self.spaxel_weight,
+                                          self.spaxel_iflux,
+                                          flux,
+                                          coord1, coord2, wave,
+                                          rois_pixel, roiw_pixel, weight_pixel,
+                                          softrad_pixel)
+# ********************************************************************************
+
+    def map_file_to_slab(self, this_par1, this_par2, k, subtract_background):
+        """ Map the detector pixels of one file to a wavelength slab of the cube
+
+        The point cloud of the file is mapped with the msm weighting to the
+        range of wavelength planes it may contribute to, using private
+        spaxel_flux, spaxel_weight and spaxel_iflux arrays for that slab.
+
+        Parameters
+        ----------
+        this_par1 : str
+           channel (MIRI) or grating (NIRSPEC) of the file
+        this_par2 : str
+           subchannel (MIRI) or filter (NIRSPEC) of the file
+        k : int
+           index of the file in the master table for this_par1, this_par2
+        subtract_background : boolean
+           if True subtract the background from the detector data
+
+        Returns
+        -------
+        index of the first spaxel of the slab in the flattened cube and the
+        spaxel_flux, spaxel_weight, and spaxel_iflux arrays of the slab
+        """
+        ifile = self.master_table.FileMap[self.instrument][this_par1][this_par2][k]
+        pixelresult = self.map_detector_to_outputframe(this_par1,
+                                                       this_par2,
+                                                       subtract_background,
+                                                       ifile)
+
+        coord1, coord2, wave, flux, rois_pixel, roiw_pixel, weight_pixel,\
+            softrad_pixel, alpha_det, beta_det = pixelresult
+
+        zstart, zend = cube_cloud.wavelength_slab(self.zcoord, wave, roiw_pixel)
+        nplane = self.naxis1 * self.naxis2
+        total_num = nplane * (zend - zstart)
+        spaxel_flux = np.zeros(total_num)
+        spaxel_weight = np.zeros(total_num)
+        spaxel_iflux = np.zeros(total_num)
+
+        if total_num > 0:
+            cube_cloud.match_det2cube_msm(self.naxis1, self.naxis2, zend - zstart,
+                                          self.cdelt1, self.cdelt2,
+                                          self.cdelt3_normal[zstart:zend],
+                                          self.xcenters, self.ycenters,
+                                          self.zcoord[zstart:zend],
+                                          spaxel_flux,
+                                          spaxel_weight,
+                                          spaxel_iflux,
+                                          flux,
+                                          coord1, coord2, wave,
+                                          rois_pixel, roiw_pixel, weight_pixel,
+                                          softrad_pixel)
+
+        return zstart * nplane, spaxel_flux, spaxel_weight, spaxel_iflux
+# ********************************************************************************
+
+    def map_files_parallel(self, tasks, subtract_background):
+        """ Map input files to the cube using a pool of worker processes
+
+        Each worker maps one file to a wavelength slab of the cube with
+        private accumulators (see map_file_to_slab). The slabs are added to
+        spaxel_flux, spaxel_weight and spaxel_iflux in the order of the files,
+        so the result does not depend on the number of processes.
+
+        Parameters
+        ----------
+        tasks : list of tuple
+           (this_par1, this_par2, k) identifying the files to map
+        subtract_background : boolean
+           if True subtract the background from the detector data
+        """
+        results = parallel_utils.map_ordered(
+            lambda task: self.map_file_to_slab(*task, subtract_background),
+            tasks, self.nproc)
+        for istart, spaxel_flux, spaxel_weight, spaxel_iflux in results:
+            cube_slice = slice(istart, istart + spaxel_flux.size)
+            self.spaxel_flux[cube_slice] += spaxel_flux
+            self.spaxel_weight[cube_slice] += spaxel_weight
+            self.spaxel_iflux[cube_slice] += spaxel_iflux
+# ********************************************************************************
+
     def build_ifucube_single(self):
 
         """ Build a set of single mode IFU cubes used for outlier detection
@@ -698,21 +818,9 @@ class IFUCubeData():
             coord1, coord2, wave, flux, rois_pixel, roiw_pixel, weight_pixel, \
                 softrad_pixel, alpha_det, beta_det = pixelresult
 
-            cube_cloud.match_det2cube_msm(self.naxis1,
-                                          self.naxis2,
-                                          self.naxis3,
-                                          self.cdelt1, self.cdelt2,
-                                          self.cdelt3_normal,
-                                          self.xcenters,
-                                          self.ycenters,
-                                          self.zcoord,
-                                          self.spaxel_flux,
-                                          self.spaxel_weight,
-                                          self.spaxel_iflux,
-                                          flux,
-                                          coord1, coord2, wave,
-                                          rois_pixel, roiw_pixel, weight_pixel,
-                                          softrad_pixel)
+            self.map_point_cloud_msm(flux, coord1, coord2, wave,
+                                     rois_pixel, roiw_pixel, weight_pixel,
+                                     softrad_pixel)
 # _______________________________________________________________________
 # shove Flux and iflux in the  final ifucube
             self.find_spaxel_flux()
@@ -1094,68 +1202,37 @@ class IFUCubeData():
                 y = np.reshape(y, y.size)
                 x = np.reshape(x, x.size)
                 if self.coord_system == 'world':
-                    ra, dec, wave = input_model.meta.wcs(x, y)
+                    ra, dec, wave = self.detector_maps(
+                        input_model, 'world')
+                    ra = ra[y, x]
                     valid1 = ~np.isnan(ra)
                     ra = ra[valid1]
-                    dec = dec[valid1]
-                    wave = wave[valid1]
+                    dec = dec[y, x][valid1]
+                    wave = wave[y, x][valid1]
                     x = x[valid1]
                     y = y[valid1]
                     if self.weighting == 'miripsf':
-                        det2ab_transform = input_model.meta.wcs.get_transform('detector',
-                                                                              'alpha_beta')
-                        alpha, beta, lam = det2ab_transform(x, y)
+                        alpha, beta, lam = self.detector_maps(
+                            input_model, 'alpha_beta')
+                        alpha = alpha[y, x]
+                        beta = beta[y, x]
                 elif self.coord_system == 'alpha-beta':
-                    det2ab_transform = input_model.meta.wcs.get_transform('detector',
-                                                                          'alpha_beta')
-                    alpha, beta, wave = det2ab_transform(x, y)
-                    valid1 = ~np.isnan(coord1)
+                    alpha, beta, wave = self.detector_maps(
+                        input_model, 'alpha_beta')
+                    alpha = alpha[y, x]
+                    valid1 = ~np.isnan(alpha)
                     alpha = alpha[valid1]
-                    beta = beta[valid1]
-                    wave = wave[valid1]
+                    beta = beta[y, x][valid1]
+                    wave = wave[y, x][valid1]
                     x = x[valid1]
                     y = y[valid1]
 # ________________________________________________________________________________
             elif self.instrument == 'NIRSPEC':
-                # initialize the ra,dec, and wavelength arrays
-                # we will loop over slices and fill in values
-                # the flag_det will be set when a slice pixel is filled in
-                #   at the end we will use this flag to pull out valid data
-                ra_det = np.zeros((2048, 2048))
-                dec_det = np.zeros((2048, 2048))
-                lam_det = np.zeros((2048, 2048))
-                flag_det = np.zeros((2048, 2048))
-                # for NIRSPEC each file has 30 slices
-                # wcs information access seperately for each slice
-                nslices = 30
-                log.info("Mapping each NIRSpec slice to sky; this takes a while for NIRSpec data")
-                for ii in range(nslices):
-                    slice_wcs = nirspec.nrs_wcs_set_input(input_model, ii)
-                    x, y = wcstools.grid_from_bounding_box(slice_wcs.bounding_box)
-                    ra, dec, lam = slice_wcs(x, y)
-
-                    # the slices are curved on detector so a rectangular region
-                    # returns NaNs
-                    valid = ~np.isnan(lam)
-                    ra = ra[valid]
-                    dec = dec[valid]
-                    lam = lam[valid]
-                    x = x[valid]
-                    y = y[valid]
-
-                    xind = _toindex(x)
-                    yind = _toindex(y)
-                    xind = np.ndarray.flatten(xind)
-                    yind = np.ndarray.flatten(yind)
-                    ra = np.ndarray.flatten(ra)
-                    dec = np.ndarray.flatten(dec)
-                    lam = np.ndarray.flatten(lam)
-                    ra_det[yind, xind] = ra
-                    dec_det[yind, xind] = dec
-                    lam_det[yind, xind] = lam
-                    flag_det[yind, xind] = 1
-                    # done looping  - pull out valid values
-                valid_data = np.where(flag_det == 1)
+                # the ra,dec, and wavelength of the pixels of all the slices
+                # (NaN for pixels not in a slice)
+                ra_det, dec_det, lam_det = self.detector_maps(
+                    input_model, 'world')
+                valid_data = np.where(~np.isnan(lam_det))
                 y, x = valid_data
                 ra = ra_det[valid_data]
                 dec = dec_det[valid_data]
@@ -0,0 +1,21 @@
+"""
+Test the cube_build coordinate conversions.
+"""
+import numpy as np
+
+from jwst.cube_build import coord
+
+
+def test_std2radec_array():
+    xi, eta = np.meshgrid(np.linspace(-5.0, 5.0, 11),
+                          np.linspace(-4.0, 4.0, 9))
+    xi = xi.ravel()
+    eta = eta.ravel()
+
+    ra, dec = coord.std2radec(0.001, 45.0, xi, eta)
+    for k in range(xi.size):
+        ra1, dec1 = coord.std2radec(0.001, 45.0, xi[k], eta[k])
+        assert ra[k] == ra1[0]
+        assert dec[k] == dec1[0]
+
+    assert ((ra >= 0) & (ra < 360)).all()
@@ -0,0 +1,279 @@
+"""
+Test mapping of the point cloud to the IFU cube spaxels.
+"""
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from jwst.cube_build import cube_cloud
+
+
+def _cube_geometry(naxis1=9, naxis2=7, naxis3=30, cdelt=0.2, linear=True):
+    xcoord = -0.9 + cdelt * np.arange(naxis1)
+    ycoord = -0.6 + cdelt * np.arange(naxis2)
+    ycenters, xcenters = np.meshgrid(ycoord, xcoord, indexing='ij')
+    if linear:
+        zcoord = 5.0 + 0.01 * np.arange(naxis3)
+    else:
+        zcoord = 5.0 + 0.01 * np.arange(naxis3) ** 1.2
+    zcdelt3 = np.append(np.diff(zcoord), zcoord[-1] - zcoord[-2])
+    return xcenters.ravel(), ycenters.ravel(), zcoord, zcdelt3
+
+
+def _point_cloud(npts, seed=0):
+    rng = np.random.RandomState(seed)
+    coord1 = rng.uniform(-1.3, 1.3, npts)
+    coord2 = rng.uniform(-1.0, 1.0, npts)
+    wave = rng.uniform(4.95, 5.4, npts)
+    flux = rng.uniform(1.0, 10.0, npts)
+    rois = np.full(npts, 0.35)
+    roiw = rng.uniform(0.01, 0.03, npts)
+    weight = np.full(npts, 2.0)
+    softrad = np.full(npts, 0.01)
+    return coord1, coord2, wave, flux, rois, roiw, weight, softrad
+
+
+def _brute_force_msm(naxis1, naxis2, naxis3, cdelt1, cdelt2, zcdelt3,
+                     xcenters, ycenters, zcoord, flux, coord1, coord2, wave,
+                     rois, roiw, weight, softrad):
+    total = naxis1 * naxis2 * naxis3
+    spaxel_flux = np.zeros(total)
+    spaxel_weight = np.zeros(total)
+    spaxel_iflux = np.zeros(total)
+    xc = np.tile(xcenters, naxis3)
+    yc = np.tile(ycenters, naxis3)
+    zc = np.repeat(zcoord, naxis1 * naxis2)
+    zd = np.repeat(zcdelt3, naxis1 * naxis2)
+    for k in range(coord1.size - 1):
+        xd = xc - coord1[k]
+        yd = yc - coord2[k]
+        match = ((np.sqrt(xd * xd + yd * yd) <= rois[k]) &
+                 (abs(zc - wave[k]) <= roiw[k]))
+        d2 = (((coord1[k] - xc[match]) / cdelt1)**2 +
+              ((coord2[k] - yc[match]) / cdelt2)**2 +
+              ((wave[k] - zc[match]) / zd[match])**2)
+        w = 1.0 / np.maximum(np.sqrt(d2)**weight[k], softrad[k])
+        spaxel_flux[match] += w * flux[k]
+        spaxel_weight[match] += w
+        spaxel_iflux[match] += 1
+    return spaxel_flux, spaxel_weight, spaxel_iflux
+
+
+@pytest.mark.parametrize('linear', [True, False])
+@pytest.mark.parametrize('max_candidates', [50, 4000000])
+def test_match_det2cube_msm(linear, max_candidates, monkeypatch):
+    naxis1, naxis2, naxis3 = 9, 7, 30
+    xcenters, ycenters, zcoord, zcdelt3 = _cube_geometry(
+        naxis1, naxis2, naxis3, linear=linear
+    )
+    coord1, coord2, wave, flux, rois, roiw, weight, softrad = \
+        _point_cloud(500)
+
+    expected = _brute_force_msm(naxis1, naxis2, naxis3, 0.2, 0.2, zcdelt3,
+                                xcenters, ycenters, zcoord, flux,
+                                coord1, coord2, wave, rois, roiw, weight,
+                                softrad)
+
+    # force small batches of point cloud members:
+    roi_matches = cube_cloud._roi_matches
+
+    def batched_roi_matches(*args):
+        return roi_matches(*args, max_candidates=max_candidates)
+
+    monkeypatch.setattr(cube_cloud, '_roi_matches', batched_roi_matches)
+
+    total = naxis1 * naxis2 * naxis3
+    spaxel_flux = np.zeros(total)
+    spaxel_weight = np.zeros(total)
+    spaxel_iflux = np.zeros(total)
+    cube_cloud.match_det2cube_msm(naxis1, naxis2, naxis3, 0.2, 0.2, zcdelt3,
+                                  xcenters, ycenters, zcoord,
+                                  spaxel_flux, spaxel_weight, spaxel_iflux,
+                                  flux, coord1, coord2, wave,
+                                  rois, roiw, weight, softrad)
+
+    assert expected[2].sum() > 0
+    assert np.array_equal(spaxel_iflux, expected[2])
+    assert np.allclose(spaxel_flux, expected[0], rtol=1e-12, atol=0)
+    assert np.allclose(spaxel_weight, expected[1], rtol=1e-12, atol=0)
+
+
+def test_wavelength_slab():
+    naxis1, naxis2, naxis3 = 9, 7, 60
+    xcenters, ycenters, zcoord, zcdelt3 = _cube_geometry(
+        naxis1, naxis2, naxis3, linear=False
+    )
+    coord1, coord2, wave, flux, rois, roiw, weight, softrad = \
+        _point_cloud(300, seed=1)
+    wave = 5.1 + 0.2 * (wave - wave.min()) / (wave.max() - wave.min())
+
+    nplane = naxis1 * naxis2
+    total = nplane * naxis3
+    full = [np.zeros(total) for _ in range(3)]
+    cube_cloud.match_det2cube_msm(naxis1, naxis2, naxis3, 0.2, 0.2, zcdelt3,
+                                  xcenters, ycenters, zcoord, *full,
+                                  flux, coord1, coord2, wave,
+                                  rois, roiw, weight, softrad)
+
+    zstart, zend = cube_cloud.wavelength_slab(zcoord, wave, roiw)
+    assert 0 < zstart < zend < naxis3
+
+    slab = [np.zeros(nplane * (zend - zstart)) for _ in range(3)]
+    cube_cloud.match_det2cube_msm(naxis1, naxis2, zend - zstart, 0.2, 0.2,
+                                  zcdelt3[zstart:zend], xcenters, ycenters,
+                                  zcoord[zstart:zend], *slab,
+                                  flux, coord1, coord2, wave,
+                                  rois, roiw, weight, softrad)
+
+    for f, s in zip(full, slab):
+        assert np.array_equal(f[zstart * nplane:zend * nplane], s)
+        assert not f[:zstart * nplane].any()
+        assert not f[zend * nplane:].any()
+
+    assert cube_cloud.wavelength_slab(zcoord, wave[:0], roiw[:0]) == (0, 0)
+
+
+def _brute_force_miripsf(alpha_resol, beta_resol, wave_resol,
+                         naxis1, naxis2, naxis3, xcenters, ycenters, zcoord,
+                         spaxel_alpha, spaxel_beta, spaxel_wave, flux,
+                         coord1, coord2, wave, alpha_det, beta_det,
+                         rois, roiw, weight, softrad):
+    total = naxis1 * naxis2 * naxis3
+    spaxel_flux = np.zeros(total)
+    spaxel_weight = np.zeros(total)
+    spaxel_iflux = np.zeros(total)
+    xc = np.tile(xcenters, naxis3)
+    yc = np.tile(ycenters, naxis3)
+    zc = np.repeat(zcoord, naxis1 * naxis2)
+    for k in range(coord1.size - 1):
+        xd = xc - coord1[k]
+        yd = yc - coord2[k]
+        match = ((np.sqrt(xd * xd + yd * yd) <= rois[k]) &
+                 (abs(zc - wave[k]) <= roiw[k]))
+        norm = [float(w) for w in cube_cloud.FindNormalizationWeights(
+            wave[k], wave_resol, alpha_resol, beta_resol)]
+        d2 = (((alpha_det[k] - spaxel_alpha[match]) / norm[0])**2 +
+              ((beta_det[k] - spaxel_beta[match]) / norm[1])**2 +
+              ((wave[k] - spaxel_wave[match]) / norm[2])**2)
+        w = 1.0 / np.maximum(np.sqrt(d2)**weight[k], softrad[k])
+        spaxel_flux[match] += w * flux[k]
+        spaxel_weight[match] += w
+        spaxel_iflux[match] += 1
+    return spaxel_flux, spaxel_weight, spaxel_iflux
+
+
+def test_find_normalization_weights():
+    alpha_resol = np.array([5.1, 0.1, 0.02, 0.05, 0.03])
+    beta_resol = np.array([5.2, 0.2, 0.01, 0.15, 0.02])
+    wave_resol = np.array([5.15, 3000.0, 100.0, 5.0])
+    wave = np.linspace(4.9, 5.4, 11)
+
+    weights = cube_cloud.FindNormalizationWeights(wave, wave_resol,
+                                                  alpha_resol, beta_resol)
+    for k, w in enumerate(wave):
+        expected = cube_cloud.FindNormalizationWeights(w, wave_resol,
+                                                       alpha_resol,
+                                                       beta_resol)
+        assert [float(x[k]) for x in weights] == \
+            [float(x) for x in expected]
+
+    assert weights[0][0] == 0.1 + 0.02 * wave[0]
+    assert weights[0][-1] == 0.05 + 0.03 * wave[-1]
+
+
+def test_match_det2cube_miripsf():
+    naxis1, naxis2, naxis3 = 9, 7, 30
+    xcenters, ycenters, zcoord, zcdelt3 = _cube_geometry(
+        naxis1, naxis2, naxis3
+    )
+    coord1, coord2, wave, flux, rois, roiw, weight, softrad = \
+        _point_cloud(500, seed=2)
+
+    # alpha-beta coordinates: rotated and scaled cube coordinates
+    rng = np.random.RandomState(3)
+    alpha_det = 0.8 * coord1 + 0.1 * coord2 + rng.normal(0, 0.01, wave.size)
+    beta_det = -0.1 * coord1 + 0.8 * coord2
+    spaxel_alpha = np.tile(0.8 * xcenters + 0.1 * ycenters, naxis3)
+    spaxel_beta = np.tile(-0.1 * xcenters + 0.8 * ycenters, naxis3)
+    spaxel_wave = np.repeat(zcoord, naxis1 * naxis2)
+
+    alpha_resol = np.array([5.1, 0.1, 0.02, 0.05, 0.03])
+    beta_resol = np.array([5.2, 0.2, 0.01, 0.15, 0.02])
+    wave_resol = np.array([5.15, 3000.0, 100.0, 5.0])
+
+    expected = _brute_force_miripsf(alpha_resol, beta_resol, wave_resol,
+                                    naxis1, naxis2, naxis3,
+                                    xcenters, ycenters, zcoord,
+                                    spaxel_alpha, spaxel_beta, spaxel_wave,
+                                    flux, coord1, coord2, wave,
+                                    alpha_det, beta_det,
+                                    rois, roiw, weight, softrad)
+
+    total = naxis1 * naxis2 * naxis3
+    spaxel_flux = np.zeros(total)
+    spaxel_weight = np.zeros(total)
+    spaxel_iflux = np.zeros(total)
+    cube_cloud.match_det2cube_miripsf(alpha_resol, beta_resol, wave_resol,
+                                      naxis1, naxis2, naxis3,
+                                      xcenters, ycenters, zcoord,
+                                      spaxel_flux, spaxel_weight,
+                                      spaxel_iflux,
+                                      spaxel_alpha, spaxel_beta, spaxel_wave,
+                                      flux, coord1, coord2, wave,
+                                      alpha_det, beta_det,
+                                      rois, roiw, weight, softrad)
+
+    assert expected[2].sum() > 0
+    assert np.array_equal(spaxel_iflux, expected[2])
+    assert np.allclose(spaxel_flux, expected[0], rtol=1e-12, atol=0)
+    assert np.allclose(spaxel_weight, expected[1], rtol=1e-12, atol=0)
+
+
+def test_msm_weight_matrix(monkeypatch):
+    naxis1, naxis2, naxis3 = 9, 7, 30
+    xcenters, ycenters, zcoord, zcdelt3 = _cube_geometry(
+        naxis1, naxis2, naxis3, linear=False
+    )
+    coord1, coord2, wave, flux, rois, roiw, weight, softrad = \
+        _point_cloud(500, seed=4)
+    geometry = (naxis1, naxis2, naxis3, 0.2, 0.2, zcdelt3,
+                xcenters, ycenters, zcoord)
+
+    total = naxis1 * naxis2 * naxis3
+    expected = [np.zeros(total) for _ in range(3)]
+    cube_cloud.match_det2cube_msm(*geometry, *expected, flux,
+                                  coord1, coord2, wave,
+                                  rois, roiw, weight, softrad)
+
+    cache = OrderedDict()
+    matrix = cube_cloud.msm_weight_matrix(*geometry, coord1, coord2, wave,
+                                          rois, roiw, weight, softrad,
+                                          cache=cache)
+    assert list(cache.values()) == [matrix]
+    assert matrix.shape == (total, 500)
+
+    result = [np.zeros(total) for _ in range(3)]
+    cube_cloud.apply_weight_matrix(matrix, flux, *result)
+    assert np.array_equal(result[2], expected[2])
+    assert np.allclose(result[0], expected[0], rtol=1e-12, atol=0)
+    assert np.allclose(result[1], expected[1], rtol=1e-12, atol=0)
+
+    # without a cache the same matrix is computed again
+    uncached = cube_cloud.msm_weight_matrix(*geometry, coord1, coord2, wave,
+                                            rois, roiw, weight, softrad)
+    assert uncached is not matrix
+    assert (uncached != matrix).nnz == 0
+
+    # the cached matrix is reused for new fluxes of the same point cloud
+    def msm_weights(*args):
+        raise AssertionError('weights computed again')
+
+    monkeypatch.setattr(cube_cloud, '_msm_weights', msm_weights)
+    assert cube_cloud.msm_weight_matrix(*geometry, coord1.copy(), coord2,
+                                        wave, rois, roiw, weight,
+                                        softrad, cache=cache) is matrix
+    with pytest.raises(AssertionError):
+        cube_cloud.msm_weight_matrix(*geometry, coord1 + 0.01, coord2,
+                                     wave, rois, roiw, weight, softrad,
+                                     cache=cache)
@@ -0,0 +1,102 @@
+"""
+Test the overlap of detector pixels with cube spaxels (area weighting).
+"""
+import numpy as np
+import pytest
+
+from jwst.cube_build import cube_overlap
+
+
+def _pixel_quads(npix, size=1.0, seed=0):
+    """ Random (possibly rotated and sheared) quadrilaterals """
+    rng = np.random.RandomState(seed)
+    xc = rng.uniform(0.0, 10.0, npix)
+    yc = rng.uniform(0.0, 10.0, npix)
+    angle = rng.uniform(0.0, 2 * np.pi, npix)
+    dx = np.array([-0.5, 0.5, 0.5, -0.5]) * size
+    dy = np.array([-0.5, -0.5, 0.5, 0.5]) * size
+    c = np.cos(angle)[:, np.newaxis]
+    s = np.sin(angle)[:, np.newaxis]
+    xp = xc[:, np.newaxis] + c * dx - s * dy + rng.normal(0, 0.05, (npix, 4))
+    yp = yc[:, np.newaxis] + s * dx + c * dy + rng.normal(0, 0.05, (npix, 4))
+    return xp, yp
+
+
+def test_sh_find_overlap_batch():
+    xp, yp = _pixel_quads(300)
+    rng = np.random.RandomState(1)
+    xcenter = xp.mean(axis=1) + rng.uniform(-1.0, 1.0, 300)
+    ycenter = yp.mean(axis=1) + rng.uniform(-1.0, 1.0, 300)
+
+    # include axis-aligned pixels (vertical and horizontal edges):
+    xp[:20] = np.round(xp[:20, :1]) + [0, 1, 1, 0]
+    yp[:20] = np.round(yp[:20, :1]) + [0, 0, 1, 1]
+
+    area = cube_overlap.sh_find_overlap_batch(xcenter, ycenter, 0.8, 1.2,
+                                              xp, yp)
+    expected = [cube_overlap.SH_FindOverlap(xcenter[k], ycenter[k], 0.8, 1.2,
+                                            xp[k], yp[k])
+                for k in range(300)]
+
+    assert (area > 0).sum() > 100
+    assert (area == 0).sum() > 10
+    assert np.allclose(area, expected, rtol=1e-10, atol=1e-12)
+
+
+def _reference_match(yy, pixel_flux, alpha_corner, wave_corner, xcoord,
+                     zcoord, crval1, crval3, cdelt1, cdelt3, naxis1, naxis2):
+    total = naxis1 * naxis2 * len(zcoord)
+    spaxel_flux = np.zeros(total)
+    spaxel_weight = np.zeros(total)
+    spaxel_iflux = np.zeros(total)
+    nplane = naxis1 * naxis2
+    for k in range(len(pixel_flux) - 1):
+        area = cube_overlap.find_area_quad(alpha_corner[k].min(),
+                                           wave_corner[k].min(),
+                                           alpha_corner[k], wave_corner[k])
+        for zz in range(len(zcoord)):
+            for xx in range(len(xcoord)):
+                overlap = cube_overlap.SH_FindOverlap(
+                    xcoord[xx], zcoord[zz], cdelt1, cdelt3,
+                    alpha_corner[k], wave_corner[k]
+                )
+                if overlap > 0:
+                    i = zz * nplane + yy * naxis1 + xx
+                    spaxel_flux[i] += overlap / area * pixel_flux[k]
+                    spaxel_weight[i] += overlap / area
+                    spaxel_iflux[i] += 1
+    return spaxel_flux, spaxel_weight, spaxel_iflux
+
+
+@pytest.mark.parametrize('max_pairs', [7, 1000000])
+def test_match_pixels_to_spaxels(max_pairs):
+    naxis1, naxis2, naxis3 = 12, 3, 14
+    cdelt1 = 0.9
+    cdelt3 = 0.8
+    crval1 = 0.0
+    crval3 = 0.0
+    xcoord = crval1 + cdelt1 * (np.arange(naxis1) + 0.5)
+    zcoord = crval3 + cdelt3 * (np.arange(naxis3) + 0.5)
+
+    alpha_corner, wave_corner = _pixel_quads(60, seed=2)
+    pixel_flux = np.random.RandomState(3).uniform(1.0, 5.0, 60)
+
+    expected = _reference_match(1, pixel_flux, alpha_corner, wave_corner,
+                                xcoord, zcoord, crval1, crval3, cdelt1,
+                                cdelt3, naxis1, naxis2)
+
+    total = naxis1 * naxis2 * naxis3
+    spaxel_flux = np.zeros(total)
+    spaxel_weight = np.zeros(total)
+    spaxel_iflux = np.zeros(total)
+    cube_overlap.match_pixels_to_spaxels(1, pixel_flux, alpha_corner,
+                                         wave_corner, spaxel_flux,
+                                         spaxel_weight, spaxel_iflux,
+                                         xcoord, zcoord, crval1, crval3,
+                                         cdelt1, cdelt3, naxis1, naxis2,
+                                         max_pairs=max_pairs)
+
+    assert expected[2].sum() > 0
+    assert np.array_equal(spaxel_iflux, expected[2])
+    assert np.allclose(spaxel_flux, expected[0], rtol=1e-7, atol=1e-14)
+    assert np.allclose(spaxel_weight, expected[1], rtol=1e-7, atol=1e-14)
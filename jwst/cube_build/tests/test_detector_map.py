@@ -0,0 +1,106 @@
+"""
+Test the cache of detector coordinate maps.
+"""
+import numpy as np
+from astropy.modeling import models
+from gwcs import wcs
+from gwcs import coordinate_frames as cf
+
+from jwst import datamodels
+from jwst.cube_build import detector_map
+
+
+def _miri_model(shift=0.0):
+    model = datamodels.IFUImageModel((20, 24))
+    model.meta.instrument.name = 'MIRI'
+    model.meta.filename = 'test_cal.fits'
+
+    detector = cf.Frame2D(name='detector')
+    alpha_beta = cf.Frame2D(name='alpha_beta')
+    world = cf.Frame2D(name='world')
+    det2ab = (models.Shift(shift) & models.Shift(0) |
+              models.Scale(0.1) & models.Scale(0.2) |
+              models.Mapping((0, 1, 0)) |
+              models.Identity(2) & models.Scale(0.01))
+    ab2world = (models.Shift(10.0) & models.Shift(5.0) &
+                models.Shift(4.0))
+    model.meta.wcs = wcs.WCS([(detector, det2ab),
+                              (alpha_beta, ab2world),
+                              (world, None)])
+    return model
+
+
+def test_detector_map(monkeypatch):
+    model = _miri_model()
+    y, x = np.mgrid[:20, :24]
+    detector_maps = detector_map.DetectorMaps()
+
+    ra, dec, wave = detector_maps(model)
+    expected = model.meta.wcs(x, y)
+    assert ra.shape == (20, 24)
+    for m, e in zip((ra, dec, wave), expected):
+        assert np.array_equal(m, e)
+        assert not m.flags.writeable
+
+    alpha, beta, lam = detector_maps(model, 'alpha_beta')
+    expected = model.meta.wcs.get_transform('detector', 'alpha_beta')(x, y)
+    for m, e in zip((alpha, beta, lam), expected):
+        assert np.array_equal(m, e)
+
+    # maps are reused for the same WCS, without hashing it, and evaluated
+    # again for a new WCS
+    def evaluate_map(model, frame):
+        raise AssertionError('map evaluated again')
+
+    def hash_wcs(wcsobj):
+        raise AssertionError('WCS hashed')
+
+    evaluate = detector_map._evaluate_map
+    monkeypatch.setattr(detector_map, '_evaluate_map', evaluate_map)
+    monkeypatch.setattr(detector_map, 'wcs_hash', hash_wcs)
+    assert detector_maps(model)[0] is ra
+    assert detector_maps(datamodels.IFUImageModel(model))[0] is ra
+
+    monkeypatch.setattr(detector_map, '_evaluate_map', evaluate)
+    shifted = detector_maps(_miri_model(shift=1.0))
+    assert np.allclose(shifted[0][:, :-1], ra[:, 1:])
+
+    # the maps are only kept by their cache
+    assert detector_map.DetectorMaps()(model)[0] is not ra
+    detector_maps.clear()
+    assert detector_maps(model)[0] is not ra
+
+
+def test_detector_map_saved(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.join('detmaps'))
+    model = _miri_model()
+    maps = detector_map.DetectorMaps(cache_dir)(model)
+    assert tmpdir.join('detmaps', 'test_cal_world_detmap.npz').check()
+
+    # the saved map is read back in a new session
+    def evaluate_map(model, frame):
+        raise AssertionError('map evaluated again')
+
+    evaluate = detector_map._evaluate_map
+    monkeypatch.setattr(detector_map, '_evaluate_map', evaluate_map)
+    saved = detector_map.DetectorMaps(cache_dir)(model)
+    for m, s in zip(maps, saved):
+        assert np.array_equal(m, s)
+
+    # a saved map made with a different WCS is replaced
+    monkeypatch.setattr(detector_map, '_evaluate_map', evaluate)
+    shifted = _miri_model(shift=1.0)
+    new = detector_map.DetectorMaps(cache_dir)(shifted)
+    assert not np.array_equal(new[0], maps[0])
+    saved = detector_map.DetectorMaps(cache_dir)(shifted)
+    assert np.array_equal(saved[0], new[0])
+
+
+def test_cache_size(monkeypatch):
+    monkeypatch.setattr(detector_map, 'MAX_CACHE_SIZE', 3 * 20 * 24 * 8 * 2)
+    detector_maps = detector_map.DetectorMaps()
+    models = [_miri_model(shift=s) for s in range(3)]
+    maps = [detector_maps(model) for model in models]
+    assert len(detector_maps._cache) == 2
+    assert detector_maps(models[2])[0] is maps[2][0]
+    assert detector_maps(models[0])[0] is not maps[0][0]
@@ -0,0 +1,321 @@
+import mmap
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+from astropy.io import fits
+
+from . import fits_support
+from . import model_base
+from .multispec import MultiSpecModel
+
+
+__all__ = ['MultiIntSpecModel', 'MultiIntSpecWriter']
+
+# Columns of the spec_table of a MultiSpecModel, stored as 2-D arrays
+COLUMNS = ('wavelength', 'flux', 'error', 'dq', 'net', 'nerror',
+           'background', 'berror', 'npixels')
+
+# Units of the columns, as set by extract_1d
+COLUMN_UNITS = {'wavelength': 'um', 'flux': 'mJy', 'error': 'mJy',
+                'net': 'DN/s', 'nerror': 'DN/s',
+                'background': 'DN/s', 'berror': 'DN/s'}
+
+# Attributes of each spectrum of a MultiSpecModel stored in spec_times
+TIMES = ('int_num', 'start_utc', 'mid_utc', 'end_utc',
+         'start_tdb', 'mid_tdb', 'end_tdb')
+
+# Approximate size in bytes of the blocks of zeros written to a new file
+WRITE_BLOCK_SIZE = 8 * 1024**2
+
+# Attributes shared by all the integrations of a spectrum
+KEYWORDS = ('name', 'slitlet_id', 'source_id', 'source_name', 'source_alias',
+            'stellarity', 'source_type', 'source_xpos', 'source_ypos',
+            'shutter_state', 'slit_ra', 'slit_dec', 'spectral_order',
+            'time_scale')
+
+
+class MultiIntSpecModel(model_base.DataModel):
+    """
+    A data model for the 1-D spectra of all the integrations of an exposure.
+
+    This holds the same spectra as a `MultiSpecModel` with one spectrum
+    for each integration, but in columns: each member of `spec` is one
+    slit or spectral order, and each of its arrays has one row for each
+    integration.  This avoids one FITS extension per integration, so
+    files with many integrations are much faster to write, read and
+    iterate over.
+
+    If `init` is a `MultiSpecModel` instance, its spectra are converted to
+    this layout.  The spectra are grouped by slit name, slitlet and source
+    ID and spectral order, and the spectra of a group must all have the
+    same length.  Use `to_multispec` to convert back.
+
+    Parameters
+    __________
+    int_times : numpy table
+         table of times for each integration
+
+    spec.items.wavelength : numpy float64 array
+         Wavelengths, one row per integration
+
+    spec.items.flux : numpy float64 array
+         Flux, one row per integration
+
+    spec.items.error : numpy float64 array
+         Error of the flux
+
+    spec.items.dq : numpy uint32 array
+         Data quality flags
+
+    spec.items.net : numpy float64 array
+         Net count rate
+
+    spec.items.nerror : numpy float64 array
+         Error of the net count rate
+
+    spec.items.background : numpy float64 array
+         Background count rate
+
+    spec.items.berror : numpy float64 array
+         Error of the background count rate
+
+    spec.items.npixels : numpy float64 array
+         Number of pixels added to get the net count rate
+
+    spec.items.spec_times : numpy table
+         Integration number and times of each row
+
+    Examples
+    --------
+    >>> with MultiSpecModel('x1dints.fits') as x1dints:  # doctest: +SKIP
+    ...     columnar = MultiIntSpecModel(x1dints)
+    >>> columnar.spec[0].flux.sum(axis=1)  # doctest: +SKIP
+    """
+    schema_url = "multiintspec.schema.yaml"
+
+    def __init__(self, init=None, **kwargs):
+
+        if isinstance(init, MultiSpecModel):
+            super(MultiIntSpecModel, self).__init__(init=None, **kwargs)
+            self.update(init, only="PRIMARY")
+            if len(init.int_times) > 0:
+                self.int_times = init.int_times.copy()
+            for group in _group_spectra(init.spec):
+                self.spec.append(self.spec.item())
+                _spectra_to_columns(group, self.spec[-1])
+            return
+
+        super(MultiIntSpecModel, self).__init__(init=init, **kwargs)
+
+    def to_multispec(self):
+        """Convert to a `MultiSpecModel` with one spectrum per integration.
+
+        The spectra of each member of `spec` are appended in turn, one for
+        each row.  The spectral WCS of the spectra is not set.
+
+        Returns
+        -------
+        output_model : `MultiSpecModel`
+        """
+        output_model = MultiSpecModel()
+        output_model.update(self, only="PRIMARY")
+        if len(self.int_times) > 0:
+            output_model.int_times = self.int_times.copy()
+
+        spec_dtype = output_model.spec.item().spec_table.dtype
+        for columns in self.spec:
+            keywords = {key: getattr(columns, key) for key in KEYWORDS}
+            times = columns.spec_times
+            (nrows, nelem) = columns.flux.shape
+            for row in range(nrows):
+                otab = np.zeros(nelem, dtype=spec_dtype)
+                for name in COLUMNS:
+                    otab[name.upper()] = getattr(columns, name)[row]
+                output_model.spec.append(output_model.spec.item())
+                spec = output_model.spec[-1]
+                spec.spec_table = otab
+                for name, unit in COLUMN_UNITS.items():
+                    spec.spec_table.columns[name].unit = unit
+                for key, value in keywords.items():
+                    if value is not None:
+                        setattr(spec, key, value)
+                if row < len(times) and times['int_num'][row] > 0:
+                    for name in TIMES:
+                        value = times[name][row].item()
+                        if not np.isnan(value):
+                            setattr(spec, name, value)
+
+        return output_model
+
+
+class MultiIntSpecWriter:
+    """
+    Write a `MultiIntSpecModel` file a chunk of integrations at a time.
+
+    The file is created with the metadata of `model` and with arrays of the
+    full size, `len(spec_times)` rows for each member of `model.spec`, all
+    zeros, and the rows are filled in by `write`.  So the spectra of an
+    exposure with many integrations can be saved without holding all of
+    them in memory.  The file can then be read with `MultiIntSpecModel`.
+
+    Parameters
+    ----------
+    model : `MultiIntSpecModel`
+        The metadata of the file.  The `spec_times` table and the keywords
+        of each member of `spec` must be set; its arrays are not used.
+        `model` is not modified.
+
+    path : str
+        The name of the file to create.
+
+    nelem : list of int
+        The number of elements of the spectra of each member of `spec`.
+
+    Examples
+    --------
+    >>> writer = MultiIntSpecWriter(model, 'x1dints.fits', [2048])  # doctest: +SKIP
+    >>> writer.write(0, 0, {'wavelength': wl, 'flux': flux})  # doctest: +SKIP
+    """
+
+    def __init__(self, model, path, nelem):
+        self.path = path
+
+        # The arrays of the template have the full size, so that the
+        # headers and the ASDF tree describe them, but they are never
+        # read: the data are written to the file as blocks of zeros.
+        template = model.copy()
+        for (spec, n) in zip(template.spec, nelem):
+            shape = (len(spec.spec_times), n)
+            for name in COLUMNS:
+                dtype = np.uint32 if name == 'dq' else np.float64
+                setattr(spec, name, _unread_array(shape, dtype))
+        template.on_save(path)
+
+        names = {name.upper() for name in COLUMNS}
+        with fits_support.to_fits(template._instance, template._schema) as ff:
+            with warnings.catch_warnings():
+                warnings.filterwarnings('ignore', message='Card is too long')
+                ff._update_asdf_extension()
+                ff._hdulist[0].writeto(path, overwrite=True)
+                for hdu in ff._hdulist[1:]:
+                    if hdu.name in names:
+                        _write_zeros(path, hdu.header)
+                    else:
+                        with fits.open(path, mode='append') as hdulist:
+                            hdulist.append(hdu)
+        template.close()
+
+    def write(self, index, start, columns):
+        """Write rows of the arrays of one member of `spec`.
+
+        Parameters
+        ----------
+        index : int
+            Index of the member of `spec`.
+
+        start : int
+            The first row to write.
+
+        columns : dict
+            2-D arrays with the same number of rows, keyed by the column
+            names ('wavelength', 'flux', ...).  Columns not given are left
+            as zeros.
+        """
+        with fits.open(self.path, mode='update', memmap=True,
+                       do_not_scale_image_data=True) as hdulist:
+            for (name, values) in columns.items():
+                hdu = hdulist[name.upper(), index + 1]
+                values = np.asarray(values)
+                bzero = hdu.header.get('BZERO', 0)
+                if bzero:
+                    # unsigned integers, stored as signed
+                    values = values.astype(np.int64) - int(bzero)
+                hdu.data[start:start + len(values)] = \
+                    values.astype(hdu.data.dtype)
+
+
+def _unread_array(shape, dtype):
+    """An array of zeros backed by an anonymous memory map.
+
+    Its pages only take memory when they are accessed.
+    """
+    dtype = np.dtype(dtype)
+    nbytes = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    buffer = mmap.mmap(-1, nbytes)
+    return np.frombuffer(buffer, dtype=dtype,
+                         count=int(np.prod(shape))).reshape(shape)
+
+
+def _write_zeros(path, header):
+    """Append an image extension of zeros to a FITS file, block by block.
+
+    The values stored are those that read as zeros after scaling with the
+    BZERO keyword of `header`, if any.
+    """
+    stored = np.dtype(fits.hdu.base.BITPIX2DTYPE[header['BITPIX']])
+    nrows = header['NAXIS2']
+    rows = max(WRITE_BLOCK_SIZE // (header['NAXIS1'] * stored.itemsize), 1)
+    block = np.full((min(rows, nrows), header['NAXIS1']),
+                    -header.get('BZERO', 0), dtype=stored.newbyteorder('>'))
+
+    hdu = fits.StreamingHDU(path, header.copy())
+    for row in range(0, nrows, rows):
+        hdu.write(block[:min(rows, nrows - row)])
+    hdu.close()
+
+
+def _group_spectra(spectra):
+    """Group the spectra of a MultiSpecModel by slit and spectral order.
+
+    Returns
+    -------
+    list of lists
+        The spectra of each group, in their input order.  The groups are in
+        the order of their first spectrum.
+    """
+    groups = OrderedDict()
+    for spec in spectra:
+        key = (spec.name, spec.slitlet_id, spec.source_id,
+               spec.spectral_order)
+        groups.setdefault(key, []).append(spec)
+
+    return list(groups.values())
+
+
+def _spectra_to_columns(spectra, columns):
+    """Copy the spectra of one slit or order to the arrays of `columns`.
+
+    Parameters
+    ----------
+    spectra : list
+        Members of the `spec` attribute of a `MultiSpecModel`, one for each
+        integration.
+
+    columns : member of the `spec` attribute of a `MultiIntSpecModel`
+        This is modified in-place.
+    """
+    nelem = {len(spec.spec_table) for spec in spectra}
+    if len(nelem) > 1:
+        raise ValueError("The spectra of {} have different lengths, "
+                         "they can't be stored as columns.".format(
+                            spectra[0].name))
+
+    for name in COLUMNS:
+        setattr(columns, name,
+                np.array([spec.spec_table[name.upper()] for spec in spectra]))
+
+    spec_times = np.zeros(len(spectra), dtype=columns.spec_times.dtype)
+    for row, spec in enumerate(spectra):
+        for name in TIMES:
+            value = getattr(spec, name)
+            if value is not None:
+                spec_times[name][row] = value
+            elif name != 'int_num':
+                spec_times[name][row] = np.nan
+    columns.spec_times = spec_times
+
+    for key in KEYWORDS:
+        value = getattr(spectra[0], key)
+        if value is not None:
+            setattr(columns, key, value)
@@ -6,13 +6,17 @@ import warnings
 import jsonschema
 
 import pytest
+from asdf import fits_embed
+from astropy.io import fits
 from astropy.time import Time
 import numpy as np
 from numpy.testing import assert_allclose
 
 from .. import (DataModel, ImageModel, MaskModel, QuadModel,
                 MultiSlitModel, ModelContainer, SlitModel,
-                SlitDataModel, IFUImageModel)
+                SlitDataModel, IFUImageModel, MultiSpecModel,
+                MultiIntSpecModel)
+from ..multiintspec import MultiIntSpecWriter, COLUMNS
 from ..util import open as open_model
 from ...lib.file_utils import pushdir
 
@@ -616,3 +620,97 @@ def test_ifuimage():
     im = ImageModel(ifuimage)
     assert type(im) == ImageModel
     im.close()
+
+
+def _multispec(nints, orders):
+    ms = MultiSpecModel()
+    ms.meta.instrument.name = 'NIRISS'
+    for order in orders:
+        for integ in range(nints):
+            ms.spec.append(ms.spec.item())
+            spec = ms.spec[-1]
+            otab = np.zeros(10, dtype=spec.spec_table.dtype)
+            otab['WAVELENGTH'] = np.arange(10) + order
+            otab['FLUX'] = 10. * integ + order
+            otab['DQ'] = integ
+            spec.spec_table = otab
+            spec.spectral_order = order
+            spec.int_num = integ + 1
+            spec.mid_utc = 58000. + integ
+    return ms
+
+
+def test_multiintspec_from_multispec():
+    ms = _multispec(nints=3, orders=[1, 2])
+    with MultiIntSpecModel(ms) as columnar:
+        assert columnar.meta.instrument.name == 'NIRISS'
+        assert len(columnar.spec) == 2
+        for order, spec in zip([1, 2], columnar.spec):
+            assert spec.spectral_order == order
+            assert spec.flux.shape == (3, 10)
+            assert_allclose(spec.flux[:, 0], [order, 10. + order, 20. + order])
+            assert_allclose(spec.wavelength[1], np.arange(10) + order)
+            assert list(spec.spec_times['int_num']) == [1, 2, 3]
+            assert_allclose(spec.spec_times['mid_utc'], 58000. + np.arange(3))
+            assert np.isnan(spec.spec_times['start_utc']).all()
+
+        columnar.save(TMP_FITS, overwrite=True)
+
+    with open_model(TMP_FITS) as columnar:
+        assert isinstance(columnar, MultiIntSpecModel)
+        assert columnar.spec[1].spectral_order == 2
+        assert_allclose(columnar.spec[1].flux[2], 22.)
+
+        back = columnar.to_multispec()
+        assert len(back.spec) == 6
+        for expected, spec in zip(ms.spec, back.spec):
+            assert spec.spectral_order == expected.spectral_order
+            assert spec.int_num == expected.int_num
+            assert spec.mid_utc == expected.mid_utc
+            assert spec.start_utc is None
+            assert_allclose(spec.spec_table['FLUX'],
+                            expected.spec_table['FLUX'])
+            assert_allclose(spec.spec_table['DQ'], expected.spec_table['DQ'])
+
+
+def test_multiintspec_writer():
+    columnar = MultiIntSpecModel(_multispec(nints=5, orders=[1, 2]))
+    columnar.spec[0].dq[3, 4] = 2**31 + 7
+    skeleton = MultiIntSpecModel(_multispec(nints=5, orders=[1, 2]))
+
+    writer = MultiIntSpecWriter(skeleton, TMP_FITS, [10, 10])
+    assert skeleton.spec[0].flux.shape == (5, 10)
+
+    # the headers and the ASDF tree describe the full arrays, all zeros
+    with fits.open(TMP_FITS) as hdulist:
+        assert hdulist['FLUX', 2].header['NAXIS2'] == 5
+        assert not hdulist['DQ', 1].data.any()
+        with fits_embed.AsdfInFits.open(hdulist) as ff:
+            assert ff.tree['spec'][1]['flux'].shape == (5, 10)
+            assert ff.tree['spec'][0]['dq'].shape == (5, 10)
+
+    for start in range(0, 5, 2):
+        for index, spec in enumerate(columnar.spec):
+            writer.write(index, start,
+                         {name: getattr(spec, name)[start:start + 2]
+                          for name in COLUMNS})
+
+    with open_model(TMP_FITS) as result:
+        assert isinstance(result, MultiIntSpecModel)
+        assert result.meta.instrument.name == 'NIRISS'
+        for spec, expected in zip(result.spec, columnar.spec):
+            assert spec.spectral_order == expected.spectral_order
+            assert_allclose(spec.spec_times['mid_utc'],
+                            expected.spec_times['mid_utc'])
+            for name in COLUMNS:
+                assert np.array_equal(getattr(spec, name),
+                                      getattr(expected, name))
+        assert result.spec[0].dq[3, 4] == 2**31 + 7
+
+
+def test_multiintspec_different_lengths():
+    ms = _multispec(nints=2, orders=[1])
+    ms.spec[1].spec_table = ms.spec[1].spec_table[:5]
+    with pytest.raises(ValueError):
+        MultiIntSpecModel(ms)
+
@@ -10,6 +10,7 @@ from .. import datamodels
 from ..datamodels import dqflags
 from .. assign_wcs import niriss        # for specifying spectral order number
 from .. transforms import models as trmodels
+from .. lib import parallel_utils
 from .. lib import pipe_utils
 from . import extract1d
 from . import ifu
@@ -1134,12 +1135,78 @@ class ExtractBase:
         self.bkg_order = 0
         self.nod_correction = 0.
         self.wcs = None
+        # WCS coordinates evaluated by evaluate_wcs, keyed by the pixel
+        # coordinates, so that they are computed only once when the same
+        # extraction is done for each integration of a cube.
+        self._wcs_coords = {}
 
 
     def update_extraction_limits(self, ap):
         pass
 
 
+    def evaluate_wcs(self, x_array, y_array, verbose):
+        """Evaluate the WCS along the spectral trace.
+
+        Parameters
+        ----------
+        x_array, y_array : ndarray, 1-D
+            Pixel coordinates along the spectral trace.
+
+        verbose : bool
+            If True, log messages.
+
+        Returns
+        -------
+        ra, dec, wcs_wl : ndarray, 1-D
+            Right ascension, declination and wavelength at each pixel.
+            The arrays are computed only once for given pixel coordinates,
+            and copies are returned.
+        """
+
+        key = (x_array.tobytes(), y_array.tobytes())
+        if key not in self._wcs_coords:
+            nelem = len(x_array)
+            if self.exp_type in WFSS_EXPTYPES:
+                # We expect two (x and y) or three (x, y, spectral order).
+                n_inputs = self.wcs.forward_transform.n_inputs
+                ra = np.zeros(nelem, dtype=np.float64)
+                dec = np.zeros(nelem, dtype=np.float64)
+                # Temporary variable so as not to clobber `wavelength`.
+                wcs_wl = np.zeros(nelem, dtype=np.float64)
+                transform = self.wcs.forward_transform
+                if n_inputs == 2:
+                    for i in range(nelem):
+                        ra[i], dec[i], wcs_wl[i], _ = transform(
+                                        x_array[i], y_array[i])
+                elif n_inputs == 3:
+                    for i in range(nelem):
+                        ra[i], dec[i], wcs_wl[i], _ = transform(
+                                x_array[i], y_array[i], self.spectral_order)
+                else:
+                    if verbose:
+                        log.warning("n_inputs for wcs function is %d",
+                                    n_inputs)
+                        log.warning("WCS function was expected to take "
+                                    "either 2 or 3 arguments.")
+                    ra[:] = -999.
+                    dec[:] = -999.
+                    wcs_wl[:] = -999.
+            else:
+                """
+                See issue #1781
+                if self.instrument_name == "NIRSPEC":
+                    # xxx temporary:  NIRSpec wcs is one-based.
+                    ra, dec, wcs_wl = self.wcs(x_array + 1., y_array + 1.)
+                else:
+                    ra, dec, wcs_wl = self.wcs(x_array, y_array)
+                """
+                ra, dec, wcs_wl = self.wcs(x_array, y_array)
+            self._wcs_coords[key] = (ra, dec, wcs_wl)
+
+        return tuple(a.copy() for a in self._wcs_coords[key])
+
+
     def assign_polynomial_limits(self, verbose):
         pass
 
@@ -1844,34 +1911,7 @@ class ExtractModel(ExtractBase):
         if self.wcs is not None:
             if verbose and not got_wavelength:
                 log.debug("Wavelengths are from the wcs function.")
-            nelem = slice1 - slice0
-            if self.exp_type in WFSS_EXPTYPES:
-                # We expect two (x and y) or three (x, y, spectral order).
-                n_inputs = self.wcs.forward_transform.n_inputs
-                ra = np.zeros(nelem, dtype=np.float64)
-                dec = np.zeros(nelem, dtype=np.float64)
-                # Temporary variable so as not to clobber `wavelength`.
-                wcs_wl = np.zeros(nelem, dtype=np.float64)
-                transform = self.wcs.forward_transform
-                if n_inputs == 2:
-                    for i in range(nelem):
-                        ra[i], dec[i], wcs_wl[i], _ = transform(
-                                        x_array[i], y_array[i])
-                elif n_inputs == 3:
-                    for i in range(nelem):
-                        ra[i], dec[i], wcs_wl[i], _ = transform(
-                                x_array[i], y_array[i], self.spectral_order)
-                else:
-                    if verbose:
-                        log.warning("n_inputs for wcs function is %d",
-                                    n_inputs)
-                        log.warning("WCS function was expected to take "
-                                    "either 2 or 3 arguments.")
-                    ra[:] = -999.
-                    dec[:] = -999.
-                    wcs_wl[:] = -999.
-            else:
-                ra, dec, wcs_wl = self.wcs(x_array, y_array)
+            ra, dec, wcs_wl = self.evaluate_wcs(x_array, y_array, verbose)
             # We need one right ascension and one declination, representing
             # the direction of pointing.
             mask = np.isnan(ra)
@@ -2015,6 +2055,8 @@ class ImageExtractModel(ExtractBase):
         # ref_model contains one or more images; ref_image is the one that
         # matches the current configuration (slit name and spectral order).
         self.ref_image = ref_image
+        # Source and background masks for each shape of science data
+        self._masks = {}
         self.spectral_order = spectral_order
         self.dispaxis = dispaxis
         self.nod_correction = nod_correction
@@ -2147,8 +2189,14 @@ class ImageExtractModel(ExtractBase):
         """
 
         shape = data.shape
-        # Truncate or expand reference image to match the science data.
-        ref = self.match_shape(shape)
+        if shape not in self._masks:
+            # Truncate or expand reference image to match the science data.
+            ref = self.match_shape(shape)
+            # The values of these arrays will be just 0 or 1.  If ref did
+            # not define any background pixels, however, mask_bkg will be
+            # None.
+            self._masks[shape] = self.separate_target_and_background(ref)
+        (mask_target, mask_bkg) = self._masks[shape]
 
         # This is the axis along which to add up the data.
         if self.dispaxis == HORIZONTAL:
@@ -2156,10 +2204,6 @@ class ImageExtractModel(ExtractBase):
         else:
             axis = 1
 
-        # The values of these arrays will be just 0 or 1.  If ref did not
-        # define any background pixels, however, mask_bkg will be None.
-        (mask_target, mask_bkg) = self.separate_target_and_background(ref)
-
         # This is the number of pixels in the cross-dispersion direction,
         # in the target extraction region.
         n_target = mask_target.sum(axis=axis, dtype=np.float)
@@ -2259,46 +2303,10 @@ class ImageExtractModel(ExtractBase):
             indy = np.where(indy >= shape[0], shape[0] - 1, indy)
             wavelength = wl_array[indy, indx]
 
-        nelem = len(x_array)
-
         if self.wcs is not None:
             if verbose and not got_wavelength:
                 log.debug("Wavelengths are from the wcs function.")
-            if self.exp_type in WFSS_EXPTYPES:
-                # We expect two (x and y) or three (x, y, spectral order).
-                n_inputs = self.wcs.forward_transform.n_inputs
-                ra = np.zeros(nelem, dtype=np.float)
-                dec = np.zeros(nelem, dtype=np.float)
-                # Temporary variable so as not to clobber `wavelength`.
-                wcs_wl = np.zeros(nelem, dtype=np.float)
-                transform = self.wcs.forward_transform
-                if n_inputs == 2:
-                    for i in range(nelem):
-                        ra[i], dec[i], wcs_wl[i], _ = transform(
-                                        x_array[i], y_array[i])
-                elif n_inputs == 3:
-                    for i in range(nelem):
-                        ra[i], dec[i], wcs_wl[i], _ = transform(
-                                x_array[i], y_array[i], self.spectral_order)
-                else:
-                    if verbose:
-                        log.warning("n_inputs for wcs function is %d",
-                                    n_inputs)
-                        log.warning("WCS function was expected to take "
-                                    "either 2 or 3 arguments.")
-                    ra[:] = -999.
-                    dec[:] = -999.
-                    wcs_wl[:] = -999.
-            else:
-                """
-                See issue #1781
-                if self.instrument_name == "NIRSPEC":
-                    # xxx temporary:  NIRSpec wcs is one-based.
-                    ra, dec, wcs_wl = self.wcs(x_array + 1., y_array + 1.)
-                else:
-                    ra, dec, wcs_wl = self.wcs(x_array, y_array)
-                """
-                ra, dec, wcs_wl = self.wcs(x_array, y_array)
+            ra, dec, wcs_wl = self.evaluate_wcs(x_array, y_array, verbose)
             # We need one right ascension and one declination, representing
             # the direction of pointing.
             middle = ra.shape[0] // 2           # ra and dec have same shape
@@ -2509,7 +2517,8 @@ def interpolate_response(wavelength, relsens, verbose):
 
 
 def run_extract1d(input_model, refname, smoothing_length, bkg_order,
-                  log_increment, subtract_background):
+                  log_increment, subtract_background,
+                  nproc=1):
     """Extract 1-D spectra.
 
     This just reads the reference file (if any) and calls do_extract1d.
@@ -2541,6 +2550,10 @@ def run_extract1d(input_model, refname, smoothing_length, bkg_order,
         If not None, this parameter overrides the value in the
         extract_1d reference file.
 
+    nproc : int
+        Number of processes used to extract the slits of a MultiSlitModel
+        or MultiProductModel.
+
     Returns
     -------
     output_model : data model
@@ -2560,7 +2573,8 @@ def run_extract1d(input_model, refname, smoothing_length, bkg_order,
 
     output_model = do_extract1d(input_model, ref_dict,
                                 smoothing_length, bkg_order,
-                                log_increment, subtract_background)
+                                log_increment, subtract_background,
+                                nproc)
 
     return output_model
 
@@ -2601,7 +2615,8 @@ def ref_dict_sanity_check(ref_dict):
 
 
 def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
-                 log_increment, subtract_background):
+                 log_increment, subtract_background,
+                 nproc=1):
     """Extract 1-D spectra.
 
     Parameters
@@ -2631,6 +2646,10 @@ def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
         If not None, this parameter overrides the value in the
         extract_1d reference file.
 
+    nproc : int
+        Number of processes used to extract the slits of a MultiSlitModel
+        or MultiProductModel.
+
     Returns
     -------
     output_model : data model
@@ -2659,17 +2678,16 @@ def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
         else:                           # MultiProductModel
             slits = input_model.products
 
-        # Loop over the slits in the input model
-        for slit in slits:
+        def extract_slit(slit):
             log.info('Working on slit %s', slit.name)
             prev_offset = OFFSET_NOT_ASSIGNED_YET
             if np.size(slit.data) <= 0:
                 log.info('No data for slit %s, skipping ...', slit.name)
-                continue
+                return None
             sp_order = get_spectral_order(slit)
             if sp_order == 0 and not prism_mode:
                 log.info("Spectral order 0 is a direct image, skipping ...")
-                continue
+                return None
             extract_params = get_extract_parameters(
                                 ref_dict,
                                 slit, slit.name, sp_order,
@@ -2681,12 +2699,12 @@ def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
                 raise ValueError('Missing extraction parameters.')
             elif extract_params['match'] == PARTIAL:
                 log.info('Spectral order %d not found, skipping ...', sp_order)
-                continue
+                return None
             find_dispaxis(input_model, slit, sp_order, extract_params)
             if extract_params['dispaxis'] is None:
                 log.warning("The dispersion direction couldn't be determined, "
                             "so skipping ...")
-                continue
+                return None
 
             try:
                 (ra, dec, wavelength, net, background, npixels, dq,
@@ -2695,7 +2713,7 @@ def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
                                         prev_offset, True, extract_params)
             except InvalidSpectralOrderNumberError as e:
                 log.info(str(e) + ", skipping ...")
-                continue
+                return None
             got_relsens = True
             try:
                 relsens = slit.relsens
@@ -2720,6 +2738,18 @@ def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
                             dtype=spec_dtype)
             spec = datamodels.SpecModel(spec_table=otab)
             spec.meta.wcs = spec_wcs.create_spectral_wcs(ra, dec, wavelength)
+            spec.slit_ra = ra
+            spec.slit_dec = dec
+            spec.spectral_order = sp_order
+            copy_keyword_info(slit, slit.name, spec)
+            return spec
+
+        # The slits are independent; with several processes each one is
+        # extracted in a worker and the spectra are kept in slit order.  The
+        # column units are not serialized, so they are set here.
+        for spec in parallel_utils.map_ordered(extract_slit, slits, nproc):
+            if spec is None:
+                continue
             spec.spec_table.columns['wavelength'].unit = 'um'
             spec.spec_table.columns['flux'].unit = 'mJy'
             spec.spec_table.columns['error'].unit = 'mJy'
@@ -2727,28 +2757,11 @@ def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
             spec.spec_table.columns['nerror'].unit = 'DN/s'
             spec.spec_table.columns['background'].unit = 'DN/s'
             spec.spec_table.columns['berror'].unit = 'DN/s'
-            spec.slit_ra = ra
-            spec.slit_dec = dec
-            spec.spectral_order = sp_order
-            copy_keyword_info(slit, slit.name, spec)
             output_model.spec.append(spec)
     else:
-        slitname = input_model.meta.exposure.type
-        if slitname is None:
-            slitname = ANY
-        if slitname == 'NIS_SOSS':
-            slitname = input_model.meta.subarray.name
+        (slitname, spectral_order_list) = get_slitname_and_orders(input_model)
         log.debug('slitname=%s', slitname)
 
-        # Loop over these spectral order numbers.
-        if input_model.meta.exposure.type == "NIS_SOSS":
-            # This list of spectral order numbers may need to be assigned
-            # differently for other exposure types.
-            spectral_order_list = [1, 2, 3]
-        else:
-            # For this case, we'll call get_spectral_order to get the order.
-            spectral_order_list = ["not set yet"]
-
         if isinstance(input_model, (datamodels.ImageModel,
                                     datamodels.DrizProductModel)):
             prev_offset = OFFSET_NOT_ASSIGNED_YET
@@ -2831,51 +2844,14 @@ def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
         elif isinstance(input_model, (datamodels.CubeModel,
                                       datamodels.SlitModel)):
 
-            slit = DUMMY
-
-            # NRS_BRIGHTOBJ exposures are instances of SlitModel.
-            prev_offset = OFFSET_NOT_ASSIGNED_YET
-            for sp_order in spectral_order_list:
-                if sp_order == "not set yet":
-                    sp_order = get_spectral_order(input_model)
-                    if sp_order == 0 and not prism_mode:
-                        log.info("Spectral order 0 is a direct image, "
-                                 "skipping ...")
-                        continue
-
-                extract_params = get_extract_parameters(
-                                    ref_dict,
-                                    input_model, slitname, sp_order,
-                                    input_model.meta, smoothing_length,
-                                    bkg_order)
-                if subtract_background is not None:
-                    extract_params['subtract_background'] = subtract_background
-                if extract_params['match'] == NO_MATCH:
-                    log.critical('Missing extraction parameters.')
-                    raise ValueError('Missing extraction parameters.')
-                elif extract_params['match'] == PARTIAL:
-                    log.warning('Spectral order %d not found, skipping ...',
-                                sp_order)
-                    continue
-                find_dispaxis(input_model, slit, sp_order, extract_params)
-                if extract_params['dispaxis'] is None:
-                    log.warning("The dispersion direction couldn't be "
-                                "determined, so skipping ...")
-                    continue
-
-                got_relsens = True
-                try:
-                    relsens = input_model.relsens
-                except AttributeError:
-                    got_relsens = False
-                if got_relsens and len(relsens) == 0:
-                    got_relsens = False
-                if not got_relsens:
-                    log.warning("No relsens for input file, "
-                                "so can't compute flux.")
+            # The extraction geometry is the same for all integrations,
+            # so the extraction model of each order is only created once.
+            for (sp_order, extract_model, relsens) in setup_integrations(
+                                input_model, ref_dict, smoothing_length,
+                                bkg_order, subtract_background):
 
-                # Loop over each integration in the input model
                 verbose = True          # for just the first integration
+                # Loop over each integration in the input model
                 if input_model.data.shape[0] == 1:
                     log.info("Beginning loop, just 1 integration ...")
                 else:
@@ -2883,22 +2859,10 @@ def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
                              input_model.data.shape[0])
                 for integ in range(input_model.data.shape[0]):
                     # Extract spectrum
-                    try:
-                        (ra, dec, wavelength, net, background, npixels, dq,
-                         prev_offset) = extract_one_slit(
-                                        input_model, slit, integ,
-                                        prev_offset, verbose, extract_params)
-                    except InvalidSpectralOrderNumberError as e:
-                        log.info(str(e) + ", skipping ...")
-                        break
-                    if got_relsens:
-                        # reciprocal of the response
-                        rr_factor = interpolate_response(
-                                        wavelength, input_model.relsens,
-                                        verbose)
-                        flux = net * rr_factor
-                    else:
-                        flux = np.zeros_like(net)
+                    (ra, dec, wavelength, flux, net, background, npixels,
+                     dq) = extract_integration(input_model, integ,
+                                               extract_model, relsens,
+                                               verbose)
                     fl_error = np.ones_like(net)
                     nerror = np.ones_like(net)
                     berror = np.ones_like(net)
@@ -2980,16 +2944,276 @@ def do_extract1d(input_model, ref_dict, smoothing_length, bkg_order,
     return output_model
 
 
-def populate_time_keywords(input_model, output_model):
-    """Copy the integration times keywords to header keywords.
+def get_slitname_and_orders(input_model):
+    """Get the slit name and the spectral orders to extract.
+
+    Parameters
+    ----------
+    input_model : data model
+        The input science model, with a single spectrum for each spectral
+        order (i.e. not a MultiSlitModel).
+
+    Returns
+    -------
+    slitname : str
+        The slit name, or "ANY", or for NIRISS SOSS data the subarray name.
+
+    spectral_order_list : list
+        The spectral order numbers, or ["not set yet"] if the order is to
+        be found by calling `get_spectral_order`.
+    """
+
+    slitname = input_model.meta.exposure.type
+    if slitname is None:
+        slitname = ANY
+    if slitname == 'NIS_SOSS':
+        slitname = input_model.meta.subarray.name
+
+    # Loop over these spectral order numbers.
+    if input_model.meta.exposure.type == "NIS_SOSS":
+        # This list of spectral order numbers may need to be assigned
+        # differently for other exposure types.
+        spectral_order_list = [1, 2, 3]
+    else:
+        # For this case, we'll call get_spectral_order to get the order.
+        spectral_order_list = ["not set yet"]
+
+    return (slitname, spectral_order_list)
+
+
+def setup_integrations(input_model, ref_dict, smoothing_length, bkg_order,
+                       subtract_background):
+    """Create the extraction model of each spectral order of a cube.
+
+    Extended summary
+    ----------------
+    The extraction geometry is the same for all integrations of
+    multi-integration data, so one extraction model is created for each
+    spectral order, and `extract_integration` is called with it for each
+    integration.
+
+    Parameters
+    ----------
+    input_model : CubeModel or SlitModel
+        The input science model, with 3-D data.
+
+    ref_dict : dict or None
+        The contents of the reference file, see `do_extract1d`.
+
+    smoothing_length : int
+        Width of a boxcar function for smoothing the background regions.
+
+    bkg_order : int
+        Polynomial order for fitting to each column (or row, if the
+        dispersion is vertical) of background.
+
+    subtract_background : bool or None
+        User supplied flag indicating whether the background should be
+        subtracted, see `do_extract1d`.
+
+    Returns
+    -------
+    list of tuples
+        (sp_order, extract_model, relsens) for each spectral order that
+        can be extracted.  `relsens` is None if there is no response for
+        the input, so the flux can't be computed.
+    """
+
+    (slitname, spectral_order_list) = get_slitname_and_orders(input_model)
+    prism_mode = is_prism(input_model)
+    slit = DUMMY
+
+    orders = []
+    # NRS_BRIGHTOBJ exposures are instances of SlitModel.
+    prev_offset = OFFSET_NOT_ASSIGNED_YET
+    for sp_order in spectral_order_list:
+        if sp_order == "not set yet":
+            sp_order = get_spectral_order(input_model)
+            if sp_order == 0 and not prism_mode:
+                log.info("Spectral order 0 is a direct image, "
+                         "skipping ...")
+                continue
+
+        extract_params = get_extract_parameters(
+                            ref_dict,
+                            input_model, slitname, sp_order,
+                            input_model.meta, smoothing_length,
+                            bkg_order)
+        if subtract_background is not None:
+            extract_params['subtract_background'] = subtract_background
+        if extract_params['match'] == NO_MATCH:
+            log.critical('Missing extraction parameters.')
+            raise ValueError('Missing extraction parameters.')
+        elif extract_params['match'] == PARTIAL:
+            log.warning('Spectral order %d not found, skipping ...',
+                        sp_order)
+            continue
+        find_dispaxis(input_model, slit, sp_order, extract_params)
+        if extract_params['dispaxis'] is None:
+            log.warning("The dispersion direction couldn't be "
+                        "determined, so skipping ...")
+            continue
+
+        try:
+            relsens = input_model.relsens
+        except AttributeError:
+            relsens = None
+        if relsens is not None and len(relsens) == 0:
+            relsens = None
+        if relsens is None:
+            log.warning("No relsens for input file, "
+                        "so can't compute flux.")
+
+        try:
+            (extract_model, prev_offset) = setup_extraction(
+                                input_model, slit,
+                                input_model.data.shape[-2:],
+                                prev_offset, True, extract_params)
+        except InvalidSpectralOrderNumberError as e:
+            log.info(str(e) + ", skipping ...")
+            continue
+        orders.append((sp_order, extract_model, relsens))
+
+    return orders
+
+
+def extract_integration(input_model, integ, extract_model, relsens,
+                        verbose):
+    """Extract the spectrum of one integration.
+
+    Parameters
+    ----------
+    input_model : CubeModel or SlitModel
+        The input science model, with 3-D data.
+
+    integ : int
+        The integration number (zero indexed).
+
+    extract_model : ExtractModel or ImageExtractModel
+        The extraction model, from `setup_integrations`.
+
+    relsens : table or None
+        The response of the input, or None if the flux can't be computed.
+
+    verbose : bool
+        If True, log more info.
+
+    Returns
+    -------
+    tuple
+        ra, dec, wavelength, flux, net, background, npixels, dq.  The
+        flux is zero if `relsens` is None.
+    """
+
+    input_dq = input_model.dq[integ] if hasattr(input_model, 'dq') else None
+    data = replace_bad_values(input_model.data[integ], input_dq, fill=0.)
+    try:
+        wl_array = input_model.wavelength
+    except AttributeError:
+        wl_array = None
+
+    (ra, dec, wavelength, net, background, npixels, dq) = \
+                extract_model.extract(data, wl_array, verbose)
+    if relsens is not None:
+        # reciprocal of the response
+        rr_factor = interpolate_response(wavelength, relsens, verbose)
+        flux = net * rr_factor
+    else:
+        flux = np.zeros_like(net)
+
+    return (ra, dec, wavelength, flux, net, background, npixels, dq)
+
+
+def extract_chunks(input_model, ref_dict, smoothing_length, bkg_order,
+                   subtract_background, chunk_size):
+    """Extract the spectra of multi-integration data, chunk by chunk.
+
+    Extended summary
+    ----------------
+    Instead of one `SpecModel` for each integration and spectral order, as
+    returned by `do_extract1d`, the spectra of a chunk of integrations are
+    returned as 2-D arrays with one row for each integration.  The
+    extraction geometry is set up once (see `setup_integrations`), and only
+    the spectra of one chunk are held in memory at a time.
+
+    Parameters
+    ----------
+    input_model : CubeModel or SlitModel
+        The input science model, with 3-D data.
+
+    ref_dict : dict or None
+        The contents of the reference file, see `do_extract1d`.
+
+    smoothing_length : int
+        Width of a boxcar function for smoothing the background regions.
+
+    bkg_order : int
+        Polynomial order for fitting to each column (or row, if the
+        dispersion is vertical) of background.
+
+    subtract_background : bool or None
+        User supplied flag indicating whether the background should be
+        subtracted, see `do_extract1d`.
+
+    chunk_size : int
+        Number of integrations extracted at a time.
+
+    Yields
+    ------
+    start : int
+        Index of the first integration of the chunk (zero indexed).
+
+    spectra : list of tuples
+        (sp_order, ra, dec, columns) for each spectral order.  `columns`
+        is a dict of the columns of the spectrum table of a `SpecModel`,
+        in lower case ('wavelength', 'flux', ...), as arrays with one row
+        for each integration of the chunk.
+    """
+
+    ref_dict = ref_dict_sanity_check(ref_dict)
+    orders = setup_integrations(input_model, ref_dict, smoothing_length,
+                                bkg_order, subtract_background)
+    nints = input_model.data.shape[0]
+    names = ('wavelength', 'flux', 'net', 'background', 'npixels', 'dq')
+
+    verbose = True              # for just the first integration
+    for start in range(0, nints, chunk_size):
+        stop = min(start + chunk_size, nints)
+        spectra = []
+        for (sp_order, extract_model, relsens) in orders:
+            rows = [extract_integration(input_model, integ, extract_model,
+                                        relsens, verbose)
+                    for integ in range(start, stop)]
+            (ra, dec) = rows[0][:2]
+            columns = {name: np.array([row[k + 2] for row in rows])
+                       for (k, name) in enumerate(names)}
+            columns['error'] = np.ones_like(columns['net'])
+            columns['nerror'] = np.ones_like(columns['net'])
+            columns['berror'] = np.ones_like(columns['net'])
+            spectra.append((sp_order, ra, dec, columns))
+        verbose = False
+        log.info("... %d integrations done", stop)
+
+        yield (start, spectra)
+
+    # If the reference file is an image, explicitly close it.
+    if ref_dict is not None and 'ref_model' in ref_dict:
+        ref_dict['ref_model'].close()
+
+
+def int_times_offset(input_model):
+    """Find the rows of the INT_TIMES table for the integrations of the data.
 
     Parameters
     ----------
     input_model : data model
         The input science model.
 
-    output_model : data model
-        The output science model.  This may be modified in-place.
+    Returns
+    -------
+    int or None
+        The row of the INT_TIMES table for the first integration of the
+        data, or None if the table can't be used for these data.
     """
 
     nints = input_model.meta.exposure.nints
@@ -3014,7 +3238,7 @@ def populate_time_keywords(input_model, output_model):
         nrows = 0
     if nrows < 1:
         log.warning("There is no INT_TIMES table in the input file.")
-        return
+        return None
 
     # If we have a single plane (e.g. ImageModel or MultiSlitModel),
     # we will only populate the keywords if the corresponding uncal file
@@ -3051,15 +3275,9 @@ def populate_time_keywords(input_model, output_model):
         skip = True
 
     if skip:
-        return
+        return None
 
     int_num = input_model.int_times['integration_number']
-    start_utc = input_model.int_times['int_start_MJD_UTC']
-    mid_utc = input_model.int_times['int_mid_MJD_UTC']
-    end_utc = input_model.int_times['int_end_MJD_UTC']
-    start_tdb = input_model.int_times['int_start_BJD_TDB']
-    mid_tdb = input_model.int_times['int_mid_BJD_TDB']
-    end_tdb = input_model.int_times['int_end_BJD_TDB']
 
     # Inclusive range of integration numbers in the input data,
     # zero indexed.
@@ -3071,10 +3289,68 @@ def populate_time_keywords(input_model, output_model):
     if data_range[0] < table_range[0] or data_range[1] > table_range[1]:
         log.warning("Not using the INT_TIMES table because it does not "
                     "include rows for all integrations in the data.")
-        return
+        return None
 
     log.debug("TSO data, so copying times from the INT_TIMES table.")
 
+    return offset
+
+
+def integration_times(input_model):
+    """Get the integration numbers and times of multi-integration data.
+
+    Parameters
+    ----------
+    input_model : CubeModel or SlitModel
+        The input science model, with 3-D data.
+
+    Returns
+    -------
+    dict or None
+        Arrays 'int_num', 'start_utc', 'mid_utc', 'end_utc', 'start_tdb',
+        'mid_tdb' and 'end_tdb', with one element for each integration, or
+        None if the INT_TIMES table can't be used for these data.
+    """
+
+    offset = int_times_offset(input_model)
+    if offset is None:
+        return None
+
+    rows = slice(offset, offset + input_model.data.shape[0])
+    int_times = input_model.int_times
+    return {'int_num': int_times['integration_number'][rows],
+            'start_utc': int_times['int_start_MJD_UTC'][rows],
+            'mid_utc': int_times['int_mid_MJD_UTC'][rows],
+            'end_utc': int_times['int_end_MJD_UTC'][rows],
+            'start_tdb': int_times['int_start_BJD_TDB'][rows],
+            'mid_tdb': int_times['int_mid_BJD_TDB'][rows],
+            'end_tdb': int_times['int_end_BJD_TDB'][rows]}
+
+
+def populate_time_keywords(input_model, output_model):
+    """Copy the integration times keywords to header keywords.
+
+    Parameters
+    ----------
+    input_model : data model
+        The input science model.
+
+    output_model : data model
+        The output science model.  This may be modified in-place.
+    """
+
+    offset = int_times_offset(input_model)
+    if offset is None:
+        return
+
+    int_num = input_model.int_times['integration_number']
+    start_utc = input_model.int_times['int_start_MJD_UTC']
+    mid_utc = input_model.int_times['int_mid_MJD_UTC']
+    end_utc = input_model.int_times['int_end_MJD_UTC']
+    start_tdb = input_model.int_times['int_start_BJD_TDB']
+    mid_tdb = input_model.int_times['int_mid_BJD_TDB']
+    end_tdb = input_model.int_times['int_end_BJD_TDB']
+
     if hasattr(input_model, 'data'):
         shape = input_model.data.shape
         if len(shape) == 2:
@@ -3299,9 +3575,6 @@ def extract_one_slit(input_model, slit, integ,
         copied from the input `prev_offset`.
     """
 
-    if verbose:
-        log_initial_parameters(extract_params)
-
     input_dq = None                             # possibly replaced below
     if integ > -1:
         data = input_model.data[integ]
@@ -3330,6 +3603,61 @@ def extract_one_slit(input_model, slit, integ,
 
     data = replace_bad_values(data, input_dq, fill=0.)
 
+    (extract_model, offset) = setup_extraction(input_model, slit, data.shape,
+                                               prev_offset, verbose,
+                                               extract_params)
+    (ra, dec, wavelength, net, background, npixels, dq) = \
+                extract_model.extract(data, wl_array, verbose)
+
+    return (ra, dec, wavelength, net, background, npixels, dq, offset)
+
+
+def setup_extraction(input_model, slit, shape,
+                     prev_offset, verbose, extract_params):
+    """Create the extraction model for one slit, or spectral order.
+
+    Extended summary
+    ----------------
+    The extraction model holds the extraction geometry (limits, nod/dither
+    offset and polynomial functions).  It does not depend on the data
+    values, so for multi-integration data it can be created once and its
+    `extract` method called for each integration.
+
+    Parameters
+    ----------
+    input_model : data model
+        The input science model.
+
+    slit : one slit from a MultiSlitModel (or similar), or "dummy"
+        See `extract_one_slit`.
+
+    shape : tuple
+        The shape of the 2-D data array from which spectra will be
+        extracted.
+
+    prev_offset : float or str
+        See `extract_one_slit`.
+
+    verbose : boolean
+        If True, log more info (extraction parameters, for example).
+
+    extract_params : dict
+        Parameters read from the reference file.
+
+    Returns
+    -------
+    extract_model : ExtractModel or ImageExtractModel
+        The extraction model, ready for calling its `extract` method.
+
+    offset : float
+       The nod/dither offset in the cross-dispersion direction, either
+        computed by calling `offset_from_offset` in this function, or
+        copied from the input `prev_offset`.
+    """
+
+    if verbose:
+        log_initial_parameters(extract_params)
+
     if extract_params['ref_file_type'] == FILE_TYPE_IMAGE:
         # The reference file is an image.
         extract_model = ImageExtractModel(input_model, slit, verbose, **extract_params)
@@ -3338,7 +3666,7 @@ def extract_one_slit(input_model, slit, integ,
         # If there is a reference file (there doesn't have to be), it's in
         # JSON format.
         extract_model = ExtractModel(input_model, slit, verbose, **extract_params)
-        ap = get_aperture(data.shape, extract_model.wcs,
+        ap = get_aperture(shape, extract_model.wcs,
                           verbose, extract_params)
         extract_model.update_extraction_limits(ap)
 
@@ -3362,10 +3690,8 @@ def extract_one_slit(input_model, slit, integ,
         extract_model.log_extraction_parameters()
 
     extract_model.assign_polynomial_limits(verbose)
-    (ra, dec, wavelength, net, background, npixels, dq) = \
-                extract_model.extract(data, wl_array, verbose)
 
-    return (ra, dec, wavelength, net, background, npixels, dq, offset)
+    return (extract_model, offset)
 
 
 def replace_bad_values(data, input_dq, fill=0.):
@@ -7,12 +7,9 @@
 
 # STDLIB
 import logging
-import math
-import copy
 
 # THIRD PARTY
 import numpy as np
-from astropy.modeling import models, fitting
 
 __all__ = ['extract1d']
 __taskname__ = 'extract1d'
@@ -194,54 +191,44 @@ def extract1d(image, lambdas, disp_range,
     ##         Perform spectral extraction:        ##
     #################################################
 
-    bkg_model = None
-
-    countrate = np.zeros(nl, dtype=np.float64)
-    background = np.zeros(nl, dtype=np.float64)
-    npixels = np.zeros(nl, dtype=np.float64)
-    # x is an index (column number) within `image`, while j is an index in
+    # The source and background extraction regions are converted to
+    # fractional-pixel aperture weights for all columns at once, the
+    # background polynomials are fitted to all columns as one batched
+    # least-squares problem, and the source is extracted from all columns
+    # with array operations.
+    # x0:x1 is the range of columns within `image`, while index j in
     # lambdas, countrate, background, npixels, and the arrays in
-    # srclim and bkglim.
-    x = disp_range[0]
-    for j in range(nl):
-        lam = lambdas[j]
-
-        if nbkglim > 0:
-
-            # Compute a polynomial fit to the background for the current
-            # column, using the (optionally) smoothed background.
-            bkg_model, bkg_npts = _fit_background_model(
-                temp_image, x, j, bkglim, bkg_order
-            )
-
-            if bkg_npts == 0:
-                bkg_model = None
-                log.warning("Not enough valid pixels to determine background "
-                             "for lambda={} (column {:d})".format(lam, x))
-
-            elif len(bkg_model) < bkg_order:
-                log.warning("Not enough valid pixels to determine background "
-                             "with the required order for lambda={} "
-                             "(column {:d}).\n"
-                             "Lowering background order to {:d}"
-                             .format(lam, x, len(bkg_model)))
-
-        # Extract the source, and optionally subtract background using the
-        # polynomial fit to the background for this column.  Even if
-        # background smoothing was done, we must extract the source from
-        # the original, unsmoothed image.
-        # source total flux, background total flux, area, total weight
-        (total_flux, bkg_flux, tarea, twht) = _extract_src_flux(
-            image, x, j, lam, srclim,
-            weights=weights, bkgmodel=bkg_model
+    # srclim and bkglim corresponds to column x0 + j.
+    x0 = disp_range[0]
+    x1 = x0 + nl
+    nrows = shape[0]
+
+    bkg_coeff = None
+    if nbkglim > 0:
+        bkg_wht, bkg_wht2, bkg_count = _aperture_weights(bkglim, nrows)
+        bkg_coeff, bkg_npts = _fit_background_batch(
+            temp_image[:, x0:x1], np.sqrt(bkg_wht2), bkg_count, bkg_order
         )
-        countrate[j] = total_flux
-        npixels[j] = tarea
-        if nbkglim > 0:
-            background[j] = bkg_flux
-
-        x += 1
-        continue
+        for j in np.nonzero(bkg_npts == 0)[0]:
+            log.warning("Not enough valid pixels to determine background "
+                        "for lambda={} (column {:d})".format(lambdas[j],
+                                                             x0 + j))
+        for j in np.nonzero((bkg_npts > 0) & (bkg_npts <= bkg_order))[0]:
+            log.warning("Not enough valid pixels to determine background "
+                        "with the required order for lambda={} "
+                        "(column {:d}).\n"
+                        "Lowering background order to {:d}"
+                        .format(lambdas[j], x0 + j, bkg_npts[j] - 1))
+
+    # Extract the source, and optionally subtract background using the
+    # polynomial fit to the background for each column.  Even if
+    # background smoothing was done, we must extract the source from
+    # the original, unsmoothed image.
+    src_wht, src_wht2, src_count = _aperture_weights(srclim, nrows)
+    (countrate, background, npixels) = _extract_src_flux_batch(
+        image[:, x0:x1], lambdas, src_wht, src_count,
+        weights=weights, bkg_coeff=bkg_coeff
+    )
 
     return (countrate, background, npixels)
 
@@ -281,348 +268,265 @@ def bxcar(image, smoothing_length):
     return temp_im[..., half:half + width].astype(image.dtype)
 
 
-def _extract_src_flux(image, x, j, lam, srclim,
-                      weights, bkgmodel):
-    """Subtract the background and extract the source.
+def _aperture_weights(limits, nrows):
+    """Compute the fractional-pixel weights of extraction regions.
 
     Parameters:
     -----------
-    image : 2-D ndarray
-        The input data array.
-
-    x : int
-        This is an index (column number) within `image`.
-
-    j : int
-        This is an index starting with 0 at the first pixel of the
-        extracted spectrum.  See `disp_range` in function `extract1d`.
-        j = 0 when x = disp_range[0].
-
-    lam : float
-
-    srclim : list of lists of ndarrays
-        For each i, srclim[i] is a two-element list.  Those two elements
-        are arrays of the lower and upper limits of one of the extraction
-        regions.  Of course, there may only be one extraction region.
-
-    weights : function or None
-        If not None, this function gives the weights for pixels within
-        an extraction region.
+    limits : list of lists of ndarrays
+        For each i, limits[i] is a two-element list.  Those two elements
+        are 1-D arrays of the lower and upper limits of one of the source
+        or background extraction regions, for every column.
 
-    bkgmodel : function
+    nrows : int
+        Number of pixels in the cross-dispersion direction.
 
     Returns:
     --------
-    total_flux : float or NaN
-        Sum of counts within the source extraction region for the current
-        column.  This will be NaN if there is no data in the source
-        extraction region for the current column.
-
-    bkg_flux : float
-        Sum of counts within the background extraction regions for the
-        current column.
-
-    tarea : float
-        The sum of the number of pixels in the source extraction region for
-        the current column.  If only a fraction of a pixel is included at
-        an endpoint, that fraction is what would be included in the sum.
-        For example, if the source limits (in `srclim`) are (3, 7), then
-        the extraction region extends from the middle of pixel 3 to the
-        middle of pixel 7, so the pixel areas in the extraction region
-        would be:  0.5, 1.0, 1.0, 1.0, 0.5, resulting in `tarea` = 4.
-
-    twht : float
-        Two different weights are applied to the pixels.  One is the
-        fraction of a pixel that is included in the extraction (this will
-        be 1.0 except possibly at the endpoints); see also `tarea`.  The
-        other weight depends on the `weights` argument.  If `weights` is
-        None, then this weight will be 1.0 for each pixel, and `twht` will
-        be the sum of these values.  If the source limits are (3, 7) as in
-        the example for `tarea`, `twht` would be 5.0.
+    wht : ndarray, 2-D, float64
+        For each pixel (row, column), the fraction of the pixel that is
+        within the union of the extraction regions.  The lower and upper
+        limits are clipped to the image, and the pixels from the one
+        containing the lower limit to the one containing the upper limit
+        are extracted.
+
+    wht2 : ndarray, 2-D, float64
+        Sum of the squares of the weights of the pixel.  This differs from
+        ``wht**2`` for pixels extracted more than once.
+
+    count : ndarray, 2-D, int
+        Number of times each pixel is extracted for the column: overlapping
+        intervals are merged first, and a pixel shared by two intervals is
+        extracted twice.  This can include pixels with zero weight, if a
+        limit is at a pixel edge.
     """
+    ncols = len(limits[0][0])
+    wht = np.zeros((nrows, ncols), dtype=np.float64)
+    wht2 = np.zeros((nrows, ncols), dtype=np.float64)
+    count = np.zeros((nrows, ncols), dtype=int)
+
+    # sort each segment, then sort the segments of each column in the
+    # increasing order of lower limit
+    lower = np.array([lim[0] for lim in limits], dtype=np.float64)
+    upper = np.array([lim[1] for lim in limits], dtype=np.float64)
+    lower, upper = np.minimum(lower, upper), np.maximum(lower, upper)
+    order = np.argsort(lower, axis=0, kind='mergesort')
+    icol = np.arange(ncols)
+    lower = lower[order, icol]
+    upper = upper[order, icol]
+
+    # coalesce overlapping intervals, column by column
+    y = np.arange(nrows, dtype=np.float64)[:, np.newaxis]
+    current_lower = lower[0].copy()
+    current_upper = upper[0].copy()
+    for k in range(1, len(limits)):
+        merge = lower[k] <= current_upper
+        _add_interval(wht, wht2, count, y, current_lower, current_upper,
+                      ~merge)
+        current_lower = np.where(merge, current_lower, lower[k])
+        current_upper = np.where(merge,
+                                 np.maximum(current_upper, upper[k]),
+                                 upper[k])
+    _add_interval(wht, wht2, count, y, current_lower, current_upper,
+                  np.ones(ncols, dtype=bool))
+
+    return (wht, wht2, count)
+
+
+def _add_interval(wht, wht2, count, y, lower, upper, use):
+    """Add one interval per column to aperture weights.
 
-    # extract pixel values along the column that are within
-    # source limits:
-    y, val, area = _extract_colpix(image, x, j, srclim)
-
-    # find indices of "good" (finite) values:
-    good = np.isfinite(val)
-    npts = good.sum()
-
-    if npts == 0:
-        return (np.nan, 0.0, 0.0, 0.0) # src total flux, bkg, area, total weight
-
-    # filter-out bad values:
-    #TODO: in the future we may need to develop a way of interpolating
-    #      over missing values either from a model or from adjacent columns
-    val = val[good]
-    area = area[good]
-    y = y[good]
-    if bkgmodel is None:
-        bkg = np.zeros_like(val, dtype=np.float64)
-    else:
-        bkg = bkgmodel(y)
+    Parameters:
+    -----------
+    wht, wht2, count : ndarray, 2-D
+        Weights, sums of squared weights and number of times pixels are
+        extracted, updated in place.  See `_aperture_weights`.
 
-    # subtract background:
-    val -= bkg
+    y : ndarray, 2-D
+        Pixel coordinates of the rows, shape (nrows, 1).
 
-    # brightness -> flux:
-    val *= area
-    bkg *= area
+    lower, upper : ndarray, 1-D
+        Lower and upper limits of the interval for each column.
 
-    # compute weights:
-    if weights is None:
-        wht = np.ones_like(y, dtype=np.float64)
-    else:
-        wht = weights(lam, y)
+    use : ndarray, 1-D, bool
+        The interval is only added for the columns where this is True.
+    """
+    ns = wht.shape[0] - 1
+    ns12 = ns + 0.5
+
+    i1 = np.clip(lower, -0.5, ns12)
+    i2 = np.clip(upper, -0.5, ns12)
+    ii1 = np.clip(np.floor(i1 + 0.5), 0, ns)
+    ii2 = np.minimum(ns, np.floor(i2 + 0.5))
 
-    # compute weighted total flux
-    # NOTE: the correct formulae must be derived depending on
-    #       final interpretation of weights [not available at
-    #       initial release v0.0.1]
-    tarea = area.sum(dtype=np.float64)
-    twht = wht.sum(dtype=np.float64)
-    mwht = twht / wht.shape[0]
-    total_flux = (val * wht).sum(dtype=np.float64) / mwht
-    bkg_flux = bkg.sum(dtype=np.float64)
+    # fraction of each pixel [y - 0.5, y + 0.5] within [i1, i2]
+    overlap = (np.minimum(i2, y + 0.5) - np.maximum(i1, y - 0.5))
+    inside = use & (y >= ii1) & (y <= ii2)
+    overlap = np.where(inside, np.clip(overlap, 0., 1.), 0.)
+    wht += overlap
+    wht2 += overlap * overlap
+    count += inside
 
-    return (total_flux, bkg_flux, tarea, twht)
 
+def _fit_background_batch(image, wht, count, bkg_order,
+                          max_size=4000000):
+    """Fit polynomials to the background of all columns.
 
-def _fit_background_model(image, x, j, bkglim, bkg_order):
-    """Extract background pixels and fit a polynomial.
+    For each column, this is a weighted linear least-squares fit of a
+    polynomial of order ``min(bkg_order, npts - 1)`` to the good (finite)
+    pixels of the background regions.  Columns with the same order are
+    solved together.
 
     Parameters:
     -----------
     image : 2-D ndarray
-        The input data array.
-
-    x : int
-        This is an index (column number) within `image`.
+        The (optionally smoothed) data, for the extracted columns.
 
-    j : int
-        This is an index starting with 0 at the first pixel of the
-        extracted spectrum.  See `disp_range` in function `extract1d`.
-        j = 0 when x = disp_range[0].
+    wht : ndarray, 2-D
+        Weights of the pixels of the background regions in the fit (the
+        square root of ``wht2`` from `_aperture_weights`).
 
-    bkglim : list of lists of arrays
-        For each i, bkglim[i] is a two-element list.  Those two elements
-        are arrays of the lower and upper limits of one of the background
-        extraction regions.
+    count : ndarray, 2-D
+        Number of times the pixels are extracted.  See `_aperture_weights`.
 
     bkg_order : int
-        Polynomial order for fitting to the background regions of the
-        current column.
+        Polynomial order for fitting to the background regions.
+
+    max_size : int
+        Maximum number of elements of the design matrices solved at once.
 
     Returns:
     --------
-    bkg_model : function
-        Polynomial fit to the background regions for the current column.
-
-    npts : int
-        This is intended to be the number of good values in the background
-        regions.  If the background limits are at pixel edges, however,
-        `npts` can include a pixel with zero weight; that is, `npts` can be
-        1 larger than one might expect.
+    coeff : ndarray, 2-D, float64
+        Polynomial coefficients, shape (bkg_order + 1, ncols).  Column j
+        holds the coefficients of the background model of column j, in
+        increasing order of power (zero for columns without background).
+
+    npts : ndarray, 1-D, int
+        Number of good values in the background regions of each column,
+        counting a pixel as often as it is extracted.  The background of
+        columns with ``npts == 0`` is zero.
     """
-
-    # extract pixel values along the column that are within
-    # background limits:
-    y, val, wht = _extract_colpix(image, x, j, bkglim)
-
-    # find indices of "good" (finite) values:
-    good = np.isfinite(val)
-    npts = good.sum()
-
-    if npts == 0 or not np.any(good):
-        return (models.Polynomial1D(0), 0)
-
-    # filter-out bad values:
-    val = val[good]
-    wht = wht[good]
-    y = y[good]
-
-    lsqfitter = fitting.LinearLSQFitter()
-    bkg_model = lsqfitter(models.Polynomial1D(min(bkg_order, npts - 1)),
-                          y, val, weights=wht)
-
-    return (bkg_model, npts)
-
-
-def _extract_colpix(image_data, x, j, limits):
-    """Extract either the source or background data.
+    ncols = image.shape[1]
+    coeff = np.zeros((bkg_order + 1, ncols), dtype=np.float64)
+
+    good = (count > 0) & np.isfinite(image)
+    npts = np.where(good, count, 0).sum(axis=0)
+    rows = np.nonzero(good.any(axis=1))[0]
+    if rows.size == 0:
+        return (coeff, npts)
+
+    # only the rows containing background pixels enter the fit
+    r0 = rows[0]
+    r1 = rows[-1] + 1
+    y = np.arange(r0, r1, dtype=np.float64)
+    w = np.where(good, wht, 0.)[r0:r1]
+    wv = w * np.where(good, image, 0.)[r0:r1]
+
+    order = np.minimum(bkg_order, npts - 1)
+    for m in np.unique(order[order >= 0]):
+        design = y[:, np.newaxis] ** np.arange(m + 1)
+        columns = np.nonzero(order == m)[0]
+        batch = max(max_size // design.size, 1)
+        for istart in range(0, columns.size, batch):
+            cols = columns[istart:istart + batch]
+
+            # weighted design matrices, with normalized columns
+            lhs = w[:, cols].T[:, :, np.newaxis] * design
+            scale = np.sqrt((lhs * lhs).sum(axis=1))
+            scale[scale == 0.] = 1.
+            lhs /= scale[:, np.newaxis, :]
+            rhs = wv[:, cols].T[:, :, np.newaxis]
+
+            # pseudo-inverse solution, via the SVD of each matrix
+            u, sv, vt = np.linalg.svd(lhs, full_matrices=False)
+            cutoff = 1.e-15 * sv.max(axis=1, keepdims=True)
+            with np.errstate(divide='ignore'):
+                sinv = np.where(sv > cutoff, 1. / sv, 0.)
+            c = np.matmul(u.transpose(0, 2, 1), rhs)[:, :, 0] * sinv
+            c = np.matmul(vt.transpose(0, 2, 1), c[:, :, np.newaxis])
+            c = c[:, :, 0] / scale
+            coeff[:m + 1, cols] = c.T
+
+    return (coeff, npts)
+
+
+def _extract_src_flux_batch(image, lambdas, wht, count,
+                            weights, bkg_coeff):
+    """Subtract the background and extract the source for all columns.
+
+    For each column, the background polynomial is evaluated at the good
+    (finite) pixels of the source regions and subtracted, and the result
+    is summed with the aperture weights as fractional pixel areas.
 
     Parameters:
     -----------
-    image_data : 2-D ndarray
-        The input data array.
+    image : 2-D ndarray
+        The input data, for the extracted columns.
 
-    x : int
-        This is an index (column number) within `image_data`.
+    lambdas : 1-D array
+        Wavelength of each column.
 
-    j : int
-        This is an index starting with 0 at the first pixel of the
-        extracted spectrum.  See `disp_range` in function `extract1d`.
-        j = 0 when x = disp_range[0].
+    wht, count : ndarray, 2-D
+        Aperture weights and number of times the pixels of the source
+        regions are extracted.  See `_aperture_weights`.
 
-    limits : list of lists of ndarrays
-        For each i, limits[i] is a two-element list.  Those two elements
-        are 1-D arrays of the pixel coordinates for the lower and upper
-        limits of one of the source or background extraction regions.  The
-        number of elements in each of these arrays is the number of pixels
-        in the domain from disp_range[0] to and including disp_range[1].
+    weights : function or None
+        If not None, this function gives the weights for pixels within
+        an extraction region.
+
+    bkg_coeff : ndarray, 2-D, or None
+        Coefficients of the background polynomials (see
+        `_fit_background_batch`), or None if there is no background.
 
     Returns:
     --------
-    y : ndarray, float64
-        Y pixel coordinates within the current column, for every pixel that
-        is included in any of the intervals in `limits`.
-
-    val : ndarray, float64
-        The image values at the pixels given by `y`.  That is,
-        val[i] = image_data[y[i], x].
-
-    wht : ndarray, float64
-        The weight associated with each element in `val`.  The weight
-        ranges from 0 to 1, giving the fraction of a pixel that is included
-        within an interval.  For example, suppose one of the elements in
-        `limits` has values 3.0 and 9.0 for the lower and upper limits for
-        pixel number `x`.  That corresponds to this list of Y pixel values:
-        [3., 4., 5., 6., 7., 8., 9.].  (You would then see this list as a
-        section in `y`.)  Because the integer value is the center of the
-        pixel, the lower and upper limits are in the middle of those
-        pixels, so the corresponding weights would be:
-        [0.5, 1., 1., 1., 1., 1., 0.5].
-    """
-
-    # These are the extraction limits in image pixel coordinates:
-    intervals = []
-    for l in limits:
-        intervals.append([l[0][j], l[1][j]])
-
-    if len(intervals) == 0:
-        return ([], [], [])
-
-    # optimize limits:
-    intervals = _coalesce_bounds(intervals)
-
-    # compute number of data points:
-    ns = image_data.shape[0] - 1
-    ns12 = ns + 0.5
-
-    npts = sum(map(lambda x: min(ns, int(math.floor(x[1] + 0.5))) - \
-                   max(0, int(math.floor(x[0] + 0.5))) + 1,
-                   intervals))
-    npts = max(npts, 1)
-
-    # pre-allocate data arrays:
-    y = np.empty(npts, dtype=np.float64)
-    val = np.empty(npts, dtype=np.float64)
-    wht = np.ones(npts, dtype=np.float64)
-
-    # populate data and weights:
-    k = 0
-    for i in intervals:
-        i1 = i[0] if i[0] >= -0.5 else -0.5
-        i2 = i[1] if i[1] <= ns12 else ns12
-
-        ii1 = max(0, int(math.floor(i1 + 0.5)))
-        ii1 = min(ii1, ns)
-        ii2 = min(ns, int(math.floor(i2 + 0.5)))
-
-        # special case: ii1 == ii2:
-        if ii1 == ii2:
-            v = image_data[ii1, x]
-            val[k] = v
-            wht[k] = i2 - i1
-            k += 1
-            continue
+    total_flux : ndarray, 1-D, float64
+        Sum of counts within the source extraction region for each column,
+        NaN if there is no data in the source extraction region.
 
-        # bounds in different pixels:
-        # a. lower bound:
-        v = image_data[ii1, x]
-        val[k] = v
-        wht[k] = 1.0 - divmod(i1 - 0.5, 1)[1] if i1 >= -0.5 else 1.0
+    bkg_flux : ndarray, 1-D, float64
+        Sum of the background within the source extraction region.
 
-        # b. upper bound:
-        v = image_data[ii2, x]
-        kn = k + ii2 - ii1
-        val[kn] = v
-        wht[kn] = divmod(i2 + 0.5, 1)[1] if i2 < ns12 else 1.0
-
-        # c. all other intermediate pixels:
-        val[k + 1:kn] = image_data[ii1 + 1:ii2, x]
-        y[k:kn + 1] = np.arange(ii1, ii2 + 1, 1, dtype=np.float64)
-
-        k += ii2 - ii1 + 1
-
-    return (y, val, wht) # pixel coordinate, value, wheight=fractional pixel area
-
-
-def _coalesce_bounds(segments):
-    """Optimize limits.
-
-    Parameters:
-    -----------
-    segments : list of two-element lists of float
-        Each element of `segments` is a list containing the lower and upper
-        limits of a source or background extraction region for one of the
-        columns in the input image.
-
-    Returns:
-    --------
-    list of two-element lists of float
-        A copy of `segments`, but sorted, and with overlapping intervals
-        merged into a smaller number of equivalent intervals.
+    tarea : ndarray, 1-D, float64
+        Sum of the fractional pixel areas within the source extraction
+        region.
     """
-    if not isinstance(segments, list):
-        raise TypeError("'segments' must be a list")
-
-    intervals = copy.deepcopy(segments)
-
-    if all([isinstance(x, list) for x in intervals]):
-        # make sure each nested list is a list of two numbers:
-        for x in intervals:
-            if len(x) != 2:
-                raise ValueError("Each list in the 'segments' list must have "
-                                 "exactly two elements")
-            try:
-                map(float, x)
-            except TypeError:
-                raise TypeError("Each segment in 'segments' must be a list of "
-                                "two numbers")
-    else:
-        # we have a single "interval" (or "segment"):
-        if len(intervals) != 2:
-            raise ValueError("'segments' list must be a list of lists of two "
-                             "numbers or 'segments' must be a list of exactly "
-                             "two numbers")
-        try:
-            map(float, intervals)
-        except TypeError:
-            raise TypeError("Each bound in 'segments' must be a number")
-
-        intervals.sort()
-        return intervals
-
-    # sort each "segment" in an increasing order, then sort the entire list
-    # in the increasing order of lower limit:
-    for segment in intervals:
-        segment.sort()
-    intervals.sort(key=lambda x: x[0])
-
-    # coalesce intervals/segments:
-    if len(intervals) > 0:
-        cint = [intervals.pop(0)]
-    else:
-        return [[]]
-
-    while len(intervals) > 0:
-        pint = cint[-1]
-        interval = intervals.pop(0)
-        if interval[0] <= pint[1]:
-            pint[1] = interval[1]
-            continue
-        cint.append(interval)
+    nrows, ncols = image.shape
+    val = image.astype(np.float64)
+    good = (count > 0) & np.isfinite(val)
+    count = np.where(good, count, 0)
+    npts = count.sum(axis=0)
+
+    y = np.arange(nrows, dtype=np.float64)[:, np.newaxis]
+    bkg = np.zeros((nrows, ncols), dtype=np.float64)
+    if bkg_coeff is not None:
+        for k in range(bkg_coeff.shape[0] - 1, -1, -1):
+            bkg *= y
+            bkg += bkg_coeff[k]
+
+    # subtract background, and brightness -> flux:
+    area = np.where(good, wht, 0.)
+    val = np.where(good, val - bkg, 0.) * area
+    bkg *= area
 
-    return cint
+    tarea = area.sum(axis=0, dtype=np.float64)
+    bkg_flux = bkg.sum(axis=0, dtype=np.float64)
+    if weights is None:
+        total_flux = val.sum(axis=0, dtype=np.float64)
+    else:
+        wht_src = np.zeros((nrows, ncols), dtype=np.float64)
+        for j in np.nonzero(npts)[0]:
+            rows = good[:, j]
+            wht_src[rows, j] = weights(lambdas[j], y[rows, 0])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # mean weight of the extracted pixels
+            mwht = (wht_src * count).sum(axis=0, dtype=np.float64) / npts
+            total_flux = (val * wht_src).sum(axis=0, dtype=np.float64) / mwht
+
+    no_data = npts == 0
+    total_flux[no_data] = np.nan
+    bkg_flux[no_data] = 0.
+    tarea[no_data] = 0.
+
+    return (total_flux, bkg_flux, tarea)
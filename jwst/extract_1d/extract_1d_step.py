@@ -55,6 +55,8 @@ class Extract1dStep(Step):
     log_increment = integer(default=50)
     # Flag indicating whether the background should be subtracted.
     subtract_background = boolean(default=None)
+    # Number of processes used to extract the slits of multi-slit data.
+    nproc = integer(min=1, default=1)
     """
 
     reference_file_types = ['extract1d']
@@ -123,7 +125,8 @@ class Extract1dStep(Step):
                                                  self.smoothing_length,
                                                  self.bkg_order,
                                                  self.log_increment,
-                                                 self.subtract_background)
+                                                 self.subtract_background,
+                                                 self.nproc)
                     # Set the step flag to complete in each MultiSpecModel
                     temp.meta.cal_step.extract_1d = 'COMPLETE'
                     result.append(temp)
@@ -142,7 +145,8 @@ class Extract1dStep(Step):
                                                self.smoothing_length,
                                                self.bkg_order,
                                                self.log_increment,
-                                               self.subtract_background)
+                                               self.subtract_background,
+                                               self.nproc)
                 # Set the step flag to complete
                 result.meta.cal_step.extract_1d = 'COMPLETE'
             else:
@@ -163,7 +167,8 @@ class Extract1dStep(Step):
                                            self.smoothing_length,
                                            self.bkg_order,
                                            self.log_increment,
-                                           self.subtract_background)
+                                           self.subtract_background,
+                                           self.nproc)
             # Set the step flag to complete
             result.meta.cal_step.extract_1d = 'COMPLETE'
 
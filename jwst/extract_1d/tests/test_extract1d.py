@@ -0,0 +1,114 @@
+"""
+Test for extract_1d.extract1d
+"""
+import numpy as np
+import pytest
+from astropy.modeling import models
+
+from jwst.extract_1d import extract1d
+
+
+def _column_by_column(image, lambdas, disp_range, srclim, bkglim,
+                      bkg_order, weights=None):
+    """ Reference extraction, one column at a time """
+    nl = lambdas.shape[0]
+    nrows = image.shape[0]
+    countrate = np.zeros(nl)
+    background = np.zeros(nl)
+    npixels = np.zeros(nl)
+    for j in range(nl):
+        x = disp_range[0] + j
+        column = image[:, x:x + 1]
+        bkg_coeff = None
+        if bkglim:
+            _, wht2, count = extract1d._aperture_weights(
+                [[lim[0][j:j + 1], lim[1][j:j + 1]] for lim in bkglim], nrows)
+            bkg_coeff, _ = extract1d._fit_background_batch(
+                column, np.sqrt(wht2), count, bkg_order)
+        wht, _, count = extract1d._aperture_weights(
+            [[lim[0][j:j + 1], lim[1][j:j + 1]] for lim in srclim], nrows)
+        (countrate[j:j + 1], background[j:j + 1], npixels[j:j + 1]) = \
+            extract1d._extract_src_flux_batch(
+                column, lambdas[j:j + 1], wht, count,
+                weights=weights, bkg_coeff=bkg_coeff)
+    return countrate, background, npixels
+
+
+def _image(shape, seed=0):
+    rng = np.random.RandomState(seed)
+    y = np.arange(shape[0], dtype=np.float64)[:, np.newaxis]
+    x = np.arange(shape[1], dtype=np.float64)
+    image = (10. + 0.01 * x + 0.2 * y + 0.01 * y**2 +
+             100. * np.exp(-0.5 * ((y - 15. - 0.002 * x) / 1.5)**2) +
+             rng.normal(0., 0.5, shape))
+    image[rng.uniform(size=shape) < 0.02] = np.nan
+    image[:, 40] = np.nan
+    return image.astype(np.float32)
+
+
+@pytest.mark.parametrize('bkg_order', [0, 1, 2])
+def test_extract1d_background(bkg_order):
+    image = _image((32, 300))
+    disp_range = [5, 295]
+    nl = disp_range[1] - disp_range[0]
+    lambdas = np.linspace(1., 2., nl)
+
+    p_src = [[models.Polynomial1D(1, c0=12.3, c1=0.002),
+              models.Polynomial1D(1, c0=18.6, c1=0.002)]]
+    p_bkg = [[models.Polynomial1D(0, c0=2.2), models.Polynomial1D(0, c0=7.8)],
+             [models.Polynomial1D(1, c0=22.4, c1=0.01),
+              models.Polynomial1D(0, c0=28.7)]]
+
+    result = extract1d.extract1d(image, lambdas, disp_range, p_src, p_bkg,
+                                 independent_var='pixel',
+                                 bkg_order=bkg_order)
+
+    pixels = np.arange(disp_range[0], disp_range[1], dtype=np.float64)
+    srclim = [[p[0](pixels), p[1](pixels)] for p in p_src]
+    bkglim = [[p[0](pixels), p[1](pixels)] for p in p_bkg]
+    expected = _column_by_column(image, lambdas, disp_range, srclim, bkglim,
+                                 bkg_order)
+
+    countrate, background, npixels = result
+    assert np.isnan(countrate[40 - disp_range[0]])
+    for r, e in zip(result, expected):
+        assert np.allclose(r, e, rtol=1e-7, atol=1e-7, equal_nan=True)
+
+
+def test_extract1d_weights():
+    image = _image((24, 50), seed=1)
+    disp_range = [0, 50]
+    lambdas = np.linspace(1., 2., 50)
+
+    # overlapping source regions, limits at pixel edges
+    p_src = [[models.Polynomial1D(0, c0=3.5), models.Polynomial1D(0, c0=9.)],
+             [models.Polynomial1D(1, c0=8., c1=0.05),
+              models.Polynomial1D(0, c0=14.5)]]
+
+    def weights(lam, y):
+        return lam * (1. + 0.1 * y)
+
+    result = extract1d.extract1d(image, lambdas, disp_range, p_src,
+                                 independent_var='pixel', weights=weights)
+
+    pixels = np.arange(50, dtype=np.float64)
+    srclim = [[p[0](pixels), p[1](pixels)] for p in p_src]
+    expected = _column_by_column(image, lambdas, disp_range, srclim, None,
+                                 0, weights=weights)
+
+    assert not result[1].any()
+    for r, e in zip(result, expected):
+        assert np.allclose(r, e, rtol=1e-10, atol=1e-10, equal_nan=True)
+
+
+def test_aperture_weights():
+    lower = np.array([3., 2.7, -1., 4.2])
+    upper = np.array([7., 2.9, 1.2, 8.5])
+    wht, wht2, count = extract1d._aperture_weights([[lower, upper]], 9)
+
+    assert np.allclose(wht[:, 0], [0, 0, 0, 0.5, 1, 1, 1, 0.5, 0])
+    assert np.allclose(wht[:, 1], [0, 0, 0, 0.2, 0, 0, 0, 0, 0])
+    assert np.allclose(wht[:, 2], [1, 0.7, 0, 0, 0, 0, 0, 0, 0])
+    assert np.allclose(wht[:, 3], [0, 0, 0, 0, 0.3, 1, 1, 1, 1])
+    assert np.array_equal(count[:, 0], wht[:, 0] > 0)
+    assert count[:, 3].sum() == 5
@@ -0,0 +1,118 @@
+"""
+Test extracting the integrations of a cube with a single extraction model
+"""
+import numpy as np
+import pytest
+
+from jwst import datamodels
+from jwst.extract_1d import extract
+
+
+EXTRACT_PARAMS = {
+    'ref_file_type': extract.FILE_TYPE_JSON,
+    'match': extract.EXACT,
+    'dispaxis': extract.HORIZONTAL,
+    'spectral_order': 1,
+    'xstart': 2,
+    'xstop': 27,
+    'ystart': 4,
+    'ystop': 8,
+    'extract_width': None,
+    'src_coeff': None,
+    'bkg_coeff': [[0.5], [2.5], [10.5], [12.5]],
+    'independent_var': 'pixel',
+    'smoothing_length': 0,
+    'bkg_order': 0,
+    'subtract_background': None,
+}
+
+
+@pytest.fixture
+def cube():
+    rng = np.random.RandomState(11)
+    model = datamodels.CubeModel((4, 14, 30))
+    model.data[...] = 5. + rng.normal(size=model.data.shape)
+    model.data[:, 5:8, :] += 100.
+    model.data[1, 6, 10] = np.nan
+    model.dq[2, 5, 20] = datamodels.dqflags.pixel['DO_NOT_USE']
+    model.meta.exposure.type = 'NRS_BRIGHTOBJ'
+    return model
+
+
+def test_setup_once(cube):
+    (extract_model, offset) = extract.setup_extraction(
+        cube, extract.DUMMY, cube.data.shape[-2:],
+        extract.OFFSET_NOT_ASSIGNED_YET, False, EXTRACT_PARAMS)
+    assert offset == 0.
+
+    for integ in range(cube.data.shape[0]):
+        data = extract.replace_bad_values(cube.data[integ], cube.dq[integ])
+        result = extract_model.extract(data, None, False)
+        expected = extract.extract_one_slit(
+            cube, extract.DUMMY, integ, extract.OFFSET_NOT_ASSIGNED_YET,
+            False, EXTRACT_PARAMS)
+        for r, e in zip(result, expected[:-1]):
+            if r is None:
+                assert e is None
+            else:
+                assert np.array_equal(r, e)
+
+
+def test_wcs_evaluated_once(cube):
+    (extract_model, _) = extract.setup_extraction(
+        cube, extract.DUMMY, cube.data.shape[-2:],
+        extract.OFFSET_NOT_ASSIGNED_YET, False, EXTRACT_PARAMS)
+
+    calls = []
+
+    def wcs(x, y):
+        calls.append(1)
+        return (np.full(x.shape, 30.), y / 100., 1. + x / 10.)
+
+    extract_model.wcs = wcs
+    spectra = [extract_model.extract(cube.data[integ], None, False)
+               for integ in range(cube.data.shape[0])]
+    assert len(calls) == 1
+    for spectrum in spectra:
+        assert spectrum[0] == 30.
+        assert np.allclose(spectrum[2], 1. + np.arange(2, 28) / 10.)
+
+    # the returned wavelengths are copies of the cached ones
+    spectra[0][2][:] = 0.
+    assert np.all(spectra[1][2] > 0.)
+
+
+def test_extract_chunks(cube):
+    ref_dict = {'ref_file_type': extract.FILE_TYPE_JSON,
+                'apertures': [{'id': 'NRS_BRIGHTOBJ', 'spectral_order': 1,
+                               'dispaxis': 1, 'xstart': 2, 'xstop': 27,
+                               'ystart': 4, 'ystop': 8,
+                               'bkg_coeff': [[0.5], [2.5], [10.5], [12.5]],
+                               'bkg_order': 0}]}
+    cube.meta.wcsinfo.dispersion_direction = 1
+    cube.meta.exposure.nints = 6
+    cube.meta.exposure.integration_start = 2
+    cube.meta.exposure.integration_end = 5
+    int_times = np.zeros(6, dtype=cube.int_times.dtype)
+    int_times['integration_number'] = np.arange(1, 7)
+    int_times['int_mid_MJD_UTC'] = 58000. + np.arange(6)
+    cube.int_times = int_times
+    expected = extract.do_extract1d(cube, ref_dict, None, None, 0, None)
+    assert len(expected.spec) == 4
+
+    chunks = list(extract.extract_chunks(cube, ref_dict, None, None, None,
+                                         chunk_size=3))
+    assert [start for (start, spectra) in chunks] == [0, 3]
+    for (start, spectra) in chunks:
+        ((sp_order, ra, dec, columns),) = spectra
+        assert sp_order == 1
+        for (row, spec) in enumerate(expected.spec[start:start + 3]):
+            assert (ra, dec) == (spec.slit_ra, spec.slit_dec)
+            for name, values in columns.items():
+                assert np.array_equal(values[row],
+                                      spec.spec_table[name.upper()])
+
+    times = extract.integration_times(cube)
+    assert list(times['int_num']) == [spec.int_num for spec in expected.spec]
+    assert list(times['mid_utc']) == [spec.mid_utc for spec in expected.spec]
+    assert list(times['int_num']) == [2, 3, 4, 5]
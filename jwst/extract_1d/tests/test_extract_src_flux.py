@@ -1,5 +1,5 @@
 """
-Test for extract_1d._extract_src_flux
+Test for extract_1d._extract_src_flux_batch
 """
 import math
 
@@ -11,40 +11,44 @@ def test_extract_src_flux():
 
     shape = (9, 5)
     image = np.arange(shape[0] * shape[1], dtype=np.float32).reshape(shape)
-    x = 2
     j = 2
-    lam = 1.234                 # an arbitrary value (not actually used)
+    lambdas = np.zeros(shape[1]) + 1.234    # arbitrary (not actually used)
     weights = None
-    bkgmodel = None
+    bkg_coeff = None
     lower = np.zeros(shape[1], dtype=np.float64) + 3.   # middle of pixel 3
     upper = np.zeros(shape[1], dtype=np.float64) + 7.   # middle of pixel 7
     srclim = [[lower, upper]]
+    wht, wht2, count = extract1d._aperture_weights(srclim, shape[0])
 
-    (total_flux, bkg_flux, tarea, twht) = extract1d._extract_src_flux(
-                    image, x, j, lam, srclim, weights, bkgmodel)
+    (total_flux, bkg_flux, tarea) = extract1d._extract_src_flux_batch(
+                    image, lambdas, wht, count, weights, bkg_coeff)
 
     # 0.5 * 17. + 22. + 27. + 32. + 0.5 * 37.
-    assert math.isclose(total_flux, 108., rel_tol=1.e-8, abs_tol=1.e-8)
+    assert math.isclose(total_flux[j], 108., rel_tol=1.e-8, abs_tol=1.e-8)
 
-    assert bkg_flux == 0.
+    assert bkg_flux[j] == 0.
 
-    assert math.isclose(tarea, 4., rel_tol=1.e-8, abs_tol=1.e-8)
+    assert math.isclose(tarea[j], 4., rel_tol=1.e-8, abs_tol=1.e-8)
 
     image[5, 2] = np.nan
 
-    (total_flux, bkg_flux, tarea, twht) = extract1d._extract_src_flux(
-                    image, x, j, lam, srclim, weights, bkgmodel)
+    (total_flux, bkg_flux, tarea) = extract1d._extract_src_flux_batch(
+                    image, lambdas, wht, count, weights, bkg_coeff)
 
     # 0.5 * 17. + 22. + 32. + 0.5 * 37.
-    assert math.isclose(total_flux, 81., rel_tol=1.e-8, abs_tol=1.e-8)
+    assert math.isclose(total_flux[j], 81., rel_tol=1.e-8, abs_tol=1.e-8)
 
-    assert math.isclose(tarea, 3., rel_tol=1.e-8, abs_tol=1.e-8)
+    assert math.isclose(tarea[j], 3., rel_tol=1.e-8, abs_tol=1.e-8)
 
     image[:, 2] = np.nan
 
-    (total_flux, bkg_flux, tarea, twht) = extract1d._extract_src_flux(
-                    image, x, j, lam, srclim, weights, bkgmodel)
+    (total_flux, bkg_flux, tarea) = extract1d._extract_src_flux_batch(
+                    image, lambdas, wht, count, weights, bkg_coeff)
 
-    assert np.isnan(total_flux)
+    assert np.isnan(total_flux[j])
 
-    assert tarea == 0.
+    assert tarea[j] == 0.
+
+    # the other columns are not affected
+    assert math.isclose(total_flux[1], 0.5 * (16. + 36.) + 21. + 26. + 31.,
+                        rel_tol=1.e-8, abs_tol=1.e-8)
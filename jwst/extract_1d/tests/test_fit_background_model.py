@@ -1,5 +1,5 @@
 """
-Test for extract_1d._fit_background_model
+Test for extract_1d._fit_background_batch
 """
 import math
 
@@ -11,28 +11,47 @@ def test_fit_background_model():
 
     shape = (9, 5)
     image = np.arange(shape[0] * shape[1], dtype=np.float32).reshape(shape)
-    x = 2
     j = 2
 
     b_lower = np.zeros(shape[1], dtype=np.float64) + 3.5    # 4, inclusive
     b_upper = np.zeros(shape[1], dtype=np.float64) + 4.5    # 4, inclusive
     bkglim = [[b_lower, b_upper]]
     bkg_order = 0
+    wht, wht2, count = extract1d._aperture_weights(bkglim, shape[0])
 
-    (bkg_model, npts) = extract1d._fit_background_model(
-                        image, x, j, bkglim, bkg_order)
+    (bkg_coeff, npts) = extract1d._fit_background_batch(
+                        image, np.sqrt(wht2), count, bkg_order)
 
-    assert math.isclose(bkg_model(0.), 22.0, rel_tol=1.e-8, abs_tol=1.e-8)
-    assert math.isclose(bkg_model(8.), 22.0, rel_tol=1.e-8, abs_tol=1.e-8)
+    assert bkg_coeff.shape == (bkg_order + 1, shape[1])
+    assert math.isclose(bkg_coeff[0, j], 22.0, rel_tol=1.e-8, abs_tol=1.e-8)
 
-    assert npts == 2
+    assert npts[j] == 2
 
     image[:, 2] = np.nan
 
-    (bkg_model, npts) = extract1d._fit_background_model(
-                        image, x, j, bkglim, bkg_order)
+    (bkg_coeff, npts) = extract1d._fit_background_batch(
+                        image, np.sqrt(wht2), count, bkg_order)
 
-    assert math.isclose(bkg_model(0.), 0.0, rel_tol=1.e-8, abs_tol=1.e-8)
-    assert math.isclose(bkg_model(8.), 0.0, rel_tol=1.e-8, abs_tol=1.e-8)
+    assert math.isclose(bkg_coeff[0, j], 0.0, rel_tol=1.e-8, abs_tol=1.e-8)
 
-    assert npts == 0
+    assert npts[j] == 0
+
+    assert math.isclose(bkg_coeff[0, 1], 21.0, rel_tol=1.e-8, abs_tol=1.e-8)
+
+
+def test_fit_background_linear():
+
+    shape = (9, 5)
+    y = np.arange(shape[0], dtype=np.float64)[:, np.newaxis]
+    image = (2. + 0.5 * y + np.zeros(shape)).astype(np.float32)
+    image[1, 3] = np.nan
+
+    bkglim = [[np.zeros(shape[1]) - 0.5, np.zeros(shape[1]) + 2.5],
+              [np.zeros(shape[1]) + 5.5, np.zeros(shape[1]) + 8.5]]
+    wht, wht2, count = extract1d._aperture_weights(bkglim, shape[0])
+
+    (bkg_coeff, npts) = extract1d._fit_background_batch(
+                        image, np.sqrt(wht2), count, 1)
+
+    assert np.allclose(bkg_coeff[0], 2., rtol=1.e-8, atol=1.e-8)
+    assert np.allclose(bkg_coeff[1], 0.5, rtol=1.e-8, atol=1.e-8)
@@ -18,7 +18,8 @@ def extract2d(input_model,
               grism_objects=None,
               extract_height=None,
               extract_orders=None,
-              mmag_extract=99.):
+              mmag_extract=99.,
+              nproc=1):
     """
     The main extract_2d function
 
@@ -38,6 +39,8 @@ def extract2d(input_model,
         Cross-dispersion extraction height to use for time series grisms.
         This will override the default which for NRC_TSGRISM is a set
         size of 64 pixels.
+    nproc : int
+        Number of processes used to extract the NIRSpec slits.
 
     Returns
     -------
@@ -61,7 +64,8 @@ def extract2d(input_model,
         output_model = nrs_extract2d(input_model,
                                      slit_name=slit_name,
                                      apply_wavecorr=apply_wavecorr,
-                                     reference_files=reference_files)
+                                     reference_files=reference_files,
+                                     nproc=nproc)
     elif exp_type in slitless_modes:
         if exp_type == 'NRC_TSGRISM':
             if extract_height is None:
@@ -20,6 +20,7 @@ class Extract2dStep(Step):
         extract_height =  integer(default=None)  # extraction height in pixels
         grism_objects = list(default=None)  # list of grism objects to use
         mmag_extract = float(default=99.)  # minimum abmag to extract
+        nproc = integer(min=1, default=1)  # processes used for NIRSpec slits
     """
 
     reference_file_types = ['wavecorr', 'wavelengthrange']
@@ -35,6 +36,7 @@ class Extract2dStep(Step):
                                                 reference_files=reference_file_names,
                                                 extract_orders=self.extract_orders,
                                                 grism_objects=self.grism_objects,
-                                                extract_height=self.extract_height)
+                                                extract_height=self.extract_height,
+                                                nproc=self.nproc)
 
         return output_model
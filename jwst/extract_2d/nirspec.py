@@ -12,13 +12,15 @@ from .. import datamodels
 from ..transforms import models as trmodels
 from ..assign_wcs import nirspec
 from ..assign_wcs import util
+from ..lib import parallel_utils
 from ..lib import pipe_utils
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 
-def nrs_extract2d(input_model, slit_name=None, apply_wavecorr=False, reference_files={}):
+def nrs_extract2d(input_model, slit_name=None, apply_wavecorr=False, reference_files={},
+                  nproc=1):
     """
     Main extract_2d function for Nirspec exposures.
 
@@ -33,6 +35,8 @@ def nrs_extract2d(input_model, slit_name=None, apply_wavecorr=False, reference_f
         Nirspec exposures.
     reference_files : dict
         Reference files - uses the ``wavecorr`` reference file.
+    nproc : int
+        Number of processes the slits are extracted with.
     """
     exp_type = input_model.meta.exposure.type.upper()
 
@@ -79,12 +83,16 @@ def nrs_extract2d(input_model, slit_name=None, apply_wavecorr=False, reference_f
     else:
         output_model = datamodels.MultiSlitModel()
         output_model.update(input_model)
-        slits = []
-        for slit in open_slits:
+
+        # Evaluate the WCS of all the slits at once
+        slit_maps = nirspec.nrs_slit_maps(input_model,
+                                          [slit.name for slit in open_slits])
+
+        def extract_slit(slit):
             new_model, xlo, xhi, ylo, yhi = process_slit(input_model, slit,
-                                                         exp_type, apply_wavecorr, reffile)
+                                                         exp_type, apply_wavecorr, reffile,
+                                                         slit_map=slit_maps[slit.name])
 
-            slits.append(new_model)
             orig_s_region = new_model.meta.wcsinfo.s_region.strip()
             util.update_s_region_spectral(new_model)
             if orig_s_region != new_model.meta.wcsinfo.s_region.strip():
@@ -96,11 +104,16 @@ def nrs_extract2d(input_model, slit_name=None, apply_wavecorr=False, reference_f
             # Copy BUNIT values to output slit
             new_model.meta.bunit_data = input_model.meta.bunit_data
             new_model.meta.bunit_err = input_model.meta.bunit_err
+            return new_model
+
+        # The slits are independent; with several processes each one is
+        # extracted in a worker and the results are kept in slit order.
+        slits = parallel_utils.map_ordered(extract_slit, open_slits, nproc)
         output_model.slits.extend(slits)
     return output_model
 
 
-def process_slit(input_model, slit, exp_type, apply_wavecorr, reffile):
+def process_slit(input_model, slit, exp_type, apply_wavecorr, reffile, slit_map=None):
     """
     Construct a data model for each slit.
 
@@ -121,6 +134,9 @@ def process_slit(input_model, slit, exp_type, apply_wavecorr, reffile):
         Flag whether to apply the zero point wavelength correction.
     reffile : str
         Path to ``wavecorr`` reference file.
+    slit_map : `~jwst.assign_wcs.nirspec.SlitMap`, optional
+        The coordinates of the slit pixels, from
+        `~jwst.assign_wcs.nirspec.nrs_slit_maps`.
 
     Returns
     -------
@@ -130,7 +146,8 @@ def process_slit(input_model, slit, exp_type, apply_wavecorr, reffile):
         The corners of the extracted slit in pixel space.
 
     """
-    new_model, xlo, xhi, ylo, yhi = extract_slit(input_model, slit, exp_type)
+    new_model, xlo, xhi, ylo, yhi = extract_slit(input_model, slit, exp_type,
+                                                 slit_map=slit_map)
     if apply_wavecorr and _is_point_source(slit, exp_type, input_model.meta.target.source_type):
         apply_zero_point_correction(new_model, slit, reffile)
         log.info("Slit {0}: Wavelength zero-point correction applied.".format(slit.name))
@@ -197,7 +214,7 @@ def offset_wcs(slit_wcs):
     return xlo, xhi, ylo, yhi
 
 
-def extract_slit(input_model, slit, exp_type):
+def extract_slit(input_model, slit, exp_type, slit_map=None):
     """
     Extract a slit from a full frame image.
 
@@ -209,6 +226,9 @@ def extract_slit(input_model, slit, exp_type):
         A slit object.
     exp_type : str
         The exposure type.
+    slit_map : `~jwst.assign_wcs.nirspec.SlitMap`, optional
+        The coordinates of the slit pixels.  If given, the wavelengths are
+        taken from it instead of evaluating the slit WCS.
 
     Returns
     -------
@@ -249,8 +269,13 @@ def extract_slit(input_model, slit, exp_type):
     slit_wcs.bounding_box = util.wcs_bbox_from_shape(ext_data.shape)
 
     # compute wavelengths
-    x, y = wcstools.grid_from_bounding_box(slit_wcs.bounding_box, step=(1, 1))
-    ra, dec, lam = slit_wcs(x, y)
+    ny, nx = ext_data.shape[-2:]
+    if (slit_map is not None and (slit_map.xstart, slit_map.ystart) == (xlo, ylo)
+            and slit_map.world[-1].shape[0] >= ny and slit_map.world[-1].shape[1] >= nx):
+        lam = slit_map.world[-1][:ny, :nx]
+    else:
+        x, y = wcstools.grid_from_bounding_box(slit_wcs.bounding_box, step=(1, 1))
+        ra, dec, lam = slit_wcs(x, y)
     lam = lam.astype(np.float32)
     new_model = datamodels.SlitModel(data=ext_data, err=ext_err, dq=ext_dq, wavelength=lam,
                                      var_rnoise=ext_var_rnoise, var_poisson=ext_var_poisson,
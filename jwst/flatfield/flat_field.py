@@ -2,6 +2,7 @@
 #  Module for applying flat fielding
 #
 
+import hashlib
 import logging
 import math
 
@@ -25,10 +26,14 @@ FIXED_SLIT_TYPES = ["NRS_LAMP", "NRS_BRIGHTOBJ", "NRS_FIXEDSLIT"]
 HORIZONTAL = 1
 VERTICAL = 2
 
+# Maximum total size, in bytes, of the combined NIRSpec flat fields kept
+# in a cache for reuse.
+MAX_FLAT_CACHE_SIZE = 512 * 1024**2
+
 
 def do_correction(input_model, flat_model,
                   f_flat_model, s_flat_model,
-                  d_flat_model, flat_suffix=None):
+                  d_flat_model, flat_suffix=None, cache=None):
     """Flat-field a JWST data model using a flat-field model
 
     Parameters
@@ -53,6 +58,10 @@ def do_correction(input_model, flat_model,
         Filename suffix for optional output file to save flat field images.
         Note that this is only supported for NIRSpec spectrographic data.
 
+    cache : collections.OrderedDict or None
+        Combined NIRSpec flat fields computed before, owned by the caller.
+        See `create_flat_field`.
+
     Returns
     -------
     output_model : data model
@@ -75,7 +84,8 @@ def do_correction(input_model, flat_model,
     if is_NRS_spectrographic:
         interpolated_flats = do_NIRSpec_flat_field(output_model,
                                                    f_flat_model, s_flat_model,
-                                                   d_flat_model, flat_suffix)
+                                                   d_flat_model, flat_suffix,
+                                                   cache=cache)
     else:
         if flat_suffix is not None:
             log.warning("The flat_suffix parameter is not implemented "
@@ -208,7 +218,7 @@ def apply_flat_field(science, flat):
 #
 def do_NIRSpec_flat_field(output_model,
                           f_flat_model, s_flat_model,
-                          d_flat_model, flat_suffix):
+                          d_flat_model, flat_suffix, cache=None):
     """Apply flat-fielding for NIRSpec data, updating the output model.
 
     Parameters
@@ -230,6 +240,9 @@ def do_NIRSpec_flat_field(output_model,
         flat field images.  If not None, a file will be written (later, not
         by the current function).
 
+    cache : collections.OrderedDict or None
+        Combined flat fields computed before.  See `create_flat_field`.
+
     Returns
     -------
     MultiSlitModel, ImageModel (for IFU data), or None
@@ -248,7 +261,7 @@ def do_NIRSpec_flat_field(output_model,
                                .format(type(output_model)))
         return NIRSpec_brightobj(output_model,
                                  f_flat_model, s_flat_model,
-                                 d_flat_model, flat_suffix)
+                                 d_flat_model, flat_suffix, cache=cache)
 
     # We expect NIRSpec IFU data to be an IFUImageModel, but it's conceivable
     # that the slices have been copied out into a MultiSlitModel, so
@@ -262,7 +275,7 @@ def do_NIRSpec_flat_field(output_model,
                                    .format(type(output_model)))
             return NIRSpec_IFU(output_model,
                                f_flat_model, s_flat_model,
-                               d_flat_model, flat_suffix)
+                               d_flat_model, flat_suffix, cache=cache)
 
     # Create an output model for the interpolated flat fields.
     if flat_suffix is not None:
@@ -349,7 +362,7 @@ def do_NIRSpec_flat_field(output_model,
         (flat_2d, flat_dq_2d) = create_flat_field(wl,
                         f_flat_model, s_flat_model, d_flat_model,
                         xstart, xstop, ystart, ystop,
-                        exposure_type, slit.name, slit_nt)
+                        exposure_type, slit.name, slit_nt, cache=cache)
         mask = (flat_2d <= 0.)
         nbad = mask.sum(dtype=np.intp)
         if nbad > 0:
@@ -445,7 +458,7 @@ def populate_interpolated_flats(k, slit,
 
 def NIRSpec_brightobj(output_model,
                       f_flat_model, s_flat_model,
-                      d_flat_model, flat_suffix):
+                      d_flat_model, flat_suffix, cache=None):
     """Apply flat-fielding for NIRSpec BRIGHTOBJ data, in-place
 
     Parameters
@@ -467,6 +480,9 @@ def NIRSpec_brightobj(output_model,
         flat field images.  If not None, a file will be written (later, not
         by the current function).
 
+    cache : collections.OrderedDict or None
+        Combined flat fields computed before.  See `create_flat_field`.
+
     Returns
     -------
     ImageModel or None
@@ -545,7 +561,7 @@ def NIRSpec_brightobj(output_model,
                         wl,
                         f_flat_model, s_flat_model, d_flat_model,
                         xstart, xstop, ystart, ystop,
-                        exposure_type, slit_name, None)
+                        exposure_type, slit_name, None, cache=cache)
     mask = (flat_2d <= 0.)
     nbad = mask.sum(dtype=np.intp)
     if nbad > 0:
@@ -582,7 +598,7 @@ def NIRSpec_brightobj(output_model,
 
 def NIRSpec_IFU(output_model,
                 f_flat_model, s_flat_model,
-                d_flat_model, flat_suffix):
+                d_flat_model, flat_suffix, cache=None):
     """Apply flat-fielding for NIRSpec IFU data, in-place
 
     Parameters
@@ -604,6 +620,9 @@ def NIRSpec_IFU(output_model,
         flat field images.  If not None, a file will be written (later, not
         by the current function).
 
+    cache : collections.OrderedDict or None
+        Combined flat fields computed before.  See `create_flat_field`.
+
     Returns
     -------
     ImageModel or None
@@ -616,7 +635,7 @@ def NIRSpec_IFU(output_model,
     flat_dq = np.zeros_like(output_model.dq)
 
     try:
-        list_of_wcs = nirspec.nrs_ifu_wcs(output_model)
+        slice_maps = nirspec.nrs_slit_maps(output_model, range(30))
     except (KeyError, AttributeError):
         if output_model.meta.cal_step.assign_wcs == 'COMPLETE':
             log.error("The input file does not appear to have WCS info.")
@@ -624,23 +643,15 @@ def NIRSpec_IFU(output_model,
         else:
             log.error("This mode %s requires WCS information.", exposure_type)
             raise RuntimeError("The assign_wcs step has not been run.")
-    for (k, ifu_wcs) in enumerate(list_of_wcs):
+    for (k, slice_map) in enumerate(slice_maps.values()):
 
         # example:  bounding_box = ((1600.5, 2048.5),   # X
         #                           (1886.5, 1925.5))   # Y
         truncated = False
-        try:
-            xstart = ifu_wcs.bounding_box[0][0]
-            xstop = ifu_wcs.bounding_box[0][1]
-            ystart = ifu_wcs.bounding_box[1][0]
-            ystop = ifu_wcs.bounding_box[1][1]
-            log.debug("Using ifu_wcs.bounding_box.")
-        except AttributeError:
-            log.info("ifu_wcs.bounding_box not found; using domain instead.")
-            xstart = ifu_wcs.domain[0]['lower']
-            xstop = ifu_wcs.domain[0]['upper']
-            ystart = ifu_wcs.domain[1]['lower']
-            ystop = ifu_wcs.domain[1]['upper']
+        xstart = slice_map.bounding_box[0][0]
+        xstop = slice_map.bounding_box[0][1]
+        ystart = slice_map.bounding_box[1][0]
+        ystop = slice_map.bounding_box[1][1]
 
         if xstart < -0.5:
             truncated = True
@@ -671,13 +682,16 @@ def NIRSpec_IFU(output_model,
         ystart = int(math.ceil(ystart))
         ystop = int(math.floor(ystop)) + 1
 
-        dx = xstop - xstart
-        dy = ystop - ystart
-        ind = np.indices((dy, dx))
-        x = ind[1] + xstart
-        y = ind[0] + ystart
-        coords = ifu_wcs(x, y)
-        wl = coords[2]
+        # Keep the limits within the pixels covered by the slice map.
+        (ny, nx) = slice_map.world[2].shape
+        xstart = max(xstart, slice_map.xstart)
+        xstop = min(xstop, slice_map.xstart + nx)
+        ystart = max(ystart, slice_map.ystart)
+        ystop = min(ystop, slice_map.ystart + ny)
+
+        # These pixels are all within the bounding box of the slice.
+        wl = slice_map.world[2][ystart - slice_map.ystart:ystop - slice_map.ystart,
+                                xstart - slice_map.xstart:xstop - slice_map.xstart].copy()
         nan_flag = np.isnan(wl)
         good_flag = np.logical_not(nan_flag)
         if wl[good_flag].max() < MICRONS_100:
@@ -688,7 +702,7 @@ def NIRSpec_IFU(output_model,
         (flat_2d, flat_dq_2d) = create_flat_field(wl,
                         f_flat_model, s_flat_model, d_flat_model,
                         xstart, xstop, ystart, ystop,
-                        exposure_type, None, None)
+                        exposure_type, None, None, cache=cache)
         flat_2d[nan_flag] = 1.
         mask = (flat_2d <= 0.)
         nbad = mask.sum(dtype=np.intp)
@@ -729,7 +743,7 @@ def NIRSpec_IFU(output_model,
 
 def create_flat_field(wl, f_flat_model, s_flat_model, d_flat_model,
                       xstart, xstop, ystart, ystop,
-                      exposure_type, slit_name, slit_nt=None):
+                      exposure_type, slit_name, slit_nt=None, cache=None):
     """Extract and combine flat field components.
 
     Parameters
@@ -766,6 +780,13 @@ def create_flat_field(wl, f_flat_model, s_flat_model, d_flat_model,
     slit_nt : namedtuple or None
         For MSA data only, info about the current slit.
 
+    cache : collections.OrderedDict or None
+        Combined flat fields computed before, owned by the caller, keyed by
+        the reference files, the slit and a hash of the wavelengths.  The
+        new flat field is stored in it, and the least recently used ones
+        are dropped when their total size exceeds MAX_FLAT_CACHE_SIZE.
+        If None, the flat field is not cached.
+
     Returns
     -------
     flat_2d : ndarray, 2-D, float
@@ -776,6 +797,17 @@ def create_flat_field(wl, f_flat_model, s_flat_model, d_flat_model,
         The data quality array corresponding to flat_2d.
     """
 
+    key = None
+    if cache is not None:
+        key = _flat_cache_key(wl, f_flat_model, s_flat_model, d_flat_model,
+                              xstart, xstop, ystart, ystop,
+                              exposure_type, slit_name, slit_nt)
+    if key is not None and key in cache:
+        log.debug("Using the cached flat field for slit %s", slit_name)
+        cache.move_to_end(key)
+        (flat_2d, flat_dq) = cache[key]
+        return (flat_2d.copy(), flat_dq.copy())
+
     dispaxis = find_dispaxis(wl)
     if dispaxis is None:
         log.warning("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
@@ -803,9 +835,60 @@ def create_flat_field(wl, f_flat_model, s_flat_model, d_flat_model,
     mask2 = np.bitwise_and(flat_dq, dqflags.pixel['NO_FLAT_FIELD'])
     flat_2d[mask1 + mask2 > 0] = 1.
 
+    if key is not None:
+        cache[key] = (flat_2d.copy(), flat_dq.copy())
+        _flat_cache_resize(cache)
+
     return (flat_2d, flat_dq)
 
 
+def _flat_cache_key(wl, f_flat_model, s_flat_model, d_flat_model,
+                    xstart, xstop, ystart, ystop,
+                    exposure_type, slit_name, slit_nt):
+    """Key identifying a combined flat field in the cache.
+
+    The key contains the names of the reference files, the location and
+    name of the slit, the shutter position (MSA data) and a hash of the
+    wavelengths.  None is returned, i.e. the flat field is not cached, if
+    one of the reference models was not read from a file.
+    """
+
+    ref_files = []
+    for ref_model in (f_flat_model, s_flat_model, d_flat_model):
+        if ref_model is None:
+            ref_files.append(None)
+        elif not ref_model.meta.filename:
+            return None
+        else:
+            ref_files.append(ref_model.meta.filename)
+
+    if slit_nt is None:
+        shutter = None
+    else:
+        shutter = (getattr(slit_nt, 'quadrant', None),
+                   getattr(slit_nt, 'xcen', None),
+                   getattr(slit_nt, 'ycen', None))
+
+    wl = np.ascontiguousarray(wl)
+    wl_hash = hashlib.sha1(wl.tobytes()).hexdigest()
+
+    return (tuple(ref_files), xstart, xstop, ystart, ystop,
+            exposure_type, slit_name, shutter,
+            wl.shape, wl.dtype.str, wl_hash)
+
+
+def _flat_cache_resize(cache):
+    """Drop the least recently used flat fields to limit the cache size"""
+
+    def nbytes(item):
+        return sum(a.nbytes for a in item)
+
+    total = sum(nbytes(item) for item in cache.values())
+    while len(cache) > 1 and total > MAX_FLAT_CACHE_SIZE:
+        (_, item) = cache.popitem(last=False)
+        total -= nbytes(item)
+
+
 def find_dispaxis(wl):
     """Find which axis is the dispersion direction
 
@@ -1384,28 +1467,35 @@ def combine_fast_slow(wl, flat_2d, flat_dq, tab_wl, tab_flat, dispaxis):
         dwl[0:-1, :] = wl_c[1:, :] - wl_c[0:-1, :]
         dwl[-1, :] = dwl[-2, :]
 
-    # Values averaged within tab_flat.
-    values = np.zeros_like(wl_c)
-    (ny, nx) = wl_c.shape
     # Abscissas and weights for 3-point Gaussian integration, but taking
     # the width of the interval to be 1, so the result will be the average
     # over the interval.
     d = math.sqrt(0.6) / 2.
     dx = np.array([-d, 0., d])
     wgt = np.array([5., 8., 5.]) / 18.
-    for j in range(ny):
-        for i in range(nx):
-            if wl[j, i] <= 0.:          # note:  wl, not wl_c
-                values[j, i] = 1.
-            else:
-                # average the tabular data over the range of wavelengths
-                temp = g_average(wl_c[j, i], dwl[j, i],
-                                 tab_wl, tab_flat, dx, wgt)
-                if temp is None:
-                    values[j, i] = 1.
-                    combined_dq[j, i] |= dqflags.pixel['NO_FLAT_FIELD']
-                else:
-                    values[j, i] = temp
+
+    # Average the tabular data over the range of wavelengths of each
+    # pixel.  This is the same as g_average, for all pixels at once.
+    wl_c64 = wl_c.astype(np.float64)
+    dwl64 = dwl.astype(np.float64)
+    average = np.zeros(wl_c.shape, dtype=np.float64)
+    no_flat = np.zeros(wl_c.shape, dtype=bool)
+    for k in range(len(dx)):
+        (value, out_of_range) = wl_interpolate_array(
+                                        wl_c64 + dwl64 * dx[k],
+                                        tab_wl, tab_flat)
+        average += value * wgt[k]
+        no_flat |= out_of_range
+
+    # Values averaged within tab_flat.
+    values = np.zeros_like(wl_c)
+    values[...] = average
+    values[no_flat] = 1.
+    with np.errstate(invalid='ignore'):
+        zero_wl = wl <= 0.              # note:  wl, not wl_c
+    values[zero_wl] = 1.
+    no_flat &= ~zero_wl
+    combined_dq[no_flat] |= dqflags.pixel['NO_FLAT_FIELD']
 
     return (flat_2d * values, combined_dq)
 
@@ -1554,6 +1644,56 @@ def wl_interpolate(wavelength, tab_wl, tab_flat):
     return q * tab_flat[n0] + p * tab_flat[n0 + 1]
 
 
+def wl_interpolate_array(wavelengths, tab_wl, tab_flat):
+    """Interpolate the flat field at an array of wavelengths.
+
+    Extended summary
+    ----------------
+    This is the same as wl_interpolate, but for an array of wavelengths.
+
+    Parameters
+    ----------
+    wavelengths : ndarray
+        The wavelengths (microns) at which to find the flat-field values.
+
+    tab_wl : ndarray, 1-D
+        Array of wavelengths corresponding to `tab_flat` flat-field values.
+        These are assumed to be strictly increasing.
+
+    tab_flat : ndarray, 1-D
+        Array of flat-field values.
+
+    Returns
+    -------
+    values : ndarray, float64
+        The flat-field values (from `tab_flat`) at `wavelengths`.  This
+        is zero where `out_of_range` is True.
+
+    out_of_range : ndarray, bool
+        True where the wavelength is not positive, is NaN, or is outside
+        the range of `tab_wl`.
+    """
+
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        out_of_range = ~((wavelengths > 0.) &
+                         (wavelengths >= tab_wl[0]) &
+                         (wavelengths <= tab_wl[-1]))
+    w = np.where(out_of_range, tab_wl[0], wavelengths)
+
+    last = len(tab_wl) - 1
+    n0 = np.clip(np.searchsorted(tab_wl, w) - 1, 0, max(last - 1, 0))
+    n1 = np.minimum(n0 + 1, last)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = (w - tab_wl[n0]) / (tab_wl[n1] - tab_wl[n0])
+    q = 1. - p
+
+    values = q * tab_flat[n0] + p * tab_flat[n1]
+    values[out_of_range] = 0.
+
+    return (values, out_of_range)
+
+
 def interpolate_flat(image_flat, image_dq, image_wl, wl):
     """Interpolate within the 3-D flat field image to get a 2-D flat.
 
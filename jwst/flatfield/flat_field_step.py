@@ -1,5 +1,7 @@
 #! /usr/bin/env python
 
+from collections import OrderedDict
+
 from ..stpipe import Step
 from .. import datamodels
 from . import flat_field
@@ -147,11 +149,17 @@ class FlatFieldStep(Step):
             d_flat_model = None
             self.flat_suffix = None
 
+        # Combined NIRSpec flat fields are reused by the later exposures
+        # processed by this step instance, e.g. within one pipeline run.
+        if getattr(self, '_flat_cache', None) is None:
+            self._flat_cache = OrderedDict()
+
         # Do the flat-field correction
         (output_model, interpolated_flats) = \
                 flat_field.do_correction(input_model, flat_model,
                                          f_flat_model, s_flat_model,
-                                         d_flat_model, self.flat_suffix)
+                                         d_flat_model, self.flat_suffix,
+                                         cache=self._flat_cache)
 
         # Close the inputs
         input_model.close()
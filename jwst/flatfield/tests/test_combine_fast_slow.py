@@ -0,0 +1,109 @@
+"""
+Test for flat_field.combine_fast_slow and the cache of NIRSpec flat fields
+"""
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from jwst.datamodels import dqflags
+from jwst.flatfield import flat_field
+
+
+def _reference(wl, flat_2d, flat_dq, tab_wl, tab_flat, dispaxis):
+    """Pixel by pixel version of combine_fast_slow, using g_average"""
+    wl_c = flat_field.clean_wl(wl, dispaxis)
+    dwl = np.zeros_like(wl_c)
+    dwl[:, 0:-1] = wl_c[:, 1:] - wl_c[:, 0:-1]
+    dwl[:, -1] = dwl[:, -2]
+    combined_dq = flat_dq.copy()
+
+    d = math.sqrt(0.6) / 2.
+    dx = np.array([-d, 0., d])
+    wgt = np.array([5., 8., 5.]) / 18.
+    values = np.zeros_like(wl_c)
+    (ny, nx) = wl.shape
+    for j in range(ny):
+        for i in range(nx):
+            if wl[j, i] <= 0.:
+                values[j, i] = 1.
+                continue
+            temp = flat_field.g_average(wl_c[j, i], dwl[j, i],
+                                        tab_wl, tab_flat, dx, wgt)
+            if temp is None:
+                values[j, i] = 1.
+                combined_dq[j, i] |= dqflags.pixel['NO_FLAT_FIELD']
+            else:
+                values[j, i] = temp
+
+    return (flat_2d * values, combined_dq)
+
+
+def test_combine_fast_slow():
+    tab_wl = np.linspace(1., 2., 51)
+    tab_flat = 1. + 0.1 * np.sin(10. * tab_wl)
+
+    # wavelengths run past both ends of the table, and some are zero
+    wl = np.tile(np.linspace(0.9, 2.1, 40), (6, 1))
+    wl[2, 5:9] = 0.
+    wl[:, 20] = tab_wl[10]
+    flat_2d = np.full(wl.shape, 2., dtype=np.float32)
+    flat_dq = np.zeros(wl.shape, dtype=np.uint32)
+    flat_dq[0, 0] = dqflags.pixel['UNRELIABLE_FLAT']
+
+    (flat, dq) = flat_field.combine_fast_slow(wl, flat_2d, flat_dq,
+                                              tab_wl, tab_flat,
+                                              flat_field.HORIZONTAL)
+    (expected, expected_dq) = _reference(wl, flat_2d, flat_dq,
+                                         tab_wl, tab_flat,
+                                         flat_field.HORIZONTAL)
+    assert np.allclose(flat, expected, rtol=1.e-12, atol=0.)
+    assert np.array_equal(dq, expected_dq)
+    assert np.any(dq & dqflags.pixel['NO_FLAT_FIELD'])
+    assert not np.any(dq[2, 5:9] & dqflags.pixel['NO_FLAT_FIELD'])
+    assert flat_dq[0, 0] == dqflags.pixel['UNRELIABLE_FLAT']
+
+
+def test_flat_cache(monkeypatch):
+    wl = np.tile(np.linspace(1., 2., 30), (5, 1))
+    calls = []
+
+    def spectrograph_flat(wl, s_flat_model, *args):
+        calls.append(s_flat_model)
+        return (np.full(wl.shape, 0.5), None)
+
+    monkeypatch.setattr(flat_field, 'spectrograph_flat', spectrograph_flat)
+    monkeypatch.setattr(flat_field, 'fore_optics_flat',
+                        lambda *args: (1., None))
+    monkeypatch.setattr(flat_field, 'detector_flat',
+                        lambda *args: (1., None))
+
+    args = (None, None, None, 10, 40, 20, 25, 'NRS_FIXEDSLIT', 'S200A1')
+    cache = OrderedDict()
+    (flat_2d, flat_dq) = flat_field.create_flat_field(wl, *args, cache=cache)
+    assert len(calls) == 1
+    assert len(cache) == 1
+
+    # the cached flat field is returned, but callers get their own copy
+    flat_2d[...] = 3.
+    (cached, cached_dq) = flat_field.create_flat_field(wl.copy(), *args,
+                                                       cache=cache)
+    assert len(calls) == 1
+    assert np.all(cached == 0.5)
+    assert np.array_equal(cached_dq, flat_dq)
+
+    # different wavelengths or a different slit make a new flat field
+    flat_field.create_flat_field(wl * 1.01, *args, cache=cache)
+    assert len(calls) == 2
+    flat_field.create_flat_field(wl, *args[:-1], 'S200A2', cache=cache)
+    assert len(calls) == 3
+
+    # without a cache, the flat field is always computed
+    flat_field.create_flat_field(wl, *args)
+    assert len(calls) == 4
+
+    # the least recently used flat fields are dropped
+    monkeypatch.setattr(flat_field, 'MAX_FLAT_CACHE_SIZE', 1)
+    flat_field.create_flat_field(wl * 1.02, *args, cache=cache)
+    assert len(calls) == 5
+    assert len(cache) == 1
@@ -0,0 +1,60 @@
+"""
+Test the flat field of NIRSpec IFU data, using the slice maps of the WCS
+"""
+from collections import OrderedDict
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from jwst import datamodels
+from jwst.assign_wcs.nirspec import SlitMap
+from jwst.flatfield import flat_field
+
+
+def _slice_map(bounding_box):
+    # coordinates of the pixels of the bounding box, as from nrs_slit_maps
+    (x0, x1), (y0, y1) = bounding_box
+    xstart, xstop = int(np.floor(x0 + 0.5)), int(np.ceil(x1 - 0.5))
+    ystart, ystop = int(np.floor(y0 + 0.5)), int(np.ceil(y1 - 0.5))
+    y, x = np.mgrid[ystart:ystop + 1, xstart:xstop + 1]
+    wl = 1.0 + 1.0e-3 * x + 1.0e-6 * y
+    mask = np.ones(wl.shape, dtype=bool)
+    return SlitMap(xstart, ystart, bounding_box, mask, (x, y, wl),
+                   (x, y, wl))
+
+
+def test_nirspec_ifu_slice_limits(monkeypatch):
+    """The flat field is applied to the pixels of each slice on the detector"""
+    boxes = [
+        ((100.5, 120.5), (200.5, 210.5)),
+        # extends beyond the detector edges:
+        ((-3.2, 10.4), (2040.3, 2052.6)),
+        ((2040.7, 2049.8), (-1.6, 6.2)),
+    ]
+    slice_maps = OrderedDict((k, _slice_map(box))
+                             for k, box in enumerate(boxes))
+    monkeypatch.setattr(flat_field.nirspec, 'nrs_slit_maps',
+                        lambda model, slit_names: slice_maps)
+
+    def create_flat_field(wl, f_flat_model, s_flat_model, d_flat_model,
+                          xstart, xstop, ystart, ystop, *args, **kwargs):
+        assert wl.shape == (ystop - ystart, xstop - xstart)
+        return 2.0 * wl, np.zeros(wl.shape, dtype=np.uint32)
+
+    monkeypatch.setattr(flat_field, 'create_flat_field', create_flat_field)
+
+    model = datamodels.IFUImageModel((2048, 2048))
+    model.meta.exposure.type = 'NRS_IFU'
+    model.data[:] = 1.0
+    flat_field.NIRSpec_IFU(model, None, None, None, None)
+
+    y, x = np.mgrid[:2048, :2048]
+    expected = np.ones((2048, 2048), dtype=np.float32)
+    for (x0, x1), (y0, y1) in boxes:
+        inside = ((x >= max(np.ceil(x0), 0)) & (x <= min(np.floor(x1), 2047)) &
+                  (y >= max(np.ceil(y0), 0)) & (y <= min(np.floor(y1), 2047)))
+        wl = 1.0 + 1.0e-3 * x[inside] + 1.0e-6 * y[inside]
+        expected[inside] = 1.0 / (2.0 * wl)
+
+    assert model.meta.cal_step.flat_field == 'COMPLETE'
+    assert_allclose(model.data, expected, rtol=1.e-6)
@@ -0,0 +1,139 @@
+"""
+Find footprints on the sky that may overlap, using bounding spherical caps.
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+__all__ = ['bounding_cap', 'FootprintIndex']
+
+
+def bounding_cap(polygon):
+    """
+    Compute a spherical cap that bounds a spherical polygon.
+
+    Parameters
+    ----------
+    polygon : `~spherical_geometry.polygon.SphericalPolygon`
+        The footprint to bound.
+
+    Returns
+    -------
+    center : numpy.ndarray, None
+        Unit vector pointing to the center of the cap or `None` when the
+        polygon is empty.
+
+    radius : float
+        Angular radius of the cap in radians.
+
+    """
+    xyz = []
+    for ra, dec in polygon.to_radec():
+        if len(ra) == 0:
+            continue
+        lon = np.deg2rad(ra)
+        lat = np.deg2rad(dec)
+        cos_lat = np.cos(lat)
+        xyz.append(np.array([cos_lat * np.cos(lon), cos_lat * np.sin(lon),
+                             np.sin(lat)]).T)
+
+    if not xyz:
+        return None, 0.0
+
+    xyz = np.vstack(xyz)
+    center = xyz.sum(axis=0)
+    norm = np.linalg.norm(center)
+    if norm == 0.0:
+        return xyz[0], np.pi
+    center /= norm
+
+    radius = np.arccos(np.clip(np.dot(xyz, center), -1.0, 1.0)).max()
+    if radius >= 0.5 * np.pi:
+        # a cap this large is not guaranteed to contain the edges of the
+        # polygon: make the cap cover the entire sphere
+        radius = np.pi
+
+    # pad caps slightly to account for round-off in vertex coordinates:
+    return center, radius + 1.0e-9
+
+
+def _chord(angle):
+    """ Length of the chord on a unit sphere subtending ``angle``. """
+    return 2.0 * np.sin(0.5 * min(angle, np.pi))
+
+
+class FootprintIndex():
+    """
+    A spatial index (KD-tree) of spherical caps bounding footprints on the
+    sky.
+
+    The index is used to find pairs of footprints that *may* overlap,
+    so that the (expensive) intersections of spherical polygons need to be
+    computed only for these pairs.
+
+    Parameters
+    ----------
+    polygons : list of `~spherical_geometry.polygon.SphericalPolygon`
+        The footprints to index. Empty footprints do not overlap anything.
+
+    """
+    def __init__(self, polygons):
+        caps = [bounding_cap(polygon) for polygon in polygons]
+        self._idx = np.array(
+            [k for k, (center, _) in enumerate(caps) if center is not None],
+            dtype=int
+        )
+        self._centers = np.array(
+            [caps[k][0] for k in self._idx]
+        ).reshape((-1, 3))
+        self._radii = np.array([caps[k][1] for k in self._idx])
+
+        if self._idx.size:
+            self._rmax = self._radii.max()
+            self._tree = cKDTree(self._centers)
+        else:
+            self._rmax = 0.0
+            self._tree = None
+
+    def pairs(self):
+        """ Return a sorted list of index pairs ``(i, j)``, ``i < j``, of
+        footprints that may overlap.
+
+        """
+        if self._idx.size < 2:
+            return []
+
+        # query pairs closer than the largest possible separation of two
+        # overlapping caps (chord length on the unit sphere)...
+        pairs = self._tree.query_pairs(_chord(2.0 * self._rmax),
+                                       output_type='ndarray')
+
+        # ... and keep only those whose caps actually intersect:
+        k1, k2 = pairs[:, 0], pairs[:, 1]
+        cos_sep = np.einsum('ij,ij->i', self._centers[k1], self._centers[k2])
+        sep = np.arccos(np.clip(cos_sep, -1.0, 1.0))
+        keep = sep <= self._radii[k1] + self._radii[k2]
+
+        return sorted(
+            (min(i, j), max(i, j)) for i, j in
+            zip(self._idx[k1[keep]].tolist(), self._idx[k2[keep]].tolist())
+        )
+
+    def neighbors(self, polygon):
+        """ Return a set of indices of footprints that may overlap a
+        spherical polygon.
+
+        """
+        center, radius = bounding_cap(polygon)
+        if center is None or self._tree is None:
+            return set()
+
+        k = np.asarray(
+            self._tree.query_ball_point(center, _chord(radius + self._rmax)),
+            dtype=int
+        )
+        if k.size == 0:
+            return set()
+
+        cos_sep = np.dot(self._centers[k], center)
+        sep = np.arccos(np.clip(cos_sep, -1.0, 1.0))
+        return set(self._idx[k[sep <= radius + self._radii[k]]].tolist())
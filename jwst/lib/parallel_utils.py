@@ -0,0 +1,105 @@
+"""Process pool for independent pieces of work, such as the slits of a MOS exposure"""
+import io
+import logging
+import multiprocessing
+
+import asdf
+
+from ..datamodels import DataModel
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+__all__ = ['map_ordered']
+
+# State handed to forked workers.  It is only populated while a process
+# pool is running in map_ordered.
+_worker_state = {}
+
+
+class _PackedModel:
+    """A data model serialized to ASDF, to be passed between processes"""
+
+    def __init__(self, model):
+        self.cls = model.__class__
+        buff = io.BytesIO()
+        asdf.AsdfFile(model._instance).write_to(buff)
+        self.data = buff.getvalue()
+
+    def unpack(self):
+        return self.cls(asdf.open(io.BytesIO(self.data), copy_arrays=True))
+
+
+def _pack(result):
+    """Replace the data models in a result by their serialization"""
+    if isinstance(result, DataModel):
+        return _PackedModel(result)
+    if isinstance(result, (tuple, list)):
+        return type(result)(_pack(r) for r in result)
+    return result
+
+
+def _unpack(result):
+    """Rebuild the data models in a result returned by a worker"""
+    if isinstance(result, _PackedModel):
+        return result.unpack()
+    if isinstance(result, (tuple, list)):
+        return type(result)(_unpack(r) for r in result)
+    return result
+
+
+def _map_worker(index):
+    """Apply the function to one item"""
+    return _pack(_worker_state['func'](_worker_state['items'][index]))
+
+
+def map_ordered(func, items, nproc=1):
+    """Apply a function to each item, using a pool of processes.
+
+    The worker processes are forked, so they share the items (and any input
+    arrays ``func`` refers to) with the parent process without copying or
+    pickling them; only the index of each item is sent to the workers.
+    ``func`` can therefore be a closure.  Data models in the results,
+    including those inside tuples or lists, are sent back to the parent
+    serialized as ASDF.
+
+    Parameters
+    ----------
+    func : callable
+        Function of a single item
+
+    items : sequence
+        The items to process
+
+    nproc : int
+        Number of worker processes.  With 1 (or a single item), or on
+        platforms where processes cannot be forked, the items are processed
+        in this process.
+
+    Returns
+    -------
+    results : list
+        ``func(item)`` for each item, in the order of ``items``.
+    """
+    items = list(items)
+    nproc = min(nproc, len(items))
+    if nproc <= 1:
+        return [func(item) for item in items]
+
+    try:
+        ctx = multiprocessing.get_context('fork')
+    except ValueError:
+        log.warning('Processes cannot be forked on this platform; '
+                    'processing {} items serially'.format(len(items)))
+        return [func(item) for item in items]
+
+    log.info('Processing {} items using {} processes'.format(
+        len(items), nproc))
+    _worker_state.update(func=func, items=items)
+    try:
+        with ctx.Pool(nproc) as pool:
+            results = pool.map(_map_worker, range(len(items)), chunksize=1)
+    finally:
+        _worker_state.clear()
+
+    return [_unpack(result) for result in results]
@@ -0,0 +1,50 @@
+"""Test the spatial index of footprints on the sky"""
+import numpy as np
+from spherical_geometry.polygon import SphericalPolygon
+
+from ..footprint_index import FootprintIndex, bounding_cap
+
+
+def _square(ra, dec, size):
+    half = 0.5 * size
+    ra = ra + np.array([-half, half, half, -half, -half]) / np.cos(np.deg2rad(dec))
+    dec = dec + np.array([-half, -half, half, half, -half])
+    return SphericalPolygon.from_radec(ra, dec)
+
+
+def test_bounding_cap():
+    polygon = _square(30.0, 20.0, 0.1)
+    center, radius = bounding_cap(polygon)
+    assert np.isclose(np.linalg.norm(center), 1.0)
+    assert 0.0 < radius < np.deg2rad(0.1)
+
+    # all vertices are inside the cap:
+    for ra, dec in polygon.to_radec():
+        lon, lat = np.deg2rad(ra), np.deg2rad(dec)
+        xyz = np.array([np.cos(lat) * np.cos(lon),
+                        np.cos(lat) * np.sin(lon), np.sin(lat)])
+        assert np.all(np.arccos(np.clip(center.dot(xyz), -1, 1)) <= radius)
+
+    assert bounding_cap(SphericalPolygon([]))[0] is None
+
+
+def test_footprint_index():
+    rng = np.random.RandomState(3)
+    polygons = [_square(ra, dec, 0.05) for ra, dec in
+                zip(rng.uniform(0.0, 0.2, 30), rng.uniform(-0.1, 0.1, 30))]
+    polygons.append(SphericalPolygon([]))
+    index = FootprintIndex(polygons)
+
+    overlapping = [
+        (i, j) for i in range(len(polygons)) for j in range(i + 1, len(polygons))
+        if polygons[i].intersects_poly(polygons[j])
+    ]
+    pairs = index.pairs()
+    assert overlapping
+    assert set(overlapping) <= set(pairs)
+    assert len(pairs) < len(polygons) * (len(polygons) - 1) // 2
+    assert all(j < len(polygons) - 1 for i, j in pairs)
+
+    neighbors = index.neighbors(polygons[0])
+    assert {j for i, j in overlapping if i == 0} < neighbors
+    assert index.neighbors(_square(180.0, 0.0, 0.05)) == set()
@@ -0,0 +1,61 @@
+"""Test the process pool utilities"""
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from .. import parallel_utils
+from ... import datamodels
+
+
+def test_map_ordered():
+    items = list(range(10))
+    results = parallel_utils.map_ordered(lambda i: (i, os.getpid()), items,
+                                         nproc=3)
+    assert [r[0] for r in results] == items
+    assert os.getpid() not in [r[1] for r in results]
+
+
+def test_map_ordered_serial():
+    results = parallel_utils.map_ordered(lambda i: (i, os.getpid()), [0, 1],
+                                         nproc=1)
+    assert results == [(0, os.getpid()), (1, os.getpid())]
+
+
+def test_map_ordered_no_fork(monkeypatch):
+    def get_context(method=None):
+        raise ValueError('cannot find context for {!r}'.format(method))
+
+    monkeypatch.setattr(multiprocessing, 'get_context', get_context)
+    results = parallel_utils.map_ordered(lambda i: (i, os.getpid()), [0, 1],
+                                         nproc=2)
+    assert results == [(0, os.getpid()), (1, os.getpid())]
+
+
+def test_map_ordered_models():
+    data = np.arange(24, dtype=np.float32).reshape(4, 6)
+
+    def make_slit(i):
+        slit = datamodels.SlitModel(data * i)
+        slit.name = 'slit{}'.format(i)
+        slit.xstart = i
+        return slit, [i, None]
+
+    results = parallel_utils.map_ordered(make_slit, range(4), nproc=2)
+    for i, (slit, extra) in enumerate(results):
+        assert isinstance(slit, datamodels.SlitModel)
+        assert slit.name == 'slit{}'.format(i)
+        assert slit.xstart == i
+        assert np.array_equal(slit.data, data * i)
+        assert extra == [i, None]
+
+
+def test_map_ordered_error():
+    def fail(i):
+        if i == 2:
+            raise ValueError('bad item')
+        return i
+
+    with pytest.raises(ValueError, match='bad item'):
+        parallel_utils.map_ordered(fail, range(4), nproc=2)
@@ -19,7 +19,7 @@ log.setLevel(logging.DEBUG)
 CRBIT = np.uint32(datamodels.dqflags.pixel['JUMP_DET'])
 
 
-__all__ = ["OutlierDetection", "flag_cr", "abs_deriv"]
+__all__ = ["OutlierDetection", "flag_cr", "cr_good_mask", "abs_deriv"]
 
 
 class OutlierDetection:
@@ -374,29 +374,74 @@ def flag_cr(sci_image, blot_image, **pars):
     backg    = 0               # Background value
 
     """
-    grow = pars.get('grow', 1)
-    ctegrow = pars.get('ctegrow', 0)  # not provided by outlierpars
-    backg = pars.get('backg', 0)
-    snr1, snr2 = [float(val) for val in pars.get('snr', '5.0 4.0').split()]
-    scl1, scl2 = [float(val) for val in pars.get('scale', '1.2 0.7').split()]
-
     if not sci_image.meta.background.subtracted:
         # Include background back into blotted image for comparison
         subtracted_background = sci_image.meta.background.level
         log.debug("Subtracted background: {}".format(subtracted_background))
     if subtracted_background is None:
-        subtracted_background = backg
+        subtracted_background = pars.get('backg', 0)
 
     exptime = sci_image.meta.exposure.exposure_time
 
     sci_data = sci_image.data * exptime
     blot_data = blot_image.data * exptime
+
+    cr_mask = cr_good_mask(sci_data, blot_data, sci_image.err,
+                           subtracted_background, **pars)
+
+    count_sci = np.count_nonzero(sci_image.dq)
+    count_cr = np.count_nonzero(cr_mask)
+    log.debug("Pixels in input DQ: {}".format(count_sci))
+    log.debug("Pixels in cr_mask:  {}".format(count_cr))
+
+    # Update the DQ array in the input image in place
+    np.bitwise_or(sci_image.dq, np.invert(cr_mask) * CRBIT, sci_image.dq)
+
+
+def cr_good_mask(sci_data, blot_data, err, subtracted_background, **pars):
+    """Compare science data with a model, returning the mask of good pixels.
+
+    This is the computation done by `flag_cr`, on arrays.  The arrays may
+    be 3-D, e.g. the integrations of a TSO exposure, in which case each
+    plane is compared independently to the corresponding plane of
+    ``blot_data``, which may also be a single 2-D image.
+
+    Parameters
+    ----------
+    sci_data : ndarray
+        The science data, multiplied by the exposure time
+
+    blot_data : ndarray
+        The model (blotted median) data, multiplied by the exposure time
+
+    err : ndarray
+        The error array of the science data
+
+    subtracted_background : float
+        Background level to add back into the model
+
+    pars : dict
+        The user parameters for Outlier Detection, see `flag_cr`
+
+    Returns
+    -------
+    cr_mask : ndarray of bool
+        False for the pixels flagged as outliers
+    """
+    grow = pars.get('grow', 1)
+    ctegrow = pars.get('ctegrow', 0)  # not provided by outlierpars
+    snr1, snr2 = [float(val) for val in pars.get('snr', '5.0 4.0').split()]
+    scl1, scl2 = [float(val) for val in pars.get('scale', '1.2 0.7').split()]
+
     blot_deriv = abs_deriv(blot_data)
 
-    err_data = np.nan_to_num(sci_image.err)
+    err_data = np.nan_to_num(err)
+
+    # Kernels act on the last two axes only
+    leading = (1,) * (np.ndim(sci_data) - 2)
 
     # Define output cosmic ray mask to populate
-    cr_mask = np.zeros(sci_image.shape, dtype=np.uint8)
+    cr_mask = np.zeros(np.shape(sci_data), dtype=np.uint8)
 
     #
     #
@@ -412,7 +457,7 @@ def flag_cr(sci_image, blot_image, **pars):
     tmp1 = np.logical_not(np.greater(diff_noise, t2))
 
     # Convolve mask with 3x3 kernel
-    kernel = np.ones((3, 3), dtype=np.uint8)
+    kernel = np.ones(leading + (3, 3), dtype=np.uint8)
     tmp2 = np.zeros(tmp1.shape, dtype=np.int32)
     ndimage.convolve(tmp1, kernel, output=tmp2, mode='nearest', cval=0)
 
@@ -446,13 +491,14 @@ def flag_cr(sci_image, blot_image, **pars):
     cr_mask = cr_mask_orig_bool.astype(np.int8)
 
     # make radial convolution kernel and convolve it with original cr_mask
-    cr_grow_kernel = np.ones((grow, grow))
+    cr_grow_kernel = np.ones(leading + (grow, grow))
     cr_grow_kernel_conv = cr_mask.copy()
     ndimage.convolve(cr_mask, cr_grow_kernel, output=cr_grow_kernel_conv)
 
     # make tail convolution kernel and (shortly) convolve it with
     # original cr_mask
-    cr_ctegrow_kernel = np.zeros((2 * ctegrow + 1, 2 * ctegrow + 1))
+    cr_ctegrow_kernel = np.zeros(leading +
+                                 (2 * ctegrow + 1, 2 * ctegrow + 1))
     cr_ctegrow_kernel_conv = cr_mask.copy()
 
     # which pixels are masked by tail kernel depends on readout direction
@@ -460,9 +506,9 @@ def flag_cr(sci_image, blot_image, **pars):
     # remains below.  For now, we set to zero, which turns off CTE masking.
     ctedir = 0
     if (ctedir == 1):
-        cr_ctegrow_kernel[0:ctegrow, ctegrow] = 1
+        cr_ctegrow_kernel[..., 0:ctegrow, ctegrow] = 1
     if (ctedir == -1):
-        cr_ctegrow_kernel[ctegrow + 1:2 * ctegrow + 1, ctegrow] = 1
+        cr_ctegrow_kernel[..., ctegrow + 1:2 * ctegrow + 1, ctegrow] = 1
     if (ctedir == 0):
         pass
 
@@ -481,28 +527,22 @@ def flag_cr(sci_image, blot_image, **pars):
                    where_cr_grow_kernel_conv, cr_mask)
     cr_mask = cr_mask.astype(bool)
 
-    count_sci = np.count_nonzero(sci_image.dq)
-    count_cr = np.count_nonzero(cr_mask)
-    log.debug("Pixels in input DQ: {}".format(count_sci))
-    log.debug("Pixels in cr_mask:  {}".format(count_cr))
-
-    # Update the DQ array in the input image in place
-    np.bitwise_or(sci_image.dq, np.invert(cr_mask) * CRBIT, sci_image.dq)
+    return cr_mask
 
 
 def abs_deriv(array):
-    """Take the absolute derivate of a numpy array."""
+    """Take the absolute derivate of a numpy array along its last two axes."""
     tmp = np.zeros(array.shape, dtype=np.float64)
     out = np.zeros(array.shape, dtype=np.float64)
 
-    tmp[1:, :] = array[:-1, :]
+    tmp[..., 1:, :] = array[..., :-1, :]
     tmp, out = _absolute_subtract(array, tmp, out)
-    tmp[:-1, :] = array[1:, :]
+    tmp[..., :-1, :] = array[..., 1:, :]
     tmp, out = _absolute_subtract(array, tmp, out)
 
-    tmp[:, 1:] = array[:, :-1]
+    tmp[..., :, 1:] = array[..., :, :-1]
     tmp, out = _absolute_subtract(array, tmp, out)
-    tmp[:, :-1] = array[:, 1:]
+    tmp[..., :, :-1] = array[..., :, 1:]
     tmp, out = _absolute_subtract(array, tmp, out)
 
     return out
@@ -8,12 +8,14 @@ from . import outlier_detection
 from . import outlier_detection_scaled
 from . import outlier_detection_ifu
 from . import outlier_detection_spec
+from . import outlier_detection_tso
 
 # Categorize all supported versions of outlier_detection
 outlier_registry = {'imaging': outlier_detection.OutlierDetection,
                     'scaled': outlier_detection_scaled.OutlierDetectionScaled,
                     'ifu': outlier_detection_ifu.OutlierDetectionIFU,
-                    'slitspec': outlier_detection_spec.OutlierDetectionSpec
+                    'slitspec': outlier_detection_spec.OutlierDetectionSpec,
+                    'tso': outlier_detection_tso.OutlierDetectionTSO
                     }
 
 # Categorize all supported modes
@@ -62,6 +64,8 @@ class OutlierDetectionStep(Step):
         good_bits = integer(default=4)
         scale_detection = boolean(default=False)
         search_output_file = boolean(default=False)
+        nproc = integer(min=1, default=1) # processes used for single drizzle
+        rolling_window_width = integer(min=0, default=0) # TSO integrations in the median, 0 for all
     """
 
     def process(self, input):
@@ -106,6 +110,8 @@ class OutlierDetectionStep(Step):
                 'save_intermediate_results': self.save_intermediate_results,
                 'resample_data': self.resample_data,
                 'good_bits': self.good_bits,
+                'nproc': self.nproc,
+                'rolling_window_width': self.rolling_window_width,
                 'make_output_path': self.make_output_path,
             }
 
@@ -124,12 +130,16 @@ class OutlierDetectionStep(Step):
             elif exptype in TSO_SPEC_MODES:
                 # algorithm selected for TSO data (no resampling)
                 pars['resample_data'] = False  # force resampling off...
-                detection_step = outlier_registry['imaging']
+                detection_step = self._tso_detection_step()
                 pars['resample_suffix'] = 's2d'
-            elif exptype in TSO_IMAGE_MODES+CORON_IMAGE_MODES and \
-                    not self.scale_detection:
+            elif exptype in TSO_IMAGE_MODES and not self.scale_detection:
                 # algorithm selected for TSO data (no resampling)
                 pars['resample_data'] = False  # force resampling off...
+                detection_step = self._tso_detection_step()
+                pars['resample_suffix'] = 'i2d'
+            elif exptype in CORON_IMAGE_MODES and not self.scale_detection:
+                # algorithm selected for coronagraphic data (no resampling)
+                pars['resample_data'] = False  # force resampling off...
                 detection_step = outlier_registry['imaging']
                 pars['resample_suffix'] = 'i2d'
             elif exptype in TSO_IMAGE_MODES and self.scale_detection:
@@ -151,9 +161,12 @@ class OutlierDetectionStep(Step):
 
             if not self.valid_input:
                 result = input_models
-                for input in result:
-                    input.meta.cal_step.outlier_detection = "SKIPPED"
-                    self.skip = True
+                if self.input_container:
+                    for input in result:
+                        input.meta.cal_step.outlier_detection = "SKIPPED"
+                else:
+                    result.meta.cal_step.outlier_detection = "SKIPPED"
+                self.skip = True
                 return result
 
             self.log.debug("Using {} class for outlier_detection".format(
@@ -173,6 +186,16 @@ class OutlierDetectionStep(Step):
 
             return self.input_models
 
+    def _tso_detection_step(self):
+        """Select the algorithm for TSO data.
+
+        A CubeModel is processed directly along the integration axis;
+        a ModelContainer of integrations uses the default algorithm.
+        """
+        if self.input_container:
+            return outlier_registry['imaging']
+        return outlier_registry['tso']
+
     def _build_reffile_container(self, reftype):
         """Return a ModelContainer of reference file models.
 
@@ -0,0 +1,225 @@
+"""Outlier detection for time-series observations, on the input cube."""
+
+import numpy as np
+
+from .. import datamodels
+from ..resample.resample_utils import build_mask
+from .outlier_detection import OutlierDetection, cr_good_mask, CRBIT
+
+import logging
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+# Approximate size, in bytes, of each input array processed at once
+MAX_CHUNK_SIZE = 64 * 1024**2
+
+__all__ = ["OutlierDetectionTSO", "masked_median"]
+
+
+class OutlierDetectionTSO(OutlierDetection):
+    """Flag outliers in the integrations of a TSO CubeModel.
+
+    This is the outlier detection done by `OutlierDetection` without
+    resampling, but working directly on the 3-D arrays of the input
+    `~jwst.datamodels.CubeModel` instead of a `ModelContainer` with an
+    `ImageModel` for each integration.  The median is computed along the
+    integration axis and the integrations are compared to it in chunks of
+    integrations, so that memory use does not grow with the number of
+    integrations.
+
+    By default, a single median image of all integrations is used, as
+    with `OutlierDetection`.  If the ``rolling_window_width`` parameter
+    is larger than 1, each integration is instead compared to the median
+    of the ``rolling_window_width`` integrations around it, which follows
+    astrophysical variations of the source over the exposure.
+    """
+
+    default_suffix = 'i2d'
+
+    def __init__(self, input_models, reffiles=None, **pars):
+        """Initialize the class with the input CubeModel.
+
+        Parameters
+        ----------
+        input_models : `~jwst.datamodels.CubeModel`
+            The integrations of a TSO exposure.  The DQ array is updated
+            in place.
+
+        pars : dict, optional
+            Optional user-specified parameters to modify how outlier_detection
+            will operate.  In addition to the parameters of
+            `OutlierDetection`, ``rolling_window_width`` sets the number of
+            integrations combined in the median (0 for all integrations).
+        """
+        OutlierDetection.__init__(self, input_models,
+                                  reffiles=reffiles, **pars)
+
+    def do_detection(self):
+        """Flag outlier pixels in the DQ array of the input cube."""
+        self.build_suffix(**self.outlierpars)
+        pars = self.outlierpars
+        cube = self.inputs
+        nints = cube.data.shape[0]
+
+        # Pixels excluded from the median, decided from the input DQ
+        # before any outlier is flagged
+        badmask = self._low_weight_mask()
+
+        width = pars.get('rolling_window_width', 0) or 0
+        if width <= 1 or width >= nints:
+            log.info("Computing the median of {} integrations".format(nints))
+            median_image = self.create_median_image(badmask)
+            if pars['save_intermediate_results']:
+                self._save_median(datamodels.ImageModel(data=median_image))
+        else:
+            log.info("Computing rolling medians of {} integrations".format(
+                width))
+            median_image = None
+            if pars['save_intermediate_results']:
+                median_cube = np.zeros(cube.data.shape, dtype=np.float32)
+
+        if not cube.meta.background.subtracted:
+            # Include background back into median for comparison
+            subtracted_background = cube.meta.background.level
+        else:
+            subtracted_background = None
+        if subtracted_background is None:
+            subtracted_background = pars.get('backg', 0)
+        exptime = cube.meta.exposure.exposure_time
+
+        nflagged = 0
+        for start, stop in self._chunks(nints, cube.data[0].nbytes):
+            if median_image is None:
+                blot = self.rolling_median(badmask, start, stop, width)
+                if pars['save_intermediate_results']:
+                    median_cube[start:stop] = blot
+            else:
+                blot = median_image
+
+            cr_mask = cr_good_mask(cube.data[start:stop] * exptime,
+                                   blot * exptime, cube.err[start:stop],
+                                   subtracted_background, **pars)
+            nflagged += cr_mask.size - np.count_nonzero(cr_mask)
+            cube.dq[start:stop] |= np.invert(cr_mask) * CRBIT
+
+        log.debug("Pixels flagged as outliers: {}".format(nflagged))
+
+        if median_image is None and pars['save_intermediate_results']:
+            self._save_median(datamodels.CubeModel(data=median_cube))
+
+    def _low_weight_mask(self):
+        """Mask of the pixels to exclude from the median.
+
+        This is what `OutlierDetection.create_median` computes from the
+        exposure-time weights of the integrations, which are either 0 or
+        the exposure time.
+        """
+        cube = self.inputs
+        maskpt = self.outlierpars.get('maskpt', 0.7)
+        exptime = cube.meta.exposure.exposure_time
+
+        good = build_mask(cube.dq, self.outlierpars['good_bits']) > 0
+        weight = exptime * good
+        badmask = np.less(weight, exptime * maskpt)
+        # Integrations without good pixels have no valid mean weight, so
+        # none of their pixels get masked
+        badmask &= good.any(axis=(1, 2))[:, np.newaxis, np.newaxis]
+
+        return badmask
+
+    def _chunks(self, nints, nbytes):
+        """Ranges of integrations to process at once"""
+        step = max(1, MAX_CHUNK_SIZE // max(nbytes, 1))
+        for start in range(0, nints, step):
+            yield start, min(start + step, nints)
+
+    def create_median_image(self, badmask):
+        """Median of all the integrations, ignoring masked pixels."""
+        data = self.inputs.data
+        nlow = self.outlierpars.get('nlow', 0)
+        nhigh = self.outlierpars.get('nhigh', 0)
+
+        # The median needs all the integrations, so split the image in rows
+        median_image = np.zeros(data.shape[1:], dtype=np.float32)
+        nbytes = data.shape[0] * data.shape[2] * data.itemsize
+        for start, stop in self._chunks(data.shape[1], nbytes):
+            median_image[start:stop] = masked_median(
+                data[:, start:stop], badmask[:, start:stop], nlow, nhigh)
+
+        return median_image
+
+    def rolling_median(self, badmask, start, stop, width):
+        """Median of the ``width`` integrations around each integration.
+
+        Returns
+        -------
+        median_cube : ndarray, 3-D
+            The median for integrations ``start`` to ``stop``.  The window
+            is shifted at the ends of the exposure so that it always holds
+            ``width`` integrations.
+        """
+        data = self.inputs.data
+        nlow = self.outlierpars.get('nlow', 0)
+        nhigh = self.outlierpars.get('nhigh', 0)
+        nints = data.shape[0]
+
+        median_cube = np.zeros((stop - start,) + data.shape[1:],
+                               dtype=np.float32)
+        for i in range(start, stop):
+            first = min(max(i - width // 2, 0), nints - width)
+            window = slice(first, first + width)
+            median_cube[i - start] = masked_median(
+                data[window], badmask[window], nlow, nhigh)
+
+        return median_cube
+
+    def _save_median(self, median_model):
+        median_model.update(self.inputs)
+        median_output_path = self.make_output_path(
+            basepath=self.inputs.meta.filename,
+            suffix='median'
+        )
+        log.info("Writing out MEDIAN image to: {}".format(median_output_path))
+        median_model.save(median_output_path)
+
+
+def masked_median(data, badmask, nlow=0, nhigh=0):
+    """Median along the first axis, ignoring masked values.
+
+    This gives the same result as `stsci.image.median` for a stack of
+    images: the ``nlow`` lowest and ``nhigh`` highest good values are
+    rejected when there are more good values than that, the median of an
+    even number of values is the mean of the two middle values, and pixels
+    without good values are set to 0.
+
+    Parameters
+    ----------
+    data : ndarray
+        Stack of images
+
+    badmask : ndarray of bool
+        True for the values to ignore, same shape as ``data``
+
+    nlow, nhigh : int
+        Number of low and high values to reject for each pixel
+
+    Returns
+    -------
+    median : ndarray
+        Array with the shape of ``data`` without its first axis
+    """
+    stack = np.where(badmask, np.nan, data)
+    stack.sort(axis=0)                  # NaN are sorted last
+    ngood = len(data) - np.count_nonzero(badmask, axis=0)
+
+    reject = nlow + nhigh < ngood
+    low = np.where(reject, nlow, 0)
+    nused = np.where(reject, ngood - nlow - nhigh, ngood)
+
+    lower = low + np.maximum(nused - 1, 0) // 2
+    upper = np.minimum(low + nused // 2, len(data) - 1)
+    pixels = np.ix_(*[np.arange(n) for n in ngood.shape])
+    median = 0.5 * (stack[(lower,) + pixels] + stack[(upper,) + pixels])
+    median[ngood == 0] = 0.
+
+    return median
@@ -0,0 +1,96 @@
+"""
+Test outlier detection on TSO cubes
+"""
+import numpy as np
+import pytest
+from astropy.modeling import models
+from gwcs import wcs
+from gwcs import coordinate_frames as cf
+from stsci.image import median
+
+from jwst import datamodels
+from jwst.datamodels import dqflags
+from jwst.outlier_detection import outlier_detection_tso
+from jwst.outlier_detection.outlier_detection import OutlierDetection
+from jwst.outlier_detection.outlier_detection_tso import (
+    OutlierDetectionTSO, masked_median)
+
+CRBIT = dqflags.pixel['JUMP_DET']
+
+PARS = {
+    'weight_type': 'exptime',
+    'nlow': 0,
+    'nhigh': 0,
+    'maskpt': 0.7,
+    'grow': 1,
+    'snr': '4.0 3.0',
+    'scale': '0.5 0.4',
+    'backg': 0.0,
+    'save_intermediate_results': False,
+    'resample_data': False,
+    'good_bits': 4,
+    'resample_suffix': 'i2d',
+}
+
+
+def _tso_cube(nints=8, trend=0.):
+    rng = np.random.RandomState(3)
+    cube = datamodels.CubeModel((nints, 20, 30))
+    cube.data[...] = 100. + rng.normal(size=cube.data.shape)
+    cube.data += trend * np.arange(nints)[:, np.newaxis, np.newaxis]
+    cube.err[...] = 1.
+    cube.data[2, 5, 7] += 500.
+    cube.data[5, 12, 20] += 300.
+    cube.dq[1, 3, 3] = dqflags.pixel['DO_NOT_USE']
+    cube.meta.exposure.type = 'NRC_TSIMAGE'
+    cube.meta.exposure.exposure_time = 10.
+    cube.meta.background.subtracted = False
+    cube.meta.wcs = wcs.WCS([(cf.Frame2D(name='detector'),
+                              models.Identity(2)),
+                             (cf.Frame2D(name='world'), None)])
+    return cube
+
+
+@pytest.mark.parametrize('chunk_size', [None, 1])
+def test_tso_same_as_images(chunk_size, monkeypatch):
+    if chunk_size is not None:
+        monkeypatch.setattr(outlier_detection_tso, 'MAX_CHUNK_SIZE',
+                            chunk_size)
+    cube = _tso_cube()
+    expected = _tso_cube()
+
+    OutlierDetectionTSO(cube, reffiles={}, **PARS).do_detection()
+    OutlierDetection(expected, reffiles={}, **PARS).do_detection()
+
+    assert np.array_equal(cube.dq, expected.dq)
+    assert cube.dq[2, 5, 7] & CRBIT
+    assert cube.dq[5, 12, 20] & CRBIT
+
+
+def test_tso_rolling_median():
+    # The source brightens over the exposure, which a single median of
+    # all integrations takes as outliers
+    cube = _tso_cube(trend=5.)
+    OutlierDetectionTSO(cube, reffiles={}, **PARS).do_detection()
+    assert np.count_nonzero(cube.dq & CRBIT) > 100
+
+    cube = _tso_cube(trend=5.)
+    OutlierDetectionTSO(cube, reffiles={}, rolling_window_width=3,
+                        **PARS).do_detection()
+    flagged = np.argwhere(cube.dq & CRBIT)
+    assert {(2, 5, 7), (5, 12, 20)} <= set(map(tuple, flagged))
+    assert set(flagged[:, 0]) == {2, 5}
+
+
+@pytest.mark.parametrize('nlow, nhigh', [(0, 0), (1, 0), (1, 1), (2, 2)])
+def test_masked_median(nlow, nhigh):
+    rng = np.random.RandomState(5)
+    data = rng.normal(size=(6, 4, 5)).astype(np.float32)
+    badmask = rng.uniform(size=data.shape) < 0.3
+    badmask[:, 0, 0] = True
+
+    result = masked_median(data, badmask, nlow, nhigh)
+    expected = median(list(data), nlow=nlow, nhigh=nhigh,
+                      badmasks=list(badmask))
+    assert np.allclose(result, expected)
+    assert result[0, 0] == 0.
@@ -5,7 +5,6 @@ import math
 import numpy as np
 import logging
 from jwst.assign_wcs import nirspec, util
-from gwcs import wcstools
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
@@ -326,15 +325,13 @@ def do_correction(input_model, pathloss_model):
         # Create the 2-d pathloss arrays, initialize with NaNs
         wavelength_array = np.zeros(input_model.shape, dtype=np.float32)
         wavelength_array.fill(np.nan)
-        for slice in NIRSPEC_IFU_SLICES:
-            slice_wcs = nirspec.nrs_wcs_set_input(input_model, slice)
-            x, y = wcstools.grid_from_bounding_box(slice_wcs.bounding_box)
-            xmin = int(x.min())
-            xmax = int(x.max())
-            ymin = int(y.min())
-            ymax = int(y.max())
-            ra, dec, wavelength = slice_wcs(x, y)
-            wavelength_array[ymin:ymax+1, xmin:xmax+1] = wavelength
+        slice_maps = nirspec.nrs_slit_maps(input_model, NIRSPEC_IFU_SLICES)
+        for slice_map in slice_maps.values():
+            wavelength = np.where(slice_map.mask, slice_map.world[2], np.nan)
+            ny, nx = wavelength.shape
+            xmin = slice_map.xstart
+            ymin = slice_map.ystart
+            wavelength_array[ymin:ymin+ny, xmin:xmin+nx] = wavelength
         pathloss_pointsource_2d = interpolate_onto_grid(wavelength_array,
                                                         wavelength_pointsource,
                                                         pathloss_pointsource_vector)
@@ -1,7 +1,6 @@
 #
 #  Module for correcting for persistence
 
-import math
 import numpy as np
 import logging
 from .. import datamodels
@@ -15,6 +14,25 @@ SCALEFACTOR = 2.
 from traps, compared with photon-generated charges.
 """
 
+def family_axis(param, ndim):
+    """Reshape trap parameters to broadcast against arrays of pixels.
+
+    Parameters
+    ----------
+    param : ndarray, 1-D
+        One value for each trap family.
+
+    ndim : int
+        The number of dimensions of the arrays of pixels.
+
+    Returns
+    -------
+    ndarray
+        `param`, with `ndim` axes of length one appended.
+    """
+
+    return np.reshape(param, (-1,) + (1,) * ndim)
+
 def no_NaN(input_model, fill_value,
            zap_nan=False, zap_zero=False):
     """Replace NaNs and/or zeros with a fill value.
@@ -206,14 +224,16 @@ class DataSet():
             skipped = True
             return (self.output_obj, None, None, skipped)
 
-        # Read the table of capture and decay parameters.
+        # Read the table of capture and decay parameters.  All trap families
+        # are processed at once, so these are arrays with one element for
+        # each family.
         par = self.get_parameters()
         nfamilies = len(par[0])
         if nfamilies <= 0:
             log.error("The trappars reference table is empty!")
+        capture_param = tuple(p.astype(np.float64) for p in par[0:3])
+        decay_param = par[3].astype(np.float64)
 
-        # Note that this might be a subarray.
-        persistence = np.zeros((shape[-2], shape[-1]), dtype=np.float64)
         (nints, ngroups, ny, nx) = shape
         t_group = self.output_obj.meta.exposure.group_time
 
@@ -259,29 +279,24 @@ class DataSet():
                         - self.traps_filled.meta.exposure.end_time) * 86400.
             log.debug("Decay time for previous traps-filled file = %g s",
                       to_start)
-            for k in range(nfamilies):
-                decay_param_k = self.get_decay_param(par, k)
-                decay = self.compute_decay(self.traps_filled.data[k],
-                                           decay_param_k, to_start)
-                self.traps_filled.data[k, :, :] -= decay
-                del decay
+            self.traps_filled.data -= self.compute_decay(
+                                self.traps_filled.data, decay_param, to_start)
 
         """
         These will be full-frame:
             self.traps_filled           (nfamilies, det_ny, det_nx)
             self.trap_density (before extracting subarray)
             self.persistencesat (before extracting subarray)
-            decayed                     (nfamilies, det_ny, det_nx)
-            decayed_in_group            (det_ny, det_nx)
 
         These will be subarrays if the input object is a subarray:
             self.output_obj             (nints, ngroups, ny, nx)
             self.trap_density (after extracting subarray)
             self.persistencesat (after extracting subarray)
+            filled_at_start             (nfamilies, ny * nx)
             persistence
             self.output_pers
-            filled
-            cr_filled
+            filled                      (nfamilies, ny, nx)
+            cr_filled                   (nfamilies, ny, nx)
         """
 
         # If the science image is a subarray, extract matching sections of
@@ -321,70 +336,71 @@ class DataSet():
         else:
             self.output_pers = None
 
-        # Buffer for accumulating the number of decayed traps from the
-        # start of an integration to the current group (in the loop below).
-        decayed = np.zeros((nfamilies, det_ny, det_nx), dtype=np.float64)
+        # The traps that are filled at the start of an integration decay
+        # exponentially during the integration, so the cumulative number of
+        # decays at the end of each group is a fixed fraction of them:
+        # decayed_fraction[group, k] for trap family k.
+        group_end = t_group * np.arange(1, ngroups + 1, dtype=np.float64)
+        remaining = self.remaining_fraction(decay_param,
+                                            group_end[:, np.newaxis])
+        decayed_fraction = 1. - remaining
 
         # self.traps_filled will be updated with each integration, to
         # account for charge capture and decay of traps.
-        filled = -1                             # just to ensure that it exists
         for integ in range(nints):
             self.get_group_info(integ)          # self.tgroup, etc.
-            decayed[:, :, :] = 0.               # initialize
             # slope has to be computed early in the loop over integrations,
             # before the data are modified by subtracting persistence.
             # The slope is needed for computing charge captures.
             (grp_slope, slope) = self.compute_slope(integ)
+
+            # Compute and subtract the decays during the reset.
+            # Decays during the reset at the beginning of the
+            # first integration have already been accounted for.
+            if integ > 0 and self.nresets > 0:
+                reset_time = self.tframe * self.nresets
+                self.traps_filled.data -= self.compute_decay(
+                                self.traps_filled.data, decay_param,
+                                reset_time)
+
+            if is_subarray:
+                filled_at_start = self.traps_filled.data[:, save_slice[0],
+                                                         save_slice[1]]
+            else:
+                filled_at_start = self.traps_filled.data
+            filled_at_start = filled_at_start.reshape(
+                                (nfamilies, ny * nx)).astype(np.float64)
+
             for group in range(ngroups):
-                persistence[:, :] = 0.          # initialize
-                for k in range(nfamilies):
-                    decay_param_k = self.get_decay_param(par, k)
-                    # Compute and subtract the decays during the reset.
-                    # Decays during the reset at the beginning of the
-                    # first integration have already been accounted for.
-                    if integ > 0 and group == 0 and self.nresets > 0:
-                        reset_time = self.tframe * self.nresets
-                        decay_during_reset = \
-                            self.compute_decay(self.traps_filled.data[k],
-                                               decay_param_k, reset_time)
-                        self.traps_filled.data[k, :, :] -= decay_during_reset
-                    # Decays during current group, for current trap family.
-                    decayed_in_group = \
-                        self.compute_decay(self.traps_filled.data[k],
-                                           decay_param_k, t_group)
-                    # Cumulative decay to the end of the current group.
-                    decayed[k, :, :] += decayed_in_group
-                    self.traps_filled.data[k, :, :] -= decayed_in_group
-                    if is_subarray:
-                        persistence += decayed[k, save_slice[0], save_slice[1]]
-                    else:
-                        persistence += decayed[k, :, :]
-                    del decayed_in_group
+                # Cumulative decay to the end of the current group, summed
+                # over trap families.
+                persistence = np.dot(decayed_fraction[group],
+                                     filled_at_start).reshape((ny, nx))
 
                 # Persistence was computed in DN.
                 self.output_obj.data[integ, group, :, :] -= persistence
                 if self.save_persistence:
-                    self.output_pers.data[integ, group, :, :] = \
-                        persistence.copy()
+                    self.output_pers.data[integ, group, :, :] = persistence
                 if persistence.max() >= self.flag_pers_cutoff:
                     mask = (persistence >= self.flag_pers_cutoff)
                     self.output_obj.pixeldq[mask] |= dqflags.pixel['DO_NOT_USE']
+            del filled_at_start
+
+            # The traps that did not decay by the end of the integration.
+            self.traps_filled.data *= family_axis(remaining[-1], 2)
 
             # Update traps_filled with the number of traps that captured
             # a charge during the current integration.
-            for k in range(nfamilies):
-                capture_param_k = self.get_capture_param(par, k)
-                # This may be a subarray.
-                filled = self.predict_capture(capture_param_k,
-                                              self.trap_density.data,
-                                              integ, grp_slope, slope)
-                if is_subarray:
-                    self.traps_filled.data[k, save_slice[0],
-                                              save_slice[1]] += filled
-                else:
-                    self.traps_filled.data[k, :, :] += filled
-
-        del filled
+            # This may be a subarray.
+            filled = self.predict_capture(capture_param,
+                                          self.trap_density.data,
+                                          integ, grp_slope, slope)
+            if is_subarray:
+                self.traps_filled.data[:, save_slice[0],
+                                          save_slice[1]] += filled
+            else:
+                self.traps_filled.data += filled
+            del filled
 
         # Update the start and end times (and other stuff) in the
         # traps_filled image to the times for the current exposure.
@@ -661,54 +677,6 @@ class DataSet():
         return (grp_slope, slope)
 
 
-    def get_capture_param(self, par, k):
-        """Extract capture parameters for the current trap family.
-
-        Parameters
-        ----------
-        par : tuple of ndarray
-            These were read from the trap parameters reference table.
-            Each element of the tuple is a column from the table.  Each
-            row of the table is for a different trap family.
-
-        k : int
-            Index of the current trap family
-
-        Returns
-        -------
-        tuple of three floats
-            These are the capture parameters for the current trap family.
-        """
-
-        (par0, par1, par2) = par[0:3]
-
-        return (par0[k], par1[k], par2[k])
-
-
-    def get_decay_param(self, par, k):
-        """Extract decay parameter(s) for the current trap family.
-
-        Parameters
-        ----------
-        par : tuple of ndarray
-            These were read from the trap parameters reference table.
-            Each element of the tuple is a column from the table.  Each
-            row of the table is for a different trap family.
-
-        k : int
-            Index of the current trap family
-
-        Returns
-        -------
-        float
-            This is the decay parameter for the current trap family.
-        """
-
-        par3 = par[3]
-
-        return par3[k]
-
-
     def get_group_info(self, integ):
         """Get some metadata.
 
@@ -754,19 +722,18 @@ class DataSet():
                 self.nresets = 1
 
 
-    def predict_capture(self, capture_param_k, trap_density, integ,
+    def predict_capture(self, capture_param, trap_density, integ,
                         grp_slope, slope):
         """Compute the number of traps that will be filled in time dt.
 
-        This is based on Michael Regan's trapcapturemodel.pro.
+        This is based on Michael Regan's trapcapturemodel.pro.  All trap
+        families are computed at once.
 
         Parameters
         ----------
-        capture_param_k : tuple of three floats
-            Three values read from a reference table.  These will be from
-            three separate columns but just one row; the row corresponds
-            to the current trap family.  (The _k in the variable name
-            indicates that the values are for one trap family.)
+        capture_param : tuple of three ndarrays
+            Three columns read from a reference table.  Each element of
+            a column is for a different trap family.
 
         trap_density : ndarray, 2-D
             Image of the total number of traps per pixel.
@@ -788,8 +755,9 @@ class DataSet():
 
         Returns
         -------
-        ndarray, 2-D
-            The computed traps_filled at the end of the integration.
+        ndarray, 3-D
+            The computed traps_filled at the end of the integration, one
+            image plane for each trap family.
         """
 
         data = self.output_obj.data[integ, :, :, :]
@@ -809,11 +777,8 @@ class DataSet():
         if hasattr(self.persistencesat, "dq"):
             mask = (np.bitwise_and(self.persistencesat.dq,
                                    dqflags.pixel["DO_NOT_USE"]) > 0)
-            mshape = mask.shape
-            mask = mask.reshape((1,) + mshape)
-            m3 = np.repeat(mask, ngroups, 0)
-            pflag[m3] = False
-            del mask, m3
+            pflag[:, mask] = False
+            del mask
 
         # All of these are 2-D arrays.
         sat_count = pflag.sum(axis=0, dtype=np.intp)
@@ -823,7 +788,7 @@ class DataSet():
 
         # Traps that were filled due to the linear portion of the ramp.
         ramp_traps_filled = self.predict_ramp_capture(
-                                capture_param_k,
+                                capture_param,
                                 trap_density, slope, dt)
 
         filled = ramp_traps_filled.copy()
@@ -831,35 +796,32 @@ class DataSet():
         any_saturated = np.any(mask)
         if any_saturated:
             # Traps that were filled due to the saturated portion of the ramp.
-            filled[mask] = self.predict_saturation_capture(
-                                capture_param_k,
+            filled[:, mask] = self.predict_saturation_capture(
+                                capture_param,
                                 trap_density[mask],
-                                ramp_traps_filled[mask],
+                                ramp_traps_filled[:, mask],
                                 sattime[mask], sat_count[mask], ngroups)
         del sat_count, sattime, ramp_traps_filled, mask
 
         # Traps that were filled due to cosmic-ray jumps.
-        cr_filled = self.delta_fcn_capture(
-                                capture_param_k,
+        filled += self.delta_fcn_capture(
+                                capture_param,
                                 trap_density, integ,
                                 grp_slope, ngroups, t_group)
-        filled += cr_filled
 
         return filled
 
 
-    def predict_ramp_capture(self, capture_param_k, trap_density, slope, dt):
+    def predict_ramp_capture(self, capture_param, trap_density, slope, dt):
         """Compute the number of traps that will be filled in time dt.
 
         This is based on Michael Regan's predictrampcapture3.pro.
 
         Parameters
         ----------
-        capture_param_k : tuple
-            Three values read from a reference table.  These will be from
-            three separate columns but just one row; the row corresponds
-            to the current trap family.  (The _k in the variable name
-            indicates that the values are for one trap family.)
+        capture_param : tuple of three ndarrays
+            Three columns read from a reference table, with one element
+            for each trap family.
 
         trap_density : ndarray, 2-D
             Image of the total number of traps per pixel.
@@ -877,17 +839,20 @@ class DataSet():
 
         Returns
         -------
-        ndarray, 2-D
-            The computed traps_filled at the end of the integration.
+        ndarray, 3-D
+            The computed traps_filled at the end of the integration, one
+            image plane for each trap family.
         """
 
-        (par0, par1, par2) = capture_param_k
-        if par1 == 0:
+        (par0, par1, par2) = [family_axis(p, trap_density.ndim)
+                              for p in capture_param]
+        zero = (par1 == 0)
+        for k in np.flatnonzero(zero):
             log.error("Capture parameter is zero; parameters are %g, %g, %g",
-                      par0, par1, par2)
-            tau = 1.e10                 # arbitrary "big" number
-        else:
-            tau = 1. / abs(par1)
+                      capture_param[0][k], capture_param[1][k],
+                      capture_param[2][k])
+        # Use an arbitrary "big" number for tau if par1 is zero.
+        tau = np.where(zero, 1.e10, 1. / np.abs(np.where(zero, 1., par1)))
 
         traps_filled = (trap_density * slope**2
                         * (dt**2 * (par0 + par2) / 2.
@@ -898,7 +863,7 @@ class DataSet():
         return traps_filled
 
 
-    def predict_saturation_capture(self, capture_param_k, trap_density,
+    def predict_saturation_capture(self, capture_param, trap_density,
                                    incoming_filled_traps,
                                    sattime, sat_count, ngroups):
         """Compute number of traps filled due to saturated pixels.
@@ -915,22 +880,22 @@ class DataSet():
         `trap_density`, `incoming_filled_traps`, `sattime`, and `sat_count`
         were all 2-D arrays in the calling function `predict_capture`, but
         these arrays have been masked to select only ramps with at least
-        one saturated group, so in this function these arrays are 1-D.
+        one saturated group, so in this function these arrays are 1-D,
+        except `incoming_filled_traps`, which has one row for each trap
+        family.
 
         Parameters
         ----------
-        capture_param_k : tuple
-            Three values read from a reference table.  These will be from
-            three separate columns but just one row; the row corresponds
-            to the current trap family.  (The _k in the variable name
-            indicates that the values are for one trap family.)
+        capture_param : tuple of three ndarrays
+            Three columns read from a reference table, with one element
+            for each trap family.
 
         trap_density : ndarray
             Image of the total number of traps per pixel.
 
-        incoming_filled_traps : ndarray
-            Traps filled due to linear portion of the ramp.
-            This may be modified in-place.
+        incoming_filled_traps : ndarray, 2-D
+            Traps filled due to linear portion of the ramp, for each trap
+            family.  This may be modified in-place.
 
         sattime : ndarray
             Time (seconds) during which each pixel was saturated.
@@ -945,16 +910,18 @@ class DataSet():
         Returns
         -------
         ndarray, 2-D
-            The computed traps_filled at the end of the integration.
+            The computed traps_filled at the end of the integration, one
+            row for each trap family.
         """
 
-        (par0, par1, par2) = capture_param_k
+        (par0, par1, par2) = [family_axis(p, trap_density.ndim)
+                              for p in capture_param]
         par1 = abs(par1)        # the minus sign will be specified explicitly
 
         # For each pixel that had no ramp before saturation, fill all the
         # instantaneous traps; otherwise, they were filled during the ramp.
         flag = (sat_count == ngroups)
-        incoming_filled_traps[flag] = trap_density[flag] * par2
+        incoming_filled_traps[:, flag] = trap_density[flag] * par2
 
         # Find out how many exponential traps have already been filled.
         exp_filled_traps = incoming_filled_traps - trap_density * par2
@@ -972,7 +939,7 @@ class DataSet():
         return total_filled_traps
 
 
-    def delta_fcn_capture(self, capture_param_k, trap_density, integ,
+    def delta_fcn_capture(self, capture_param, trap_density, integ,
                           grp_slope, ngroups, t_group):
         """Compute number of traps filled due to cosmic-ray jumps.
 
@@ -987,13 +954,13 @@ class DataSet():
         cr_filled = trap_density * jump
                     * (par0 * (1 - exp(-delta_t / tau)) + par2)
 
+        The jumps are found once, and applied to all trap families.
+
         Parameters
         ----------
-        capture_param_k : tuple
-            Three values read from a reference table.  These will be from
-            three separate columns but just one row; the row corresponds
-            to the current trap family.  (The _k in the variable name
-            indicates that the values are for one trap family.)
+        capture_param : tuple of three ndarrays
+            Three columns read from a reference table, with one element
+            for each trap family.
 
         trap_density : ndarray, 2-D
             Image of the total number of traps per pixel.
@@ -1016,14 +983,16 @@ class DataSet():
 
         Returns
         -------
-        ndarray, 2-D
-            The computed cr_filled at the end of the integration.
+        ndarray, 3-D
+            The computed cr_filled at the end of the integration, one
+            image plane for each trap family.
         """
 
-        (par0, par1, par2) = capture_param_k
+        (par0, par1, par2) = [family_axis(p, 1) for p in capture_param]
         # cr_filled will be incremented group-by-group, depending on
         # where cosmic rays were found in each group.
-        cr_filled = np.zeros_like(trap_density)
+        cr_filled = np.zeros((len(par0),) + trap_density.shape,
+                             dtype=trap_density.dtype)
         data = self.output_obj.data[integ, :, :, :]
         gdq = self.output_obj.groupdq[integ, :, :, :]
         gdqflags = dqflags.group
@@ -1045,9 +1014,9 @@ class DataSet():
                        - data[z_prev, cr_flag[0], cr_flag[1]])
                         - grp_slope[cr_flag])
                 jump = np.where(jump < 0., 0., jump)
-                cr_filled[cr_flag] += trap_density[cr_flag] * jump \
-                                      * (par0 * (1. - math.exp(par1 * delta_t))
-                                         + par2)
+                cr_filled[:, cr_flag[0], cr_flag[1]] += \
+                        trap_density[cr_flag] * jump \
+                        * (par0 * (1. - np.exp(par1 * delta_t)) + par2)
 
         cr_filled *= SCALEFACTOR
         return cr_filled
@@ -1060,14 +1029,14 @@ class DataSet():
 
         Parameters
         ----------
-        traps_filled : ndarray, 2-D
-            This is an image of the number of filled traps in each pixel
-            for the current trap family.
+        traps_filled : ndarray, 3-D
+            This is an image of the number of filled traps in each pixel,
+            with one image plane for each trap family.
 
-        decay_param : float
-            The decay parameter.  This is negative, but otherwise it's
-            the reciprocal of the e-folding time for trap decay for the
-            current trap family.
+        decay_param : ndarray, 1-D
+            The decay parameter for each trap family.  This is negative,
+            but otherwise it's the reciprocal of the e-folding time for
+            trap decay.
 
         delta_t : float
             The time interval (unit = second) over which the trap decay
@@ -1075,15 +1044,38 @@ class DataSet():
 
         Returns
         -------
-        decayed : ndarray, 2-D
+        decayed : ndarray, 3-D
             Image of the computed number of trap decays for each pixel,
-            for the current trap family.
+            for each trap family.
         """
 
-        if decay_param == 0.:
-            decayed = traps_filled * 0.
-        else:
-            tau = 1. / abs(decay_param)
-            decayed = traps_filled * (1. - math.exp(-delta_t / tau))
+        decayed_fraction = 1. - self.remaining_fraction(decay_param, delta_t)
+
+        return traps_filled * family_axis(decayed_fraction, 2)
+
+
+    def remaining_fraction(self, decay_param, delta_t):
+        """Compute the fraction of filled traps that do not decay.
+
+        Parameters
+        ----------
+        decay_param : ndarray, 1-D
+            The decay parameter for each trap family.  A value of zero
+            means that the traps do not decay.
+
+        delta_t : float or ndarray
+            The time interval (unit = second).  If this is an array, it
+            must broadcast against `decay_param`, e.g. with shape (n, 1)
+            for n time intervals.
+
+        Returns
+        -------
+        ndarray
+            exp(-delta_t / tau), where tau is the e-folding time, for each
+            trap family (last axis) and time interval.
+        """
+
+        nonzero = (decay_param != 0.)
+        tau = 1. / np.abs(np.where(nonzero, decay_param, 1.))
 
-        return decayed
+        return np.where(nonzero, np.exp(-delta_t / tau), 1.)
@@ -0,0 +1,144 @@
+"""
+Test the persistence correction for all trap families at once
+"""
+import numpy as np
+
+from jwst import datamodels
+from jwst.persistence import persistence
+
+
+DECAY_PARAM = np.array([-0.001, -0.02, 0.])
+
+
+def make_dataset(nints, ngroups, traps_filled, trap_density=0.):
+    (nfamilies, ny, nx) = traps_filled.shape
+    data = np.zeros((nints, ngroups, ny, nx), dtype=np.float32)
+    data += 100. * np.arange(ngroups, dtype=np.float32)[:, None, None]
+    output_obj = datamodels.RampModel(data=data)
+    output_obj.meta.subarray.xstart = 1
+    output_obj.meta.subarray.ystart = 1
+    output_obj.meta.exposure.ngroups = ngroups
+    output_obj.meta.exposure.nframes = 1
+    output_obj.meta.exposure.groupgap = 0
+    output_obj.meta.exposure.group_time = 10.
+    output_obj.meta.exposure.frame_time = 10.
+    output_obj.meta.exposure.nresets_at_start = 1
+    output_obj.meta.exposure.nresets_between_ints = 1
+    output_obj.meta.exposure.start_time = 58000.
+
+    traps_filled_model = datamodels.TrapsFilledModel(data=traps_filled)
+    traps_filled_model.meta.subarray.xstart = 1
+    traps_filled_model.meta.subarray.ystart = 1
+    traps_filled_model.meta.exposure.end_time = 58000.
+
+    trap_density_model = datamodels.TrapDensityModel(
+        data=np.full((ny, nx), trap_density, dtype=np.float32))
+    trap_density_model.meta.subarray.xstart = 1
+    trap_density_model.meta.subarray.ystart = 1
+
+    table = np.zeros(nfamilies, dtype=[('capture0', np.float64),
+                                       ('capture1', np.float64),
+                                       ('capture2', np.float64),
+                                       ('decay_param', np.float64)])
+    table['capture0'] = 0.2
+    table['capture1'] = -0.01
+    table['capture2'] = 0.1
+    table['decay_param'] = DECAY_PARAM[:nfamilies]
+    trappars_model = datamodels.TrapParsModel(trappars_table=table)
+
+    persat_model = datamodels.PersistenceSatModel(
+        data=np.full((ny, nx), 1.e5, dtype=np.float32))
+    persat_model.meta.subarray.xstart = 1
+    persat_model.meta.subarray.ystart = 1
+
+    return persistence.DataSet(output_obj, traps_filled_model, 1.e10, True,
+                               trap_density_model, trappars_model,
+                               persat_model)
+
+
+def test_decay_all_families():
+    """Without charge capture, persistence is the decay of filled traps"""
+    (nints, ngroups) = (2, 5)
+    rng = np.random.RandomState(9)
+    traps_filled = rng.uniform(0., 1000., size=(3, 6, 7)).astype(np.float32)
+    dataset = make_dataset(nints, ngroups, traps_filled.copy())
+    input_data = dataset.output_obj.data.copy()
+
+    (output_obj, traps_filled_model, output_pers, skipped) = dataset.do_all()
+    assert not skipped
+
+    tau = np.full(3, np.inf)
+    tau[:2] = 1. / np.abs(DECAY_PARAM[:2])
+    filled = traps_filled.astype(np.float64)
+    for integ in range(nints):
+        if integ > 0:
+            # decay during the reset between integrations
+            filled = filled * np.exp(-10. / tau)[:, None, None]
+        for group in range(ngroups):
+            remaining = np.exp(-10. * (group + 1) / tau)[:, None, None]
+            expected = (filled * (1. - remaining)).sum(axis=0)
+            assert np.allclose(output_pers.data[integ, group], expected,
+                               rtol=1.e-5)
+        filled = filled * np.exp(-10. * ngroups / tau)[:, None, None]
+
+    assert np.allclose(output_obj.data, input_data - output_pers.data,
+                       rtol=1.e-6, atol=1.e-3)
+    assert np.allclose(traps_filled_model.data, filled, rtol=1.e-5)
+    # the family with decay_param = 0 does not decay
+    assert np.allclose(traps_filled_model.data[2], traps_filled[2])
+
+
+def ramp_capture(capture_param_k, trap_density, slope, dt):
+    """Traps filled by a ramp, for a single trap family"""
+    (par0, par1, par2) = capture_param_k
+    tau = 1. / abs(par1)
+    return persistence.SCALEFACTOR * (
+        trap_density * slope**2
+        * (dt**2 * (par0 + par2) / 2.
+           + par0 * (dt * tau + tau**2) * np.exp(-dt / tau)
+           - par0 * tau**2))
+
+
+def test_capture_all_families():
+    """Each trap family captures charge with its own parameters"""
+    traps_filled = np.zeros((3, 4, 5), dtype=np.float32)
+    dataset = make_dataset(1, 4, traps_filled, trap_density=0.5)
+    dataset.trappars_model.trappars_table['capture0'] = [0.2, 0.05, 0.4]
+    dataset.trappars_model.trappars_table['capture1'] = [-0.01, -0.3, -0.002]
+    dataset.trappars_model.trappars_table['capture2'] = [0.1, 0.02, 0.]
+    # a saturated pixel and a cosmic-ray jump
+    dataset.output_obj.data[0, 1:, 0, 0] = 2.e5
+    dataset.output_obj.data[0, 2:, 3, 4] += 500.
+    dataset.output_obj.groupdq[0, 2, 3, 4] = \
+        datamodels.dqflags.group['JUMP_DET']
+    dataset.get_group_info(0)
+    (grp_slope, slope) = dataset.compute_slope(0)
+
+    par = dataset.get_parameters()
+    capture_param = tuple(p.astype(np.float64) for p in par[0:3])
+    filled = dataset.predict_capture(capture_param,
+                                     dataset.trap_density.data,
+                                     0, grp_slope, slope)
+    assert filled.shape == (3, 4, 5)
+    assert np.all(filled > 0.)
+
+    dt = dataset.ngroups * dataset.tgroup + dataset.nresets * dataset.tframe
+    for k in range(3):
+        capture_param_k = tuple(p[k] for p in capture_param)
+        # each family computed on its own
+        filled_k = dataset.predict_capture(
+            tuple(np.array([p]) for p in capture_param_k),
+            dataset.trap_density.data, 0, grp_slope, slope)
+        assert np.allclose(filled[k], filled_k[0], rtol=1.e-12)
+        # the pixels without saturation or jumps
+        expected = ramp_capture(capture_param_k, dataset.trap_density.data,
+                                slope, dt)
+        assert filled[k, 0, 0] != expected[0, 0]
+        assert filled[k, 3, 4] > expected[3, 4]
+        expected[0, 0] = filled[k, 0, 0]
+        expected[3, 4] = filled[k, 3, 4]
+        assert np.allclose(filled[k], expected, rtol=1.e-6)
+    assert not np.allclose(filled[0], filled[1])
+
+    (_, traps_filled_model, _, _) = dataset.do_all()
+    assert np.allclose(traps_filled_model.data, filled, rtol=1.e-5)
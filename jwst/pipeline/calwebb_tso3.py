@@ -1,14 +1,18 @@
 import os.path as op
+from collections import OrderedDict
 
+import numpy as np
 from astropy.table import vstack
 
 from ..stpipe import Pipeline
 from .. import datamodels
+from ..datamodels.multiintspec import MultiIntSpecWriter, TIMES
 
 from ..outlier_detection import outlier_detection_step
 from ..tso_photometry import tso_photometry_step
-from ..extract_1d import extract_1d_step
+from ..extract_1d import extract_1d_step, extract
 from ..white_light import white_light_step
+from ..white_light.white_light import light_curve
 
 __all__ = ['Tso3Pipeline']
 
@@ -28,6 +32,8 @@ class Tso3Pipeline(Pipeline):
 
     spec = """
         scale_detection = boolean(default=False)
+        # Number of integrations extracted at a time, if greater than 0
+        integration_chunk = integer(default=0, min=0)
     """
 
     # Define alias to steps
@@ -62,28 +68,13 @@ class Tso3Pipeline(Pipeline):
         for cube in input_models:
             if input_exptype is None:
                 input_exptype = cube.meta.exposure.type
-            # Convert CubeModel into ModelContainer of 2-D DataModels
-            input_2dmodels = datamodels.ModelContainer()
-            for i in range(cube.data.shape[0]):
-                # convert each plane of data cube into it own array
-                # for outlier detection...
-                image = datamodels.ImageModel(data=cube.data[i],
-                                              err=cube.err[i], dq=cube.dq[i])
-                image.update(cube)
-                image.meta.wcs = cube.meta.wcs
-                input_2dmodels.append(image)
 
             if not self.scale_detection:
-                msg = "Performing outlier detection on input images..."
+                # The cube is processed along the integration axis, and
+                # its DQ array is updated in place
+                msg = "Performing outlier detection on input integrations..."
                 self.log.info(msg)
-                input_2dmodels = self.outlier_detection(input_2dmodels)
-
-                # Transfer updated DQ values to original input observation
-                for i in range(cube.data.shape[0]):
-                    # Update DQ arrays with those from outlier_detection step
-                    cube.dq[i] = input_2dmodels[i].dq
-                cube.meta.cal_step.outlier_detection = \
-                    input_2dmodels[0].meta.cal_step.outlier_detection
+                self.outlier_detection(cube)
 
             else:
                 msg = "Performing scaled outlier detection on input images..."
@@ -112,6 +103,12 @@ class Tso3Pipeline(Pipeline):
             for cube in input_models:
                 # Extract Photometry from imaging data
                 phot_result_list.append(self.tso_photometry(cube))
+        elif self.integration_chunk > 0 and not self.extract_1d.skip:
+            # Create name for extracted white-light (Level 3) product
+            phot_tab_suffix = 'whtlt'
+
+            # Stream the spectra to the x1dints product
+            phot_result_list = self.extract_chunks(input_models, input)
         else:
             # Create name for extracted white-light (Level 3) product
             phot_tab_suffix = 'whtlt'
@@ -131,8 +128,12 @@ class Tso3Pipeline(Pipeline):
                 x1d_result.spec.extend(result.spec)
 
                 # perform white-light photometry on 1d extracted data
-                self.log.info("Performing white-light photometry...")
-                phot_result_list.append(self.white_light(result))
+                if not self.white_light.skip:
+                    self.log.info("Performing white-light photometry...")
+                    phot_result_list.append(self.white_light(result))
+
+            x1d_result.meta.cal_step.extract_1d = 'COMPLETE'
+            x1d_result.meta.cal_step.white_light = self._white_light_status()
 
             # Update some metadata from the association
             x1d_result.meta.asn.pool_name = \
@@ -142,6 +143,10 @@ class Tso3Pipeline(Pipeline):
             # Save the final x1d Multispec model
             self.save_model(x1d_result, suffix='x1dints')
 
+        if not phot_result_list:
+            self.log.info("No photometry catalog to write.")
+            return
+
         phot_results = vstack(phot_result_list)
         phot_tab_name = self.make_output_path(suffix=phot_tab_suffix, ext='ecsv')
         self.log.info("Writing Level 3 photometry catalog {}...".format(
@@ -149,3 +154,111 @@ class Tso3Pipeline(Pipeline):
         phot_results.write(phot_tab_name, format='ascii.ecsv')
 
         return
+
+    def extract_chunks(self, input_models, asn_file):
+        """Extract spectra and white-light fluxes a chunk at a time.
+
+        The spectra of `integration_chunk` integrations are extracted at a
+        time, and written to a "_x1dints" `MultiIntSpecModel` product, so
+        the spectra of all the integrations are not held in memory at once.
+        The white-light fluxes are summed as the spectra are extracted,
+        unless the white_light step is skipped.
+
+        Parameters
+        ----------
+        input_models: ModelContainer
+            The exposures to process
+
+        asn_file: str
+            The name of the association file
+
+        Returns
+        -------
+        phot_result_list: list of `~astropy.table.QTable`
+            The white-light table of each exposure, empty if the
+            white_light step is skipped
+        """
+        x1d_result = datamodels.MultiIntSpecModel()
+        x1d_result.update(input_models[0])
+        x1d_result.meta.cal_step.extract_1d = 'COMPLETE'
+        x1d_result.meta.cal_step.white_light = self._white_light_status()
+        x1d_result.meta.asn.pool_name = input_models.meta.asn_table.asn_pool
+        x1d_result.meta.asn.table_name = op.basename(asn_file)
+        x1d_name = self.make_output_path(suffix='x1dints')
+
+        nints = [cube.data.shape[0] for cube in input_models]
+        writer = None
+        orders = []
+        phot_result_list = []
+        for (cube, cube_start) in zip(input_models, np.cumsum([0] + nints)):
+            self.log.info("Extracting 1-D spectra...")
+            ref_file = self.extract_1d.get_reference_file(cube, 'extract1d')
+            self.log.info('Using EXTRACT1D reference file %s', ref_file)
+            chunks = extract.extract_chunks(
+                cube, extract.load_ref_file(ref_file),
+                self.extract_1d.smoothing_length, self.extract_1d.bkg_order,
+                self.extract_1d.subtract_background, self.integration_chunk)
+
+            fluxsums = OrderedDict()
+            for (start, spectra) in chunks:
+                if writer is None:
+                    # The orders of the first exposure are the members of
+                    # the product, with rows for all the exposures
+                    spec_times = self._spec_times(
+                        input_models, x1d_result.spec.item().spec_times)
+                    for (sp_order, ra, dec, columns) in spectra:
+                        x1d_result.spec.append(x1d_result.spec.item())
+                        member = x1d_result.spec[-1]
+                        member.spectral_order = sp_order
+                        member.slit_ra = ra
+                        member.slit_dec = dec
+                        member.time_scale = 'UTC'
+                        member.spec_times = spec_times
+                        orders.append(sp_order)
+                    writer = MultiIntSpecWriter(
+                        x1d_result, x1d_name,
+                        [spectrum[3]['flux'].shape[1] for spectrum in spectra])
+
+                for (sp_order, ra, dec, columns) in spectra:
+                    if sp_order not in orders:
+                        raise ValueError("Spectral order {} is not in the "
+                                         "first exposure".format(sp_order))
+                    writer.write(orders.index(sp_order), cube_start + start,
+                                 columns)
+                    sums = fluxsums.setdefault(
+                        sp_order, np.zeros(cube.data.shape[0]))
+                    sums[start:start + len(columns['flux'])] = \
+                        columns['flux'].sum(axis=1)
+
+            # perform white-light photometry on 1d extracted data
+            if not self.white_light.skip:
+                self.log.info("Performing white-light photometry...")
+                phot_result_list.append(light_curve(
+                    cube, np.concatenate(list(fluxsums.values())),
+                    list(fluxsums), [len(sums) for sums in fluxsums.values()]))
+
+        if writer is not None:
+            self.log.info('Saved model in {}'.format(x1d_name))
+
+        return phot_result_list
+
+    def _white_light_status(self):
+        """The cal_step status of the white-light step."""
+        return 'SKIPPED' if self.white_light.skip else 'COMPLETE'
+
+    @staticmethod
+    def _spec_times(input_models, template):
+        """The integration numbers and times of all the exposures."""
+        nints = [cube.data.shape[0] for cube in input_models]
+        spec_times = np.zeros(sum(nints), dtype=template.dtype)
+        row = 0
+        for (cube, n) in zip(input_models, nints):
+            times = extract.integration_times(cube)
+            for name in TIMES:
+                if times is not None:
+                    spec_times[name][row:row + n] = times[name]
+                elif name != 'int_num':
+                    spec_times[name][row:row + n] = np.nan
+            row += n
+
+        return spec_times
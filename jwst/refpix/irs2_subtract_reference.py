@@ -3,11 +3,13 @@ import logging
 import numpy as np
 from scipy.ndimage.filters import convolve1d
 
+from ..lib import parallel_utils
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 def correct_model(input_model, irs2_model,
-                  scipix_n_default=16, refpix_r_default=4, pad=8):
+                  scipix_n_default=16, refpix_r_default=4, pad=8, nproc=1):
     """Process IRS^2 data.
 
     Parameters
@@ -31,6 +33,9 @@ def correct_model(input_model, irs2_model,
         of each row (new-row overhead).  The padding is needed to preserve
         the phase of temporally periodic signals.
 
+    nproc: int
+        Number of processes used to correct the integrations in parallel.
+
     Returns
     -------
     output_model: ramp model
@@ -138,15 +143,31 @@ def correct_model(input_model, irs2_model,
     # or interspersed reference pixels).
     irs2_mask = make_irs2_mask(output_model, scipix_n, refpix_r)
 
-    for integ in range(n_int):
-        # The input data have a length of 3200 for the last axis (X), while
-        # the output data have an X axis with length 2048, the same as the
-        # Y axis.  This is the reason for the slice `nx-ny:` that is used
-        # below.  The last axis of output_model.data should be 2048.
-        data0 = data[integ, :, :, :]
-        data0 = subtract_reference(data0, alpha, beta, irs2_mask,
-                                   scipix_n, refpix_r, pad)
+    # The indices of normal and reference pixels, the times of the samples
+    # and the Fourier filter are the same for all integrations.
+    geometry = readout_geometry(ny, scipix_n, refpix_r, pad)
+
+    # The input data have a length of 3200 for the last axis (X), while
+    # the output data have an X axis with length 2048, the same as the
+    # Y axis.  This is the reason for the slice `nx-ny:` that is used
+    # below.  The last axis of output_model.data should be 2048.
+    nproc = min(nproc, n_int)
+
+    def correct_integration(integ):
+        data0 = subtract_reference(data[integ, :, :, :], alpha, beta,
+                                   irs2_mask, scipix_n, refpix_r, pad,
+                                   geometry=geometry)
+        if nproc > 1:
+            # Worker process; the parent copies the result into data.
+            return data0
         data[integ, :, :, nx - ny:] = data0
+
+    results = parallel_utils.map_ordered(correct_integration,
+                                         range(n_int), nproc)
+    if nproc > 1:
+        for integ, data0 in enumerate(results):
+            data[integ, :, :, nx - ny:] = data0
+    del results
     temp_data = data[:, :, :, nx - ny:]
     del data
     # Convert back to sky orientation.
@@ -184,23 +205,21 @@ def make_irs2_mask(output_model, scipix_n, refpix_r):
     stuff_at_end = part - k * (scipix_n + refpix_r)
 
     # Create the mask which flags normal pixels as True.
-    irs2_mask = np.ones(irs2_nx, dtype=np.bool)
+    irs2_mask = np.ones(irs2_nx, dtype=bool)
     irs2_mask[0:refout] = False
 
     # Check whether the interspersed reference pixels are in the same
     # locations regardless of readout direction.
     if stuff_at_end == scipix_n // 2:
         # Yes, they are in the same locations.
-        for i in range(refout + scipix_n // 2, irs2_nx + 1,
-                       scipix_n + refpix_r):
-            irs2_mask[i:i + refpix_r] = False
+        irs2_mask[ref_sample_indices(refout + scipix_n // 2, irs2_nx,
+                                     scipix_n, refpix_r)] = False
     else:
         # Set the flags for each readout direction separately.
         nelem = refout                  # number of elements per output
-        temp = np.ones(nelem, dtype=np.bool)
-        for i in range(scipix_n // 2, nelem + 1,
-                       scipix_n + refpix_r):
-            temp[i:i + refpix_r] = False
+        temp = np.ones(nelem, dtype=bool)
+        temp[ref_sample_indices(scipix_n // 2, nelem,
+                                scipix_n, refpix_r)] = False
         j = refout
         irs2_mask[j:j + nelem] = temp.copy()
         j += nelem
@@ -212,6 +231,15 @@ def make_irs2_mask(output_model, scipix_n, refpix_r):
 
     return irs2_mask
 
+def ref_sample_indices(start, stop, scipix_n, refpix_r):
+    """Indices of the blocks of refpix_r reference samples, below `stop`."""
+
+    first = np.arange(start, stop + 1, scipix_n + refpix_r, dtype=np.intp)
+    indices = (first[:, np.newaxis] +
+               np.arange(refpix_r, dtype=np.intp)).ravel()
+
+    return indices[indices < stop]
+
 def exclude_ref(output_model, irs2_mask):
     """Copy out the normal pixels from PIXELDQ, GROUPDQ, and ERR arrays.
 
@@ -262,7 +290,7 @@ def exclude_ref(output_model, irs2_mask):
         output_model.err = temp_array[..., irs2_mask]
 
 def subtract_reference(data0, alpha, beta, irs2_mask,
-                       scipix_n, refpix_r, pad):
+                       scipix_n, refpix_r, pad, geometry=None):
     """Subtract reference output and pixels for the current integration.
 
     Parameters
@@ -302,6 +330,10 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
         The effective number of pixels sampled during the pause at the end
         of each row (new-row overhead).
 
+    geometry: tuple or None
+        The value of `readout_geometry` for these data, if it has been
+        computed already.
+
     Returns
     -------
     data0: ramp data
@@ -317,10 +349,6 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
     ny = shape[1]
     nx = shape[2]
 
-    # See expression in equation 1 in IRS2_Handoff.pdf.
-    # row = 712, if scipix_n = 16, refpix_r = 4, pad = 8.
-    row = (scipix_n + refpix_r + 2) * 512 // scipix_n + pad
-
     # s = size(data0)
     # If data0 is the data for one integration, then:
     # s[0] would be 3
@@ -328,20 +356,11 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
     # s[2] = shape[1] = ny, the length of the Y axis
     # s[3] = shape[0] = ngroups, the number of groups (or frames)
 
-    ind_n = np.arange(512, dtype=np.intp)
-    ind_ref = np.arange(512 // scipix_n * refpix_r, dtype=np.intp)
-
-    # hnorm is an array of column indices of normal pixels.
-    # len(hnorm) = 512; len(href) = 128
-    # len(hnorm1) = 512; len(href1) = 128
-    hnorm = ind_n + refpix_r * ((ind_n + scipix_n // 2) // scipix_n)
-
-    # href is an array of column indices of reference pixels.
-    href = ind_ref + scipix_n * (ind_ref // refpix_r) + scipix_n // 2
-
-    hnorm1 = ind_n + (refpix_r + 2) * ((ind_n + scipix_n // 2) // scipix_n)
-    href1 = ind_ref + (scipix_n + 2) * (ind_ref // refpix_r) + \
-            scipix_n // 2 + 1
+    # The indices of normal and reference pixels, the times of the samples
+    # and the Fourier filter only depend on the readout geometry.
+    if geometry is None:
+        geometry = readout_geometry(ny, scipix_n, refpix_r, pad)
+    (row, hnorm, href, hnorm1, href1, ht, hs, time_arr, aa) = geometry
 
     # Subtract the average over the ramp for each pixel.
     b_offset = data0.sum(axis=0, dtype=np.float64) / float(ngroups)
@@ -385,33 +404,25 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
     # IDL:  data0 = temporary(d0)
     d0[:, :, :, hnorm1] = data0[:, :, :, hnorm]
     d0[:, :, :, href1] = data0[:, :, :, href]
-    data0 = d0.copy()
+    data0 = d0
     del d0
 
     #; <<<<< Fitting and removal of slopes per frame to remove issues at frame
     # boundaries.
-    # IDL:  time = findgen(row, s[2])
-    time_arr = np.arange(ny * row, dtype=np.float32).reshape((ny, row))
-    time_arr -= time_arr.mean(dtype=np.float64)
     row4plus4 = np.array([0, 1, 2, 3, 2044, 2045, 2046, 2047], dtype=np.intp)
 
-    # For ab_3, it should be OK to use the same index order as the IDL code.
-    ab_3 = np.zeros((2, ngroups, 5), dtype=np.float32)
-    for i in range(5):
-        for k in range(ngroups):
-            # mask is 2-D, since both row4plus4 and : have more than one
-            # element.
-            mask = (data0[i, k, row4plus4, :] != 0.)
-            (intercept, slope) = ols_line(time_arr[row4plus4, :][mask],
-                                          data0[i, k, row4plus4, :][mask])
-            ab_3[0, k, i] = intercept
-            ab_3[1, k, i] = slope
-    for i in range(5):
-        for k in range(ngroups):
-            # weight is 0 where data0 is 0, else 1.
-            weight = (data0[i, k, :, :] != 0.).astype(np.float32)
-            data0[i, k, :, :] -= (ab_3[0, k, i] +
-                                  time_arr * ab_3[1, k, i]) * weight
+    # The lines are fit to the nonzero values of all outputs and groups at
+    # once; intercept and slope have shape (5, ngroups).
+    (intercept, slope) = ols_lines(time_arr[row4plus4, :],
+                                   data0[:, :, row4plus4, :])
+    intercept = intercept.astype(np.float32)[:, :, np.newaxis, np.newaxis]
+    slope = slope.astype(np.float32)[:, :, np.newaxis, np.newaxis]
+    for k in range(ngroups):
+        # weight is 0 where data0 is 0, else 1.
+        weight = (data0[:, k, :, :] != 0.).astype(np.float32)
+        data0[:, k, :, :] -= (intercept[:, k] +
+                              time_arr * slope[:, k]) * weight
+    del weight
 
     # <<<<<<<
 
@@ -422,19 +433,19 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
     w_ind = np.arange(1, 32, dtype=np.float32) / 32.
     w = np.sin(w_ind * np.pi)
     kk = 0
-    for jj in range(ngroups):
-        dat = data0[kk, jj, :, :].reshape(row * ny)
-        mask = (dat != 0.).astype(np.float32)
-        numerator = convolve1d(dat, w, mode='wrap')
-        denominator = convolve1d(mask, w, mode='wrap')
-        div_zero = (denominator == 0.)          # check for divide by zero
-        numerator = np.where(div_zero, 0., numerator)
-        denominator = np.where(div_zero, 1., denominator)
-        dat = numerator / denominator
-        dat = dat.reshape(ny, row)
-        mask = mask.reshape(ny, row)
-        # xxx why '+=' instead of just '=' ?
-        data0[kk, jj, :, :] += dat * (1. - mask)
+    # All groups at once; each group is a separate (wrapped) time series.
+    dat = data0[kk, :, :, :].reshape((ngroups, row * ny))
+    mask = (dat != 0.).astype(np.float32)
+    numerator = convolve1d(dat, w, axis=1, mode='wrap')
+    denominator = convolve1d(mask, w, axis=1, mode='wrap')
+    div_zero = (denominator == 0.)          # check for divide by zero
+    numerator = np.where(div_zero, 0., numerator)
+    denominator = np.where(div_zero, 1., denominator)
+    dat = numerator / denominator
+    # xxx why '+=' instead of just '=' ?
+    dat *= (1. - mask)
+    data0[kk, :, :, :] += dat.reshape((ngroups, ny, row))
+    del numerator, denominator, div_zero, dat, mask
 
     #;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;
     # Use Fourier filter/interpolation to replace
@@ -442,6 +453,141 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
     # (b) gaps and normal data in the time-ordered reference data
     # This "improves" upon the cosine interpolation performed above.
 
+    # IDL:  aa = a # replicate(1, s[3]) ; for application to the data
+    # In IDL, aa is a 2-D array with one column of `a` for each group.  In
+    # Python, numpy broadcasting should take care of this.
+
+    n_iter_norm = 3
+    # IDL:  fft_interp_norm, dd0, 2, replicate(1, s[1] / 4, s[2], 4),
+    #                        row, hnorm, hnorm1, s, aa , n_iter_norm
+    fft_interp_norm(data0[0, :, :, :], np.ones((ny, nx // 4), dtype=np.int64),
+                    row, hnorm, hnorm1,
+                    ny, ngroups, aa, n_iter_norm)
+
+#;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;
+
+    # ; construct the reference data
+    r0 = np.zeros_like(data0)
+    r0[:, :, :, ht] = data0[:, :, :, hs]
+    #;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;
+
+    # data0 has shape (5, ngroups, ny, row).  See the section above where
+    # d0 was created, then copied (moved) to data0.
+    shape_d = data0.shape
+    # sd[1] = shape_d[3]   row (712)
+    # sd[2] = shape_d[2]   ny (2048)
+    # sd[3] = shape_d[1]   ngroups
+    # sd[4] = shape_d[0]   5
+    # s is used below, so for convenience, here are the values again:
+    # s[1] = shape[2] = nx
+    # s[2] = shape[1] = ny
+    # s[3] = shape[0] = ngroups
+    nelem = shape_d[2] * shape_d[3]
+
+    # The time-ordered data are real, so real FFTs are used, for all groups
+    # at once.  The IDL code keeps the real part of the inverse of the full
+    # complex spectrum; with real FFTs, this is given by the Hermitian parts
+    # of alpha and beta.  IDL and numpy differ in where they apply the
+    # normalization for the FFT, but the normalizations of the forward and
+    # inverse transforms cancel, so they are not applied here.
+    alpha_h = hermitian_part(alpha, nelem)
+
+    if beta is not None:
+        beta_h = hermitian_part(beta, nelem)
+        # IDL:  refout0 = reform(data0[*,*,*,0], sd[1] * sd[2], sd[3])
+        # IDL:  refout0 = fft(refout0, dim=1, /over)
+        refout0 = np.fft.rfft(data0[0, :, :, :].reshape((shape_d[1], nelem)),
+                              axis=1)
+
+    # IDL:  r0 = reform(r0, sd[1] * sd[2], sd[3], 5, /over)
+    r0 = r0.reshape((5, shape_d[1], nelem))
+    for k in range(1, 5):
+        r0f = np.fft.rfft(r0[k, :, :], axis=1)
+        # IDL:  for k=0,3 do oBridge[k]->Execute,
+        #           "for i=0, s3-1 do r0[*,i] *= alpha"
+        r0f *= alpha_h[k - 1]
+        # IDL:  for k=0,3 do oBridge[k]->Execute,
+        #           "for i=0, s3-1 do r0[*,i] += beta * refout0[*,i]"
+        if beta is not None:
+            r0f += beta_h[k - 1] * refout0
+        # IDL:  for k=0,3 do oBridge[k]->Execute,
+        #           "r0 = fft(r0, 1, dim=1, /overwrite)", /nowait
+        r0[k, :, :] = np.fft.irfft(r0f, n=nelem, axis=1)
+        del r0f
+
+    # sd[1] = shape_d[3]   row (712)
+    # sd[2] = shape_d[2]   ny (2048)
+    # sd[3] = shape_d[1]   ngroups
+    # sd[4] = shape_d[0]   5
+    # IDL:  r0 = reform(r0, sd[1], sd[2], sd[3], 5, /over)
+    r0 = r0.reshape(shape_d)
+    r0 = r0[:, :, :, hnorm1]
+    data0 = data0[:, :, :, hnorm1]
+
+    data0 -= r0
+    data0[2, :, :, :] = data0[2, :, :, ::-1]
+    data0[4, :, :, :] = data0[4, :, :, ::-1]
+
+    # IDL:  data0 = transpose(data0, [0,3,1,2])  0, 1, 2, 3 --> 0, 3, 1, 2
+    # current order:  512, ny, ngroups, 5     (IDL)
+    # current order:  5, ngroups, ny, 512     (numpy)
+    #                 0  1        2   3       current numpy indices
+    # transpose to:   512, 5, ny, ngroups     (IDL)
+    # transpose to:   ngroups, ny, 5, 512     (numpy)
+    #                 1        2   0  3       transpose order for numpy
+    # Therefore:      0 1 2 3  -->  1 2 0 3   transpose order for numpy
+    data0 = np.transpose(data0, (1, 2, 0, 3))
+
+    # IDL:  data0 = reform(data0[*, 1:*, *, *], s[2], s[2], s[3], /over)
+    # Note:  ny x ny, not ny x nx.
+    data0 = data0[:, :, 1:, :].reshape((ngroups, ny, ny))
+    # b_offset is the average over the ramp that we subtracted near the
+    # beginning; add it back in.
+    # Shape of b_offset is (2048, 3200), data0 is (ngroups, 2048, 2048).
+    data0 += b_offset[..., irs2_mask]
+
+    return data0
+
+def readout_geometry(ny, scipix_n, refpix_r, pad):
+    """Indices, sample times and Fourier filter for a readout geometry.
+
+    These are the same for all integrations, so `correct_model` computes
+    them once and passes them to `subtract_reference`; the arrays are
+    read-only.
+
+    Returns
+    -------
+    tuple
+        row, the length of a row of the time-ordered data; hnorm, href,
+        hnorm1 and href1, the indices of normal and reference pixels in the
+        data and in the time-ordered data; ht and hs, the indices for
+        shuffling the reference pixels; time_arr, the relative time of
+        each sample; and aa, the Fourier filter.
+    """
+
+    # See expression in equation 1 in IRS2_Handoff.pdf.
+    # row = 712, if scipix_n = 16, refpix_r = 4, pad = 8.
+    row = (scipix_n + refpix_r + 2) * 512 // scipix_n + pad
+
+    ind_n = np.arange(512, dtype=np.intp)
+    ind_ref = np.arange(512 // scipix_n * refpix_r, dtype=np.intp)
+
+    # hnorm is an array of column indices of normal pixels.
+    # len(hnorm) = 512; len(href) = 128
+    # len(hnorm1) = 512; len(href1) = 128
+    hnorm = ind_n + refpix_r * ((ind_n + scipix_n // 2) // scipix_n)
+
+    # href is an array of column indices of reference pixels.
+    href = ind_ref + scipix_n * (ind_ref // refpix_r) + scipix_n // 2
+
+    hnorm1 = ind_n + (refpix_r + 2) * ((ind_n + scipix_n // 2) // scipix_n)
+    href1 = ind_ref + (scipix_n + 2) * (ind_ref // refpix_r) + \
+            scipix_n // 2 + 1
+
+    # IDL:  time = findgen(row, s[2])
+    time_arr = np.arange(ny * row, dtype=np.float32).reshape((ny, row))
+    time_arr -= time_arr.mean(dtype=np.float64)
+
     # Parameters for the filter to be used.
     # length of apodization cosine filter
     elen = 110000 // (scipix_n + refpix_r + 2)
@@ -469,23 +615,6 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
     aa = np.concatenate((temp_a2, roll_a2[::-1]))
     del temp_a1, temp_a2, roll_a2
 
-    # IDL:  aa = a # replicate(1, s[3]) ; for application to the data
-    # In IDL, aa is a 2-D array with one column of `a` for each group.  In
-    # Python, numpy broadcasting should take care of this.
-
-    n_iter_norm = 3
-    dd0 = data0[0, :, :, :]
-    # IDL:  fft_interp_norm, dd0, 2, replicate(1, s[1] / 4, s[2], 4),
-    #                        row, hnorm, hnorm1, s, aa , n_iter_norm
-    fft_interp_norm(dd0, np.ones((ny, nx // 4), dtype=np.int64),
-                    row, hnorm, hnorm1,
-                    ny, ngroups, aa, n_iter_norm)
-    data0[0, :, :, :] = dd0.copy()
-    del aa, dd0
-
-#;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;
-
-#;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;
     # The comments in this section are for scipix_n = 16, refpix_r = 4.
     # ; indices for keeping/shuffling reference pixels
     n0 = 512 // scipix_n
@@ -521,110 +650,64 @@ def subtract_reference(data0, alpha, beta, irs2_mask,
         temp_hs = temp_hs[:, ::-1]
         hs = temp_hs.flatten()
 
-    # ; construct the reference data
-    r0 = np.zeros_like(data0)
-    r0[:, :, :, ht] = data0[:, :, :, hs]
-    #;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;;
+    geometry = (row, hnorm, href, hnorm1, href1, ht, hs, time_arr, aa)
+    for array in geometry[1:]:
+        array.setflags(write=False)
 
-    # data0 has shape (5, ngroups, ny, row).  See the section above where
-    # d0 was created, then copied (moved) to data0.
-    shape_d = data0.shape
-    # sd[1] = shape_d[3]   row (712)
-    # sd[2] = shape_d[2]   ny (2048)
-    # sd[3] = shape_d[1]   ngroups
-    # sd[4] = shape_d[0]   5
-    # s is used below, so for convenience, here are the values again:
-    # s[1] = shape[2] = nx
-    # s[2] = shape[1] = ny
-    # s[3] = shape[0] = ngroups
+    return geometry
 
-    # IDL and numpy differ in where they apply the normalization for the
-    # FFT.  This really shouldn't matter.
-    normalization = float(shape_d[2] * shape_d[3])
+def hermitian_part(coeff, nelem):
+    """Hermitian part of complex Fourier coefficients, for real FFTs.
 
-    if beta is not None:
-        # IDL:  refout0 = reform(data0[*,*,*,0], sd[1] * sd[2], sd[3])
-        refout0 = data0[0, :, :, :].reshape((shape_d[1],
-                                           shape_d[2] * shape_d[3]))
-        # IDL:  refout0 = fft(refout0, dim=1, /over)
-        # Divide by the length of the axis to be consistent with IDL.
-        refout0 = np.fft.fft(refout0, axis=1) / normalization
-
-    # IDL:  r0 = reform(r0, sd[1] * sd[2], sd[3], 5, /over)
-    r0 = r0.reshape((5, shape_d[1], shape_d[2] * shape_d[3]))
-    r0 = r0.astype(np.complex64)
-    r0f = ["dummy", 1, 1, 1, 1]         # elements 1 - 4 populated in loop
-    for k in range(1, 5):
-        r0f[k] = np.fft.fft(r0[k, :, :], axis=1) / normalization
+    For real data `d` of length `nelem`,
+    ``irfft(rfft(d) * hermitian_part(coeff, nelem), nelem)`` is equal to
+    ``ifft(fft(d) * coeff).real``.
 
-    # IDL:  for k=0,3 do oBridge[k]->Execute,
-    #           "for i=0, s3-1 do r0[*,i] *= alpha"
-    for k in range(1, 5):
-        for i in range(ngroups):
-            # Each element of r0f is the fft of r0[k, :, :], for some k.
-            r0f[k][i, :] *= alpha[k - 1]
-
-    # IDL:  for k=0,3 do oBridge[k]->Execute,
-    #           "for i=0, s3-1 do r0[*,i] += beta * refout0[*,i]"
-    if beta is not None:
-        for k in range(1, 5):
-            for i in range(ngroups):
-                r0f[k][i, :] += (beta[k - 1] * refout0[i, :])
-
-    # IDL:  for k=0,3 do oBridge[k]->Execute,
-    #           "r0 = fft(r0, 1, dim=1, /overwrite)", /nowait
-    for k in range(1, 5):
-        r0[k, :, :] = np.fft.ifft(r0f[k], axis=1) * normalization
-
-    # sd[1] = shape_d[3]   row (712)
-    # sd[2] = shape_d[2]   ny (2048)
-    # sd[3] = shape_d[1]   ngroups
-    # sd[4] = shape_d[0]   5
-    # IDL:  r0 = reform(r0, sd[1], sd[2], sd[3], 5, /over)
-    r0 = r0.reshape(shape_d)
-    r0 = r0.real
-    r0 = r0[:, :, :, hnorm1]
-    data0 = data0[:, :, :, hnorm1]
+    Parameters
+    ----------
+    coeff: ndarray, complex
+        The coefficients for all frequencies; the last axis has length
+        `nelem`.
 
-    data0 -= r0
-    data0[2, :, :, :] = data0[2, :, :, ::-1]
-    data0[4, :, :, :] = data0[4, :, :, ::-1]
+    nelem: int
+        Length of the data.
 
-    # IDL:  data0 = transpose(data0, [0,3,1,2])  0, 1, 2, 3 --> 0, 3, 1, 2
-    # current order:  512, ny, ngroups, 5     (IDL)
-    # current order:  5, ngroups, ny, 512     (numpy)
-    #                 0  1        2   3       current numpy indices
-    # transpose to:   512, 5, ny, ngroups     (IDL)
-    # transpose to:   ngroups, ny, 5, 512     (numpy)
-    #                 1        2   0  3       transpose order for numpy
-    # Therefore:      0 1 2 3  -->  1 2 0 3   transpose order for numpy
-    data0 = np.transpose(data0, (1, 2, 0, 3))
+    Returns
+    -------
+    ndarray, complex128
+        The coefficients for the non-negative frequencies of a real FFT;
+        the last axis has length nelem // 2 + 1.
+    """
 
-    # IDL:  data0 = reform(data0[*, 1:*, *, *], s[2], s[2], s[3], /over)
-    # Note:  ny x ny, not ny x nx.
-    data0 = data0[:, :, 1:, :].reshape((ngroups, ny, ny))
-    # b_offset is the average over the ramp that we subtracted near the
-    # beginning; add it back in.
-    # Shape of b_offset is (2048, 3200), data0 is (ngroups, 2048, 2048).
-    data0 += b_offset[..., irs2_mask]
+    freq = np.arange(nelem // 2 + 1, dtype=np.intp)
+    coeff_h = coeff[..., freq].astype(np.complex128)
+    coeff_h += np.conj(coeff[..., -freq % nelem])
+    coeff_h /= 2.
 
-    return data0
+    return coeff_h
 
 def fft_interp_norm(dd0, mask0, row, hnorm, hnorm1,
                     ny, ngroups, aa, n_iter_norm):
+    """Fourier filter the time-ordered data, keeping the normal pixels.
+
+    All groups are filtered at once, in place, with real FFTs.  The filter
+    `aa` must be symmetric (aa[k] == aa[-k]), as the one built for the
+    IRS2 readout is; the result is then the real part of the complex
+    filtered data.
+    """
 
     mm = np.zeros((ny, row), dtype=np.int8)
     mm[:, hnorm1] = mask0[:, hnorm]
-    hm = (mm != 0)                      # 2-D boolean mask
-    for j in range(ngroups):
-        dd = dd0[j, :, :].copy()
-        p = dd.flatten()                        # make a copy, not a view
-        for it in range(n_iter_norm):
-            pp = np.fft.fft(p)
-            pp *= aa
-            p[:] = np.fft.ifft(pp).real
-            p[hm.ravel()] = dd[hm]
-        dd0[j, :, :] = p.reshape((ny, row))
+    hm = (mm != 0).ravel()              # 1-D boolean mask
+    nelem = ny * row
+    dd = dd0.reshape((ngroups, nelem))
+    p = dd.copy()
+    for it in range(n_iter_norm):
+        pp = np.fft.rfft(p, axis=1)
+        pp *= aa[:nelem // 2 + 1]
+        p[:] = np.fft.irfft(pp, n=nelem, axis=1)
+        p[:, hm] = dd[:, hm]
+    dd0[...] = p.reshape((ngroups, ny, row))
 
 def ols_line(x, y):
     """Fit a straight line using ordinary least squares."""
@@ -646,3 +729,44 @@ def ols_line(x, y):
     intercept = mean_y - slope * mean_x
 
     return (intercept, slope)
+
+def ols_lines(x, y):
+    """Fit straight lines to the nonzero values, using ordinary least squares.
+
+    Parameters
+    ----------
+    x: ndarray
+        The independent variable, with the shape of the last two axes of `y`.
+
+    y: ndarray
+        The data.  A line is fit for each index of the other axes; values
+        equal to zero are not used.
+
+    Returns
+    -------
+    tuple of ndarray
+        The intercepts and slopes, with the shape of the other axes of `y`.
+        Both are zero where all values are zero.
+    """
+
+    axes = (-2, -1)
+    weight = (y != 0.)
+    xf = x.astype(np.float64)
+    npts = weight.sum(axis=axes)
+    sum_x = (xf * weight).sum(axis=axes)
+    sum_y = y.sum(axis=axes, dtype=np.float64)
+    sum_x2 = (xf**2 * weight).sum(axis=axes)
+    sum_xy = (xf * y).sum(axis=axes)
+
+    empty = (npts == 0)
+    npts = np.where(empty, 1, npts)
+    mean_x = sum_x / npts
+    mean_y = sum_y / npts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (sum_xy - npts * mean_x * mean_y) / \
+                (sum_x2 - npts * mean_x**2)
+    intercept = mean_y - slope * mean_x
+    slope[empty] = 0.
+    intercept[empty] = 0.
+
+    return (intercept, slope)
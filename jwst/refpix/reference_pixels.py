@@ -41,7 +41,7 @@ import numpy as np
 from scipy import stats
 import logging
 from ..datamodels import dqflags
-from ..lib import reffile_utils
+from ..lib import parallel_utils, reffile_utils
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
@@ -172,6 +172,8 @@ class Dataset():
         self.side_gain = side_gain
         self.odd_even_rows = odd_even_rows
         self.bad_reference_pixels = False
+        # Number of processes for full-frame NIR data, set by correct_model
+        self.nproc = 1
 
         # Define temp array for processing every group
         self.pixeldq = self.get_pixeldq()
@@ -320,6 +322,13 @@ class NIRDataset(Dataset):
         gain to use in applying the side reference pixel correction
 
     """
+    #
+    # Detector orientation relative to the DMS orientation, as used by
+    # detector_view: transpose, then flip the rows and/or the columns
+    transpose = False
+    flip_rows = False
+    flip_columns = False
+
     def __init__(self, input_model,
                  odd_even_columns,
                  use_side_ref_pixels,
@@ -333,6 +342,83 @@ class NIRDataset(Dataset):
                                          side_gain,
                                          odd_even_rows=False)
 
+    def detector_view(self, data):
+        """Get a view of an array in detector orientation
+
+        Parameters:
+        -----------
+
+        data: NDArray
+            Array in DMS orientation along its last two axes, e.g. the
+            groups of an integration
+
+        Returns:
+        --------
+
+        view: NDArray
+            View of `data` in detector orientation.  Changes to the view
+            are made to `data`, so no transformation back is needed.
+
+        """
+        if self.transpose:
+            data = np.swapaxes(data, -1, -2)
+        if self.flip_rows:
+            data = data[..., ::-1, :]
+        if self.flip_columns:
+            data = data[..., ::-1]
+        return data
+
+    def sigma_clip_stack(self, data, dq, low=3.0, high=3.0):
+        """Calculate the clipped means of a stack of arrays at once
+
+        This gives the results of `sigma_clip` for each array along the
+        first axis of `data`, e.g. the same reference pixels in every group.
+
+        Parameters:
+        -----------
+
+        data: NDArray
+            Stack of arrays of pixels to be sigma-clipped
+
+        dq: NDArray
+            DQ array for each array of the stack
+
+        low: float
+            lower clipping boundary, in standard deviations from the mean (default=3.0)
+
+        high: float
+            upper clipping boundary, in standard deviations from the mean (default=3.0)
+
+        Returns:
+        --------
+
+        mean: NDArray
+            1-d array of the clipped means, or None if there are no good pixels
+
+        """
+        good = np.bitwise_and(dq, dqflags.pixel['DO_NOT_USE']) == 0
+        if not good.any():
+            return None
+        values = data.reshape(len(data), -1)[:, good.ravel()]
+        values = values.astype(np.float64)
+        #
+        # Clip all arrays until none changes; arrays with zero variance
+        # are not clipped
+        keep = np.ones(values.shape, dtype=bool)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            while True:
+                n = keep.sum(axis=1)
+                mean = np.where(keep, values, 0.).sum(axis=1) / n
+                deviation = values - mean[:, np.newaxis]
+                std = np.sqrt(np.where(keep, deviation**2, 0.).sum(axis=1) / n)
+                inside = ((deviation >= -low * std[:, np.newaxis]) &
+                          (deviation <= high * std[:, np.newaxis]))
+                new_keep = keep & (inside | (std == 0.)[:, np.newaxis])
+                if np.array_equal(new_keep, keep):
+                    break
+                keep = new_keep
+        return mean
+
 #
 #  Even though the recommendation specifies calculating the mean of the
 #  combined top and bottom reference sections, there's a good chance we
@@ -587,21 +673,75 @@ class NIRDataset(Dataset):
                 # For now, just average the top and bottom corrections
                 oddrefsignal = 0.5 * (oddreftop + oddrefbottom)
                 evenrefsignal = 0.5 * (evenreftop + evenrefbottom)
-                oddslice = (slice(datarowstart, datarowstop, 1),
+                oddslice = (Ellipsis,
+                            slice(datarowstart, datarowstop, 1),
                             slice(datacolstart, datacolstop, 2))
-                evenslice = (slice(datarowstart, datarowstop, 1),
+                evenslice = (Ellipsis,
+                             slice(datarowstart, datarowstop, 1),
                              slice(datacolstart + 1, datacolstop, 2))
-                group[oddslice] = group[oddslice] - oddrefsignal
-                group[evenslice] = group[evenslice] - evenrefsignal
+                group[oddslice] = group[oddslice] - \
+                    np.asarray(oddrefsignal)[..., np.newaxis, np.newaxis]
+                group[evenslice] = group[evenslice] - \
+                    np.asarray(evenrefsignal)[..., np.newaxis, np.newaxis]
             else:
                 reftop = refvalues[amplifier]['top']
                 refbottom = refvalues[amplifier]['bottom']
                 refsignal = 0.5 * (reftop + refbottom)
-                dataslice = (slice(datarowstart, datarowstop, 1),
+                dataslice = (Ellipsis,
+                             slice(datarowstart, datarowstop, 1),
                              slice(datacolstart, datacolstop, 1))
-                group[dataslice] = group[dataslice] - refsignal
+                group[dataslice] = group[dataslice] - \
+                    np.asarray(refsignal)[..., np.newaxis, np.newaxis]
         return
 
+    def get_refvalues_stack(self, groups, dq):
+        """Get the reference pixel values of a stack of groups at once
+
+        Parameters:
+        -----------
+
+        groups: NDArray
+            3-d array of the groups being processed, in detector orientation
+
+        dq: NDArray
+            DQ array of the groups, in detector orientation
+
+        Returns:
+        --------
+
+        refpix: dictionary
+            Dictionary with the same structure as returned by
+            `get_refvalues`, containing 1-d arrays of the clipped means for
+            each group.  None if a set of reference pixels has no good pixels.
+
+        """
+        refpix = {}
+        for amplifier in 'ABCD':
+            refpix[amplifier] = {}
+            refpix[amplifier]['odd'] = {}
+            refpix[amplifier]['even'] = {}
+            for top_bottom in ('top', 'bottom'):
+                rowstart, rowstop, colstart, colstop = \
+                    NIR_reference_sections[amplifier][top_bottom]
+                rows = slice(rowstart, rowstop)
+                if self.odd_even_columns:
+                    for odd_even, start in (('odd', colstart),
+                                            ('even', colstart + 1)):
+                        section = (rows, slice(start, colstop, 2))
+                        mean = self.sigma_clip_stack(
+                            groups[(Ellipsis,) + section], dq[section])
+                        if mean is None:
+                            return None
+                        refpix[amplifier][odd_even][top_bottom] = mean
+                else:
+                    section = (rows, slice(colstart, colstop))
+                    mean = self.sigma_clip_stack(
+                        groups[(Ellipsis,) + section], dq[section])
+                    if mean is None:
+                        return None
+                    refpix[amplifier][top_bottom] = mean
+        return refpix
+
     def create_reflected(self, data, smoothing_length):
         """Make an array bigger by extending it at the top and bottom by
         an amount equal to .5(smoothing length-1)
@@ -676,6 +816,61 @@ class NIRDataset(Dataset):
             result[i] = np.median(window)
         return result
 
+    def median_filter_stack(self, data, dq, smoothing_length):
+        """Median filter a stack of arrays at once
+
+        This gives the results of `median_filter` for each array along the
+        first axis of `data`.
+
+        Parameters:
+        -----------
+
+        data: NDArray
+            input 3-d array, e.g. the side reference pixels of every group
+
+        dq: NDArray
+            input 2-d dq array, the same for each array of the stack
+
+        smoothing_length: integer (should be odd)
+            height of box within which the median value is calculated
+
+        Returns:
+        --------
+
+        result: NDArray
+            2-d array of the median filtered version of each array
+
+        """
+        nrows = data.shape[-2]
+        #
+        # Row indices of the reflected arrays made by create_reflected, and
+        # of the rows in the box of each row
+        bufsize = (smoothing_length + 1 - smoothing_length % 2) // 2
+        reflected = np.abs(np.arange(-bufsize, nrows + bufsize))
+        reflected = np.where(reflected > nrows - 1,
+                             2 * (nrows - 1) - reflected, reflected)
+        boxes = reflected[np.arange(nrows)[:, np.newaxis] +
+                          np.arange(smoothing_length)]
+
+        good = np.bitwise_and(dq[boxes],
+                              dqflags.pixel['DO_NOT_USE']) == 0
+        good = good.reshape(nrows, -1)
+        ngood = good.sum(axis=1)
+        windows = data[:, boxes].reshape(len(data), nrows, -1)
+        #
+        # Bad pixels are sorted last, so the median of the ngood values of a
+        # box is taken from the first ones
+        windows = np.where(good, windows, np.inf)
+        has_nan = np.isnan(windows).any(axis=-1)
+        windows.sort(axis=-1)
+        index = np.arange(nrows)
+        lower = windows[:, index, np.maximum(ngood - 1, 0) // 2]
+        upper = windows[:, index, ngood // 2]
+        result = 0.5 * (lower + upper)
+        result[:, ngood == 0] = np.nan
+        result[has_nan] = np.nan
+        return result
+
     def calculate_side_ref_signal(self, group, colstart, colstop):
         """Calculate the reference pixel signal from the side reference pixels
         by running a box up the side reference pixels and calculating the running
@@ -788,33 +983,64 @@ class NIRDataset(Dataset):
     def do_fullframe_corrections(self):
         """Do Reference Pixels Corrections for all amplifiers, NIR detectors
         First read of each integration is NOT subtracted, as the signal is removed
-        in the superbias subtraction step"""
-        #
-        #  First transform to detector coordinates
-        #
-        for integration in range(self.nints):
-            for group in range(self.ngroups):
-                #
-                # Get the reference values from the top and bottom reference
-                # pixels
-                #
-                self.DMS_to_detector(integration, group)
-                thisgroup = self.group
-                refvalues = self.get_refvalues(thisgroup)
-                if self.bad_reference_pixels:
-                    break
-                self.do_top_bottom_correction(thisgroup, refvalues)
-                if self.use_side_ref_pixels:
-                    corrected_group = self.do_side_correction(thisgroup)
-                    self.group = corrected_group
-                else:
-                    self.group = thisgroup
-                #
-                #  Now transform back from detector to DMS coordinates.
-                self.detector_to_DMS(integration, group)
+        in the superbias subtraction step
+
+        The groups of each integration are corrected at once, on a view of
+        the data in detector orientation.  If nproc is larger than 1, the
+        integrations are corrected in parallel."""
+        pixeldq = self.detector_view(self.pixeldq)
+
+        def correct_integration(integration):
+            data = self.input_model.data[integration]
+            ok = self.correct_groups(self.detector_view(data), pixeldq)
+            return data, ok
+
+        nproc = min(self.nproc, self.nints)
+        results = parallel_utils.map_ordered(correct_integration,
+                                             range(self.nints), nproc)
+        for integration, (data, ok) in enumerate(results):
+            if not ok:
+                self.bad_reference_pixels = True
+            elif nproc > 1:
+                self.input_model.data[integration] = data
         log.setLevel(logging.INFO)
         return
 
+    def correct_groups(self, groups, dq):
+        """Correct a stack of groups for the bias drift, in place
+
+        Parameters:
+        -----------
+
+        groups: NDArray
+            3-d array of the groups being processed, in detector orientation
+
+        dq: NDArray
+            DQ array of the groups, in detector orientation
+
+        Returns:
+        --------
+
+        ok: boolean
+            False if there are no good reference pixels, in which case the
+            groups are not corrected
+
+        """
+        refvalues = self.get_refvalues_stack(groups, dq)
+        if refvalues is None:
+            return False
+        self.do_top_bottom_correction(groups, refvalues)
+        if self.use_side_ref_pixels:
+            smoothing_length = self.side_smoothing_length
+            left = self.median_filter_stack(groups[..., 0:4], dq[:, 0:4],
+                                            smoothing_length)
+            right = self.median_filter_stack(groups[..., 2044:2048],
+                                             dq[:, 2044:2048],
+                                             smoothing_length)
+            combined = 0.5 * (left + right)
+            groups -= self.side_gain * combined[..., np.newaxis]
+        return True
+
     def do_subarray_corrections(self):
         """Do corrections for subarray.  Reference pixel value calculated
         separately for odd and even columns if odd_even_columns is True,
@@ -877,6 +1103,7 @@ class NIRDataset(Dataset):
 
 class NRS1Dataset(NIRDataset):
     """For NRS1 data"""
+    transpose = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -893,6 +1120,9 @@ class NRS1Dataset(NIRDataset):
 
 class NRS2Dataset(NIRDataset):
     """NRS2 Data"""
+    transpose = True
+    flip_rows = True
+    flip_columns = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -909,6 +1139,7 @@ class NRS2Dataset(NIRDataset):
 
 class NRCA1Dataset(NIRDataset):
     """For NRCA1 data"""
+    flip_columns = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -925,6 +1156,7 @@ class NRCA1Dataset(NIRDataset):
 
 class NRCA2Dataset(NIRDataset):
     """For NRCA2 data"""
+    flip_rows = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -941,6 +1173,7 @@ class NRCA2Dataset(NIRDataset):
 
 class NRCA3Dataset(NIRDataset):
     """For NRCA3 data"""
+    flip_columns = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -957,6 +1190,7 @@ class NRCA3Dataset(NIRDataset):
 
 class NRCA4Dataset(NIRDataset):
     """For NRCA4 data"""
+    flip_rows = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -973,6 +1207,7 @@ class NRCA4Dataset(NIRDataset):
 
 class NRCALONGDataset(NIRDataset):
     """For NRCALONG data"""
+    flip_columns = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -989,6 +1224,7 @@ class NRCALONGDataset(NIRDataset):
 
 class NRCB1Dataset(NIRDataset):
     """For NRCB1 data"""
+    flip_rows = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -1005,6 +1241,7 @@ class NRCB1Dataset(NIRDataset):
 
 class NRCB2Dataset(NIRDataset):
     """For NRCB2 data"""
+    flip_columns = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -1022,6 +1259,7 @@ class NRCB2Dataset(NIRDataset):
 
 class NRCB3Dataset(NIRDataset):
     """For NRCB3 data"""
+    flip_rows = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -1038,6 +1276,7 @@ class NRCB3Dataset(NIRDataset):
 
 class NRCB4Dataset(NIRDataset):
     """For NRCB4 data"""
+    flip_columns = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -1054,6 +1293,7 @@ class NRCB4Dataset(NIRDataset):
 
 class NRCBLONGDataset(NIRDataset):
     """For NRCBLONG data"""
+    flip_rows = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -1070,6 +1310,9 @@ class NRCBLONGDataset(NIRDataset):
 
 class NIRISSDataset(NIRDataset):
     """For NIRISS data"""
+    transpose = True
+    flip_rows = True
+    flip_columns = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -1087,6 +1330,8 @@ class NIRISSDataset(NIRDataset):
 
 class GUIDER1Dataset(NIRDataset):
     """For GUIDER1 data"""
+    flip_rows = True
+    flip_columns = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -1103,6 +1348,7 @@ class GUIDER1Dataset(NIRDataset):
 
 class GUIDER2Dataset(NIRDataset):
     """For GUIDER2 data"""
+    flip_columns = True
 
     def DMS_to_detector(self, integration, group):
         #
@@ -1628,7 +1874,7 @@ def create_dataset(input_model,
 def correct_model(input_model, odd_even_columns,
                    use_side_ref_pixels,
                    side_smoothing_length, side_gain,
-                   odd_even_rows):
+                   odd_even_rows, nproc=1):
     """Wrapper to do Reference Pixel Correction on a JWST Model.
     Performs the correction on the datamodel
 
@@ -1658,6 +1904,10 @@ def correct_model(input_model, odd_even_columns,
         flag that controls whether odd and even-numbered rows are handled
         separately (MIR only)
 
+    nproc: integer
+        number of processes used to correct the integrations of full-frame
+        data (NIR only)
+
     """
     if input_model.meta.instrument.name == 'MIRI':
         if reffile_utils.is_subarray(input_model):
@@ -1674,6 +1924,7 @@ def correct_model(input_model, odd_even_columns,
     if input_dataset is None:
         status = SUBARRAY_DOESNTFIT
         return status
+    input_dataset.nproc = nproc
     result_dataset = reference_pixel_correction(input_dataset)
 
     if result_dataset.bad_reference_pixels:
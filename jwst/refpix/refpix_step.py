@@ -22,6 +22,7 @@ class RefPixStep(Step):
         side_smoothing_length = integer(default=11)
         side_gain = float(default=1.0)
         odd_even_rows = boolean(default=True)
+        nproc = integer(min=1, default=1) # processes used for full-frame NIR and IRS2 integrations
     """
 
     reference_file_types = ['refpix']
@@ -45,8 +46,8 @@ class RefPixStep(Step):
                     return result
 
                 irs2_model = datamodels.IRS2Model(self.irs2_name)
-                result = irs2_subtract_reference.correct_model(input_model,
-                                                               irs2_model)
+                result = irs2_subtract_reference.correct_model(
+                    input_model, irs2_model, nproc=self.nproc)
                 if result.meta.cal_step.refpix != 'SKIPPED':
                     result.meta.cal_step.refpix = 'COMPLETE'
                 irs2_model.close()
@@ -66,7 +67,8 @@ class RefPixStep(Step):
                                                         self.use_side_ref_pixels,
                                                         self.side_smoothing_length,
                                                         self.side_gain,
-                                                        self.odd_even_rows)
+                                                        self.odd_even_rows,
+                                                        self.nproc)
                 if status == reference_pixels.REFPIX_OK:
                     datamodel.meta.cal_step.refpix = 'COMPLETE'
                 elif status == reference_pixels.SUBARRAY_DOESNTFIT:
@@ -0,0 +1,94 @@
+"""
+Test the batched computations of the IRS2 reference correction
+"""
+import numpy as np
+import pytest
+
+from jwst.refpix import irs2_subtract_reference as irs2
+
+
+class FakeModel:
+    def __init__(self, shape):
+        self.pixeldq = np.zeros(shape, dtype=np.uint32)
+
+
+@pytest.mark.parametrize('irs2_nx, scipix_n, refpix_r',
+                         [(3200, 16, 4), (3200, 16, 2), (3000, 12, 4)])
+def test_irs2_mask(irs2_nx, scipix_n, refpix_r):
+    refout = irs2_nx // 5
+    period = scipix_n + refpix_r
+    part = refout - (scipix_n // 2 + refpix_r)
+    same_locations = (part % period == scipix_n // 2)
+
+    expected = np.ones(irs2_nx, dtype=bool)
+    expected[:refout] = False
+    if same_locations:
+        for i in range(refout + scipix_n // 2, irs2_nx + 1, period):
+            expected[i:i + refpix_r] = False
+    else:
+        temp = np.ones(refout, dtype=bool)
+        for i in range(scipix_n // 2, refout + 1, period):
+            temp[i:i + refpix_r] = False
+        for j in range(4):
+            expected[refout * (j + 1):refout * (j + 2)] = \
+                temp if j % 2 == 0 else temp[::-1]
+
+    model = FakeModel((2048, irs2_nx))
+    mask = irs2.make_irs2_mask(model, scipix_n, refpix_r)
+    assert np.array_equal(mask, expected)
+
+
+def test_hermitian_part():
+    rng = np.random.RandomState(3)
+    nelem = 64
+    data = rng.normal(size=(3, nelem))
+    coeff = rng.normal(size=nelem) + 1j * rng.normal(size=nelem)
+
+    expected = np.fft.ifft(np.fft.fft(data, axis=1) * coeff, axis=1).real
+    result = np.fft.irfft(np.fft.rfft(data, axis=1) *
+                          irs2.hermitian_part(coeff, nelem), n=nelem, axis=1)
+    assert np.allclose(result, expected)
+
+
+def test_fft_interp_norm_groups():
+    rng = np.random.RandomState(5)
+    (ny, ngroups) = (6, 3)
+    (row, hnorm, _, hnorm1, _, _, _, _, _) = \
+        irs2.readout_geometry(2048, 16, 4, 8)
+    nelem = ny * row
+    half = rng.uniform(size=nelem // 2)
+    aa = np.concatenate((half, np.roll(half, -1)[::-1])).astype(np.float32)
+    mask0 = np.ones((ny, 800), dtype=np.int64)
+    dd0 = rng.normal(size=(ngroups, ny, row)).astype(np.float32)
+
+    # Filter each group separately with complex FFTs.
+    hm = np.zeros((ny, row), dtype=bool)
+    hm[:, hnorm1] = True
+    expected = dd0.copy()
+    for j in range(ngroups):
+        p = dd0[j].ravel().copy()
+        for it in range(3):
+            p[:] = np.fft.ifft(np.fft.fft(p) * aa).real
+            p[hm.ravel()] = dd0[j][hm]
+        expected[j] = p.reshape((ny, row))
+
+    irs2.fft_interp_norm(dd0, mask0, row, hnorm, hnorm1, ny, ngroups, aa, 3)
+    assert np.allclose(dd0, expected, atol=1.e-5)
+
+
+def test_ols_lines():
+    rng = np.random.RandomState(7)
+    x = rng.normal(size=(8, 20)).astype(np.float32)
+    y = (3. + 2. * x + 0.1 * rng.normal(size=(2, 3, 8, 20))).astype(np.float32)
+    y[0, 1, :4] = 0.
+    y[1, 2] = 0.
+
+    (intercept, slope) = irs2.ols_lines(x, y)
+    assert intercept.shape == slope.shape == (2, 3)
+    for i in range(2):
+        for k in range(3):
+            mask = (y[i, k] != 0.)
+            expected = irs2.ols_line(x[mask], y[i, k][mask])
+            assert np.allclose((intercept[i, k], slope[i, k]), expected,
+                               rtol=1.e-5, atol=1.e-6)
+    assert intercept[1, 2] == 0. and slope[1, 2] == 0.
@@ -676,4 +676,52 @@ def test_do_corrections_all_detectors(setup_cube, instr, det_list, ngroups, nrow
                       odd_even_rows)
 
         np.testing.assert_almost_equal(np.mean(input_model.data[0, 0, :4, 4:-4]), rpix - rpix, decimal=0)
-        np.testing.assert_almost_equal(np.mean(input_model.data[0, 0, 4:-4, 4:-4]), dataval - rpix, decimal=0)
\ No newline at end of file
+        np.testing.assert_almost_equal(np.mean(input_model.data[0, 0, 4:-4, 4:-4]), dataval - rpix, decimal=0)
+
+def _per_group_correction(dataset):
+    '''Correct each group in turn, with the single-group methods.'''
+    for integration in range(dataset.nints):
+        for group in range(dataset.ngroups):
+            dataset.DMS_to_detector(integration, group)
+            refvalues = dataset.get_refvalues(dataset.group)
+            dataset.do_top_bottom_correction(dataset.group, refvalues)
+            dataset.group = dataset.do_side_correction(dataset.group)
+            dataset.detector_to_DMS(integration, group)
+            # keep the DQ array in DMS orientation for the next group
+            dataset.pixeldq = dataset.get_pixeldq()
+
+
+@pytest.mark.parametrize('detector', ['NRS2', 'NRCA1', 'NRCB1', 'NIS'])
+def test_fullframe_all_groups_at_once(setup_cube, detector):
+    '''The groups corrected at once match the groups corrected in turn.'''
+    rng = np.random.RandomState(1)
+    input_model = setup_cube('NIRCAM', detector, 3, 2048, 2048)
+    input_model.data[...] = 100. + 5. * rng.normal(size=input_model.data.shape)
+    input_model.data[..., :4] += 30.
+    input_model.data[..., -4:] -= 20.
+    input_model.data[0, 1, 0, 100] = 1.e4
+    input_model.pixeldq[50, 2] = dqflags.pixel['DO_NOT_USE']
+    input_model.pixeldq[1, 300] = dqflags.pixel['DO_NOT_USE']
+    expected = input_model.copy()
+
+    dataset = create_dataset(input_model, True, True, 11, 1.0, False)
+    dataset.do_fullframe_corrections()
+    _per_group_correction(create_dataset(expected, True, True, 11, 1.0,
+                                         False))
+
+    assert not dataset.bad_reference_pixels
+    np.testing.assert_allclose(input_model.data, expected.data, atol=1.e-3)
+
+
+def test_fullframe_nproc(setup_cube):
+    '''Integrations corrected in parallel give the same result.'''
+    rng = np.random.RandomState(2)
+    input_model = setup_cube('NIRCAM', 'NRCA1', 2, 2048, 2048)
+    input_model.data = np.repeat(input_model.data, 2, axis=0)
+    input_model.data[...] = rng.normal(size=input_model.data.shape)
+    expected = input_model.copy()
+
+    correct_model(input_model, True, True, 11, 1.0, False, nproc=2)
+    correct_model(expected, True, True, 11, 1.0, False)
+
+    np.testing.assert_array_equal(input_model.data, expected.data)
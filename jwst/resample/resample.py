@@ -3,6 +3,7 @@ from collections import OrderedDict
 import numpy as np
 
 from .. import datamodels
+from ..lib import parallel_utils
 
 from . import gwcs_drizzle
 from . import resample_utils
@@ -13,7 +14,6 @@ log.setLevel(logging.DEBUG)
 
 __all__ = ["ResampleData"]
 
-
 class ResampleData:
     """
     This is the controlling routine for the resampling process.
@@ -94,7 +94,7 @@ class ResampleData:
         # in single-drizzle mode (mosaic all detectors in a single observation)
         if self.drizpars['single']:
             driz_outputs = self.input_models.group_names
-            exposures = self.input_models.models_grouped
+            exposures = list(self.input_models.models_grouped)
             group_exptime = []
             for exposure in exposures:
                 group_exptime.append(exposure[0].meta.exposure.exposure_time)
@@ -108,44 +108,28 @@ class ResampleData:
             group_exptime = [total_exposure_time]
         pointings = len(self.input_models.group_names)
 
-        for obs_product, exposure, texptime in zip(driz_outputs, exposures,
-                                                   group_exptime):
-            output_model = self.blank_output.copy()
-            output_model.meta.filename = obs_product
-            saved_model_type = output_model.meta.model_type
-
-            if self.drizpars['blendheaders']:
-                self.blend_output_metadata(output_model)
-                output_model.meta.model_type = saved_model_type
+        # Each single-drizzle group produces an independent output, so
+        # those can be farmed out to a pool of worker processes.
+        nproc = min(self.drizpars.get('nproc', 1) or 1, len(exposures))
+        if self.drizpars['single'] and nproc > 1:
+            output_models = self._drizzle_groups_parallel(driz_outputs,
+                                                          exposures, nproc)
+        else:
+            output_models = []
+            for obs_product, exposure in zip(driz_outputs, exposures):
+                output_model = self._create_output_model(obs_product)
+                self._subtract_background(exposure)
+                driz = self._create_drizzle(output_model)
+                self._drizzle_group(driz, output_model, exposure)
+                output_models.append(output_model)
 
+        for output_model, exposure, texptime in zip(output_models, exposures,
+                                                    group_exptime):
             exposure_times = {'start': [], 'end': []}
-
-            # Initialize the output with the wcs
-            driz = gwcs_drizzle.GWCSDrizzle(output_model,
-                                            single=self.drizpars['single'],
-                                            pixfrac=self.drizpars['pixfrac'],
-                                            kernel=self.drizpars['kernel'],
-                                            fillval=self.drizpars['fillval'])
-
-            for n, img in enumerate(exposure):
+            for img in exposure:
                 exposure_times['start'].append(img.meta.exposure.start_time)
                 exposure_times['end'].append(img.meta.exposure.end_time)
 
-                # apply sky subtraction
-                blevel = img.meta.background.level
-                if not img.meta.background.subtracted and blevel is not None:
-                    img.data -= blevel
-
-                outwcs_pscale = output_model.meta.wcsinfo.cdelt1
-                wcslin_pscale = img.meta.wcsinfo.cdelt1
-
-                inwht = resample_utils.build_driz_weight(img,
-                    weight_type=self.drizpars['weight_type'],
-                    good_bits=self.drizpars['good_bits'])
-                driz.add_image(img.data, img.meta.wcs, inwht=inwht,
-                        expin=img.meta.exposure.exposure_time,
-                        pscale_ratio=outwcs_pscale / wcslin_pscale)
-
             # Update some basic exposure time values based on all the inputs
             output_model.meta.exposure.exposure_time = texptime
             output_model.meta.exposure.start_time = min(exposure_times['start'])
@@ -158,6 +142,112 @@ class ResampleData:
 
             self.output_models.append(output_model)
 
+    def _create_output_model(self, obs_product):
+        """Create a blank output model, with blended metadata if requested."""
+        output_model = self.blank_output.copy()
+        output_model.meta.filename = obs_product
+        saved_model_type = output_model.meta.model_type
+
+        if self.drizpars['blendheaders']:
+            self.blend_output_metadata(output_model)
+            output_model.meta.model_type = saved_model_type
+
+        return output_model
+
+    def _create_drizzle(self, output_model):
+        """Initialize a drizzle object writing into ``output_model``."""
+        return gwcs_drizzle.GWCSDrizzle(output_model,
+                                        single=self.drizpars['single'],
+                                        pixfrac=self.drizpars['pixfrac'],
+                                        kernel=self.drizpars['kernel'],
+                                        fillval=self.drizpars['fillval'])
+
+    @staticmethod
+    def _subtract_background(exposure):
+        """Apply the sky subtraction recorded in the metadata of each image."""
+        for img in exposure:
+            blevel = img.meta.background.level
+            if not img.meta.background.subtracted and blevel is not None:
+                img.data -= blevel
+
+    def _drizzle_group(self, driz, output_model, exposure):
+        """Drizzle all the images of one exposure group onto ``driz``."""
+        outwcs_pscale = output_model.meta.wcsinfo.cdelt1
+
+        for img in exposure:
+            wcslin_pscale = img.meta.wcsinfo.cdelt1
+
+            inwht = resample_utils.build_driz_weight(img,
+                weight_type=self.drizpars['weight_type'],
+                good_bits=self.drizpars['good_bits'])
+            driz.add_image(img.data, img.meta.wcs, inwht=inwht,
+                    expin=img.meta.exposure.exposure_time,
+                    pscale_ratio=outwcs_pscale / wcslin_pscale)
+
+    def _drizzle_groups_parallel(self, driz_outputs, exposures, nproc):
+        """Drizzle independent exposure groups using a pool of processes.
+
+        The output arrays for every group are allocated in shared memory
+        before the worker processes are forked (see
+        `~jwst.lib.parallel_utils.map_ordered`), so that the workers can
+        drizzle directly into them without pickling any data models or
+        output arrays back to the parent process.
+
+        Parameters
+        ----------
+        driz_outputs : list of str
+            Output product name for each group
+
+        exposures : list of lists of data models
+            The input images of each group
+
+        nproc : int
+            Number of worker processes
+
+        Returns
+        -------
+        output_models : list of `~jwst.datamodels.DrizProductModel`
+            One drizzled product per group, in input order.
+        """
+        output_models = []
+        outputs = []
+        for obs_product, exposure in zip(driz_outputs, exposures):
+            output_model = self._create_output_model(obs_product)
+            self._subtract_background(exposure)
+
+            # The shared arrays have the same layout as the arrays of the
+            # output model, so the products match those drizzled serially.
+            outsci = resample_utils.shared_array(output_model.data.shape,
+                                                 np.float32)
+            outwht = resample_utils.shared_array(output_model.wht.shape,
+                                                 np.float32)
+            outcon = resample_utils.shared_array(output_model.con.shape,
+                                                 np.int32)
+            outsci[:] = output_model.data
+            outwht[:] = output_model.wht
+            outcon[:] = output_model.con
+
+            output_models.append(output_model)
+            outputs.append((outsci, outwht, outcon))
+
+        def drizzle_group(index):
+            outsci, outwht, outcon = outputs[index]
+            driz = self._create_drizzle(output_models[index])
+            driz.outsci = outsci
+            driz.outwht = outwht
+            driz.outcon = outcon.reshape((-1,) + outsci.shape)
+            self._drizzle_group(driz, output_models[index], exposures[index])
+
+        parallel_utils.map_ordered(drizzle_group, range(len(exposures)), nproc)
+
+        for output_model, (outsci, outwht, outcon) in zip(output_models,
+                                                           outputs):
+            output_model.data = outsci
+            output_model.wht = outwht
+            output_model.con = outcon
+
+        return output_models
+
     def update_fits_wcs(self, model):
         """
         Update FITS WCS keywords of the resampled image.
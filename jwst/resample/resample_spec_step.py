@@ -4,6 +4,7 @@ from .. import datamodels
 from ..datamodels import MultiSlitModel, ModelContainer
 from . import resample_spec, ResampleStep
 from ..exp_to_source import multislit_to_container
+from ..lib import parallel_utils
 from ..assign_wcs.util import update_s_region_spectral
 
 
@@ -67,13 +68,19 @@ class ResampleSpecStep(ResampleStep):
         result : `~jwst.datamodels.MultiProductModel`
             The resampled output, one per source
         """
-        containers = multislit_to_container(input_models)
+        containers = list(multislit_to_container(input_models).values())
         result = datamodels.MultiProductModel()
         result.update(input_models[0])
-        for container in containers.values():
+
+        def drizzle_container(container):
             resamp = resample_spec.ResampleSpecData(container, **self.drizpars)
-            drizzled_models = resamp.do_drizzle()
+            return list(resamp.do_drizzle())
 
+        # Each source is resampled independently; with several processes
+        # the sources are drizzled in workers and kept in their input order.
+        results = parallel_utils.map_ordered(drizzle_container, containers,
+                                             self.nproc)
+        for container, drizzled_models in zip(containers, results):
             for model in drizzled_models:
                 model.meta.cal_step.resample = "COMPLETE"
                 model.meta.asn.pool_name = input_models.meta.pool_name
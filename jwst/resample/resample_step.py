@@ -33,6 +33,7 @@ class ResampleStep(Step):
         good_bits = integer(min=0, default=4)
         single = boolean(default=False)
         blendheaders = boolean(default=True)
+        nproc = integer(min=1, default=1) # processes used for single drizzle or spectral slits
     """
 
     reference_file_types = ['drizpars']
@@ -162,7 +163,8 @@ class ResampleStep(Step):
         kwargs = dict(
             good_bits=self.good_bits,
             single=self.single,
-            blendheaders=self.blendheaders
+            blendheaders=self.blendheaders,
+            nproc=self.nproc
             )
 
         kwargs.update(all_drizpars)
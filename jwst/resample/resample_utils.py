@@ -1,3 +1,5 @@
+import multiprocessing
+
 import numpy as np
 
 from astropy import wcs as fitswcs
@@ -189,3 +191,24 @@ def build_mask(dqarr, bitvalue):
     if bitvalue is None:
         return (np.ones(dqarr.shape, dtype=np.uint8))
     return np.logical_not(np.bitwise_and(dqarr, ~bitvalue)).astype(np.uint8)
+
+
+def shared_array(shape, dtype):
+    """Allocate a zero-filled array in memory shared with forked processes.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the array
+
+    dtype : data-type
+        Data type of the array elements
+
+    Returns
+    -------
+    `~numpy.ndarray` backed by a `multiprocessing.RawArray`
+    """
+    dtype = np.dtype(dtype)
+    size = int(np.prod(shape)) * dtype.itemsize
+    buffer = multiprocessing.RawArray('b', size)
+    return np.frombuffer(buffer, dtype=dtype).reshape(shape)
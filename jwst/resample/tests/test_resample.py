@@ -0,0 +1,79 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from astropy import coordinates as coord
+from astropy import units as u
+from astropy.modeling import models
+from gwcs import WCS
+from gwcs import coordinate_frames as cf
+
+from jwst import datamodels
+from jwst.resample.resample import ResampleData
+
+
+def make_image(exposure_number, ra, shape=(30, 40), pscale=0.1 / 3600.):
+    """Create an image with a simple tangent-plane WCS"""
+    rng = np.random.RandomState(exposure_number)
+    model = datamodels.ImageModel(shape)
+    model.data[:] = rng.normal(10., 1., size=shape)
+    model.meta.exposure.exposure_time = 10.
+    model.meta.exposure.start_time = 58000. + exposure_number
+    model.meta.exposure.end_time = 58000.1 + exposure_number
+    model.meta.background.subtracted = False
+    model.meta.background.level = 1.
+
+    model.meta.observation.program_number = '00001'
+    model.meta.observation.observation_number = '001'
+    model.meta.observation.visit_number = '001'
+    model.meta.observation.visit_group = '01'
+    model.meta.observation.sequence_id = '1'
+    model.meta.observation.activity_id = '01'
+    model.meta.observation.exposure_number = str(exposure_number)
+
+    model.meta.wcsinfo.wcsaxes = 2
+    model.meta.wcsinfo.ctype1 = 'RA---TAN'
+    model.meta.wcsinfo.ctype2 = 'DEC--TAN'
+    model.meta.wcsinfo.cdelt1 = pscale
+    model.meta.wcsinfo.cdelt2 = pscale
+    model.meta.wcsinfo.pc1_1 = 1.
+    model.meta.wcsinfo.pc1_2 = 0.
+    model.meta.wcsinfo.pc2_1 = 0.
+    model.meta.wcsinfo.pc2_2 = 1.
+    model.meta.coordinates.reference_frame = 'ICRS'
+
+    transform = (models.Shift(-shape[1] / 2.) & models.Shift(-shape[0] / 2.) |
+                 models.Scale(pscale) & models.Scale(pscale) |
+                 models.Pix2Sky_TAN() |
+                 models.RotateNative2Celestial(ra, 0., 180.))
+    detector = cf.Frame2D(name='detector', axes_order=(0, 1),
+                          unit=(u.pix, u.pix))
+    sky = cf.CelestialFrame(reference_frame=coord.ICRS(), name='world',
+                            unit=(u.deg, u.deg))
+    model.meta.wcs = WCS([(detector, transform), (sky, None)])
+    return model
+
+
+def drizzle_single(nproc):
+    input_models = datamodels.ModelContainer(
+        [make_image(n, 10. + n * 0.3 / 3600.) for n in range(1, 4)]
+    )
+    resamp = ResampleData(input_models, output='test_i2d.fits',
+                          single=True, blendheaders=False, nproc=nproc,
+                          pixfrac=1.0, kernel='square', fillval='INDEF',
+                          weight_type='exptime', good_bits=4)
+    resamp.do_drizzle()
+    return resamp.output_models
+
+
+def test_drizzle_single_parallel():
+    """Drizzling exposure groups in parallel matches drizzling serially"""
+    serial = drizzle_single(nproc=1)
+    parallel = drizzle_single(nproc=2)
+
+    assert len(serial) == len(parallel) == 3
+    for expected, result in zip(serial, parallel):
+        assert result.meta.filename == expected.meta.filename
+        assert result.con.shape == expected.con.shape
+        assert_array_equal(result.data, expected.data)
+        assert_array_equal(result.wht, expected.wht)
+        assert_array_equal(result.con, expected.con)
@@ -1,7 +1,10 @@
 import numpy as np
+from numpy.testing import assert_array_equal
 import pytest
 
+from jwst.lib.parallel_utils import map_ordered
 from jwst.resample.resample_spec import find_dispersion_axis
+from jwst.resample.resample_utils import shared_array
 
 
 def test_find_dispersion_axis():
@@ -32,3 +35,20 @@ def test_find_dispersion_axis():
     wavelengths_zeros = np.zeros((15, 100))
     with pytest.raises(RuntimeError):
         find_dispersion_axis(wavelengths_zeros)
+
+
+def test_shared_array():
+    """
+    Test that shared_array() output is updated in place by forked workers
+    """
+    arr = shared_array((4, 3), np.int32)
+    assert arr.shape == (4, 3)
+    assert arr.dtype == np.int32
+    assert not arr.any()
+
+    def fill(row):
+        arr[row] = row
+
+    map_ordered(fill, range(4), nproc=2)
+
+    assert_array_equal(arr, np.repeat(np.arange(4), 3).reshape(4, 3))
@@ -182,6 +182,98 @@ class Polygon(Region):
         """
         This is the main function which scans the polygon and creates the mask
 
+        Parameters
+        ----------
+        data : array
+            the mask array
+            it has all zeros initially, elements within a region are set to
+            the region's ID
+
+        Algorithm:
+        - Find the pixel spans covered by the polygon on all scan lines
+          at once (see `get_spans`)
+        - Set elements within each span to the region's ID
+
+        """
+        rows, xstart, xend = self.get_spans(data.shape)
+        return fill_spans(data, rows, xstart, xend, self._rid)
+
+    def get_spans(self, shape):
+        """
+        Compute the spans of pixels covered by the polygon on every scan line
+        of an image.
+
+        This is a vectorized version of the scan line algorithm implemented
+        in `scan_aet`: the intersections of all scan lines with all edges
+        are computed at once and then sorted on X of the intersection point.
+        Pairs of intersection points define the spans of filled pixels.
+
+        Parameters
+        ----------
+        shape : tuple of int
+            Shape ``(ny, nx)`` of the image to be filled.
+
+        Returns
+        -------
+        rows, xstart, xend : numpy.ndarray
+            Image row and first and last (inclusive) columns of every span
+            of pixels inside the polygon. Spans are clipped to the image.
+
+        """
+        ny, nx = shape
+        empty = (np.array([], dtype=int), ) * 3
+
+        start = self._vertices[:-1]
+        stop = self._vertices[1:]
+        non_horizontal = start[:, 1] != stop[:, 1]
+        start = start[non_horizontal]
+        stop = stop[non_horizontal]
+
+        ytop = self._scan_line_range[-1]
+        # see comments in the __init__ function for the reason of introducing
+        # polygon shifts (self._shiftx & self._shifty). Here we need to shift
+        # it back and keep only scan lines that fall inside the image.
+        y = np.arange(max(self._bbox[1], -self._shifty),
+                      min(ytop, ny - 1 - self._shifty) + 1)
+        if y.size == 0 or start.shape[0] == 0:
+            return empty
+        y = y[:, np.newaxis]
+
+        # The Active Edge Table of a scan line contains the edges that
+        # start on or below it and end above it. The AET is not updated
+        # on the top scan line and so it contains edges ending on it:
+        eymin = np.minimum(start[:, 1], stop[:, 1])
+        eymax = np.maximum(start[:, 1], stop[:, 1])
+        active = np.where(y < ytop, (eymin <= y) & (y < eymax),
+                          (eymin < y) & (y <= eymax))
+
+        # Intersections of each scan line with each edge:
+        u = stop - start
+        x = np.ceil((y - start[:, 1]) / u[:, 1] * u[:, 0] + start[:, 0])
+        x[~active] = np.inf
+        x.sort(axis=1)
+
+        # pairs of intersection points (in X order) define filled spans:
+        npairs = active.sum(axis=1) // 2
+        x1 = x[:, 0::2]
+        x2 = x[:, 1::2]
+        x1 = x1[:, :x2.shape[1]]
+        valid = np.arange(x2.shape[1]) < npairs[:, np.newaxis]
+
+        rows = np.broadcast_to(y + self._shifty, valid.shape)[valid]
+        xstart = np.maximum(0, x1[valid].astype(int) + self._shiftx)
+        xend = np.minimum(x2[valid].astype(int) + self._shiftx, nx - 1)
+
+        inside = xend >= xstart
+        return rows[inside], xstart[inside], xend[inside]
+
+    def scan_aet(self, data):
+        """
+        Scan the polygon and create the mask one scan line at a time
+        by maintaining an Active Edge Table (AET).
+
+        This is the original (non-vectorized) implementation of `scan`.
+
         Parameters
         ----------
         data : array
@@ -396,3 +488,42 @@ class Edge():
 def _round_vertex(v):
     x, y = v
     return (int(round(x)), int(round(y)))
+
+
+def fill_spans(data, rows, xstart, xend, value):
+    """
+    Set elements of ``data`` within spans of pixels to ``value``.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        A 2D array to be filled in place.
+
+    rows, xstart, xend : numpy.ndarray
+        Row and first and last (inclusive) columns of each span of pixels,
+        for example, as returned by `Polygon.get_spans`. Spans may overlap.
+
+    value : scalar
+        Value to be assigned to pixels inside the spans.
+
+    Returns
+    -------
+    data : numpy.ndarray
+        Input ``data`` array.
+
+    """
+    if len(rows) == 0:
+        return data
+
+    # mark beginning and (one past the) end of each span in a row and
+    # find covered pixels through a cumulative sum:
+    urows, irow = np.unique(rows, return_inverse=True)
+    counts = np.zeros((urows.size, data.shape[1] + 1), dtype=np.int32)
+    np.add.at(counts, (irow, xstart), 1)
+    np.add.at(counts, (irow, np.asarray(xend) + 1), -1)
+    inside = np.cumsum(counts[:, :-1], axis=1) > 0
+
+    filled = data[urows]
+    filled[inside] = value
+    data[urows] = filled
+    return data
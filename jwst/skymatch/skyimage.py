@@ -439,11 +439,9 @@ None, optional
                     continue
 
                 # set pixels in 'fill_mask' that are inside a polygon to True:
-                x, y = self.wcs_inv(ra, dec)
-                poly_vert = list(zip(*[x, y]))
-
-                polygon = region.Polygon(True, poly_vert)
-                fill_mask = polygon.scan(fill_mask)
+                rows, xstart, xend = self._polygon_spans(ra, dec)
+                fill_mask = region.fill_spans(fill_mask, rows, xstart, xend,
+                                              True)
 
             if self.mask is not None:
                 fill_mask &= self.mask
@@ -467,6 +465,18 @@ None, optional
 
         return skyval, npix, polyarea
 
+    def _polygon_spans(self, ra, dec):
+        """
+        Return spans of image pixels inside a spherical polygon with vertices
+        at ``(ra, dec)`` (see :py:meth:`region.Polygon.get_spans`).
+
+        """
+        x, y = self.wcs_inv(ra, dec)
+        poly_vert = list(zip(*[x, y]))
+
+        polygon = region.Polygon(True, poly_vert)
+        return polygon.get_spans(self.image.shape)
+
     def _calc_sky_orig(self, overlap=None, delta=True):
         """
         Compute sky background value.
@@ -9,6 +9,8 @@ from datetime import datetime
 import numpy as np
 
 # LOCAL
+from ..lib.footprint_index import FootprintIndex
+from ..lib.parallel_utils import map_ordered
 from . skyimage import SkyImage, SkyGroup
 
 
@@ -25,7 +27,8 @@ log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 
-def match(images, skymethod='global+match', match_down=True, subtract=False):
+def match(images, skymethod='global+match', match_down=True, subtract=False,
+          nproc=1):
     """
     A function to compute and/or "equalize" sky background in input images.
 
@@ -93,6 +96,11 @@ stsci_python_sphinxdocs_2.13/drizzlepac/astrodrizzle.html>`_ because it
     subtract : bool (Default = False)
         Subtract computed sky value from image data.
 
+    nproc : int, optional
+        Number of processes used to compute sky statistics in the overlaps
+        of image pairs when `skymethod` is either `'match'` or
+        `'global+match'`.
+
 
     Raises
     ------
@@ -309,7 +317,8 @@ stsci_python_sphinxdocs_2.13/drizzlepac/astrodrizzle.html>`_\ .
                  "overlapping regions.")
 
         # find "optimum" sky changes:
-        sky_deltas = _find_optimum_sky_deltas(images, apply_sky=not subtract)
+        sky_deltas = _find_optimum_sky_deltas(images, apply_sky=not subtract,
+                                              nproc=nproc)
         sky_good = np.isfinite(sky_deltas)
 
         if np.any(sky_good):
@@ -477,38 +486,45 @@ def _apply_sky(images, sky_deltas, do_global, do_skysub, show_old):
             #W[i,j] = w2
     #return A, W
 
+
 # bug workaround version:
-def _overlap_matrix(images, apply_sky=True):
-    #TODO: to improve performance, the nested loops could be parallelized
-    # since _calc_sky() here can be called independently from previous steps.
+def _overlap_matrix(images, apply_sky=True, nproc=1):
     ns = len(images)
     A = np.zeros((ns, ns), dtype=float)
     W = np.zeros((ns, ns), dtype=float)
 
-    for i in range(ns):
-        for j in range(i + 1, ns):
-            s1, w1, area1 = images[i].calc_sky(
-                overlap=images[j], delta=apply_sky
-            )
+    # Only pairs whose bounding caps intersect can possibly overlap:
+    pairs = FootprintIndex([im.polygon for im in images]).pairs()
+    log.debug("Computing sky in the overlaps of {:d} out of {:d} image pairs"
+              .format(len(pairs), ns * (ns - 1) // 2))
 
-            s2, w2, area2 = images[j].calc_sky(
-                overlap=images[i], delta=apply_sky
-            )
+    # sky values in each overlap can be computed independently:
+    results = map_ordered(
+        lambda pair: _pair_sky(images, pair[0], pair[1], apply_sky),
+        pairs, nproc
+    )
 
-            if area1 == 0.0 or area2 == 0.0 or s1 is None or s2 is None:
-                continue
+    for (i, j), (s1, w1, area1, s2, w2, area2) in zip(pairs, results):
+        if area1 == 0.0 or area2 == 0.0 or s1 is None or s2 is None:
+            continue
 
-            A[j, i] = s1
-            W[j, i] = w1
-            A[i, j] = s2
-            W[i, j] = w2
+        A[j, i] = s1
+        W[j, i] = w1
+        A[i, j] = s2
+        W[i, j] = w2
 
     return A, W
 
 
-def _find_optimum_sky_deltas(images, apply_sky=True):
+def _pair_sky(images, i, j, apply_sky):
+    s1, w1, area1 = images[i].calc_sky(overlap=images[j], delta=apply_sky)
+    s2, w2, area2 = images[j].calc_sky(overlap=images[i], delta=apply_sky)
+    return s1, w1, area1, s2, w2, area2
+
+
+def _find_optimum_sky_deltas(images, apply_sky=True, nproc=1):
     ns = len(images)
-    A, W = _overlap_matrix(images, apply_sky=apply_sky)
+    A, W = _overlap_matrix(images, apply_sky=apply_sky, nproc=nproc)
 
     def is_valid(i, j):
         return (W[i, j] > 0 and W[j, i] > 0)
@@ -37,6 +37,7 @@ class SkyMatchStep(Step):
         skymethod = option('local', 'global', 'match', 'global+match', default='global+match') # sky computation method
         match_down = boolean(default=True) # adjust sky to lowest measured value?
         subtract = boolean(default=False) # subtract computed sky from image data?
+        nproc = integer(min=1, default=1) # processes used to compute sky in overlaps
 
         # Image's bounding polygon parameters:
         stepsize = integer(default=None) # Max vertex separation
@@ -94,7 +95,7 @@ class SkyMatchStep(Step):
 
         # match/compute sky values:
         match(images, skymethod=self.skymethod, match_down=self.match_down,
-              subtract=self.subtract)
+              subtract=self.subtract, nproc=self.nproc)
 
         # set sky background value in each image's meta:
         for im in images:
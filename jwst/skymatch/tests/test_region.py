@@ -0,0 +1,64 @@
+"""
+Test the vectorized polygon filling algorithm in the ``region`` module.
+"""
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from jwst.skymatch.region import Polygon, fill_spans
+
+
+def _random_polygon(rng, nvert, shape):
+    ny, nx = shape
+    # star-shaped polygon around a random center, possibly extending beyond
+    # the top, bottom and right edges of the image:
+    xc, yc = rng.uniform(-0.2, 1.2, 2) * (nx, ny)
+    angles = np.sort(rng.uniform(0, 2 * np.pi, nvert))
+    r = rng.uniform(0.1, 0.8, nvert) * min(nx, ny)
+    x = xc + r * np.cos(angles)
+    y = yc + r * np.sin(angles)
+    # the original algorithm incorrectly fills entire rows of the image when
+    # a polygon extends more than a pixel beyond the left edge of the image:
+    x -= min(0, x.min() + 1.4)
+    vertices = list(zip(x, y))
+    vertices.append(vertices[0])
+    return vertices
+
+
+@pytest.mark.parametrize('nvert', [3, 4, 7, 20])
+def test_scan_matches_aet(nvert):
+    """
+    Test that vectorized ``scan`` fills the same pixels as the
+    original scan line algorithm.
+    """
+    rng = np.random.RandomState(nvert)
+    shape = (97, 131)
+    for _ in range(25):
+        vertices = _random_polygon(rng, nvert, shape)
+        polygon = Polygon(True, vertices)
+        mask = polygon.scan(np.zeros(shape, dtype=bool))
+        mask_aet = polygon.scan_aet(np.zeros(shape, dtype=bool))
+        assert_array_equal(mask, mask_aet)
+
+
+def test_scan_rectangle():
+    vertices = [(2, 1), (6, 1), (6, 4), (2, 4), (2, 1)]
+    mask = Polygon(1, vertices).scan(np.zeros((8, 8), dtype=np.int32))
+    expected = np.zeros((8, 8), dtype=np.int32)
+    expected[1:5, 2:7] = 1
+    assert_array_equal(mask, expected)
+
+
+def test_scan_outside_left_edge():
+    vertices = [(-9, 1), (-4, 1), (-4, 4), (-9, 4), (-9, 1)]
+    mask = Polygon(True, vertices).scan(np.zeros((8, 8), dtype=bool))
+    assert not mask.any()
+
+
+def test_fill_spans_overlapping():
+    data = np.zeros((3, 6), dtype=np.int8)
+    fill_spans(data, [0, 0, 2], [0, 2, 5], [3, 4, 5], 7)
+    expected = np.zeros((3, 6), dtype=np.int8)
+    expected[0, :5] = 7
+    expected[2, 5] = 7
+    assert_array_equal(data, expected)
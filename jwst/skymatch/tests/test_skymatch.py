@@ -0,0 +1,106 @@
+"""
+Test the computation of the sky overlap matrix in the ``skymatch`` module.
+"""
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from astropy import coordinates as coord
+from astropy import units as u
+from astropy.modeling import models
+from gwcs import WCS
+from gwcs import coordinate_frames as cf
+
+from jwst.lib.footprint_index import FootprintIndex
+from jwst.skymatch import skymatch
+from jwst.skymatch.skyimage import SkyImage, SkyGroup
+
+
+def _tan_wcs(ra, dec, shape, pscale=0.1 / 3600.0):
+    transform = (models.Shift(-shape[1] / 2.0) & models.Shift(-shape[0] / 2.0) |
+                 models.Scale(pscale) & models.Scale(pscale) |
+                 models.Pix2Sky_TAN() |
+                 models.RotateNative2Celestial(ra, dec, 180.0))
+    detector = cf.Frame2D(name='detector', axes_order=(0, 1),
+                          unit=(u.pix, u.pix))
+    sky = cf.CelestialFrame(reference_frame=coord.ICRS(), name='world',
+                            unit=(u.deg, u.deg))
+    return WCS([(detector, transform), (sky, None)])
+
+
+def _sky_image(rng, ra, dec, shape=(40, 50), id=None):
+    wcs = _tan_wcs(ra, dec, shape)
+    data = rng.normal(5.0 + 10 * rng.uniform(), 0.1, size=shape)
+    return SkyImage(image=data, wcs_fwd=wcs.__call__, wcs_inv=wcs.invert,
+                    id=id, stepsize=None)
+
+
+def _images(seed=1, ngroups=2):
+    # a few clusters of overlapping images, far apart from each other:
+    rng = np.random.RandomState(seed)
+    images = []
+    for cluster, (ra, dec) in enumerate([(10.0, 0.0), (10.0, 30.0),
+                                         (200.0, -60.0)]):
+        for k in range(4):
+            dra, ddec = rng.uniform(-3, 3, 2) / 3600.0
+            images.append(_sky_image(rng, ra + dra, dec + ddec,
+                                     id='{}_{}'.format(cluster, k)))
+    # and one image that does not overlap any other:
+    images.append(_sky_image(rng, 100.0, 45.0, id='lonely'))
+
+    if ngroups:
+        groups = [SkyGroup(images[k:k + ngroups], id=k)
+                  for k in range(0, len(images) - 1, ngroups)]
+        groups.append(SkyGroup(images[-1:], id='lonely'))
+        return groups
+    return images
+
+
+def _dense_overlap_matrix(images):
+    # sky values in the overlap of all image pairs:
+    ns = len(images)
+    A = np.zeros((ns, ns), dtype=float)
+    W = np.zeros((ns, ns), dtype=float)
+    for i in range(ns):
+        for j in range(i + 1, ns):
+            s1, w1, area1, s2, w2, area2 = skymatch._pair_sky(images, i, j,
+                                                              True)
+            if area1 == 0.0 or area2 == 0.0 or s1 is None or s2 is None:
+                continue
+            A[j, i] = s1
+            W[j, i] = w1
+            A[i, j] = s2
+            W[i, j] = w2
+    return A, W
+
+
+def test_overlap_candidates():
+    """Only pairs of nearby images are candidates for overlap"""
+    images = _images(ngroups=0)
+    pairs = FootprintIndex([im.polygon for im in images]).pairs()
+
+    assert pairs == sorted(pairs)
+    assert all(i < j for i, j in pairs)
+    for i, j in pairs:
+        assert images[i].id.split('_')[0] == images[j].id.split('_')[0]
+
+    # every overlapping pair is a candidate:
+    overlapping = [
+        (i, j) for i in range(len(images)) for j in range(i + 1, len(images))
+        if images[i].intersection(images[j]).area() > 0.0
+    ]
+    assert overlapping
+    assert set(overlapping) <= set(pairs)
+
+
+@pytest.mark.parametrize('ngroups', [0, 2])
+@pytest.mark.parametrize('nproc', [1, 2])
+def test_overlap_matrix(ngroups, nproc):
+    """The pruned overlap matrix equals the all-pairs overlap matrix"""
+    images = _images(ngroups=ngroups)
+    A_dense, W_dense = _dense_overlap_matrix(images)
+    assert np.count_nonzero(W_dense)
+
+    A, W = skymatch._overlap_matrix(images, apply_sky=True, nproc=nproc)
+    assert_array_equal(A, A_dense)
+    assert_array_equal(W, W_dense)
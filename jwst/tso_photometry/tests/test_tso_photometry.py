@@ -0,0 +1,32 @@
+"""
+Test the aperture photometry of TSO cubes
+"""
+import numpy as np
+import pytest
+from photutils import CircularAperture, CircularAnnulus
+
+from jwst.tso_photometry import tso_photometry
+
+
+@pytest.mark.parametrize('aperture', [
+    CircularAperture((20.3, 18.7), r=6.2),
+    CircularAnnulus((20.3, 18.7), r_in=9., r_out=15.),
+    CircularAperture((2., 3.), r=6.),
+])
+def test_weighted_sums(aperture, monkeypatch):
+    # a small chunk size to process the integrations in several chunks
+    monkeypatch.setattr(tso_photometry, 'MAX_CHUNK_SIZE', 2000)
+    rng = np.random.RandomState(7)
+    data = (10. + rng.normal(size=(7, 40, 50))).astype(np.float32)
+    err = np.abs(rng.normal(size=data.shape)).astype(np.float32)
+    # NaN outside of the apertures do not matter
+    data[:, -1, -1] = np.nan
+
+    weights = tso_photometry.aperture_weights(aperture, data.shape[1:])
+    sums, sum_errs = tso_photometry.weighted_sums(data, err, weights)
+
+    for i in range(len(data)):
+        expected, expected_err = aperture.do_photometry(data[i],
+                                                        error=err[i])
+        assert np.isclose(sums[i], expected[0], rtol=1.e-12)
+        assert np.isclose(sum_errs[i], expected_err[0], rtol=1.e-12)
@@ -12,6 +12,9 @@ from ..datamodels import CubeModel
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
+# Approximate size, in bytes, of the data copied at once for photometry
+MAX_CHUNK_SIZE = 64 * 1024**2
+
 
 def tso_aperture_photometry(datamodel, xcenter, ycenter, radius, radius_inner,
                             radius_outer):
@@ -57,42 +60,28 @@ def tso_aperture_photometry(datamodel, xcenter, ycenter, radius, radius_inner,
         bkg_aper = CircularAnnulus((xcenter, ycenter), r_in=radius_inner,
                                    r_out=radius_outer)
 
-    aperture_sum = []
-    aperture_sum_err = []
-    annulus_sum = []
-    annulus_sum_err = []
-
     nimg = datamodel.data.shape[0]
 
     if sub64p_wlp8:
         info = ('Photometry measured as the sum of all values in the '
                'subarray.  No background subtraction was performed.')
 
-        for i in np.arange(nimg):
-            aperture_sum.append(np.sum(datamodel.data[i, :, :]))
-            aperture_sum_err.append(
-                np.sqrt(np.sum(datamodel.err[i, :, :]**2)))
+        aperture_sum = np.sum(datamodel.data, axis=(1, 2))
+        aperture_sum_err = np.sqrt(np.sum(datamodel.err**2, axis=(1, 2)))
     else:
         info = ('Photometry measured in a circular aperture of r={0} '
                 'pixels.  Background calculated as the mean in a '
                 'circular annulus with r_inner={1} pixels and '
                 'r_outer={2} pixels.'.format(radius, radius_inner,
                                                 radius_outer))
-        for i in np.arange(nimg):
-            aper_sum, aper_sum_err = phot_aper.do_photometry(
-                datamodel.data[i, :, :], error=datamodel.err[i, :, :])
-            ann_sum, ann_sum_err = bkg_aper.do_photometry(
-                datamodel.data[i, :, :], error=datamodel.err[i, :, :])
-
-            aperture_sum.append(aper_sum[0])
-            aperture_sum_err.append(aper_sum_err[0])
-            annulus_sum.append(ann_sum[0])
-            annulus_sum_err.append(ann_sum_err[0])
-
-    aperture_sum = np.array(aperture_sum)
-    aperture_sum_err = np.array(aperture_sum_err)
-    annulus_sum = np.array(annulus_sum)
-    annulus_sum_err = np.array(annulus_sum_err)
+
+        # The exact aperture weights are computed once, and applied to
+        # all integrations at once
+        shape = datamodel.data.shape[1:]
+        aperture_sum, aperture_sum_err = weighted_sums(
+            datamodel.data, datamodel.err, aperture_weights(phot_aper, shape))
+        annulus_sum, annulus_sum_err = weighted_sums(
+            datamodel.data, datamodel.err, aperture_weights(bkg_aper, shape))
 
     # construct metadata for output table
     meta = OrderedDict()
@@ -192,3 +181,70 @@ def tso_aperture_photometry(datamodel, xcenter, ycenter, radius, radius_inner,
         tbl['net_aperture_sum_err'] = aperture_sum_err
 
     return tbl
+
+
+def aperture_weights(aperture, shape):
+    """Image of the fraction of each pixel within an aperture.
+
+    Parameters
+    ----------
+    aperture : `~photutils.PixelAperture`
+        An aperture with a single position.
+
+    shape : tuple of int
+        The shape of the image.
+
+    Returns
+    -------
+    weights : ndarray, 2-D
+        The weights of the pixels for the ``exact`` method of photutils,
+        0 outside of the aperture.
+    """
+    mask = aperture.to_mask(method='exact')
+    if isinstance(mask, list):
+        mask = mask[0]
+    weights = mask.to_image(shape)
+    if weights is None:                 # no overlap with the image
+        weights = np.zeros(shape, dtype=np.float64)
+
+    return weights
+
+
+def weighted_sums(data, err, weights):
+    """Aperture photometry of each plane of a cube.
+
+    This gives the same sums and errors as ``do_photometry`` of photutils
+    for each integration, with a single matrix product for all the
+    integrations (in chunks, to limit memory use).
+
+    Parameters
+    ----------
+    data, err : ndarray, 3-D
+        The data and error arrays of the integrations.
+
+    weights : ndarray, 2-D
+        The weight of each pixel, see `aperture_weights`.
+
+    Returns
+    -------
+    sums, sum_errs : ndarray, 1-D
+        The weighted sum of the data and its error, for each integration.
+    """
+    # only the pixels within the aperture are used, so that NaN values
+    # elsewhere do not propagate
+    pixels = np.flatnonzero(weights)
+    w = weights.ravel()[pixels]
+
+    nints = data.shape[0]
+    data = data.reshape(nints, -1)
+    err = err.reshape(nints, -1)
+
+    sums = np.zeros(nints, dtype=np.float64)
+    variances = np.zeros(nints, dtype=np.float64)
+    step = max(1, MAX_CHUNK_SIZE // max(len(pixels) * data.itemsize, 1))
+    for start in range(0, nints, step):
+        stop = min(start + step, nints)
+        sums[start:stop] = data[start:stop, pixels].dot(w)
+        variances[start:stop] = (err[start:stop, pixels]**2).dot(w)
+
+    return sums, np.sqrt(variances)
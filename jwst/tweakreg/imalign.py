@@ -14,14 +14,16 @@ from datetime import datetime
 
 # THIRD PARTY
 import numpy as np
+from scipy import sparse
 
 # LOCAL
+from ..lib.footprint_index import FootprintIndex
 from . wcsimage import (WCSGroupCatalog, WCSImageCatalog, RefCatalog)
 from . linearfit import SingularMatrixError, NotEnoughPointsError
 
 
-__all__ = ['align', 'overlap_matrix', 'max_overlap_pair', 'max_overlap_image',
-           'NotEnoughCatalogsError']
+__all__ = ['align', 'overlap_graph', 'overlap_matrix', 'max_overlap_pair',
+           'max_overlap_image', 'NotEnoughCatalogsError']
 
 __author__ = 'Mihai Cara'
 
@@ -38,7 +40,7 @@ class NotEnoughCatalogsError(Exception):
 def align(imcat, refcat=None, enforce_user_order=True,
           expand_refcat=False, minobj=None, searchrad=1.0,
           use2dhist=True, separation=0.5, tolerance=1.0,
-          xoffset=0.0, yoffset=0.0,
+          xoffset=0.0, yoffset=0.0, matching='xyxymatch',
           fitgeom='general', nclip=3, sigma=3.0):
     """
     Align (groups of) images by adjusting the parameters of their WCS based on
@@ -119,6 +121,11 @@ def align(imcat, refcat=None, enforce_user_order=True,
         reference frame. This offset will be used for all input images
         provided. This parameter is ignored when `use2dhist` is `True`.
 
+    matching : {'xyxymatch', 'kdtree', 'triangles'}, optional
+        Source matching algorithm. See
+        :py:meth:`~jwst.tweakreg.wcsimage.WCSGroupCatalog.match2ref`
+        for details.
+
     fitgeom : {'shift', 'rscale', 'general'}, optional
         The fitting geometry to be used in fitting the matched object lists.
         This parameter is used in fitting the offsets, rotations and/or scale
@@ -216,6 +223,10 @@ def align(imcat, refcat=None, enforce_user_order=True,
 
         return [], skipped_imcat
 
+    # index of image footprints used to avoid computing overlaps of images
+    # that cannot intersect the reference catalog:
+    footprints = _FootprintIndex(imcat)
+
     # get the first image to be aligned and
     # create reference catalog if needed:
     if refcat is None or refcat.catalog is None:
@@ -234,7 +245,8 @@ def align(imcat, refcat=None, enforce_user_order=True,
         current_imcat = max_overlap_image(
             refimage=refcat,
             images=imcat,
-            enforce_user_order=enforce_user_order or not expand_refcat
+            enforce_user_order=enforce_user_order or not expand_refcat,
+            footprints=footprints
         )
 
     aligned_imcat = []
@@ -253,6 +265,7 @@ def align(imcat, refcat=None, enforce_user_order=True,
                 xoffset=xoffset,
                 yoffset=yoffset,
                 tolerance=tolerance,
+                matching=matching,
                 fitgeom=fitgeom,
                 nclip=nclip,
                 sigma=sigma
@@ -282,7 +295,8 @@ def align(imcat, refcat=None, enforce_user_order=True,
         current_imcat = max_overlap_image(
             refimage=refcat,
             images=imcat,
-            enforce_user_order=enforce_user_order or not expand_refcat
+            enforce_user_order=enforce_user_order or not expand_refcat,
+            footprints=footprints
         )
 
     # log running time:
@@ -297,6 +311,90 @@ def align(imcat, refcat=None, enforce_user_order=True,
     return aligned_imcat, skipped_imcat
 
 
+class _FootprintIndex(FootprintIndex):
+    """
+    A spatial index of image footprints that also caches areas of overlap
+    of images with a reference catalog.
+
+    Cached areas are recomputed only when the footprint of the reference
+    catalog changes (e.g., when the reference catalog is expanded with
+    sources from aligned images) and only for the images whose footprints
+    may overlap the reference footprint.
+
+    """
+    def __init__(self, images):
+        super().__init__([im.polygon for im in images])
+        self._index = {id(im): k for k, im in enumerate(images)}
+        self._ref_polygon = None
+        self._ref_near = set()
+        self._ref_area = {}
+
+    def overlap_areas(self, refimage, images):
+        """ Return a list of areas of overlap of ``images`` with the
+        ``refimage``.
+
+        """
+        if refimage.polygon is not self._ref_polygon:
+            # footprint of the reference image has changed:
+            self._ref_polygon = refimage.polygon
+            self._ref_near = self.neighbors(self._ref_polygon)
+            self._ref_area = {}
+
+        area = []
+        for im in images:
+            key = id(im)
+            if key not in self._ref_area:
+                k = self._index.get(key)
+                if k is None or k in self._ref_near:
+                    self._ref_area[key] = refimage.intersection_area(im)
+                else:
+                    self._ref_area[key] = 0.0
+            area.append(self._ref_area[key])
+
+        return area
+
+
+def overlap_graph(images):
+    """
+    Compute a sparse overlap graph of images: non-zero elements (i,j) of
+    the returned sparse matrix are absolute values of the areas of overlap
+    on the sky between i-th input image and j-th input image.
+
+    Image footprints are enclosed in spherical caps and a KD-tree built on
+    the cap centers is used to find images whose footprints may overlap.
+    Areas of overlap are computed only for these pairs of images.
+
+    Parameters
+    ----------
+
+    images : list of WCSImageCatalog, WCSGroupCatalog, or RefCatalog
+        A list of catalogs that implement :py:meth:`intersection_area` method.
+
+    Returns
+    -------
+    m : scipy.sparse.csr_matrix
+        A symmetric sparse matrix of shape ``NxN`` where ``N`` is equal to
+        the number of input images. Only areas of overlap of intersecting
+        images are stored.
+
+    """
+    nimg = len(images)
+    rows = []
+    cols = []
+    data = []
+    for i, j in _FootprintIndex(images).pairs():
+        area = images[i].intersection_area(images[j])
+        if area > 0.0:
+            rows += [i, j]
+            cols += [j, i]
+            data += [area, area]
+
+    m = sparse.csr_matrix((data, (rows, cols)), shape=(nimg, nimg),
+                          dtype=float)
+    m.sort_indices()
+    return m
+
+
 def overlap_matrix(images):
     """
     Compute overlap matrix: non-diagonal elements (i,j) of this matrix are
@@ -323,14 +421,7 @@ def overlap_matrix(images):
         input image and j-th input image. Diagonal elements are set to ``0.0``.
 
     """
-    nimg = len(images)
-    m = np.zeros((nimg, nimg), dtype=np.float)
-    for i in range(nimg):
-        for j in range(i + 1, nimg):
-            area = images[i].intersection_area(images[j])
-            m[j, i] = area
-            m[i, j] = area
-    return m
+    return overlap_graph(images).toarray()
 
 
 def max_overlap_pair(images, enforce_user_order):
@@ -380,13 +471,19 @@ def max_overlap_pair(images, enforce_user_order):
         im2 = images.pop(0)
         return (im1, im2)
 
-    m = overlap_matrix(images)
-    n = m.shape[0]
-    index = m.argmax()
-    i = index // n
-    j = index % n
-    si = np.sum(m[i])
-    sj = np.sum(m[:, j])
+    m = overlap_graph(images)
+    if m.nnz:
+        # non-zero elements are stored in row-major order and so ties
+        # are resolved in the same way as by numpy.argmax on a dense matrix:
+        index = m.data.argmax()
+        i = np.searchsorted(m.indptr, index, side='right') - 1
+        j = m.indices[index]
+    else:
+        i = 0
+        j = 0
+    sums = np.asarray(m.sum(axis=1)).ravel()
+    si = sums[i]
+    sj = sums[j]
 
     if si < sj:
         c = j
@@ -401,7 +498,7 @@ def max_overlap_pair(images, enforce_user_order):
 
     # Sort the remaining of the input list of images by overlap area
     # with the reference image (in decreasing order):
-    row = m[i]
+    row = m[i].toarray().ravel()
     row = np.delete(row, i)
     row = np.delete(row, j)
     sorting_indices = np.argsort(row)[::-1]
@@ -414,7 +511,7 @@ def max_overlap_pair(images, enforce_user_order):
     return (im1, im2)
 
 
-def max_overlap_image(refimage, images, enforce_user_order):
+def max_overlap_image(refimage, images, enforce_user_order, footprints=None):
     """
     Return the image from the input ``images`` list that has the largest
     overlap with the ``refimage`` image.
@@ -434,6 +531,12 @@ def max_overlap_image(refimage, images, enforce_user_order):
         When ``enforce_user_order`` is `True`, returned image is the first
         image from the ``images`` input list regardless ofimage overlaps.
 
+    footprints : _FootprintIndex, None, optional
+        An index of image footprints used to skip computation of areas of
+        overlap of images that cannot intersect ``refimage`` and to re-use
+        areas computed in previous calls when the footprint of ``refimage``
+        has not changed. When `None`, a new index of ``images`` is created.
+
     Returns
     -------
     image: WCSImageCatalog, WCSGroupCatalog, or None
@@ -448,6 +551,9 @@ def max_overlap_image(refimage, images, enforce_user_order):
         # revert to old tweakreg behavior
         return images.pop(0)
 
-    area = [refimage.intersection_area(im) for im in images]
+    if footprints is None:
+        footprints = _FootprintIndex(images)
+
+    area = footprints.overlap_areas(refimage, images)
     idx = np.argmax(area)
     return images.pop(idx)
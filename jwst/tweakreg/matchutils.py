@@ -1,14 +1,18 @@
 """
 A module that provides algorithms for initial estimation of shifts
-based on 2D histograms.
+based on 2D histograms, for initial estimation of linear transformations
+based on matching triangles formed by sources, and for cross-matching
+sources using KD-trees.
 
 """
 
 import logging
 import numpy as np
+from scipy.spatial import cKDTree
 
 
-__all__ = ['estimate_2dhist_shift']
+__all__ = ['estimate_2dhist_shift', 'estimate_triangle_transform',
+           'kdtree_match']
 
 
 log = logging.getLogger(__name__)
@@ -16,10 +20,13 @@ log.setLevel(logging.DEBUG)
 
 
 def _xy_2dhist(imgxy, refxy, r):
-    # This code replaces the C version (arrxyzero) from carrutils.c
-    # It is about 5-8 times slower than the C version.
-    dx = np.subtract.outer(imgxy[:, 0], refxy[:, 0]).ravel()
-    dy = np.subtract.outer(imgxy[:, 1], refxy[:, 1]).ravel()
+    # This code replaces the C version (arrxyzero) from carrutils.c.
+    # Instead of computing offsets between all pairs of sources, only pairs
+    # of sources closer than the search box (in the Chebyshev sense) are
+    # found using a KD-tree.
+    pairs = _box_pairs(imgxy, refxy, r + 0.5)
+    dx = imgxy[pairs[:, 0], 0] - refxy[pairs[:, 1], 0]
+    dy = imgxy[pairs[:, 0], 1] - refxy[pairs[:, 1], 1]
     idx = np.where((dx < r + 0.5) & (dx >= -r - 0.5) &
                    (dy < r + 0.5) & (dy >= -r - 0.5))
     h = np.histogram2d(dx[idx], dy[idx], 2 * r + 1,
@@ -27,6 +34,27 @@ def _xy_2dhist(imgxy, refxy, r):
     return h[0].T
 
 
+def _box_pairs(xy1, xy2, half_width):
+    """ Return a ``(N, 2)`` array of indices of all pairs of points from
+    ``xy1`` and ``xy2`` whose X and Y coordinates differ by no more than
+    ``half_width``.
+    """
+    xy1 = np.asarray(xy1, dtype=np.float64).reshape((-1, 2))
+    xy2 = np.asarray(xy2, dtype=np.float64).reshape((-1, 2))
+    if xy1.shape[0] == 0 or xy2.shape[0] == 0:
+        return np.empty((0, 2), dtype=int)
+
+    tree1 = cKDTree(xy1)
+    tree2 = cKDTree(xy2)
+    # NOTE: add a small margin so that no pair is lost to round-off. Pairs
+    #       are filtered again by the caller.
+    pairs = tree1.sparse_distance_matrix(
+        tree2, half_width * (1.0 + 1e-12) + 1e-12, p=np.inf,
+        output_type='ndarray'
+    )
+    return np.column_stack([pairs['i'], pairs['j']]).astype(int)
+
+
 def estimate_2dhist_shift(imgxy, refxy, searchrad=3.0):
     """ Create a 2D matrix-histogram which contains the delta between each
         XY position and each UV position. Then estimate initial offset
@@ -251,3 +279,286 @@ def _find_peak(data, peak_fit_box=5, mask=None):
         fit_status = 'WARNING:EDGE'
 
     return coord, fit_status, np.s_[y1:y2, x1:x2]
+
+
+def _remove_crowded(xy, separation):
+    """ Return indices of the sources in ``xy`` that do not have any other
+    source closer than ``separation``.
+    """
+    idx = np.arange(xy.shape[0])
+    if separation <= 0 or xy.shape[0] < 2:
+        return idx
+    pairs = cKDTree(xy).query_pairs(separation, output_type='ndarray')
+    crowded = np.zeros(xy.shape[0], dtype=bool)
+    crowded[pairs.ravel()] = True
+    return idx[~crowded]
+
+
+def kdtree_match(imgxy, refxy, origin=(0.0, 0.0), matrix=None,
+                 tolerance=1.0, separation=0.0):
+    """
+    Cross-match sources in two catalogs using a KD-tree.
+
+    Input source positions are first transformed to the reference frame
+    using ``matrix @ (imgxy - origin)``. Each transformed input source is
+    then matched to the nearest reference source within ``tolerance`` while
+    ensuring that each reference source is matched to at most one (the
+    closest) input source.
+
+    Parameters
+    ----------
+    imgxy : numpy.ndarray
+        A ``(N, 2)`` array of input source positions.
+
+    refxy : numpy.ndarray
+        A ``(M, 2)`` array of reference source positions.
+
+    origin : tuple of float, optional
+        Offset of the input coordinates relative to the reference
+        coordinates. See :py:func:`estimate_2dhist_shift`.
+
+    matrix : numpy.ndarray, None, optional
+        A ``2x2`` matrix of the linear transformation from input to
+        reference coordinates (e.g., from
+        :py:func:`estimate_triangle_transform`). Identity is assumed
+        when `None`.
+
+    tolerance : float, optional
+        Matching tolerance (in the units of the reference coordinates).
+
+    separation : float, optional
+        Sources closer than ``separation`` to other sources in the same
+        catalog are not matched.
+
+    Returns
+    -------
+    matches : numpy.ndarray
+        A structured array with fields ``'input_x'``, ``'input_y'``,
+        ``'input_idx'``, ``'ref_x'``, ``'ref_y'``, and ``'ref_idx'``,
+        the same as the output of :py:func:`~stsci.stimage.xyxymatch`.
+
+    """
+    imgxy = np.asarray(imgxy, dtype=np.float64).reshape((-1, 2))
+    refxy = np.asarray(refxy, dtype=np.float64).reshape((-1, 2))
+
+    dtype = [('input_x', np.float64), ('input_y', np.float64),
+             ('input_idx', np.int64), ('ref_x', np.float64),
+             ('ref_y', np.float64), ('ref_idx', np.int64)]
+
+    img_idx = _remove_crowded(imgxy, separation)
+    ref_idx = _remove_crowded(refxy, separation)
+    if img_idx.size == 0 or ref_idx.size == 0:
+        return np.zeros(0, dtype=dtype)
+
+    xy = imgxy[img_idx] - np.asarray(origin, dtype=np.float64)
+    if matrix is not None:
+        xy = np.dot(xy, np.asarray(matrix, dtype=np.float64).T)
+
+    dist, k = cKDTree(refxy[ref_idx]).query(
+        xy, k=1, distance_upper_bound=tolerance
+    )
+    found = np.isfinite(dist)
+    dist = dist[found]
+    img_idx = img_idx[found]
+    ref_idx = ref_idx[k[found]]
+
+    # keep only the closest input source for each reference source:
+    order = np.lexsort((img_idx, dist))
+    _, first = np.unique(ref_idx[order], return_index=True)
+    keep = np.sort(order[first])
+    img_idx = img_idx[keep]
+    ref_idx = ref_idx[keep]
+
+    matches = np.zeros(img_idx.size, dtype=dtype)
+    matches['input_x'] = imgxy[img_idx, 0]
+    matches['input_y'] = imgxy[img_idx, 1]
+    matches['input_idx'] = img_idx
+    matches['ref_x'] = refxy[ref_idx, 0]
+    matches['ref_y'] = refxy[ref_idx, 1]
+    matches['ref_idx'] = ref_idx
+    return matches
+
+
+def _triangles(xy, nneighbors):
+    """
+    Build triangles from each source and pairs of its nearest neighbors.
+
+    Returns
+    -------
+    vertices : numpy.ndarray
+        A ``(T, 3)`` array of indices of triangle vertices. Vertices are
+        ordered so that the first vertex is opposite to the longest side,
+        the second vertex is opposite to the middle side and the third is
+        opposite to the shortest side of the triangle.
+
+    invariants : numpy.ndarray
+        A ``(T, 2)`` array of ratios of the middle and shortest sides to the
+        longest side of each triangle. These do not depend on shifts,
+        rotations, or scale.
+
+    sides : numpy.ndarray
+        Length of the longest side of each triangle.
+
+    """
+    npts = xy.shape[0]
+    nneighbors = min(nneighbors, npts - 1)
+    if nneighbors < 2:
+        return np.empty((0, 3), dtype=int), np.empty((0, 2)), np.empty(0)
+
+    _, nn = cKDTree(xy).query(xy, k=nneighbors + 1)
+    i1, i2 = np.triu_indices(nneighbors, 1)
+    tri = np.column_stack([
+        np.repeat(nn[:, 0], i1.size),
+        nn[:, 1:][:, i1].ravel(),
+        nn[:, 1:][:, i2].ravel()
+    ])
+    tri = np.unique(np.sort(tri, axis=1), axis=0)
+
+    # side opposite to each vertex:
+    p = xy[tri]
+    sides = np.stack([
+        np.hypot(*(p[:, 2] - p[:, 1]).T),
+        np.hypot(*(p[:, 2] - p[:, 0]).T),
+        np.hypot(*(p[:, 1] - p[:, 0]).T)
+    ], axis=1)
+
+    order = np.argsort(sides, axis=1)[:, ::-1]
+    rows = np.arange(tri.shape[0])[:, np.newaxis]
+    tri = tri[rows, order]
+    sides = sides[rows, order]
+
+    good = sides[:, 2] > 0
+    tri = tri[good]
+    sides = sides[good]
+    invariants = sides[:, 1:] / sides[:, :1]
+
+    return tri, invariants, sides[:, 0]
+
+
+def estimate_triangle_transform(imgxy, refxy, nbright=None, nneighbors=5,
+                                tolerance=0.005, rotation_tol=1.0,
+                                shift_tol=1.0):
+    """
+    Estimate a rotation, scale, and shift between two catalogs by matching
+    similar triangles formed by sources in each catalog.
+
+    Triangles are formed by each of (at most) the first ``nbright`` sources
+    in each catalog and pairs of its ``nneighbors`` nearest neighbors
+    (in the same subset of sources).
+    Triangles in the two catalogs are matched using a KD-tree built on
+    shape invariants (ratios of triangle sides). Each pair of matched
+    triangles "votes" for a similarity transformation and the transformation
+    supported by the largest number of triangle pairs is returned.
+
+    Parameters
+    ----------
+    imgxy : numpy.ndarray
+        A ``(N, 2)`` array of input source positions.
+
+    refxy : numpy.ndarray
+        A ``(M, 2)`` array of reference source positions.
+
+    nbright : int, None, optional
+        Maximum number of sources from each catalog used to form triangles.
+        This is useful when sources in catalogs are sorted by brightness.
+        All sources are used when `None`.
+
+    nneighbors : int, optional
+        Number of nearest neighbors of each source used to form triangles.
+
+    tolerance : float, optional
+        Tolerance on the side ratios for two triangles to be considered
+        similar.
+
+    rotation_tol : float, optional
+        Tolerance (in degrees) for two triangle pairs to vote for the same
+        rotation.
+
+    shift_tol : float, optional
+        Tolerance (in the units of the reference coordinates) for two
+        triangle pairs to vote for the same shift.
+
+    Returns
+    -------
+    matrix : numpy.ndarray, None
+        A ``2x2`` matrix of the linear (rotation and scale) part of the
+        transformation from input to reference coordinates
+        (``refxy ~ matrix @ imgxy + shift``) or `None` if the transformation
+        could not be found.
+
+    shift : numpy.ndarray, None
+        Shift part of the transformation.
+
+    """
+    log.info("Computing initial guess for the transformation using "
+             "triangle matching...")
+
+    imgxy = np.asarray(imgxy, dtype=np.float64).reshape((-1, 2))[:nbright]
+    refxy = np.asarray(refxy, dtype=np.float64).reshape((-1, 2))[:nbright]
+
+    img_tri, img_inv, img_side = _triangles(imgxy, nneighbors)
+    ref_tri, ref_inv, ref_side = _triangles(refxy, nneighbors)
+
+    if img_tri.shape[0] == 0 or ref_tri.shape[0] == 0:
+        log.warning("Not enough sources to form triangles.")
+        return None, None
+
+    pairs = cKDTree(img_inv).sparse_distance_matrix(
+        cKDTree(ref_inv), tolerance, output_type='ndarray'
+    )
+    if pairs.size == 0:
+        log.warning("No similar triangles found.")
+        return None, None
+    it = pairs['i']
+    jt = pairs['j']
+
+    # similarity transformation voted by each pair of triangles, computed
+    # from the longest side of the triangles (from vertex 2 to vertex 1):
+    dimg = imgxy[img_tri[it, 1]] - imgxy[img_tri[it, 2]]
+    dref = refxy[ref_tri[jt, 1]] - refxy[ref_tri[jt, 2]]
+    scale = ref_side[jt] / img_side[it]
+    angle = np.arctan2(dref[:, 1], dref[:, 0]) - \
+        np.arctan2(dimg[:, 1], dimg[:, 0])
+    angle = np.mod(angle + np.pi, 2.0 * np.pi) - np.pi
+
+    cos_a = scale * np.cos(angle)
+    sin_a = scale * np.sin(angle)
+    # centroids of the triangles define the shift:
+    cimg = imgxy[img_tri[it]].mean(axis=1)
+    cref = refxy[ref_tri[jt]].mean(axis=1)
+    shx = cref[:, 0] - (cos_a * cimg[:, 0] - sin_a * cimg[:, 1])
+    shy = cref[:, 1] - (sin_a * cimg[:, 0] + cos_a * cimg[:, 1])
+
+    # find the transformation with the largest number of votes: bin
+    # transformation parameters with bin sizes equal to the tolerances
+    # (scale is converted to a displacement at the largest distance of the
+    # sources from the origin) and select the most populated bin:
+    rmax = max(np.max(np.abs(imgxy)), 1.0)
+    params = np.column_stack([
+        np.log(scale) * rmax / shift_tol,
+        angle / np.deg2rad(rotation_tol),
+        shx / shift_tol,
+        shy / shift_tol
+    ])
+    bins = np.floor(params).astype(np.int64)
+    ubins, votes = np.unique(bins, axis=0, return_counts=True)
+    best = np.argmax(votes)
+    if votes[best] < 2:
+        log.warning("Unable to find a consistent transformation from "
+                    "matched triangles.")
+        return None, None
+
+    # combine votes from the best bin and its immediate neighbors:
+    members = np.all(np.abs(bins - ubins[best]) <= 1, axis=1)
+    scale = np.exp(np.median(np.log(scale[members])))
+    angle = np.median(angle[members])
+    shift = np.array([np.median(shx[members]), np.median(shy[members])])
+    matrix = scale * np.array([[np.cos(angle), -np.sin(angle)],
+                               [np.sin(angle), np.cos(angle)]])
+
+    log.info("Found initial rotation of {:.4g} deg, scale of {:.6g}, and "
+             "X and Y shifts of {:.4g}, {:.4g} based on {:d} triangle pairs"
+             .format(np.rad2deg(angle), scale, shift[0], shift[1],
+                     int(np.count_nonzero(members))))
+
+    return matrix, shift
@@ -0,0 +1,93 @@
+"""
+Test overlap computations used to order image alignment.
+"""
+import numpy as np
+from astropy.table import Table
+import pytest
+
+from jwst.tweakreg import imalign
+from jwst.tweakreg.wcsimage import RefCatalog
+
+
+def _make_catalogs(ncat, size=0.02, seed=0):
+    """ Create catalogs of random sources in small random patches of sky,
+    some overlapping and some disjoint.
+
+    """
+    rng = np.random.RandomState(seed)
+    centers = np.column_stack([
+        rng.uniform(150.0, 150.1, ncat),
+        rng.uniform(2.0, 2.1, ncat)
+    ])
+    catalogs = []
+    for k, (ra0, dec0) in enumerate(centers):
+        ra = ra0 + rng.uniform(-size, size, 30)
+        dec = dec0 + rng.uniform(-size, size, 30)
+        catalogs.append(
+            RefCatalog(Table([ra, dec], names=('RA', 'DEC')),
+                       name='cat{:d}'.format(k))
+        )
+    return catalogs
+
+
+def _dense_overlap_matrix(images):
+    nimg = len(images)
+    m = np.zeros((nimg, nimg))
+    for i in range(nimg):
+        for j in range(i + 1, nimg):
+            m[i, j] = m[j, i] = images[i].intersection_area(images[j])
+    return m
+
+
+def test_overlap_graph():
+    images = _make_catalogs(16, size=0.01)
+    dense = _dense_overlap_matrix(images)
+
+    m = imalign.overlap_graph(images)
+    assert m.shape == (16, 16)
+    assert 0 < m.nnz < 16 * 15
+    assert np.allclose(m.toarray(), dense, rtol=1e-4, atol=0)
+    assert np.allclose(imalign.overlap_matrix(images), dense,
+                       rtol=1e-4, atol=0)
+
+
+def test_overlap_graph_disjoint():
+    images = _make_catalogs(4, size=0.001)
+    m = imalign.overlap_graph(images)
+    assert m.nnz == 0
+
+    im1, im2 = imalign.max_overlap_pair(list(images), False)
+    assert im1 is images[0]
+    assert im2 is images[1]
+
+
+def test_max_overlap_pair():
+    images = _make_catalogs(12)
+    m = _dense_overlap_matrix(images)
+    i, j = np.unravel_index(m.argmax(), m.shape)
+    if m[i].sum() < m[:, j].sum():
+        i, j = j, i
+
+    remaining = list(images)
+    im1, im2 = imalign.max_overlap_pair(remaining, False)
+    assert im1 is images[i]
+    assert im2 is images[j]
+    assert len(remaining) == 10
+
+
+@pytest.mark.parametrize('expand', [False, True])
+def test_max_overlap_image(expand):
+    images = _make_catalogs(10, seed=1)
+    refcat = RefCatalog(images[0].catalog, name='ref')
+
+    expected = list(images[1:])
+    remaining = list(images[1:])
+    footprints = imalign._FootprintIndex(remaining)
+
+    while remaining:
+        area = [refcat.intersection_area(im) for im in expected]
+        im = imalign.max_overlap_image(refcat, remaining, False,
+                                       footprints=footprints)
+        assert im is expected.pop(int(np.argmax(area)))
+        if expand:
+            refcat.expand_catalog(im.catalog)
@@ -0,0 +1,90 @@
+"""
+Test source matching algorithms from the ``matchutils`` module
+using synthetic dense catalogs.
+"""
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+import pytest
+
+from jwst.tweakreg import matchutils
+
+
+def _make_catalogs(nsrc=3000, size=2000.0, angle=0.0, scale=1.0,
+                   shift=(0.0, 0.0), noise=0.02, seed=0):
+    rng = np.random.RandomState(seed)
+    refxy = rng.uniform(0, size, (nsrc, 2))
+    a = np.deg2rad(angle)
+    matrix = scale * np.array([[np.cos(a), -np.sin(a)],
+                               [np.sin(a), np.cos(a)]])
+    # refxy = matrix @ imgxy + shift:
+    imgxy = np.dot(refxy - shift, np.linalg.inv(matrix).T)
+    imgxy += rng.normal(0.0, noise, imgxy.shape)
+    # shuffle input catalog:
+    perm = rng.permutation(nsrc)
+    return imgxy[perm], refxy, perm
+
+
+def test_xy_2dhist_matches_dense_offsets():
+    """
+    Test that the KD-tree version of _xy_2dhist is identical to the
+    histogram of offsets between all pairs of sources.
+    """
+    imgxy, refxy, _ = _make_catalogs(nsrc=500, shift=(1.3, -2.2))
+    r = 3
+    dx = np.subtract.outer(imgxy[:, 0], refxy[:, 0]).ravel()
+    dy = np.subtract.outer(imgxy[:, 1], refxy[:, 1]).ravel()
+    idx = np.where((dx < r + 0.5) & (dx >= -r - 0.5) &
+                   (dy < r + 0.5) & (dy >= -r - 0.5))
+    expected = np.histogram2d(dx[idx], dy[idx], 2 * r + 1,
+                              [[-r - 0.5, r + 0.5], [-r - 0.5, r + 0.5]])[0].T
+    assert_array_equal(matchutils._xy_2dhist(imgxy, refxy, r), expected)
+
+
+def test_kdtree_match_shift():
+    shift = (1.3, -2.2)
+    imgxy, refxy, perm = _make_catalogs(shift=shift)
+    xyoff = matchutils.estimate_2dhist_shift(imgxy, refxy, searchrad=3)
+    # 2D histogram has a resolution of one bin:
+    assert_allclose(xyoff, (-1.3, 2.2), atol=0.6)
+
+    matches = matchutils.kdtree_match(imgxy, refxy, origin=xyoff,
+                                      tolerance=1.0, separation=2.0)
+    assert len(matches) > 0.95 * len(refxy)
+    assert_array_equal(matches['ref_idx'], perm[matches['input_idx']])
+    assert np.unique(matches['ref_idx']).size == len(matches)
+
+
+def test_kdtree_match_separation():
+    refxy = np.array([[0.0, 0.0], [10.0, 0.0], [10.2, 0.0], [20.0, 5.0]])
+    imgxy = refxy + 0.01
+    matches = matchutils.kdtree_match(imgxy, refxy, tolerance=0.1,
+                                      separation=0.5)
+    assert_array_equal(matches['input_idx'], [0, 3])
+    assert_array_equal(matches['ref_idx'], [0, 3])
+
+
+@pytest.mark.parametrize('angle, scale', [(0.0, 1.0), (7.5, 1.0),
+                                          (-32.0, 1.002)])
+def test_triangle_transform(angle, scale):
+    shift = (35.0, -12.0)
+    imgxy, refxy, perm = _make_catalogs(angle=angle, scale=scale,
+                                        shift=shift)
+
+    matrix, xyshift = matchutils.estimate_triangle_transform(imgxy, refxy)
+    a = np.deg2rad(angle)
+    expected = scale * np.array([[np.cos(a), -np.sin(a)],
+                                 [np.sin(a), np.cos(a)]])
+    assert_allclose(matrix, expected, atol=2e-3)
+
+    matches = matchutils.kdtree_match(imgxy, refxy, matrix=matrix,
+                                      origin=-np.dot(np.linalg.inv(matrix),
+                                                     xyshift),
+                                      tolerance=1.0)
+    assert len(matches) > 0.95 * len(refxy)
+    assert_array_equal(matches['ref_idx'], perm[matches['input_idx']])
+
+
+def test_triangle_transform_no_sources():
+    matrix, shift = matchutils.estimate_triangle_transform(np.zeros((2, 2)),
+                                                           np.zeros((2, 2)))
+    assert matrix is None and shift is None
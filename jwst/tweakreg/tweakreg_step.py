@@ -47,6 +47,7 @@ class TweakRegStep(Step):
         tolerance = float(default=1.0) # Matching tolerance for xyxymatch in arcsec
         xoffset = float(default=0.0), # Initial guess for X offset in arcsec
         yoffset = float(default=0.0) # Initial guess for Y offset in arcsec
+        matching = option('xyxymatch', 'kdtree', 'triangles', default='xyxymatch') # Source matching algorithm
 
         # Catalog fitting parameters:
         fitgeometry = option('shift', 'rscale', 'general', default='general') # Fitting geometry
@@ -153,6 +154,7 @@ class TweakRegStep(Step):
             tolerance=self.tolerance,
             xoffset=self.xoffset,
             yoffset=self.yoffset,
+            matching=self.matching,
             fitgeom=self.fitgeometry,
             nclip=self.nclip,
             sigma=self.sigma
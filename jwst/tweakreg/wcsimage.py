@@ -969,9 +969,8 @@ class WCSGroupCatalog():
 
     def match2ref(self, refcat, minobj=15, searchrad=1.0,
                   separation=0.5, use2dhist=True, xoffset=0.0, yoffset=0.0,
-                  tolerance=1.0):
-        """ Uses xyxymatch to cross-match sources between this catalog and
-            a reference catalog.
+                  tolerance=1.0, matching='xyxymatch'):
+        """ Cross-match sources between this catalog and a reference catalog.
 
         Parameters
         ----------
@@ -1017,6 +1016,18 @@ class WCSGroupCatalog():
             matching the object lists from each image with the reference
             image's object list.
 
+        matching : {'xyxymatch', 'kdtree', 'triangles'}, optional
+            Source matching algorithm. ``'xyxymatch'`` uses
+            :py:func:`~stsci.stimage.xyxymatch`. ``'kdtree'`` uses
+            :py:func:`~jwst.tweakreg.matchutils.kdtree_match` which is
+            much faster for large catalogs. ``'triangles'`` first estimates
+            rotation, scale, and shift between catalogs using
+            :py:func:`~jwst.tweakreg.matchutils.estimate_triangle_transform`
+            and then matches sources using
+            :py:func:`~jwst.tweakreg.matchutils.kdtree_match`. When the
+            triangle-based estimate fails, ``'triangles'`` falls back to
+            ``'kdtree'``.
+
         """
 
         colnames = self._catalog.colnames
@@ -1033,25 +1044,53 @@ class WCSGroupCatalog():
         log.info("Matching sources from '{}' with sources from reference "
                  "{:s} '{}'".format(self.name, 'image', refcat.name))
 
-        if use2dhist:
-            # Determine xyoff (X,Y offset) and tolerance
-            # to be used with xyxymatch:
-            xyoff = matchutils.estimate_2dhist_shift(
+        if matching not in ['xyxymatch', 'kdtree', 'triangles']:
+            raise ValueError("Unsupported 'matching' algorithm: '{}'"
+                             .format(matching))
+
+        matrix = None
+        if matching == 'triangles':
+            matrix, shift = matchutils.estimate_triangle_transform(
                 im_xyref,
                 refxy,
-                searchrad=searchrad
+                shift_tol=tolerance
             )
+            if matrix is None:
+                log.warning("Triangle matching failed. Falling back to "
+                            "KD-tree matching.")
+            else:
+                xyoff = -np.dot(np.linalg.inv(matrix), shift)
+
+        if matrix is None:
+            if use2dhist:
+                # Determine xyoff (X,Y offset) and tolerance
+                # to be used with xyxymatch:
+                xyoff = matchutils.estimate_2dhist_shift(
+                    im_xyref,
+                    refxy,
+                    searchrad=searchrad
+                )
 
+            else:
+                xyoff = (xoffset, yoffset)
+
+        if matching == 'xyxymatch':
+            matches = xyxymatch(
+                im_xyref,
+                refxy,
+                origin=xyoff,
+                tolerance=tolerance,
+                separation=separation
+            )
         else:
-            xyoff = (xoffset, yoffset)
-
-        matches = xyxymatch(
-            im_xyref,
-            refxy,
-            origin=xyoff,
-            tolerance=tolerance,
-            separation=separation
-        )
+            matches = matchutils.kdtree_match(
+                im_xyref,
+                refxy,
+                origin=xyoff,
+                matrix=matrix,
+                tolerance=tolerance,
+                separation=separation
+            )
 
         nmatches = len(matches)
         self._catalog.meta['nmatches'] = nmatches
@@ -1191,7 +1230,8 @@ class WCSGroupCatalog():
 
     def align_to_ref(self, refcat, minobj=15, searchrad=1.0, separation=0.5,
                      use2dhist=True, xoffset=0.0, yoffset=0.0, tolerance=1.0,
-                     fitgeom='rscale', nclip=3, sigma=3.0):
+                     matching='xyxymatch', fitgeom='rscale', nclip=3,
+                     sigma=3.0):
         """
         Matches sources from the image catalog to the sources in the
         reference catalog, finds the affine transformation between matched
@@ -1242,6 +1282,18 @@ class WCSGroupCatalog():
             matching the object lists from each image with the reference
             image's object list.
 
+        matching : {'xyxymatch', 'kdtree', 'triangles'}, optional
+            Source matching algorithm. ``'xyxymatch'`` uses
+            :py:func:`~stsci.stimage.xyxymatch`. ``'kdtree'`` uses
+            :py:func:`~jwst.tweakreg.matchutils.kdtree_match` which is
+            much faster for large catalogs. ``'triangles'`` first estimates
+            rotation, scale, and shift between catalogs using
+            :py:func:`~jwst.tweakreg.matchutils.estimate_triangle_transform`
+            and then matches sources using
+            :py:func:`~jwst.tweakreg.matchutils.kdtree_match`. When the
+            triangle-based estimate fails, ``'triangles'`` falls back to
+            ``'kdtree'``.
+
         fitgeom : {'shift', 'rscale', 'general'}, optional
             The fitting geometry to be used in fitting the matched object
             lists. This parameter is used in fitting the offsets, rotations
@@ -1266,7 +1318,7 @@ class WCSGroupCatalog():
         self.match2ref(refcat=refcat, minobj=minobj, searchrad=searchrad,
                        separation=separation,
                        use2dhist=use2dhist, xoffset=xoffset, yoffset=yoffset,
-                       tolerance=tolerance)
+                       tolerance=tolerance, matching=matching)
         fit = self.fit2ref(refcat=refcat, tanplane_wcs=tanplane_wcs,
                            fitgeom=fitgeom, nclip=nclip, sigma=sigma)
         self.apply_affine_to_wcs(
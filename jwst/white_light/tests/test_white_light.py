@@ -0,0 +1,47 @@
+"""
+Test the white-light fluxes of spectra stored as tables and as columns
+"""
+import numpy as np
+import pytest
+
+from jwst import datamodels
+from jwst.white_light.white_light import white_light
+
+
+def _multispec(nints, orders):
+    rng = np.random.RandomState(5)
+    model = datamodels.MultiSpecModel()
+    model.meta.instrument.name = 'NIRISS'
+    model.meta.exposure.type = 'NIS_SOSS'
+    model.meta.exposure.integration_start = 1
+    model.meta.exposure.integration_end = nints
+    int_times = np.zeros(nints + 1, dtype=model.int_times.dtype)
+    int_times['integration_number'] = np.arange(1, nints + 2)
+    int_times['int_mid_MJD_UTC'] = 58000. + 0.01 * np.arange(nints + 1)
+    model.int_times = int_times
+    for order in orders:
+        for integ in range(nints):
+            model.spec.append(datamodels.SpecModel())
+            spec = model.spec[-1]
+            otab = np.zeros(20, dtype=spec.spec_table.dtype)
+            otab['WAVELENGTH'] = np.arange(20.)
+            otab['FLUX'] = rng.uniform(size=20)
+            spec.spec_table = otab
+            if order is not None:
+                spec.spectral_order = order
+            spec.int_num = integ + 1
+    return model
+
+
+@pytest.mark.parametrize('orders', [[1, 2], [None]])
+def test_white_light_columns(orders):
+    tables = _multispec(nints=4, orders=orders)
+    columns = datamodels.MultiIntSpecModel(tables)
+
+    expected = white_light(tables)
+    result = white_light(columns)
+    assert result.meta == expected.meta
+    assert result.colnames == expected.colnames
+    for name in expected.colnames:
+        assert np.array_equal(result[name], expected[name])
+    assert len(result) == 4 * len(orders)
@@ -5,45 +5,52 @@ from collections import OrderedDict
 from astropy.table import QTable
 from astropy.time import Time, TimeDelta
 
+from .. import datamodels
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
 def white_light(input):
 
-    ntables = len(input.spec)
-    fluxsums = []
+    if isinstance(input, datamodels.MultiIntSpecModel):
+        (fluxsums, sporders, ntables_order) = _column_sums(input)
+    else:
+        (fluxsums, sporders, ntables_order) = _table_sums(input)
 
-    # The input should contain one row per integration for each spectral
-    # order.  NIRISS SOSS data can contain up to three orders.
-    norders = 0                 # number of different spectral orders
-    sporders = []               # list of spectral order numbers
-    ntables_order = []          # number of tables for each spectral order
-    prev_spectral_order = -999
-    for i in range(ntables):
-        # The following assumes that all rows for a given spectral order
-        # are contiguous.
-        spectral_order = input.spec[i].spectral_order
-        if spectral_order is None:
-            norders = 1
-            sporders = [0]
-            ntables_order = [ntables]
-            break
-        if spectral_order != prev_spectral_order:
-            sporders.append(spectral_order)
-            prev_spectral_order = spectral_order
-            ntables_order.append(1)
-            norders = len(sporders)
-        else:
-            ntables_order[norders - 1] += 1
+    return light_curve(input, fluxsums, sporders, ntables_order)
+
+
+def light_curve(input, fluxsums, sporders, ntables_order):
+    """Make the white-light table from the flux sums of each integration.
+
+    Parameters
+    ----------
+    input : data model
+        The model the times and metadata of the table are taken from: the
+        extracted spectra or the multi-integration data they are from.
+
+    fluxsums : array_like
+        The sum of the flux of each integration, for one spectral order
+        after the other.
+
+    sporders : list
+        The spectral order numbers.
+
+    ntables_order : list
+        The number of integrations for each spectral order.
+
+    Returns
+    -------
+    tbl : `~astropy.table.QTable`
+        The times and flux sums.
+    """
+    ntables = len(fluxsums)
+    norders = len(sporders)
 
     nints = max(ntables_order)
     log.debug("norders = %d, sporders = %s, ntables_order = %s",
               norders, str(sporders), str(ntables_order))
 
-    # Compute the flux sum for each integration in the input
-    for i in range(ntables):
-        fluxsums.append(input.spec[i].spec_table['FLUX'].sum())
-
     # Populate meta data for the output table
     tbl_meta = OrderedDict()
     tbl_meta['instrument'] = input.meta.instrument.name
@@ -123,3 +130,70 @@ def white_light(input):
     tbl['whitelight_flux'] = fluxsums
 
     return tbl
+
+
+def _table_sums(input):
+    """Flux sums of a MultiSpecModel with one table per integration.
+
+    Returns
+    -------
+    fluxsums : list
+        The sum of the flux of each table.
+
+    sporders : list
+        The spectral order numbers.
+
+    ntables_order : list
+        The number of tables for each spectral order.
+    """
+    ntables = len(input.spec)
+    fluxsums = []
+
+    # The input should contain one row per integration for each spectral
+    # order.  NIRISS SOSS data can contain up to three orders.
+    norders = 0                 # number of different spectral orders
+    sporders = []               # list of spectral order numbers
+    ntables_order = []          # number of tables for each spectral order
+    prev_spectral_order = -999
+    for i in range(ntables):
+        # The following assumes that all rows for a given spectral order
+        # are contiguous.
+        spectral_order = input.spec[i].spectral_order
+        if spectral_order is None:
+            norders = 1
+            sporders = [0]
+            ntables_order = [ntables]
+            break
+        if spectral_order != prev_spectral_order:
+            sporders.append(spectral_order)
+            prev_spectral_order = spectral_order
+            ntables_order.append(1)
+            norders = len(sporders)
+        else:
+            ntables_order[norders - 1] += 1
+
+    # Compute the flux sum for each integration in the input
+    for i in range(ntables):
+        fluxsums.append(input.spec[i].spec_table['FLUX'].sum())
+
+    return fluxsums, sporders, ntables_order
+
+
+def _column_sums(input):
+    """Flux sums of a MultiIntSpecModel, with one row per integration.
+
+    Returns the same values as `_table_sums`, with the sums of all the
+    integrations of a spectral order computed at once.
+    """
+    fluxsums = []
+    sporders = []
+    ntables_order = []
+    for spec in input.spec:
+        fluxsums.extend(spec.flux.sum(axis=1))
+        if spec.spectral_order is None:
+            sporders.append(0)
+        else:
+            sporders.append(spec.spectral_order)
+        ntables_order.append(spec.flux.shape[0])
+
+    return fluxsums, sporders, ntables_order